@@ -1,6 +1,7 @@
 import traceback
 import html
 import json
+import datetime
 from configparser import ConfigParser
 
 from telegram import Update
@@ -8,7 +9,11 @@ from telegram.constants import ParseMode
 from telegram.ext import Application, ContextTypes
 
 from utils.logger import logger
-from bot.utils.commands import get_chat_id_handler
+from sql import run_sql, pending_sql
+from bot.utils.commands import get_chat_id_handler, cache_stats_handler, check_balances_handler, rebuild_balances_handler, outbox_stats_handler, requeue_outbox_handler
+from bot.utils.notifications import flush_digests, DIGEST_INTERVAL_SECONDS
+from bot.utils.outbox import deliver_outbox, purge_outbox, DELIVERY_INTERVAL_SECONDS
+from bot.utils.pagination import stateless_paginator_handler
 from bot.context_handlers import settings_handler, back_to_menu_handler, log_out_handler
 from bot.user_login import user_login_conv
 from bot.teacher_settings import edit_course_conv, edit_classroom_conv
@@ -31,6 +36,9 @@ config = ConfigParser()
 config.read("config.ini")
 TOKEN = config.get("bot", "TOKEN")
 DEV_CHAT = config.get("bot", "DEV_CHAT")
+# resolved pendings older than this are moved to the archive, see [pending] in config.ini
+ARCHIVE_AFTER_DAYS = config.getint("pending", "ARCHIVE_AFTER_DAYS", fallback=90)
+ARCHIVE_INTERVAL_HOURS = config.getint("pending", "ARCHIVE_INTERVAL_HOURS", fallback=24)
 
 async def error_handler(update: Update, context: ContextTypes):
     """Log Errors caused by Updates."""
@@ -61,16 +69,42 @@ async def error_handler(update: Update, context: ContextTypes):
         text=msg, parse_mode=ParseMode.HTML
     )
 
+async def archive_pendings(context: ContextTypes):
+    """ Job that moves old resolved pendings to the archive. """
+    moved = await run_sql(pending_sql.archive_resolved_pendings, datetime.timedelta(days=ARCHIVE_AFTER_DAYS))
+    logger.info(f"Archived {moved} resolved pendings.")
+
 def start_bot():
     """Starts the bot"""
     logger.info("Starting ClassBot...")
     app = Application.builder().token(TOKEN).read_timeout(30).write_timeout(30).build()
     _add_handlers(app)
+    _add_jobs(app)
     app.run_polling()
 
+def _add_jobs(app):
+    if app.job_queue:
+        app.job_queue.run_repeating(archive_pendings, interval=datetime.timedelta(hours=ARCHIVE_INTERVAL_HOURS), first=0)
+        app.job_queue.run_repeating(flush_digests, interval=DIGEST_INTERVAL_SECONDS)
+        # also delivers what was left in the outbox when the bot stopped
+        app.job_queue.run_repeating(deliver_outbox, interval=DELIVERY_INTERVAL_SECONDS, first=0)
+        app.job_queue.run_repeating(purge_outbox, interval=datetime.timedelta(days=1), first=datetime.timedelta(minutes=5))
+    else:
+        # without the job-queue extra only archive once at startup, channel
+        # notifications are sent one by one and the outbox is only delivered
+        # when a handler adds a message to it
+        logger.warning("JobQueue not available, resolved pendings are only archived at startup, notification digests are disabled and failed outbox messages are not retried until a new one is added.")
+        moved = pending_sql.archive_resolved_pendings(datetime.timedelta(days=ARCHIVE_AFTER_DAYS))
+        logger.info(f"Archived {moved} resolved pendings.")
+
 def _add_handlers(app):
     # utils
     app.add_handler(get_chat_id_handler)
+    app.add_handler(cache_stats_handler)
+    app.add_handler(check_balances_handler)
+    app.add_handler(rebuild_balances_handler)
+    app.add_handler(outbox_stats_handler)
+    app.add_handler(requeue_outbox_handler)
 
     app.add_handler(user_login_conv) 
 
@@ -92,6 +126,9 @@ def _add_handlers(app):
     app.add_handler(student_activities_conv)
     app.add_handler(student_practic_classes_conv)
 
+    # after the conversations, that handle it while the user is in them
+    app.add_handler(stateless_paginator_handler)
+
     app.add_handler(settings_handler)
     app.add_handler(back_to_menu_handler)
     app.add_handler(log_out_handler)
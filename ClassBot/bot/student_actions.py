@@ -11,11 +11,13 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.media import remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_student_context
-from sql import user_sql, student_sql, practic_class_sql, classroom_sql, course_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql, conference_sql, activity_type_sql
+from sql import user_sql, practic_class_sql, classroom_sql, course_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql, conference_sql, activity_type_sql
 from bot.student_inventory import back_to_student_menu
 
 
@@ -65,11 +67,13 @@ async def select_action(update: Update, context: ContextTypes):
         return states.S_ACTIONS_SELECT_INTERVENTION
     if action == "action_teacher_correction":
         """ Shows the teachers of the classroom to select """
-        student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+        student = user_sql.get_identity(update.effective_user.id, "student")
         classroom = classroom_sql.get_classroom(student.active_classroom_id)
         teacher_ids = teacher_classroom_sql.get_teacher_ids(classroom.id)
         if teacher_ids:
-            buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(teacher_id).fullname}", callback_data=f"teacher#{teacher_id}") for i, teacher_id in enumerate(teacher_ids, start=1)]
+            # load the names of every user at once
+            users = user_sql.get_users_by_ids(teacher_ids)
+            buttons = [InlineKeyboardButton(f"{i}. {users[teacher_id].fullname}", callback_data=f"teacher#{teacher_id}") for i, teacher_id in enumerate(teacher_ids, start=1)]
             await query.edit_message_text(
                 "Seleccione el profesor al que desea rectificar",
                 reply_markup=paginated_keyboard(buttons, context=context, add_back=True)
@@ -90,9 +94,9 @@ async def select_action(update: Update, context: ContextTypes):
     if action == "action_diary_update":
         # diary can only be updated once a day
         # so first check if the student has already updated his diary today
-        student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+        student = user_sql.get_identity(update.effective_user.id, "student")
         # get the last diary update
-        last_diary_update = pending_sql.get_last_pending_of_student_by_type(student.id, student.active_classroom_id, token_type_sql.get_token_type_by_type("Actualización de diario").id)
+        last_diary_update = pending_sql.get_last_pending_of_student_by_type(student.user_id, student.active_classroom_id, token_type_sql.get_token_type_by_type("Actualización de diario").id)
         if last_diary_update:
             # if the last diary update was less than 1 day ago then don't allow to update again
             if datetime.datetime.now() - last_diary_update.creation_date < datetime.timedelta(days=1):
@@ -141,35 +145,20 @@ async def send_misc(update: Update, context: ContextTypes):
     "Creates a new miscelanious pending"
 
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
-    classroom_id = student.active_classroom_id
+    user = user_sql.get_identity(update.effective_user.id, "student")
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Miscelaneo").id
 
     # get file id if exists
-    file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
     
     text = f"{user.fullname} ha propuesto una miscelánea:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text, FileID=fid)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text, FileID=fid)
     logger.info(f"New misc by {user.fullname}.")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chan,
-                f"El estudiante {user.fullname} ha propuesto una miscelánea",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {user.fullname} ha propuesto una miscelánea")
     
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -185,7 +174,7 @@ async def select_intervention(update: Update, context: ContextTypes):
 
     if query.data.startswith("select_intervention:"):
         intervention_type = query.data.split(":")[1]
-        classroom_id = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+        classroom_id = user_sql.get_identity(update.effective_user.id, "student").active_classroom_id
 
         if intervention_type == "conference":
             conferences = conference_sql.get_conferences_by_classroom(classroom_id)
@@ -241,9 +230,8 @@ async def select_intervention(update: Update, context: ContextTypes):
 async def send_intervention(update: Update, context: ContextTypes):
     """ Creates a new intervention pending """
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
-    classroom_id = student.active_classroom_id
+    user = user_sql.get_identity(update.effective_user.id, "student")
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Intervención en clase").id
 
     if "conference_id" in context.user_data["intervention"]:
@@ -254,18 +242,10 @@ async def send_intervention(update: Update, context: ContextTypes):
         text = f"{user.fullname} ha intervenido en la clase práctica {token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id).type}:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text)
     logger.info(f"New intervention by {user.fullname}.")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chan,
-                f"El estudiante {user.fullname} ha intervenido en una clase",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {user.fullname} ha intervenido en una clase")
 
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -292,16 +272,15 @@ async def send_rectification(update: Update, context: ContextTypes):
         return states.S_ACTIONS_SEND_RECTIFICATION
     else:
         # get necessary data
-        user = user_sql.get_user_by_chatid(update.effective_user.id)
-        student = student_sql.get_student(user.id)
-        classroom_id = student.active_classroom_id
+        user = user_sql.get_identity(update.effective_user.id, "student")
+        classroom_id = user.active_classroom_id
         token_type_id = token_type_sql.get_token_type_by_type("Rectificación al profesor").id
         teacher_id = context.user_data["rectification"]["teacher_id"]
 
         text = f"{user.fullname} ha rectificado al profesor {user_sql.get_user(teacher_id).fullname}:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
         # create pending in database
-        pending_sql.add_pending(student.id, classroom_id, token_type_id, teacher_id=teacher_id, text=text)
+        pending_sql.add_pending(user.user_id, classroom_id, token_type_id, teacher_id=teacher_id, text=text)
         logger.info(f"New rectification by {user.fullname}.") 
 
         # notify this teacher that he has a new rectification in his direct pendings
@@ -326,26 +305,17 @@ async def send_rectification(update: Update, context: ContextTypes):
 async def send_status_phrase(update: Update, context: ContextTypes):
     """ Creates a new status phrase pending """
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
-    classroom_id = student.active_classroom_id
+    user = user_sql.get_identity(update.effective_user.id, "student")
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Frase de estado").id
 
     text = f"{user.fullname} ha cambiado su frase de estado:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text)
     logger.info(f"New status phrase by {user.fullname}.")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chan,
-                f"El estudiante {user.fullname} ha cambiado su frase de estado",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {user.fullname} ha cambiado su frase de estado")
 
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -357,14 +327,12 @@ async def send_status_phrase(update: Update, context: ContextTypes):
 async def send_meme(update: Update, context: ContextTypes):
     """ Creates a new meme pending """
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
-    classroom_id = student.active_classroom_id
+    user = user_sql.get_identity(update.effective_user.id, "student")
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Meme").id
 
     # get file id if exists
-    file = update.message.photo
-    if not file:
+    if not update.message.photo:
         await update.message.reply_text(
             "No se ha enviado una imagen",
             reply_markup=InlineKeyboardMarkup(keyboards.STUDENT_ACTIONS),
@@ -374,18 +342,10 @@ async def send_meme(update: Update, context: ContextTypes):
     text = f"{user.fullname} ha enviado un meme:\n" + f"{update.message.caption if update.message.caption else ''}"
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text, FileID=file[-1].file_id)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text, FileID=remember_file(update.message))
     logger.info(f"New meme by {user.fullname}.")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chan,
-                f"El estudiante {user.fullname} ha enviado un meme",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {user.fullname} ha enviado un meme")
 
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -397,26 +357,17 @@ async def send_meme(update: Update, context: ContextTypes):
 async def send_joke(update: Update, context: ContextTypes):
     """ Creates a new joke pending """
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
-    classroom_id = student.active_classroom_id
+    user = user_sql.get_identity(update.effective_user.id, "student")
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Chiste").id
 
     text = f"{user.fullname} ha enviado un chiste:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text)
     logger.info(f"New joke by {user.fullname}.")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chan,
-                f"El estudiante {user.fullname} ha enviado un chiste",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {user.fullname} ha enviado un chiste")
 
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -428,26 +379,17 @@ async def send_joke(update: Update, context: ContextTypes):
 async def send_diary_update(update: Update, context: ContextTypes):
     """ Creates a new diary update pending """
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
-    classroom_id = student.active_classroom_id
+    user = user_sql.get_identity(update.effective_user.id, "student")
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Actualización de diario").id
 
     text = f"{user.fullname} ha actualizado su diario:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text)
     logger.info(f"New diary update by {user.fullname}.")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chan,
-                f"El estudiante {user.fullname} ha actualizado su diario",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {user.fullname} ha actualizado su diario")
             
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -461,12 +403,12 @@ async def student_actions_back(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom = classroom_sql.get_classroom(student.active_classroom_id)
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(student.id).fullname,
+            fullname=student.fullname,
             role="student",
             classroom_name=classroom.name,
         ),
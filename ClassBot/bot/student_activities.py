@@ -12,11 +12,13 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.media import reply_media, remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_student_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql
+from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql
 from bot.student_inventory import back_to_student_menu
 
 
@@ -49,7 +51,7 @@ async def student_activities(update: Update, context: ContextTypes):
     if query:
         await query.answer()
 
-    classroom_id = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_chat.id, "student").active_classroom_id
     # get activity_types
     activity_types = activity_type_sql.get_activity_types(classroom_id)
     
@@ -126,25 +128,24 @@ async def activity_type_selected(update: Update, context: ContextTypes):
         activities = [activity for activity in activities if (activity.submission_deadline is None) or (activity.submission_deadline >= datetime.datetime.now())]
         # filter by token (depends if the activity_type is guild or individual)
         if activity_type.guild_activity:
-            classroom_id = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
-            guild = guild_sql.get_guild_by_student(student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id).id, classroom_id)
+            classroom_id = user_sql.get_identity(update.effective_user.id, "student").active_classroom_id
+            guild = guild_sql.get_guild_by_student(user_sql.get_identity(update.effective_user.id).user_id, classroom_id)
             if guild:
                 activities = [activity for activity in activities if not guild_token_sql.exists(guild.id, activity.token_id)]
             else: # student doesnt belong to a guild
                 text += f"No perteneces a ningún gremio, por lo que no puedes enviar entregas para esta actividad\n\n"
                 activities = None
         else:
-            activities = [activity for activity in activities if not student_token_sql.exists(student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id).id, activity.token_id)]
+            activities = [activity for activity in activities if not student_token_sql.exists(user_sql.get_identity(update.effective_user.id).user_id, activity.token_id)]
         if activities:
             # show activities with pagination
-            buttons = [InlineKeyboardButton(f"{i}. {token_sql.get_token(activity.token_id).name}", callback_data=f"activity#{activity.id}") for i, activity in enumerate(activities, start=1)]
+            # load the tokens of every activity at once
+            tokens = token_sql.get_tokens_by_ids(activity.token_id for activity in activities)
+            buttons = [InlineKeyboardButton(f"{i}. {tokens[activity.token_id].name}", callback_data=f"activity#{activity.id}") for i, activity in enumerate(activities, start=1)]
             text = "Seleccione una actividad\n\n"
             if activity_type.FileID:
                 try:
-                    try:
-                        await query.message.reply_photo(activity_type.FileID, caption=text, reply_markup=paginated_keyboard(buttons=buttons, context=context, add_back=True))
-                    except BadRequest:
-                        await query.message.reply_document(activity_type.FileID, caption=text, reply_markup=paginated_keyboard(buttons=buttons, context=context, add_back=True))
+                    await reply_media(query.message, activity_type.FileID, caption=text, reply_markup=paginated_keyboard(buttons=buttons, context=context, add_back=True))
                 except BadRequest:
                     await query.edit_message_text("Se ha producido un error al enviar el archivo.\n\n" + text, reply_markup=paginated_keyboard(buttons=buttons, context=context, add_back=True))
             else:
@@ -156,10 +157,7 @@ async def activity_type_selected(update: Update, context: ContextTypes):
             # go back to activity_type_select dont edit the keyboard
             if activity_type.FileID:
                 try:
-                    try:
-                        await query.message.reply_photo(activity_type.FileID, caption=text)
-                    except BadRequest:
-                        await query.message.reply_document(activity_type.FileID, caption=text)
+                    await reply_media(query.message, activity_type.FileID, caption=text)
                 except BadRequest:
                     await query.edit_message_text("Se ha producido un error al enviar el archivo.\n\n" + text)
             else:
@@ -175,10 +173,7 @@ async def activity_type_selected(update: Update, context: ContextTypes):
         
         if activity_type.FileID:
             try:    
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="activity_type_send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="activity_type_send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
+                await reply_media(query.message, activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="activity_type_send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo.\n\n" + text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="activity_type_send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
         else:
@@ -207,10 +202,7 @@ async def activity_selected(update: Update, context: ContextTypes):
     
     if activity.FileID:
         try:
-            try:
-                await query.message.reply_photo(activity.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
-            except BadRequest:
-                await query.message.reply_document(activity.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
+            await reply_media(query.message, activity.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
         except BadRequest:
             await query.edit_message_text("Se ha producido un error al enviar el archivo.\n\n" + text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar entrega", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
     else:
@@ -232,9 +224,9 @@ async def activity_type_send_submission(update: Update, context: ContextTypes):
     guild = None
     if activity_type.guild_activity:
         # check if student belongs to a guild
-        student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+        student = user_sql.get_identity(update.effective_user.id, "student")
         classroom_id = student.active_classroom_id
-        guild = guild_sql.get_guild_by_student(student.id, classroom_id)
+        guild = guild_sql.get_guild_by_student(student.user_id, classroom_id)
         if not guild:
             if query.message.caption:
                 await query.edit_message_caption(query.message.caption + "\n\nNo perteneces a ningún gremio, por lo que no puedes enviar entregas para esta actividad")
@@ -256,7 +248,7 @@ async def activity_type_send_submission(update: Update, context: ContextTypes):
 async def activity_type_send_submission_done(update: Update, context: ContextTypes):
     """ Creates a pending of token_type of the activity_type. """
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom_id = student.active_classroom_id
     guild_id = context.user_data['activity']['guild_id']
     activity_type_id = context.user_data['activity']['activity_type_id']
@@ -266,29 +258,15 @@ async def activity_type_send_submission_done(update: Update, context: ContextTyp
     guild = guild_sql.get_guild(guild_id) if guild_id else None
     
     # get file id if exists
-    file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
     
-    text = f"{user_sql.get_user(student.id).fullname} ha enviado una entrega para la actividad {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
+    text = f"{student.fullname} ha enviado una entrega para la actividad {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
 
     # Create pending in DB
-    pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, guild_id=guild_id, text=text, FileID=fid)
-    logger.info(f"New activity_type f{token_type.type} pending created by student {user_sql.get_user(student.id).fullname}")
+    pending_sql.add_pending(student_id=student.user_id, classroom_id=classroom_id, token_type_id=token_type.id, guild_id=guild_id, text=text, FileID=fid)
+    logger.info(f"New activity_type f{token_type.type} pending created by student {student.fullname}")
     # Send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"El estudiante {user_sql.get_user(student.id).fullname} ha enviado una entrega para la actividad {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {student.fullname} ha enviado una entrega para la actividad {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n")
 
     # notify student
     await update.message.reply_text(
@@ -309,9 +287,9 @@ async def activity_send_submission(update: Update, context: ContextTypes):
     guild_id = None
     if activity_type.guild_activity:
         # get guild id
-        student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+        student = user_sql.get_identity(update.effective_user.id, "student")
         classroom_id = student.active_classroom_id
-        guild = guild_sql.get_guild_by_student(student.id, classroom_id)
+        guild = guild_sql.get_guild_by_student(student.user_id, classroom_id)
         guild_id = guild.id if guild else None
 
     # if guild save guild id in context
@@ -331,7 +309,7 @@ async def activity_send_submission_done(update: Update, context: ContextTypes):
     if query:
         await query.answer()
     
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom_id = student.active_classroom_id
     guild_id = context.user_data['activity']['guild_id']
     activity_id = context.user_data['activity']['activity_id']
@@ -343,47 +321,30 @@ async def activity_send_submission_done(update: Update, context: ContextTypes):
 
     if not query:
         # get file id if exists
-        file = update.message.document or update.message.photo
-        fid = None
-        if file:
-            if update.message.document:
-                fid = file.file_id
-            else:
-                fid = file[-1].file_id
+        fid = remember_file(update.message)
         context.user_data['activity']['FileID'] = fid
-        text = f"{user_sql.get_user(student.id).fullname} ha enviado una entrega para la actividad {token.name} de {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
+        text = f"{student.fullname} ha enviado una entrega para la actividad {token.name} de {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
         context.user_data['activity']['text'] = text
 
     # check if a pending with this token already exists
-    pending = pending_sql.get_pending_of_student_by_token(student.id, classroom_id, token.id)
+    pending = pending_sql.get_pending_of_student_by_token(student.user_id, classroom_id, token.id)
     # or if a pending related to a guild
     pending_guild = pending_sql.get_pendings_by_guild(guild_id, classroom_id, token.id) if guild_id else None
     if pending or pending_guild:
         # notify the student a submission already exists and ask if he wants to update it
-        # (will delete the old pending and return to this state)
-        if query: # delete pending
-            pending_sql.delete_pending(pending.id)
-            logger.info(f"Pending {pending.id} deleted")
-        else:
+        # (the new submission replaces the old one when he confirms)
+        if not query:
             await update.message.reply_text(
                 "Ya has enviado una entrega para esta actividad. ¿Deseas actualizarla?",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🟢 Sí", callback_data="delete_pending")], [InlineKeyboardButton("🔴 No", callback_data="back")]]),
             )
             return states.S_ACTIVITY_SEND_SUBMISSION_DONE
     
-    # Create pending in DB
-    pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token.id, guild_id=guild_id, text=context.user_data['activity']['text'], FileID=context.user_data['activity']['FileID'])
-    logger.info(f"New activity f{token.name} of f{token_type.type} pending created by student {user_sql.get_user(student.id).fullname}")
+    # Create pending in DB, or replace the one still pending
+    pending_sql.upsert_submission(student_id=student.user_id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token.id, guild_id=guild_id, text=context.user_data['activity']['text'], FileID=context.user_data['activity']['FileID'])
+    logger.info(f"New activity f{token.name} of f{token_type.type} pending created by student {student.fullname}")
     # Send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"El estudiante {user_sql.get_user(student.id).fullname} ha enviado una entrega para la actividad {token.name} de {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"El estudiante {student.fullname} ha enviado una entrega para la actividad {token.name} de {token_type.type}:\n" + f"{'Gremio: ' + guild.name if guild else ''}\n")
 
     # notify student
     if query:
@@ -403,12 +364,12 @@ async def student_activities_back(update: Update, context: ContextTypes):
     query = update.callback_query
     await query.answer()
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom = classroom_sql.get_classroom(student.active_classroom_id)
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(student.id).fullname,
+            fullname=student.fullname,
             role="student",
             classroom_name=classroom.name,
         ),
@@ -1,7 +1,6 @@
 import datetime
 
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import BadRequest
 from telegram.ext import (
     ContextTypes,
     ConversationHandler,
@@ -11,10 +10,12 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.media import reply_media
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.clean_context import clean_student_context
-from sql import user_sql, classroom_sql, course_sql, student_sql, conference_sql, pending_sql, token_type_sql
+from sql import user_sql, classroom_sql, course_sql, conference_sql, pending_sql, token_type_sql
 from bot.student_inventory import back_to_student_menu
 
 
@@ -39,7 +40,7 @@ async def student_conferences(update: Update, context: ContextTypes):
         return ConversationHandler.END
 
     # get student
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom_id = student.active_classroom_id
     # get conferences
     conferences = conference_sql.get_conferences_by_classroom(classroom_id)
@@ -77,10 +78,7 @@ async def student_select_conference(update: Update, context: ContextTypes):
     
     # Show conference details
     if conference.fileID:
-        try:
-            await query.message.reply_photo(conference.fileID)
-        except BadRequest:
-            await query.message.reply_document(conference.fileID)
+        await reply_media(query.message, conference.fileID)
     await query.message.reply_text(
             f"Nombre: {conference.name}\n"
             f"Fecha: {datetime.date(conference.date.year, conference.date.month, conference.date.day)}\n",
@@ -90,29 +88,20 @@ async def student_select_conference(update: Update, context: ContextTypes):
 
 async def student_new_title_proposal(update: Update, context: ContextTypes):
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
+    user = user_sql.get_identity(update.effective_user.id, "student")
     conference_id = context.user_data["conference"]["id"]
     conference = conference_sql.get_conference(conference_id)
-    classroom_id = student.active_classroom_id
+    classroom_id = user.active_classroom_id
     token_type_id = token_type_sql.get_token_type_by_type("Propuesta de título").id
     text = f'{user.fullname}: Propone el título "{update.message.text}" para la conferencia {conference.name}.' 
 
     # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id, text=text)
+    pending_sql.add_pending(user.user_id, classroom_id, token_type_id, text=text)
     logger.info(f"New title proposal by {user.fullname} for conference {conference.name}.")
 
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"Propuesta de título para la conferencia {conference.name}:\n"
-                    f"{user.fullname}: Propone el título \"{update.message.text}\".",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"Propuesta de título para la conferencia {conference.name}:\n"
+            f"{user.fullname}: Propone el título \"{update.message.text}\".")
 
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -130,11 +119,11 @@ async def student_conference_back(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom = classroom_sql.get_classroom(student.active_classroom_id)
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(student.id).fullname,
+            fullname=student.fullname,
             role="student",
             classroom_name=classroom.name,
         ),
@@ -39,12 +39,12 @@ async def student_guild(update: Update, context: ContextTypes):
         )
         return 
     
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id)
+    student = user_sql.get_identity(update.effective_chat.id, "student")
     classroom_id = student.active_classroom_id
     # get the guilds of the classroom
     guilds = guild_sql.get_guilds_by_classroom(classroom_id)
     # check if the student is in a guild
-    student_guild_ids = student_guild_sql.get_guild_ids(student.id)
+    student_guild_ids = student_guild_sql.get_guild_ids(student.user_id)
     # get the guild of this classroom the student is in
     student_guild = None
     for guild in guilds:
@@ -55,7 +55,9 @@ async def student_guild(update: Update, context: ContextTypes):
     if student_guild:
         # get students in guild
         students = student_sql.get_students_by_guild(student_guild.id)
-        student_text = "\n".join([f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)])
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        student_text = "\n".join([f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)])
         text = f"<b>Gremio:</b> {guild.name}\n\n<b>Estudiantes:</b>\n{student_text}"
         await update.message.reply_text(
             text,
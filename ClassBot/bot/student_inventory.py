@@ -8,10 +8,11 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.media import reply_local_photo
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.clean_context import clean_student_context
-from sql import user_sql, student_sql, student_token_sql, token_sql, classroom_sql, course_sql
+from sql import user_sql, student_token_sql, token_sql, classroom_sql, course_sql, credit_balance_sql
 
 
 async def student_inventory(update: Update, context: ContextTypes):
@@ -35,12 +36,15 @@ async def student_inventory(update: Update, context: ContextTypes):
         return ConversationHandler.END
    
     # get total credits of the student in this classroom
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id)
+    student = user_sql.get_identity(update.effective_chat.id, "student")
     classroom_id = student.active_classroom_id
-    total_credits = student_token_sql.get_total_value_by_classroom(student.id, classroom_id)
+    row = credit_balance_sql.get_student_rank(student.user_id, classroom_id)
+    text = f"Tienes {row.total} créditos, puesto {row.rank} de {credit_balance_sql.count_leaderboard(classroom_id)} en el aula." if row else f"Tienes {student_token_sql.get_total_value_by_classroom(student.user_id, classroom_id)} créditos"
+    if row and row.delta:
+        text += f"\n+{row.delta} créditos en los últimos {credit_balance_sql.RECENT_DAYS} días."
     
     await update.message.reply_text(
-        f"Tienes {total_credits} créditos",
+        text,
         reply_markup=ReplyKeyboardMarkup(
             keyboards.STUDENT_INVENTORY, one_time_keyboard=True, resize_keyboard=True
         ),
@@ -53,12 +57,12 @@ async def back_to_student_menu(update: Update, context: ContextTypes):
         query = update.callback_query
         query.answer()
     
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id)
+    student = user_sql.get_identity(update.effective_chat.id, "student")
     classroom_name = classroom_sql.get_classroom(student.active_classroom_id).name
 
     await update.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(student.id).fullname,
+            fullname=student.fullname,
             role="student",
             classroom_name=classroom_name,
         ),
@@ -96,11 +100,11 @@ async def show_medal_list(update: Update, context: ContextTypes):
         return ConversationHandler.END
     
     # get student
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id)
+    student = user_sql.get_identity(update.effective_chat.id, "student")
     # get classroom
     classroom_id = student.active_classroom_id
     # get medals
-    tokens = student_token_sql.get_tokens_by_student_and_classroom(student.id, classroom_id)
+    tokens = student_token_sql.get_tokens_by_student_and_classroom(student.user_id, classroom_id)
     medals = [token for token in tokens if token.token_type_id == 1] # 1 is the id of the medal token type
 
     if medals:
@@ -129,8 +133,10 @@ async def select_medal(update: Update, context: ContextTypes):
     # get image if any
     if medal.image_url:
         if "path" in medal.image_url:
-            await query.message.reply_photo(
-                open(medal.image_url.split(":")[1], "rb"),
+            # uploaded only the first time any student sees it
+            await reply_local_photo(
+                query.message,
+                medal.image_url,
                 caption=f"{medal.name}\n{medal.description if medal.description else ''}",
                 reply_markup=ReplyKeyboardMarkup(
                     keyboards.STUDENT_INVENTORY, one_time_keyboard=True, resize_keyboard=True
@@ -159,9 +165,9 @@ async def select_medal_back(update: Update, context: ContextTypes):
     query.answer()
 
     # get total credits of the student in this course
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id)
+    student = user_sql.get_identity(update.effective_chat.id, "student")
     classroom_id = student.active_classroom_id
-    tokens = student_token_sql.get_tokens_by_student_and_classroom(student.id, classroom_id)
+    tokens = student_token_sql.get_tokens_by_student_and_classroom(student.user_id, classroom_id)
     total_credits = sum([token.value for token in tokens])
 
     await query.message.reply_text(
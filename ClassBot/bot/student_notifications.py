@@ -11,11 +11,12 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.media import remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_student_context
-from sql import user_sql, student_sql, classroom_sql, course_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql
+from sql import user_sql, classroom_sql, course_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql
 from bot.student_inventory import back_to_student_menu
 
 
@@ -51,17 +52,10 @@ async def student_answer_pending(update: Update, context: ContextTypes):
 async def student_send_answer(update: Update, context: ContextTypes):
     # get the pending id and teacher chat id
     pending_id, teacher_chat_id = context.user_data["pending_answer"]
-    student_name = user_sql.get_user_by_chatid(update.effective_chat.id).fullname
+    student_name = user_sql.get_identity(update.effective_chat.id).fullname
     token_type = token_type_sql.get_token_type(pending_sql.get_pending(pending_id).token_type_id).type
     
-    file = update.message.document or update.message.photo
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
-    else:
-        fid = None
+    fid = remember_file(update.message)
 
     answer_text = update.message.text or update.message.caption
 
@@ -70,7 +64,7 @@ async def student_send_answer(update: Update, context: ContextTypes):
         text = f"> Respuesta de {student_name}:\n{answer_text}"
     else:   # if there is no text, send the file
         text = f"> {student_name} ha enviado un archivo."
-    pending_sql.send_more_info(pending_id, text, fid)
+    pending_sql.send_more_info(pending_id, text, fid, author_id=user_sql.get_identity(update.effective_chat.id).user_id)
     logger.info(f"Pending {pending_id} updated with more info from student.")
     # notify the teacher
     text = f"El estudiante {student_name} ha respondido a su solicitud de informacion sobre {token_type}, puede ver los detalles en pendientes."
@@ -89,12 +83,12 @@ async def student_answer_pending_back(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
     
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_chat.id).id)
+    student = user_sql.get_identity(update.effective_chat.id, "student")
     classroom = classroom_sql.get_classroom(student.active_classroom_id)
 
     await query.message.edit_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(student.id).fullname,
+            fullname=student.fullname,
             role="student",
             classroom_name=classroom.name,
         ),
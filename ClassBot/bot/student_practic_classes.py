@@ -12,11 +12,13 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.media import reply_media, remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_student_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, practic_class_sql, practic_class_exercises_sql
+from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, practic_class_sql, practic_class_exercises_sql
 from bot.student_inventory import back_to_student_menu
 
 
@@ -43,7 +45,7 @@ async def student_practic_classes(update: Update, context: ContextTypes):
     # context vars
     context.user_data["practic_class"] = {}
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     practic_classes = practic_class_sql.get_practic_classes(classroom_id=student.active_classroom_id, include_hidden=True)
 
     if practic_classes:
@@ -100,21 +102,21 @@ async def practic_class_selected(update: Update, context: ContextTypes):
         text += f"<b>Descripción:</b> {activity_type.description}\n"
     text += "<b>Ejercicios:</b>\n"
     exercises = practic_class_exercises_sql.get_practic_class_exercises_by_practic_class_id(practic_class_id)
+    # load the token of every exercise at once
+    tokens = practic_class_exercises_sql.get_tokens_of_exercises(exercises)
     # dont show exercises the student has earned credits for
-    exercises = [exercise for exercise in exercises if not student_token_sql.exists(student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id).id, token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id).id)]
+    earned = set(student_token_sql.get_token_ids(user_sql.get_identity(update.effective_user.id).user_id))
+    exercises = [exercise for exercise in exercises if tokens[exercise.id].id not in earned]
     if exercises:
         # sort exercises by name
-        exercises.sort(key=lambda x: token_sql.get_token(activity_sql.get_activity(x.activity_id).token_id).name)
-        buttons = [InlineKeyboardButton(f"{i}. {token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id).name} - ({exercise.value})", callback_data=f"exercise#{exercise.id}") for i, exercise in enumerate(exercises, start=1)]    
+        exercises.sort(key=lambda x: tokens[x.id].name)
+        buttons = [InlineKeyboardButton(f"{i}. {tokens[exercise.id].name} - ({exercise.value})", callback_data=f"exercise#{exercise.id}") for i, exercise in enumerate(exercises, start=1)]    
         other_buttons = [
             InlineKeyboardButton("📤 Proponer nuevo título", callback_data="new_title_proposal"),
         ]
         if activity_type.FileID:
             try:
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
+                await reply_media(query.message, activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la clase práctica para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
         else:
@@ -124,10 +126,7 @@ async def practic_class_selected(update: Update, context: ContextTypes):
         text += "No hay ejercicios disponibles en este momento."
         if activity_type.FileID:
             try:
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Proponer nuevo título", callback_data="new_title_proposal")], [InlineKeyboardButton("🔙", callback_data="back")]]))
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Proponer nuevo título", callback_data="new_title_proposal")], [InlineKeyboardButton("🔙", callback_data="back")]]))
+                await reply_media(query.message, activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Proponer nuevo título", callback_data="new_title_proposal")], [InlineKeyboardButton("🔙", callback_data="back")]]))
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la clase práctica para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Proponer nuevo título", callback_data="new_title_proposal")], [InlineKeyboardButton("🔙", callback_data="back")]]))
         else:
@@ -137,27 +136,18 @@ async def practic_class_selected(update: Update, context: ContextTypes):
 async def practic_class_new_title_proposal(update: Update, context: ContextTypes):
     """ Register a new title proposal for the selected practic class. """
     # get necessary data
-    user = user_sql.get_user_by_chatid(update.effective_user.id)
-    student = student_sql.get_student(user.id)
+    user = user_sql.get_identity(update.effective_user.id, "student")
     practic_class_id = context.user_data["practic_class"]["practic_class_id"]
     practic_class = practic_class_sql.get_practic_class(practic_class_id)
     token_type_id = token_type_sql.get_token_type_by_type("Propuesta de título").id
     text = f'{user.fullname}: Propone el título "{update.message.text}" para la clase práctica "{token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id).type}"' 
 
     # create pending in database
-    pending_sql.add_pending(student.id, student.active_classroom_id, token_type_id, text=text)
+    pending_sql.add_pending(user.user_id, user.active_classroom_id, token_type_id, text=text)
     logger.info(f"New title proposal for practic class {practic_class_id} by {user.fullname}")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(student.active_classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"Propuesta de título para la clase práctica {token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id).type}:\n"
-                    f"{user.fullname}: Propone el título \"{update.message.text}\".",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, user.active_classroom_id, f"Propuesta de título para la clase práctica {token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id).type}:\n"
+            f"{user.fullname}: Propone el título \"{update.message.text}\".")
 
     # notify student that the proposal was sent
     await update.message.reply_text(
@@ -195,10 +185,7 @@ async def practic_class_exercise_selected(update: Update, context: ContextTypes)
 
     if activity.FileID:
         try:
-            try:
-                await query.message.reply_photo(activity.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar solución", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
-            except BadRequest:
-                await query.message.reply_document(activity.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar solución", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
+            await reply_media(query.message, activity.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar solución", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
         except BadRequest:
             await query.edit_message_text("Se ha producido un error al enviar el archivo.\n\n" + text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Enviar solución", callback_data="send_submission")], [InlineKeyboardButton("🔙", callback_data="back")]]))
     else:
@@ -230,7 +217,7 @@ async def practic_class_exercise_send_submission_done(update: Update, context: C
     if query:
         await query.answer()
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom_id = student.active_classroom_id
     exercise_id = context.user_data["practic_class"]["exercise_id"]
     practic_class_id = context.user_data["practic_class"]["practic_class_id"]
@@ -243,46 +230,29 @@ async def practic_class_exercise_send_submission_done(update: Update, context: C
 
     if not query:
         # get file id if exists
-        file = update.message.document or update.message.photo
-        fid = None
-        if file:
-            if update.message.document:
-                fid = file.file_id
-            else:
-                fid = file[-1].file_id
+        fid = remember_file(update.message)
         context.user_data["practic_class"]["file_id"] = fid
 
-        text = f"{user_sql.get_user(student.id).fullname} ha enviado una entrega para el ejercicio {token.name} de la clase práctica {token_type.type}:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
+        text = f"{student.fullname} ha enviado una entrega para el ejercicio {token.name} de la clase práctica {token_type.type}:\n" + f"{update.message.text if update.message.text else ''}" + f"{update.message.caption if update.message.caption else ''}"
         context.user_data["practic_class"]["text"] = text
 
     # check if a pending with this token already exists
-    pending = pending_sql.get_pending_of_student_by_token(student.id, classroom_id, token.id)
+    pending = pending_sql.get_pending_of_student_by_token(student.user_id, classroom_id, token.id)
     if pending:
         # notify the student a submission already exists and ask if he wants to update it
-        # (will delete the old pending and return to this state)
-        if query: # delete pending
-            pending_sql.delete_pending(pending.id)
-            logger.info(f"Pending {pending.id} deleted")
-        else:
+        # (the new submission replaces the old one when he confirms)
+        if not query:
             await update.message.reply_text(
                 "Ya has enviado una solución para este ejercicio. ¿Deseas actualizarla?",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🟢 Sí", callback_data="delete_pending")], [InlineKeyboardButton("🔴 No", callback_data="back")]]),
             )
             return states.S_EXERCISE_SEND_SUBMISSION_DONE
     
-    # create pending in database
-    pending_sql.add_pending(student.id, classroom_id, token_type_id=activity_type.token_type_id, token_id=token.id, text=context.user_data["practic_class"]["text"], FileID=context.user_data["practic_class"]["file_id"])
-    logger.info(f"New submission for exercise {exercise_id} by {user_sql.get_user(student.id).fullname}")
+    # create pending in database, or replace the one still pending
+    pending_sql.upsert_submission(student.user_id, classroom_id, token_type_id=activity_type.token_type_id, token_id=token.id, text=context.user_data["practic_class"]["text"], FileID=context.user_data["practic_class"]["file_id"])
+    logger.info(f"New submission for exercise {exercise_id} by {student.fullname}")
     # send notification to notification channel of the classroom if it exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"{user_sql.get_user(student.id).fullname} ha enviado una entrega para el ejercicio {token.name} de la clase práctica {token_type.type}.",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"{student.fullname} ha enviado una entrega para el ejercicio {token.name} de la clase práctica {token_type.type}.")
 
     # notify student that the submission was sent
     if query:
@@ -302,12 +272,12 @@ async def student_practic_classes_back(update: Update, context: ContextTypes):
     query = update.callback_query
     await query.answer()
 
-    student = student_sql.get_student(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    student = user_sql.get_identity(update.effective_user.id, "student")
     classroom = classroom_sql.get_classroom(student.active_classroom_id)
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(student.id).fullname,
+            fullname=student.fullname,
             role="student",
             classroom_name=classroom.name,
         ),
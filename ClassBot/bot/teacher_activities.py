@@ -12,11 +12,14 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.outbox import wake_outbox
+from bot.utils.media import reply_media, remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql
+from sql import unit_of_work, user_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, outbox_sql
 from bot.teacher_settings import back_to_teacher_menu
 
 
@@ -48,7 +51,7 @@ async def teacher_activities(update: Update, context: ContextTypes):
     # context vars
     context.user_data["activity"] = {}
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get all activity types (not hidden)
     activity_types = activity_type_sql.get_activity_types(teacher.active_classroom_id)
 
@@ -88,8 +91,8 @@ async def activity_type_name(update: Update, context: ContextTypes):
     # if the activity type already exists, and its not hidden, then ask for a new name
     # if the activity type exists and its hidden, then unhide it
     # if the activity type doesn't exist, then create it
-    activity_type = activity_type_sql.get_activity_type_by_type(context.user_data["activity"]["type"], teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id)
-    activity_token_type = token_type_sql.get_token_type_by_type(context.user_data["activity"]["type"], teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id)
+    activity_type = activity_type_sql.get_activity_type_by_type(context.user_data["activity"]["type"], user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id)
+    activity_token_type = token_type_sql.get_token_type_by_type(context.user_data["activity"]["type"], user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id)
     if activity_type:
         if activity_token_type.hidden:
             activity_type_sql.unhide_activity_type(activity_type.id)
@@ -166,18 +169,11 @@ async def activity_type_file(update: Update, context: ContextTypes):
     query = update.callback_query
     if query:
         await query.answer()
-        file = None
+        fid = None
     else:
-        file = update.message.document or update.message.photo
-
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+        fid = remember_file(update.message)
     
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
     # create activity type
     activity_type_sql.add_activity_type(
         context.user_data["activity"]["type"],
@@ -237,7 +233,9 @@ async def activity_type_selected(update: Update, context: ContextTypes):
         if activities:
             # Show activities with pagination.
             # Add buttons for back and create activity type
-            buttons = [InlineKeyboardButton(f"{i}. {token_sql.get_token(activity.token_id).name}", callback_data=f"activity#{activity.id}") for i, activity in enumerate(activities, start=1)]
+            # load the tokens of every activity at once
+            tokens = token_sql.get_tokens_by_ids(activity.token_id for activity in activities)
+            buttons = [InlineKeyboardButton(f"{i}. {tokens[activity.token_id].name}", callback_data=f"activity#{activity.id}") for i, activity in enumerate(activities, start=1)]
             other_buttons = [
                 InlineKeyboardButton(f"➕ Crear actividad", callback_data=f"create_activity#{activity_type_id}"),
                 InlineKeyboardButton("Cambiar descripción" , callback_data="activity_type_change_description"),
@@ -248,10 +246,7 @@ async def activity_type_selected(update: Update, context: ContextTypes):
         
             if activity_type.FileID:
                 try:
-                    try:
-                        await query.message.reply_photo(activity_type.FileID, caption=text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
-                    except BadRequest:
-                        await query.message.reply_document(activity_type.FileID, caption=text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
+                    await reply_media(query.message, activity_type.FileID, caption=text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
                 except BadRequest:
                     await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar el tipo de actividad para enviar otro archivo.\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
             else:
@@ -259,10 +254,7 @@ async def activity_type_selected(update: Update, context: ContextTypes):
         else:
             if activity_type.FileID:
                 try:
-                    try:
-                        await query.message.reply_photo(activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(f"➕ Crear actividad", callback_data=f"create_activity#{activity_type_id}")],] + keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
-                    except BadRequest:
-                        await query.message.reply_document(activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(f"➕ Crear actividad", callback_data=f"create_activity#{activity_type_id}")],] + keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
+                    await reply_media(query.message, activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(f"➕ Crear actividad", callback_data=f"create_activity#{activity_type_id}")],] + keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
                 except BadRequest:
                     await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar el tipo de actividad para enviar otro archivo.\n\n" + text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(f"➕ Crear actividad", callback_data=f"create_activity#{activity_type_id}")],] + keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
             else:
@@ -276,10 +268,7 @@ async def activity_type_selected(update: Update, context: ContextTypes):
         
         if activity_type.FileID:
             try:    
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
+                await reply_media(query.message, activity_type.FileID, caption=text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la actividad para enviar otro archivo.\n\n" + text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_TYPE_OPTIONS), parse_mode="HTML")
         else:
@@ -331,13 +320,7 @@ async def activity_type_edit_file(update: Update, context: ContextTypes):
 async def activity_type_edit_file_done(update: Update, context: ContextTypes):
     """ Updates the activity_type with the new file id """
     activity_type_id = context.user_data['activity']['activity_type_id']
-    file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
     activity_type_sql.update_file(activity_type_id, fid)
     logger.info(f"Activity type {activity_type_id} file updated by {update.effective_user.id}")
     await update.message.reply_text(
@@ -369,7 +352,7 @@ async def activity_type_participants(update: Update, context: ContextTypes):
     activity_type_id = context.user_data['activity']['activity_type_id']
     activity_type = activity_type_sql.get_activity_type(activity_type_id)
     token_type = token_type_sql.get_token_type(activity_type.token_type_id)
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
 
     # get all students that have tokens of this activity_type
     students = student_sql.get_students_by_classroom(classroom_id)
@@ -377,7 +360,9 @@ async def activity_type_participants(update: Update, context: ContextTypes):
 
     if students:
         # show students with text pagination
-        lines = [f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)]
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        lines = [f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)]
         # create paginator using this lines
         paginator = Paginator(lines=lines, items_per_page=10, text_before=f"Participantes de {token_type.type}:", add_back=True)
         # add paginator to context
@@ -454,16 +439,9 @@ async def activity_file(update: Update, context: ContextTypes):
     query = update.callback_query
     if query:
         await query.answer()
-        file = None
+        fid = None
     else:
-        file = update.message.document or update.message.photo
-
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+        fid = remember_file(update.message)
     
     context.user_data["activity"]["FileID"] = fid
 
@@ -502,7 +480,7 @@ async def activity_deadline(update: Update, context: ContextTypes):
     # create activity
     activity_sql.add_activity(
         activity_type_id=context.user_data["activity"]["activity_type_id"],
-        classroom_id=teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id,
+        classroom_id=user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id,
         name=context.user_data["activity"]["type"],
         description=context.user_data["activity"]["description"],
         FileID=context.user_data["activity"]["FileID"],
@@ -525,7 +503,9 @@ async def activity_deadline(update: Update, context: ContextTypes):
 
     # Show activities with pagination.
     # Add buttons for back and create activity type
-    buttons = [InlineKeyboardButton(f"{i}. {token_sql.get_token(activity.token_id).name}", callback_data=f"activity#{activity.id}") for i, activity in enumerate(activities, start=1)]
+    # load the tokens of every activity at once
+    tokens = token_sql.get_tokens_by_ids(activity.token_id for activity in activities)
+    buttons = [InlineKeyboardButton(f"{i}. {tokens[activity.token_id].name}", callback_data=f"activity#{activity.id}") for i, activity in enumerate(activities, start=1)]
     other_buttons = [
         InlineKeyboardButton(f"➕ Crear actividad", callback_data=f"create_activity#{activity_type_id}"),
         InlineKeyboardButton("Cambiar descripción" , callback_data="activity_type_change_description"),
@@ -535,10 +515,7 @@ async def activity_deadline(update: Update, context: ContextTypes):
     if query:
         if activity_type.FileID:
             try:
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption="Actividad creada\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption="Actividad creada\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
+                await reply_media(query.message, activity_type.FileID, caption="Actividad creada\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
             except BadRequest:
                 await query.edit_message_text("Actividad creada\n\n" + "Se ha producido un error al enviar el archivo. Puede intentar editar el tipo de actividad para enviar otro archivo.\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
         else:
@@ -546,10 +523,7 @@ async def activity_deadline(update: Update, context: ContextTypes):
     else:
         if activity_type.FileID:
             try:
-                try:
-                    await update.message.reply_photo(activity_type.FileID, caption="Actividad creada\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
-                except BadRequest:
-                    await update.message.reply_document(activity_type.FileID, caption="Actividad creada\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
+                await reply_media(update.message, activity_type.FileID, caption="Actividad creada\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
             except BadRequest:
                 await update.message.reply_text("Actividad creada\n\n" + "Se ha producido un error al enviar el archivo. Puede intentar editar el tipo de actividad para enviar otro archivo.\n\n" + text, reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons), parse_mode="HTML")
         else:
@@ -584,10 +558,7 @@ async def activity_selected(update: Update, context: ContextTypes):
     
     if activity.FileID:
         try:
-            try:
-                await query.message.reply_photo(activity.FileID, caption=text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_OPTIONS), parse_mode="HTML")
-            except BadRequest:
-                await query.message.reply_document(activity.FileID, caption=text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_OPTIONS), parse_mode="HTML")
+            await reply_media(query.message, activity.FileID, caption=text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_OPTIONS), parse_mode="HTML")
         except BadRequest:
             await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la actividad para enviar otro archivo.\n\n" + text, reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_OPTIONS), parse_mode="HTML")
     else:
@@ -669,13 +640,7 @@ async def activity_edit_file(update: Update, context: ContextTypes):
 async def activity_edit_file_done(update: Update, context: ContextTypes):
     """ Updates the activity with the new file id """
     activity_id = context.user_data['activity']['activity_id']
-    file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
     activity_sql.update_file(activity_id, fid)
     logger.info(f"Activity {activity_id} file updated by {update.effective_user.id}")
     await update.message.reply_text(
@@ -729,7 +694,7 @@ async def activity_participants(update: Update, context: ContextTypes):
     token = token_sql.get_token(activity.token_id)
     activity_type = activity_type_sql.get_activity_type(activity.activity_type_id)
     token_type = token_type_sql.get_token_type(activity_type.token_type_id)
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
 
     # get all students that have the token of this activity
     students = student_sql.get_students_by_classroom(classroom_id)
@@ -737,7 +702,9 @@ async def activity_participants(update: Update, context: ContextTypes):
 
     if students:
         # show students with text pagination
-        lines = [f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)]
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        lines = [f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)]
         # create paginator using this lines
         paginator = Paginator(lines=lines, items_per_page=10, text_before=f"Participantes de {token.name} de {token_type.type}:", add_back=True)
         # add paginator to context
@@ -811,7 +778,9 @@ async def review_activity(update: Update, context: ContextTypes):
                     reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_ACTIVITY_OPTIONS),
                 )
             return states.T_ACTIVITY_INFO
-        buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(student.id).fullname}", callback_data=f"student#{student.id}") for i, student in enumerate(students, start=1)]
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        buttons = [InlineKeyboardButton(f"{i}. {users[student.id].fullname}", callback_data=f"student#{student.id}") for i, student in enumerate(students, start=1)]
         text = "Seleccione al estudiante:"
     
     if query.message.caption:
@@ -867,38 +836,24 @@ async def review_activity_send_credits(update: Update, context: ContextTypes):
     token = token_sql.get_token(activity_sql.get_activity(context.user_data["activity"]["activity_id"]).token_id)
     token_type = token_type_sql.get_token_type(token.token_type_id)
     classroom_id = token.classroom_id
-    teacher_id = user_sql.get_user_by_chatid(update.effective_user.id).id
+    teacher_id = user_sql.get_identity(update.effective_user.id).user_id
 
     if reviewed_type == "student":
         student = student_sql.get_student(int(reviewed_id))
-        student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher_id)
-        logger.info(f"Student {student.id} received {value} credits for activity {token.name} from teacher {update.effective_user.id}")
-        # create approved pending
-        text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user(teacher_id).fullname} al estudiante {user_sql.get_user(student.id).fullname} por la actividad {token.name} de {token_type.type}"
-        pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher_id, text=text)
-        # notify student
-        text = f"{user_sql.get_user(teacher_id).fullname}</b> te ha otorgado <b>{value}</b> créditos por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>"
-        if comment:
-            text += f"\n<b>Comentario:</b> {comment}"
-        try:
-            await context.bot.send_message(
-                chat_id=user_sql.get_user(student.id).telegram_chatid,
-                text=text,
-                parse_mode="HTML",
-            )
-        except BadRequest:
-            logger.error(f"Error sending message to student {user_sql.get_user(student.id).fullname} (chat_id: {user_sql.get_user(student.id).telegram_chatid})")
+        with unit_of_work():
+            student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher_id)
+            logger.info(f"Student {student.id} received {value} credits for activity {token.name} from teacher {update.effective_user.id}")
+            # create approved pending
+            text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user(teacher_id).fullname} al estudiante {user_sql.get_user(student.id).fullname} por la actividad {token.name} de {token_type.type}"
+            pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher_id, text=text)
+            # notify student, sent by the outbox worker once this is committed
+            text = f"<b>{user_sql.get_user(teacher_id).fullname}</b> te ha otorgado <b>{value}</b> créditos por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>"
+            if comment:
+                text += f"\n<b>Comentario:</b> {comment}"
+            outbox_sql.enqueue(user_sql.get_user(student.id).telegram_chatid, text, parse_mode="HTML", dedupe_key=f"student_token:{student.id}:{token.id}")
+        wake_outbox(context)
         # Send to notif channel if exists
-        chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-        if chan:
-            try:
-                await context.bot.send_message(
-                    chat_id=chan,
-                    text=f"{user_sql.get_user(teacher_id).fullname}</b> ha otorgado <b>{value}</b> créditos a <b>{user_sql.get_user(student.id).fullname}</b> por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>",
-                    parse_mode="HTML",
-                )
-            except BadRequest:
-                logger.exception(f"Failed to send message to notification channel {chan}.")
+        notify_channel(context, classroom_id, f"<b>{user_sql.get_user(teacher_id).fullname}</b> ha otorgado <b>{value}</b> créditos a <b>{user_sql.get_user(student.id).fullname}</b> por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>", parse_mode="HTML")
         
         await update.message.reply_text(
             "Créditos otorgados!",
@@ -907,39 +862,22 @@ async def review_activity_send_credits(update: Update, context: ContextTypes):
     else:
         # reviewed_type == "guild"
         guild = guild_sql.get_guild(int(reviewed_id))
-        guild_token_sql.add_guild_token(guild.id, token.id, value, teacher_id=teacher_id)
-        logger.info(f"Guild {guild.id} received {value} credits for activity {token.name} from teacher {update.effective_user.id}")
-        # create approved pending
-        text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user(teacher_id).fullname} al gremio {guild.name} por la actividad {token.name} de {token_type.type}"
-        # since pendings always have a student_id, we use the first student of the guild
-        student_id = student_sql.get_students_by_guild(guild.id)[0].id
-        pending_sql.add_pending(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token.id, guild_id=guild.id, status="APPROVED", approved_by=teacher_id, text=text)
-        # notify guild (all students)
-        text = f"El profesor <b>{user_sql.get_user(teacher_id).fullname}</b> ha otorgado <b>{value}</b> créditos al gremio <b>{guild.name}</b> por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>"
-        if comment:
-            text += f"\n<b>Comentario:</b> {comment}"
-        for student in student_sql.get_students_by_guild(guild.id):
-            chat_id = user_sql.get_user(student.id).telegram_chatid
-            fullname = user_sql.get_user(student.id).fullname
-            try:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    parse_mode="HTML",
-                )
-            except BadRequest:
-                logger.error(f"Error sending message to student {fullname} (chat_id: {chat_id})")
+        with unit_of_work():
+            guild_token_sql.add_guild_token(guild.id, token.id, value, teacher_id=teacher_id)
+            logger.info(f"Guild {guild.id} received {value} credits for activity {token.name} from teacher {update.effective_user.id}")
+            # create approved pending
+            text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user(teacher_id).fullname} al gremio {guild.name} por la actividad {token.name} de {token_type.type}"
+            # since pendings always have a student_id, we use the first student of the guild
+            student_id = student_sql.get_students_by_guild(guild.id)[0].id
+            pending_sql.add_pending(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token.id, guild_id=guild.id, status="APPROVED", approved_by=teacher_id, text=text)
+            # notify guild (all students)
+            text = f"El profesor <b>{user_sql.get_user(teacher_id).fullname}</b> ha otorgado <b>{value}</b> créditos al gremio <b>{guild.name}</b> por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>"
+            if comment:
+                text += f"\n<b>Comentario:</b> {comment}"
+            outbox_sql.enqueue_many([student.chat_id for student in student_sql.get_student_chats_by_guild(guild.id)], text, parse_mode="HTML", dedupe_key=f"guild_token:{guild.id}:{token.id}")
+        wake_outbox(context)
         # Send to notif channel if exists
-        chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-        if chan:
-            try:
-                await context.bot.send_message(
-                    chat_id=chan,
-                    text=f"{user_sql.get_user(teacher_id).fullname}</b> ha otorgado <b>{value}</b> créditos a {guild.name} por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>",
-                    parse_mode="HTML",
-                )
-            except BadRequest:
-                logger.exception(f"Failed to send message to notification channel {chan}.")
+        notify_channel(context, classroom_id, f"<b>{user_sql.get_user(teacher_id).fullname}</b> ha otorgado <b>{value}</b> créditos a {guild.name} por la actividad <b>{token.name}</b> de <b>{token_type.type}</b>", parse_mode="HTML")
         
         await update.message.reply_text(
             "Créditos otorgados!",
@@ -952,7 +890,7 @@ async def teacher_activities_back(update: Update, context: ContextTypes):
     query = update.callback_query
     await query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     # get course name
@@ -960,7 +898,7 @@ async def teacher_activities_back(update: Update, context: ContextTypes):
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user_by_chatid(update.effective_user.id).fullname,
+            fullname=user_sql.get_identity(update.effective_user.id).fullname,
             classroom_name=classroom.name,
             role="teacher",
         ),
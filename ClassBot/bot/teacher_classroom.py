@@ -1,8 +1,8 @@
 import datetime
+import html
 from typing import TYPE_CHECKING
 
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import BadRequest
 from telegram.ext import (
     ContextTypes,
     ConversationHandler,
@@ -12,11 +12,15 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.broadcast import broadcast
+from bot.utils.outbox import wake_outbox
+from bot.utils.media import remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
-from bot.utils.pagination import Paginator, text_paginator_handler
+from bot.utils.pagination import Paginator, KeysetPaginator, text_paginator_handler, stateless_list, filter_key, parse_filter_key
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, practic_class_sql, practic_class_exercises_sql
+from sql import run_sql, unit_of_work, user_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, practic_class_sql, practic_class_exercises_sql, credit_balance_sql, outbox_sql
 from bot.teacher_settings import back_to_teacher_menu
 
 
@@ -55,7 +59,7 @@ async def send_message(update: Update, context: ContextTypes):
     await query.answer()
 
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
 
     await query.edit_message_text(
@@ -67,59 +71,80 @@ async def send_message(update: Update, context: ContextTypes):
 
 async def send_message_done(update: Update, context: ContextTypes):
     """ Receives the message to send to the students and sends it. """
-    file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
 
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
 
-    teacher_name = user_sql.get_user(teacher.id).fullname
+    teacher_name = teacher.fullname
     text = f"<b>Mensaje de {teacher_name}:</b>\n<b>Aula - {classroom.name}</b>\n\n<i>{update.message.text if update.message.text else ''}</i>" + f"<i>{update.message.caption if update.message.caption else ''}</i>"
 
-    # get students from db
-    students = student_sql.get_students_by_classroom(classroom.id)
-
-    # send message to all students
-    for student in students:
-        chat_id = user_sql.get_user(student.id).telegram_chatid
-        try:
-            if fid:
-                try:
-                    try:
-                        await context.bot.send_photo(photo=fid, chat_id=chat_id, caption=text, parse_mode="HTML")
-                    except BadRequest:
-                        await context.bot.send_document(document=fid, chat_id=chat_id, caption=text, parse_mode="HTML")
-                except BadRequest:
-                    await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=text,
-                        parse_mode="HTML",
-                    )
-            else:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    parse_mode="HTML",
-                )
-        except BadRequest as e:
-            logger.error(f"Error sending message to student {student.id}: {e}")
-            await update.message.reply_text(
-                f"Error enviando mensaje a {user_sql.get_user(student.id).fullname}",
-            )
-    
+    # chats of all the students in one query, sent in the background so the
+    # teacher doesn't wait for them
+    students = student_sql.get_student_chats_by_classroom(classroom.id)
+    context.application.create_task(
+        _broadcast_to_students(context, update.effective_chat.id, students, text, fid)
+    )
+
     await update.message.reply_text(
-        "Mensajes enviados",
+        f"Enviando el mensaje a {len(students)} estudiantes, te avisaré cuando termine.",
         reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
     )
 
     return ConversationHandler.END
 
+async def _broadcast_to_students(context: ContextTypes, teacher_chat_id: int, students: list, text: str, fid: str | None):
+    """ Sends the message to the students and tells the teacher who didn't get it. """
+    results = await broadcast(context.bot, [student.chat_id for student in students], text, file_id=fid)
+    failed = {result.chat_id: result.error for result in results if not result.ok}
+    report = f"Mensaje enviado a {len(results) - len(failed)} de {len(results)} estudiantes."
+    if failed:
+        names = []
+        for student in students:
+            if student.chat_id in failed:
+                logger.error(f"Error sending message to student {student.student_id}: {failed[student.chat_id]}")
+                names.append(student.fullname)
+        report += "\n\nNo se pudo enviar a:\n" + "\n".join(html.escape(name) for name in names)
+    await context.bot.send_message(chat_id=teacher_chat_id, text=report, parse_mode="HTML")
+
+@stateless_list("lb")
+def students_leaderboard(key: str) -> KeysetPaginator | None:
+    """ Returns the paginator of the students of the classroom of the key ranked
+    by credits, read one page at a time. """
+    classroom = classroom_sql.get_classroom(parse_filter_key(key)["c"])
+    if not classroom:
+        return None
+    return KeysetPaginator(
+        lambda after, limit, before=None: credit_balance_sql.get_leaderboard(classroom.id, after=after, limit=limit, before=before),
+        lambda: credit_balance_sql.count_leaderboard(classroom.id),
+        lambda i, row: f"{row.rank}. {str(row.total).ljust(10)} ➡️ {row.name} /student_{row.id}{f' (+{row.delta} esta semana)' if row.delta else ''}",
+        credit_balance_sql.leaderboard_row_key,
+        items_per_page=10, 
+        text_before=f"Estudiantes de <b>{classroom.name}</b> ordenados por créditos:", 
+        text_after="Selecciona un estudiante para ver su historial de créditos",
+        add_back=True,
+        kind="lb", filter_key=key,
+        )
+
+@stateless_list("lbg")
+def guilds_leaderboard(key: str) -> KeysetPaginator | None:
+    """ Like students_leaderboard, for the guilds of the classroom. """
+    classroom = classroom_sql.get_classroom(parse_filter_key(key)["c"])
+    if not classroom:
+        return None
+    return KeysetPaginator(
+        lambda after, limit, before=None: credit_balance_sql.get_guild_leaderboard(classroom.id, after=after, limit=limit, before=before),
+        lambda: credit_balance_sql.count_guild_leaderboard(classroom.id),
+        lambda i, row: f"{row.rank}. {str(row.total).ljust(10)} ➡️ {row.name} /guild_{row.id}{f' (+{row.delta} esta semana)' if row.delta else ''}",
+        credit_balance_sql.leaderboard_row_key,
+        items_per_page=10, 
+        text_before=f"Gremios de <b>{classroom.name}</b> ordenados por créditos:", 
+        text_after="Selecciona un gremio para ver su historial de créditos",
+        add_back=True,
+        kind="lbg", filter_key=key,
+        )
+
 async def classroom_students(update: Update, context: ContextTypes):
     """ Shows all students of the classroom ordered by amount of credits.
     Supports pagination. Each line shows the amount of credits, the student
@@ -129,25 +154,10 @@ async def classroom_students(update: Update, context: ContextTypes):
     await query.answer()
 
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-    classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
-    classroom_id = classroom.id
-    students = student_sql.get_students_by_classroom(classroom.id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
 
-    # sort students by total credits
-    students.sort(key=lambda student: student_token_sql.get_total_value_by_classroom(student.id, classroom_id), reverse=True)
-    # create lines for paginator 
-    lines = [f"{i}. {str(student_token_sql.get_total_value_by_classroom(student.id, classroom_id)).ljust(10)} ➡️ {user_sql.get_user(student.id).fullname} /student_{student.id}" for i, student in enumerate(students, start=1)]
-    # create new paginator using this lines
-    paginator = Paginator(
-        lines=lines, 
-        items_per_page=10, 
-        text_before=f"Estudiantes de <b>{classroom.name}</b> ordenados por créditos:", 
-        text_after="Selecciona un estudiante para ver su historial de créditos",
-        add_back=True,
-        )
-    # save paginator in context
-    context.user_data["paginator"] = paginator
+    # students ranked by total credits, the pages are rebuilt from the buttons
+    paginator = students_leaderboard(filter_key(c=teacher.active_classroom_id))
     # send first page
     await query.edit_message_text(
         paginator.text(),
@@ -165,25 +175,10 @@ async def classroom_guilds(update: Update, context: ContextTypes):
     await query.answer()
 
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-    classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
-    classroom_id = classroom.id
-    guilds = guild_sql.get_guilds_by_classroom(classroom.id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
 
-    # sort guilds by total credits
-    guilds.sort(key=lambda guild: guild_token_sql.get_total_value_by_classroom(guild.id, classroom_id), reverse=True)
-    # create lines for paginator
-    lines = [f"{i}. {str(guild_token_sql.get_total_value_by_classroom(guild.id, classroom_id)).ljust(10)} ➡️ {guild.name} /guild_{guild.id}" for i, guild in enumerate(guilds, start=1)]
-    # create new paginator using this lines
-    paginator = Paginator(
-        lines=lines, 
-        items_per_page=10, 
-        text_before=f"Gremios de <b>{classroom.name}</b> ordenados por créditos:", 
-        text_after="Selecciona un gremio para ver su historial de créditos",
-        add_back=True,
-        )
-    # save paginator in context
-    context.user_data["paginator"] = paginator
+    # guilds ranked by total credits, the pages are rebuilt from the buttons
+    paginator = guilds_leaderboard(filter_key(c=teacher.active_classroom_id))
     # send first page
     await query.edit_message_text(
         paginator.text(),
@@ -201,40 +196,32 @@ async def guild_info(update: Update, context: ContextTypes):
     guild_id = int(update.message.text.split("_")[1])
     guild = guild_sql.get_guild(guild_id)
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     classroom_id = classroom.id
 
     # get guild's students
-    students = student_sql.get_students_by_guild(guild.id)
+    students = await run_sql(student_sql.get_students_by_guild, guild.id)
     # sort students by total credits
-    students.sort(key=lambda student: student_token_sql.get_total_value_by_classroom(student.id, classroom_id), reverse=True)
+    balances = await run_sql(credit_balance_sql.get_student_balances, classroom_id)
+    totals = {student.id: balances.get(student.id, 0) for student in students}
+    students.sort(key=lambda student: totals[student.id], reverse=True)
     # create first lines using students
     lines = [f"Estudiantes de <b>{guild.name}</b> ordenados por créditos:"]
-    student_lines = [f"{i}. {str(student_token_sql.get_total_value_by_classroom(student.id, classroom_id)).ljust(10)} ➡️ {user_sql.get_user(student.id).fullname} /student_{student.id}" for i, student in enumerate(students, start=1)]
+    # load the names of every student at once
+    users = user_sql.get_users_by_ids(student.id for student in students)
+    student_lines = [f"{i}. {str(totals[student.id]).ljust(10)} ➡️ {users[student.id].fullname} /student_{student.id}" for i, student in enumerate(students, start=1)]
     lines.extend(student_lines)
     lines.append("")
-    lines.append(f"Créditos:")
-
-    # get guild's tokens from db
-    guild_tokens = guild_token_sql.get_guild_tokens_by_guild_and_classroom(guild_id, classroom_id) # already sorted
-    # create lines for paginator
-    i = 1
-    for guild_token in guild_tokens:
-        token = token_sql.get_token(guild_token.token_id)
-        token_type = token_type_sql.get_token_type(token.token_type_id)
-        # if not default token_type (default token_types havee classroom_id = None and no activity_type_id)
-        if token_type.classroom_id:
-            activity_type = activity_type_sql.get_activity_type_by_token_type_id(token_type.id)
-            if activity_type.single_submission:
-                lines.append(f"{i}. {guild_token.creation_date.strftime('%d/%m/%Y')} - {str(guild_token.value).ljust(10)} ➡️ <b>{token.name}</b> de <i>{token_type.type}</i>")
-            else:
-                lines.append(f"{i}. {guild_token.creation_date.strftime('%d/%m/%Y')} - {str(guild_token.value).ljust(10)} ➡️ <b>{token.name}</b>")
-        else:
-            lines.append(f"{i}. {guild_token.creation_date.strftime('%d/%m/%Y')} - {str(guild_token.value).ljust(10)} ➡️ <b>{token.name}</b>")
-        i += 1
+    lines.append(f"Créditos por semana:")
+    # weekly totals instead of every token, the full list is one button away
+    summary = await run_sql(credit_balance_sql.get_credit_summary, classroom_id, guild_id=guild.id)
+    lines.extend(summary_lines(summary))
     # create new paginator using this lines
-    other_buttons = [InlineKeyboardButton("➕ Asignar créditos", callback_data=f"assign_credits_{guild.id}")]
+    other_buttons = [
+        [InlineKeyboardButton("➕ Asignar créditos", callback_data=f"assign_credits_{guild.id}")],
+        [InlineKeyboardButton("📜 Historial detallado", callback_data=f"credit_history_guild_{guild.id}")],
+    ]
     paginator = Paginator(
         lines=lines, 
         items_per_page=10, 
@@ -277,8 +264,8 @@ async def assign_credits_to_guild_done(update: Update, context: ContextTypes):
     # get guild from db
     guild_id = context.user_data['classroom']['guild_id']
     guild = guild_sql.get_guild(guild_id)
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-    teacher_name = user_sql.get_user(teacher.id).fullname
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
+    teacher_name = teacher.fullname
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     classroom_id = classroom.id
 
@@ -292,44 +279,27 @@ async def assign_credits_to_guild_done(update: Update, context: ContextTypes):
         comment = None
     
     token_type = token_type_sql.get_token_type_by_type("Créditos otorgados directamente")
-    # Create new token
-    token_sql.add_token(name=f"{token_type.type} a {guild.name} por {teacher_name}", token_type_id=token_type.id, classroom_id=classroom_id, description=comment)
-    token_id = token_sql.get_last_token().id
-    # assign token to guild
-    guild_token_sql.add_guild_token(guild_id=guild.id, token_id=token_id, value=value, teacher_id=teacher.id)
-    logger.info(f"Teacher {teacher.id} assigned {value} credits to guild {guild.id} in classroom {classroom.id}")
-    # get first student of guild
-    student = student_sql.get_students_by_guild(guild.id)[0]
-    # create approved pending
-    text = f"Créditos otorgados directamente a {guild.name} por {teacher_name}"
-    pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token_id, guild_id=guild.id, status="APPROVED", approved_by=teacher.id, text=text)
-
-    # Notify guild
-    text = f"<b>{teacher_name}</b> le ha otorgado <b>{value}</b> créditos al gremio <b>{guild.name}</b>"
-    if comment:
-        text += f"\n\n<b>Comentario:</b>\n{comment}"
-    
-    for student in student_sql.get_students_by_guild(guild.id):
-        try:
-            await context.bot.send_message(
-                chat_id=user_sql.get_user(student.id).telegram_chatid,
-                text=text,
-                parse_mode="HTML",
-            )
-        except BadRequest:
-            logger.error(f"Error sending message to student {user_sql.get_user(student.id).fullname} (chat_id: {user_sql.get_user(student.id).telegram_chatid})")
+    with unit_of_work():
+        # Create new token
+        token_id = token_sql.add_token(name=f"{token_type.type} a {guild.name} por {teacher_name}", token_type_id=token_type.id, classroom_id=classroom_id, description=comment)
+        # assign token to guild
+        guild_token_sql.add_guild_token(guild_id=guild.id, token_id=token_id, value=value, teacher_id=teacher.user_id)
+        logger.info(f"Teacher {teacher.user_id} assigned {value} credits to guild {guild.id} in classroom {classroom.id}")
+        # get first student of guild
+        student = student_sql.get_students_by_guild(guild.id)[0]
+        # create approved pending
+        text = f"Créditos otorgados directamente a {guild.name} por {teacher_name}"
+        pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token_id, guild_id=guild.id, status="APPROVED", approved_by=teacher.user_id, text=text)
+
+        # Notify guild
+        text = f"<b>{teacher_name}</b> le ha otorgado <b>{value}</b> créditos al gremio <b>{guild.name}</b>"
+        if comment:
+            text += f"\n\n<b>Comentario:</b>\n{comment}"
+        outbox_sql.enqueue_many([student.chat_id for student in student_sql.get_student_chats_by_guild(guild.id)], text, parse_mode="HTML", dedupe_key=f"guild_token:{guild.id}:{token_id}")
+    wake_outbox(context)
     
     # Send to notif channel if exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=text,
-                parse_mode="HTML",
-            )
-        except BadRequest:
-                logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, text, parse_mode="HTML")
 
     await update.message.reply_text(
         f"Créditos asignados a {guild.name}",
@@ -337,42 +307,87 @@ async def assign_credits_to_guild_done(update: Update, context: ContextTypes):
     )
     return ConversationHandler.END
 
+def summary_lines(summary) -> list[str]:
+    """ Returns one line per week of a credit summary, with the total of the
+    week and the credits of each token type. """
+    weeks = {}
+    for row in summary:    # already sorted from the most recent
+        weeks.setdefault(row.period, []).append(row)
+    return [
+        f"{period.strftime('%d/%m/%Y')} - {str(sum(row.total for row in rows)).ljust(10)} ➡️ " + ", ".join(f"<i>{row.token_type}</i>: {row.total}" for row in rows)
+        for period, rows in weeks.items()
+    ]
+
+def history_lines(tokens) -> list[str]:
+    """ Returns one line per student_token or guild_token: the date - the
+    amount of credits, the token name and the token_type type if its related
+    activity_type has single_submission set to True. """
+    lines = []
+    for i, owner_token in enumerate(tokens, start=1):
+        token = token_sql.get_token(owner_token.token_id)
+        token_type = token_type_sql.get_token_type(token.token_type_id)
+        # if not default token_type (default token_types havee classroom_id = None and no activity_type_id)
+        if token_type.classroom_id and activity_type_sql.get_activity_type_by_token_type_id(token_type.id).single_submission:
+            lines.append(f"{i}. {owner_token.creation_date.strftime('%d/%m/%Y')} - {str(owner_token.value).ljust(10)} ➡️ <b>{token.name}</b> de <i>{token_type.type}</i>")
+        else:
+            lines.append(f"{i}. {owner_token.creation_date.strftime('%d/%m/%Y')} - {str(owner_token.value).ljust(10)} ➡️ <b>{token.name}</b>")
+    return lines
+
+async def credit_history(update: Update, context: ContextTypes):
+    """ Shows every credit of the student or guild, from the most recent.
+    Supports pagination. """
+    query = update.callback_query
+    await query.answer()
+
+    _, _, kind, owner_id = query.data.split("_")
+    owner_id = int(owner_id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
+    classroom_id = teacher.active_classroom_id
+    if kind == "student":
+        tokens = student_token_sql.get_student_token_by_student_and_classroom(owner_id, classroom_id) # already sorted
+        name = user_sql.get_user(owner_id).fullname
+    else:
+        tokens = guild_token_sql.get_guild_tokens_by_guild_and_classroom(owner_id, classroom_id) # already sorted
+        name = guild_sql.get_guild(owner_id).name
+    paginator = Paginator(
+        lines=history_lines(tokens),
+        items_per_page=10,
+        text_before=f"Historial detallado de créditos de <b>{name}:</b>",
+        text_after="",
+        add_back=True,
+        other_buttons=[InlineKeyboardButton("➕ Asignar créditos", callback_data=f"assign_credits_{owner_id}")],
+        )
+    # save paginator in context
+    context.user_data["paginator"] = paginator
+    await query.edit_message_text(
+        paginator.text(),
+        reply_markup=paginator.keyboard(),
+        parse_mode="HTML",
+    )
+
 async def student_info(update: Update, context: ContextTypes):
-    """ Shows the student's credits history per day from the most recent.
-    Supports pagination. Each line has the date - the amount of credits, 
-    the token name and the token_type type if it its related activity_type
-    has single_submission set to True. """
+    """ Shows the student's credits per week from the most recent, with the
+    total of each token type. Supports pagination. The full history is shown
+    by credit_history. """
     student_id = int(update.message.text.split("_")[1])
     # get student from db
     student = student_sql.get_student(student_id)
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     classroom_id = classroom.id
-    # get student's tokens from db
-    student_tokens = student_token_sql.get_student_token_by_student_and_classroom(student_id, classroom_id) # already sorted
-    # create lines for paginator
-    lines = []
-    i = 1
-    for student_token in student_tokens:
-        token = token_sql.get_token(student_token.token_id)
-        token_type = token_type_sql.get_token_type(token.token_type_id)
-        # if not default token_type (default token_types havee classroom_id = None and no activity_type_id)
-        if token_type.classroom_id:
-            activity_type = activity_type_sql.get_activity_type_by_token_type_id(token_type.id)
-            if activity_type.single_submission:
-                lines.append(f"{i}. {student_token.creation_date.strftime('%d/%m/%Y')} - {str(student_token.value).ljust(10)} ➡️ <b>{token.name}</b> de <i>{token_type.type}</i>")
-            else:
-                lines.append(f"{i}. {student_token.creation_date.strftime('%d/%m/%Y')} - {str(student_token.value).ljust(10)} ➡️ <b>{token.name}</b>")
-        else:
-            lines.append(f"{i}. {student_token.creation_date.strftime('%d/%m/%Y')} - {str(student_token.value).ljust(10)} ➡️ <b>{token.name}</b>")
-        i += 1
+    # weekly totals of the student's tokens, computed by the database
+    summary = await run_sql(credit_balance_sql.get_credit_summary, classroom_id, student_id=student.id)
+    lines = summary_lines(summary)
     # create new paginator using this lines
-    other_buttons = [InlineKeyboardButton("➕ Asignar créditos", callback_data=f"assign_credits_{student.id}")]
+    other_buttons = [
+        [InlineKeyboardButton("➕ Asignar créditos", callback_data=f"assign_credits_{student.id}")],
+        [InlineKeyboardButton("📜 Historial detallado", callback_data=f"credit_history_student_{student.id}")],
+    ]
     paginator = Paginator(
         lines=lines, 
         items_per_page=10, 
-        text_before=f"Historial de créditos de <b>{user_sql.get_user(student.id).fullname}:</b>", 
+        text_before=f"Créditos por semana de <b>{user_sql.get_user(student.id).fullname}:</b>", 
         text_after="",
         add_back=True,
         other_buttons=other_buttons,
@@ -414,8 +429,8 @@ async def assign_credits_to_student_done(update: Update, context: ContextTypes):
     student = student_sql.get_student(student_id)
     student_name = user_sql.get_user(student.id).fullname
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-    teacher_name = user_sql.get_user(teacher.id).fullname
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
+    teacher_name = teacher.fullname
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     classroom_id = classroom.id
 
@@ -429,41 +444,25 @@ async def assign_credits_to_student_done(update: Update, context: ContextTypes):
         comment = None
     
     token_type = token_type_sql.get_token_type_by_type("Créditos otorgados directamente")
-    # Create new token
-    token_sql.add_token(name=f"{token_type.type} a {student_name} por {teacher_name}", token_type_id=token_type.id, classroom_id=classroom_id, description=comment)
-    token_id = token_sql.get_last_token().id
-    # assign token to student
-    student_token_sql.add_student_token(student_id=student.id, token_id=token_id, value=value, teacher_id=teacher.id)
-    logger.info(f"Teacher {teacher.id} assigned {value} credits to student {student.id} in classroom {classroom.id}")
-    # Create approved pending
-    text = f"Créditos otorgados directamente a {student_name} por {teacher_name}"
-    pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token_id, status="APPROVED", approved_by=teacher.id, text=text)
-
-    # Notify student
-    text = f"<b>{teacher_name}</b> te ha otorgado <b>{value}</b> créditos"
-    if comment:
-        text += f"\n\n<b>Comentario:</b>\n{comment}"
-    
-    try:
-        await context.bot.send_message(
-            chat_id=user_sql.get_user(student.id).telegram_chatid,
-            text=text,
-            parse_mode="HTML",
-        )
-    except BadRequest:
-        logger.error(f"Error sending message to student {student_name}")
+    with unit_of_work():
+        # Create new token
+        token_id = token_sql.add_token(name=f"{token_type.type} a {student_name} por {teacher_name}", token_type_id=token_type.id, classroom_id=classroom_id, description=comment)
+        # assign token to student
+        student_token_sql.add_student_token(student_id=student.id, token_id=token_id, value=value, teacher_id=teacher.user_id)
+        logger.info(f"Teacher {teacher.user_id} assigned {value} credits to student {student.id} in classroom {classroom.id}")
+        # Create approved pending
+        text = f"Créditos otorgados directamente a {student_name} por {teacher_name}"
+        pending_sql.add_pending(student_id=student.id, classroom_id=classroom_id, token_type_id=token_type.id, token_id=token_id, status="APPROVED", approved_by=teacher.user_id, text=text)
+
+        # Notify student
+        text = f"<b>{teacher_name}</b> te ha otorgado <b>{value}</b> créditos"
+        if comment:
+            text += f"\n\n<b>Comentario:</b>\n{comment}"
+        outbox_sql.enqueue(user_sql.get_user(student.id).telegram_chatid, text, parse_mode="HTML", dedupe_key=f"student_token:{student.id}:{token_id}")
+    wake_outbox(context)
 
     # Send to notif channel if exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"<b>{teacher_name}</b> le ha otorgado <b>{value}</b> créditos a <b>{student_name}</b>",
-                parse_mode="HTML",
-            )
-        except BadRequest:
-                logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"<b>{teacher_name}</b> le ha otorgado <b>{value}</b> créditos a <b>{student_name}</b>", parse_mode="HTML")
 
     await update.message.reply_text(
         f"Créditos asignados a {user_sql.get_user(student.id).fullname}",
@@ -476,7 +475,7 @@ async def teacher_classroom_back(update: Update, context: ContextTypes):
     query = update.callback_query
     await query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     # get course name
@@ -484,7 +483,7 @@ async def teacher_classroom_back(update: Update, context: ContextTypes):
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(teacher.id).fullname,
+            fullname=teacher.fullname,
             role="teacher",
             classroom_name=classroom.name,
         ),
@@ -513,12 +512,14 @@ teacher_classroom_conv = ConversationHandler(
             MessageHandler(filters.TEXT & filters.Regex(r"^/student_\d+$"), student_info),
             text_paginator_handler,
             CallbackQueryHandler(assign_credits_to_guild, pattern=r"^assign_credits_\d+$"),
+            CallbackQueryHandler(credit_history, pattern=r"^credit_history_(student|guild)_\d+$"),
         ],
         states.T_CLASSROOM_ASSIGN_CREDITS_GUILD:[MessageHandler(filters.Regex(r"^\d+(\s.*)?") & ~filters.COMMAND, assign_credits_to_guild_done)],
         states.T_CLASSROOM_STUDENT_INFO:[
             MessageHandler(filters.TEXT & filters.Regex(r"^/student_\d+$"), student_info),
             text_paginator_handler,
             CallbackQueryHandler(assign_credits_to_student, pattern=r"^assign_credits_\d+$"),
+            CallbackQueryHandler(credit_history, pattern=r"^credit_history_(student|guild)_\d+$"),
         ],
         states.T_CLASSROOM_ASSIGN_CREDITS_STUDENT:[MessageHandler(filters.Regex(r"^\d+(\s.*)?") & ~filters.COMMAND, assign_credits_to_student_done)],
     },
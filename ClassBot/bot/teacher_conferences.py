@@ -1,7 +1,6 @@
 import datetime
 
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import BadRequest
 from telegram.ext import (
     ContextTypes,
     ConversationHandler,
@@ -11,10 +10,11 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.media import reply_media, remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, conference_sql
+from sql import run_sql, user_sql, classroom_sql, course_sql, conference_sql
 from bot.teacher_settings import back_to_teacher_menu
 
 
@@ -38,7 +38,7 @@ async def teacher_conferences(update: Update, context: ContextTypes):
         )
         return ConversationHandler.END
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     conferences = conference_sql.get_conferences_by_classroom(classroom_id)
     if conferences:
@@ -107,19 +107,15 @@ async def teacher_create_conference_date(update: Update, context: ContextTypes):
 async def teacher_create_conference_file(update: Update, context: ContextTypes):
     """ Creates the conference with the fileID of the sent file or without if no file is sent """
     if update.message: # user sent a message with probably a file.
-        file = update.message.document or update.message.photo
-        if file:
-            if update.message.document:
-                fid = file.file_id
-            else:
-                fid = file[-1].file_id
+        fid = remember_file(update.message)
+        if fid:
             context.user_data["conference"]["file_id"] = fid
     # get conference data from user context
     name = context.user_data["conference"]["name"]
     date = context.user_data["conference"]["date"]
     file_id = context.user_data["conference"].get("file_id", None)
     # get classroom id
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     # add conference to database
     conference_sql.add_conference(classroom_id, name, date, file_id)
@@ -165,12 +161,9 @@ async def teacher_conference_select(update: Update, context: ContextTypes):
         # get conference from db
         conference = conference_sql.get_conference(conference_id)
         # show conference info and send photo or document
-        # use try-except to send photo if BadRequest send document 
+        # as a photo or document, whatever it was sent as
         if conference.fileID:
-            try:
-                await query.message.reply_photo(conference.fileID)
-            except BadRequest:
-                await query.message.reply_document(conference.fileID)
+            await reply_media(query.message, conference.fileID)
         await query.message.reply_text(
                 f"<b>Nombre:</b> {conference.name}\n"
                 f"<b>Fecha:</b> {datetime.date(conference.date.year, conference.date.month, conference.date.day)}\n",
@@ -213,16 +206,16 @@ async def teacher_conference_edit_option(update: Update, context: ContextTypes):
         # get conference id
         conference_id = context.user_data["conference"]["id"]
         # delete conference from db
-        conference_sql.delete_conference(conference_id)
+        await run_sql(conference_sql.delete_conference, conference_id)
         # get back to main menu
-        teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+        teacher = user_sql.get_identity(update.effective_user.id, "teacher")
         # get active classroom from db
         classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
         # get course name
         course_name = course_sql.get_course(classroom.course_id).name
         await query.message.reply_text(
             bot_text.main_menu(
-                user_sql.get_user_by_chatid(update.effective_user.id).fullname,
+                user_sql.get_identity(update.effective_user.id).fullname,
                 role="teacher",
                 classroom_name=classroom.name,
             ),
@@ -242,12 +235,9 @@ async def teacher_conference_edit_name(update: Update, context: ContextTypes):
     # update conference name
     conference_sql.update_conference_name(conference_id, name=update.message.text)
     # show conference info and send photo or document
-    # use try-except to send photo if BadRequest send document 
+    # as a photo or document, whatever it was sent as
     if conference.fileID:
-        try:
-            await update.message.reply_photo(conference.fileID)
-        except BadRequest:
-            await update.message.reply_document(conference.fileID)
+        await reply_media(update.message, conference.fileID)
     await update.message.reply_text(
             f"<b>Nombre:</b> {conference_sql.get_conference(conference_id).name}\n"
             f"<b>Fecha:</b> {datetime.date(conference.date.year, conference.date.month, conference.date.day)}\n",
@@ -275,12 +265,9 @@ async def teacher_conference_edit_date(update: Update, context: ContextTypes):
     conference_sql.update_conference_date(conference_id, date=date)
     conference = conference_sql.get_conference(conference_id)
     # show conference info and send photo or document
-    # use try-except to send photo if BadRequest send document 
+    # as a photo or document, whatever it was sent as
     if conference.fileID:
-        try:
-            await update.message.reply_photo(conference.fileID)
-        except BadRequest:
-            await update.message.reply_document(conference.fileID)
+        await reply_media(update.message, conference.fileID)
     await update.message.reply_text(
             f"<b>Nombre:</b> {conference.name}\n"
             f"<b>Fecha:</b> {datetime.date(conference.date.year, conference.date.month, conference.date.day)}\n",
@@ -296,21 +283,14 @@ async def teacher_conference_edit_file(update: Update, context: ContextTypes):
     # get conference from db
     conference = conference_sql.get_conference(conference_id)
     # update conference file
-    file = update.message.document or update.message.photo
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
+    if fid:
         conference_sql.update_conference_fileID(conference_id, fileID=fid)
     conference = conference_sql.get_conference(conference_id)
     # show conference info and send photo or document
-    # use try-except to send photo if BadRequest send document 
+    # as a photo or document, whatever it was sent as
     if conference.fileID:
-        try:
-            await update.message.reply_photo(conference.fileID)
-        except BadRequest:
-            await update.message.reply_document(conference.fileID)
+        await reply_media(update.message, conference.fileID)
     await update.message.reply_text(
             f"<b>Nombre:</b> {conference.name}\n"
             f"<b>Fecha:</b> {datetime.date(conference.date.year, conference.date.month, conference.date.day)}\n",
@@ -324,7 +304,7 @@ async def teacher_conference_back(update: Update, context: ContextTypes):
     query = update.callback_query
     await query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     # get course name
@@ -332,7 +312,7 @@ async def teacher_conference_back(update: Update, context: ContextTypes):
 
     await query.message.reply_text(
         bot_text.main_menu(
-            user_sql.get_user_by_chatid(update.effective_user.id).fullname,
+            user_sql.get_identity(update.effective_user.id).fullname,
             role="teacher",
             classroom_name=classroom.name,
         ),
@@ -15,7 +15,7 @@ from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, guild_sql, student_sql, student_guild_sql, guild_token_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql
+from sql import run_sql, user_sql, classroom_sql, course_sql, guild_sql, student_sql, student_guild_sql, guild_token_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql
 from bot.teacher_settings import back_to_teacher_menu
 
 
@@ -42,7 +42,7 @@ async def teacher_guilds(update: Update, context: ContextTypes):
         )
         return ConversationHandler.END
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     guilds = guild_sql.get_guilds_by_classroom(classroom_id)
 
@@ -77,11 +77,11 @@ async def teacher_guilds_create(update: Update, context: ContextTypes):
 async def teacher_guilds_create_name(update: Update, context: ContextTypes):
     """ Creates the guild with the given name, then show the guilds """
     name = update.message.text
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     # create guild
     guild_sql.add_guild(classroom_id, name)
-    logger.info(f"Teacher {teacher.id} created guild {name} in classroom {classroom_id}")
+    logger.info(f"Teacher {teacher.user_id} created guild {name} in classroom {classroom_id}")
     
     # get guilds
     guilds = guild_sql.get_guilds_by_classroom(classroom_id)
@@ -116,7 +116,9 @@ async def select_guild(update: Update, context: ContextTypes):
         students = student_sql.get_students_by_guild(guild_id)
 
         if students:
-            student_text = "\n".join([f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)])
+            # load the names of every student at once
+            users = user_sql.get_users_by_ids(student.id for student in students)
+            student_text = "\n".join([f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)])
         else:
             student_text = "No hay estudiantes en este gremio"
         
@@ -135,7 +137,7 @@ async def guild_options(update: Update, context: ContextTypes):
 
     if query.data == "guild_add_student":
         # get students not in any guild and in the active classroom of the teacher
-        teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+        teacher = user_sql.get_identity(update.effective_user.id, "teacher")
         classroom_id = teacher.active_classroom_id
         # get students in classroom
         students = student_sql.get_students_by_classroom(classroom_id)
@@ -148,7 +150,9 @@ async def guild_options(update: Update, context: ContextTypes):
         students = [student for student in students if student.id not in [student_in_guild.id for student_in_guild in students_in_guilds]]
 
         if students:
-            buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(student.id).fullname}", callback_data=f"add_student#{student.id}") for i, student in enumerate(students, start=1)]
+            # load the names of every student at once
+            users = user_sql.get_users_by_ids(student.id for student in students)
+            buttons = [InlineKeyboardButton(f"{i}. {users[student.id].fullname}", callback_data=f"add_student#{student.id}") for i, student in enumerate(students, start=1)]
             await query.edit_message_text(
                 text="Seleccione el estudiante a añadir:",
                 reply_markup=paginated_keyboard(buttons, context=context, add_back=True),
@@ -167,7 +171,9 @@ async def guild_options(update: Update, context: ContextTypes):
         students = student_sql.get_students_by_guild(guild_id)
 
         if students:
-            buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(student.id).fullname}", callback_data=f"remove_student#{student.id}") for i, student in enumerate(students, start=1)]
+            # load the names of every student at once
+            users = user_sql.get_users_by_ids(student.id for student in students)
+            buttons = [InlineKeyboardButton(f"{i}. {users[student.id].fullname}", callback_data=f"remove_student#{student.id}") for i, student in enumerate(students, start=1)]
             await query.edit_message_text(
                 text="Seleccione el estudiante a eliminar:",
                 reply_markup=paginated_keyboard(buttons, context=context, add_back=True),
@@ -183,9 +189,9 @@ async def guild_options(update: Update, context: ContextTypes):
     elif query.data == "guild_delete":
         # delete guild and show guilds
         guild_id = context.user_data["guild"]["id"]
-        guild_sql.delete_guild(guild_id)
+        await run_sql(guild_sql.delete_guild, guild_id)
         # get guilds
-        guilds = guild_sql.get_guilds_by_classroom(teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id)
+        guilds = guild_sql.get_guilds_by_classroom(user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id)
         if guilds:
             # Show guilds with pagination
             buttons = [InlineKeyboardButton(f"{i}. {guild.name}", callback_data=f"guild#{guild.id}") for i, guild in enumerate(guilds, start=1)]
@@ -223,7 +229,9 @@ async def edit_guild_name(update: Update, context: ContextTypes):
     students = student_sql.get_students_by_guild(guild_id)
 
     if students:
-        student_text = "\n".join([f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)])
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        student_text = "\n".join([f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)])
     else:
         student_text = "No hay estudiantes en este gremio"
     
@@ -250,7 +258,9 @@ async def select_student_to_add(update: Update, context: ContextTypes):
     students = student_sql.get_students_by_guild(guild_id)
 
     if students:
-        student_text = "\n".join([f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)])
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        student_text = "\n".join([f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)])
     else:
         student_text = "No hay estudiantes en este gremio"
     
@@ -277,7 +287,9 @@ async def select_student_to_remove(update: Update, context: ContextTypes):
     students = student_sql.get_students_by_guild(guild_id)
 
     if students:
-        student_text = "\n".join([f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)])
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        student_text = "\n".join([f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)])
     else:
         student_text = "No hay estudiantes en este gremio"
     
@@ -294,13 +306,13 @@ async def teacher_guilds_back(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(teacher.id).fullname,
+            fullname=teacher.fullname,
             role="teacher",
             classroom_name=classroom.name,
         ),
@@ -11,14 +11,95 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.outbox import wake_outbox
+from bot.utils.media import reply_media
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
-from bot.utils.pagination import Paginator, text_paginator_handler
+from bot.utils.pagination import KeysetPaginator, text_paginator_handler, stateless_list, filter_key, parse_filter_key
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql, guild_sql, guild_token_sql, student_sql, activity_sql, activity_type_sql, practic_class_sql, practic_class_exercises_sql
+from sql import unit_of_work, user_sql, classroom_sql, course_sql, pending_sql, token_type_sql, teacher_classroom_sql, token_sql, student_token_sql, guild_sql, guild_token_sql, student_sql, activity_sql, activity_type_sql, practic_class_sql, practic_class_exercises_sql, outbox_sql
 from bot.teacher_settings import back_to_teacher_menu
 
 
+def _pending_line(i: int, pending: pending_sql.PendingRow, label: str) -> str:
+    """ Returns the line of a pending in the lists of pendings. """
+    return f"{i}. {label} - {pending.student_fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}"
+
+# The lists of pendings are stateless, see KeysetPaginator: their pages are
+# rebuilt from the filter key in the buttons. c is the classroom id, u the
+# teacher id and d (if present) shows only the direct pendings of the teacher.
+
+@stateless_list("pend")
+def pendings_list(key: str) -> KeysetPaginator:
+    """ Returns the paginator of the pendings of the classroom, except direct
+    pendings, or of the direct pendings of the teacher. """
+    values = parse_filter_key(key)
+    classroom_id, teacher_id = values["c"], values["u"]
+    direct_pending = teacher_id if "d" in values else None
+    # the counts come from the pending counters, they don't query the database
+    classroom_count = pending_sql.count_pending_rows(classroom_id)
+    direct_count = pending_sql.count_pending_rows(classroom_id, direct_pending=teacher_id)
+    if direct_pending:
+        other_buttons = [InlineKeyboardButton(f"🗃 Del aula ({classroom_count})", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
+        text_before = f"Mis pendientes directos ({direct_count}):" if classroom_count else f"Aquí están tus pendientes directos ({direct_count}), no hay más pendientes en el aula:"
+    else:
+        other_buttons = [InlineKeyboardButton(f"🗂 Mis pendientes ({direct_count})", callback_data="direct_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
+        text_before = f"Pendientes del aula ({classroom_count}):"
+    return KeysetPaginator(
+        lambda after, limit, before=None: pending_sql.get_pending_rows(classroom_id, direct_pending=direct_pending, after=after, limit=limit, before=before),
+        lambda: pending_sql.count_pending_rows(classroom_id, direct_pending=direct_pending),
+        lambda i, pending: _pending_line(i, pending, f"{pending.token_name + ' de' if pending.token_id else ''} {pending.token_type}"),
+        pending_sql.pending_row_key,
+        items_per_page=10, text_before=text_before, add_back=True, other_buttons=other_buttons,
+        kind="pend", filter_key=key,
+    )
+
+@stateless_list("pendt")
+def token_type_pendings_list(key: str) -> KeysetPaginator | None:
+    """ Returns the paginator of the pendings of the classroom of the token
+    type k. f is how the pendings are shown: 0 for default token types, 1 for
+    activity types and 2 for practic classes. b adds the bulk buttons. """
+    values = parse_filter_key(key)
+    classroom_id, token_type_id = values["c"], values["k"]
+    direct_pending = values["u"] if "d" in values else None
+    token_type = token_type_sql.get_token_type(token_type_id)
+    if not token_type:
+        return None
+    labels = {
+        0: lambda pending: pending.token_type,
+        1: lambda pending: f"{pending.token_name + ' de' if pending.token_id else ''} {pending.token_type}",
+        2: lambda pending: f"Ejercicio {pending.token_name + ' de' if pending.token_id else ''} la clase práctica {pending.token_type}",
+    }
+    label = labels[values["f"]]
+    other_buttons = [InlineKeyboardButton("🗃 Todos los pendientes", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
+    if "b" in values:
+        other_buttons = [other_buttons, bulk_buttons(key)]
+    return KeysetPaginator(
+        lambda after, limit, before=None: pending_sql.get_pending_rows(classroom_id, direct_pending=direct_pending, token_type_id=token_type_id, after=after, limit=limit, before=before),
+        lambda: pending_sql.count_pending_rows(classroom_id, direct_pending=direct_pending, token_type_id=token_type_id),
+        lambda i, pending: _pending_line(i, pending, label(pending)),
+        pending_sql.pending_row_key,
+        items_per_page=10, text_before=f'Pendientes de "{token_type.type}" ({pending_sql.count_pending_rows(classroom_id, direct_pending=direct_pending, token_type_id=token_type_id)}):', add_back=True, other_buttons=other_buttons,
+        kind="pendt", filter_key=key,
+    )
+
+@stateless_list("pendh")
+def pending_history_list(key: str) -> KeysetPaginator:
+    """ Returns the paginator of the pendings of the classroom approved by the
+    teacher, including the archived ones. """
+    values = parse_filter_key(key)
+    classroom_id, teacher_id = values["c"], values["u"]
+    other_buttons = [InlineKeyboardButton("🗃 Todos los pendientes", callback_data="all_pendings")]
+    return KeysetPaginator(
+        lambda after, limit, before=None: pending_sql.get_approved_pending_rows_of_teacher(teacher_id, classroom_id, after=after, limit=limit, before=before),
+        lambda: pending_sql.count_approved_pendings_of_teacher(teacher_id, classroom_id),
+        lambda i, pending: f"{i}. {pending.token_name}{' de ' + pending.token_type if pending.is_activity else ''} - {pending.student_fullname} Aprobado el {datetime.date(pending.approved_date.year, pending.approved_date.month, pending.approved_date.day)} con un valor de {pending.value} -> /pending_{pending.id}",
+        lambda pending: pending_sql.pending_row_key(pending, "APPROVED"),
+        items_per_page=10, text_before="Historial de pendientes que has aprobado:", add_back=True, other_buttons=other_buttons,
+        kind="pendh", filter_key=key,
+    )
+
 async def teacher_pendings(update: Update, context: ContextTypes):
     """ Shows the pendings of the current classroom, except direct pendings.
     Shows options for filtering by pending type (token_type) or showing direct pendings.
@@ -48,19 +129,13 @@ async def teacher_pendings(update: Update, context: ContextTypes):
     
     context.user_data["pending"] = {"direct": False, "history": False}
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     # get the list of pendings of this classroom that are "PENDING" and not direct pendings
-    pendings = pending_sql.get_pendings_by_classroom(classroom_id, status="PENDING")
+    # only the rows of the page shown are fetched, see pendings_list
+    paginator = pendings_list(filter_key(c=classroom_id, u=teacher.user_id))
     
-    if pendings:
-        # create a list of lines for each pending
-        lines = [f"{i}. {token_sql.get_token(pending.token_id).name + ' de' if pending.token_id else ''} {token_type_sql.get_token_type(pending.token_type_id).type} - {user_sql.get_user(pending.student_id).fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}" for i, pending in enumerate(pendings, start=1)]
-        # create new paginator using this lines
-        other_buttons = [InlineKeyboardButton("🗂 Mis pendientes", callback_data="direct_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
-        paginator = Paginator(lines, items_per_page=10, text_before="Pendientes del aula:", add_back=True, other_buttons=other_buttons)
-        # save paginator in user_data
-        context.user_data["paginator"] = paginator
+    if paginator.total:
         # send first page
         if query:
             await query.edit_message_text(
@@ -77,15 +152,8 @@ async def teacher_pendings(update: Update, context: ContextTypes):
     else:   # no pendings in the classroom
         # check if teacher has direct pendings and show those instead, if not
         # return to teacher menu
-        direct_pendings = pending_sql.get_direct_pendings_of_teacher(teacher.id, classroom_id, status="PENDING")
-        if direct_pendings:
-            # create a list of lines for each pending
-            lines = [f"{i}. {token_sql.get_token(pending.token_id).name + ' de' if pending.token_id else ''} {token_type_sql.get_token_type(pending.token_type_id).type} - {user_sql.get_user(pending.student_id).fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}" for i, pending in enumerate(direct_pendings, start=1)]
-            # create new paginator using this lines
-            other_buttons = [InlineKeyboardButton("🗃 Del aula", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
-            paginator = Paginator(lines, items_per_page=10, text_before="Aquí están tus pendientes directos, no hay más pendientes en el aula:", add_back=True, other_buttons=other_buttons)
-            # save paginator in user_data
-            context.user_data["paginator"] = paginator
+        paginator = pendings_list(filter_key(c=classroom_id, u=teacher.user_id, d=1))
+        if paginator.total:
             # send first page
             if query:
                 await query.edit_message_text(
@@ -121,19 +189,13 @@ async def teacher_direct_pendings(update: Update, context: ContextTypes):
     else:
         context.user_data["pending"]["direct"] = True
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     # get the list of direct pendings of this classroom that are "PENDING"
-    pendings = pending_sql.get_direct_pendings_of_teacher(teacher.id, classroom_id, status="PENDING")
+    # only the rows of the page shown are fetched, see pendings_list
+    paginator = pendings_list(filter_key(c=classroom_id, u=teacher.user_id, d=1))
     
-    if pendings:
-        # create a list of lines for each pending
-        lines = [f"{i}. {token_sql.get_token(pending.token_id).name + ' de' if pending.token_id else ''} {token_type_sql.get_token_type(pending.token_type_id).type} - {user_sql.get_user(pending.student_id).fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}" for i, pending in enumerate(pendings, start=1)]
-        # create new paginator using this lines
-        other_buttons = [InlineKeyboardButton("🗃 Del aula", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
-        paginator = Paginator(lines, items_per_page=10, text_before="Mis pendientes directos:", add_back=True, other_buttons=other_buttons)
-        # save paginator in user_data
-        context.user_data["paginator"] = paginator
+    if paginator.total:
         # send first page
         await query.edit_message_text(
             paginator.text(),
@@ -159,17 +221,12 @@ async def pending_history(update: Update, context: ContextTypes):
     else:
         context.user_data["pending"]["history"] = True
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
     # get the list of pendings of this classroom that are "APPROVED" by this teacher
-    pendings = pending_sql.get_approved_pendings_of_teacher(teacher.id, classroom_id)
-    if pendings:
-        lines = [f"{i}. {token_sql.get_token(pending.token_id).name}{' de ' + token_type_sql.get_token_type(pending.token_type_id).type if (activity_sql.get_activity_by_token_id(pending.token_id)) else ''} - {user_sql.get_user(pending.student_id).fullname} Aprobado el {datetime.date(pending.approved_date.year, pending.approved_date.month, pending.approved_date.day)} con un valor de {student_token_sql.get_value(pending.student_id, pending.token_id)} -> /pending_{pending.id}" for i, pending in enumerate(pendings, start=1)]
-        # create new paginator using this lines
-        other_buttons = [InlineKeyboardButton("🗃 Todos los pendientes", callback_data="all_pendings")]
-        paginator = Paginator(lines, items_per_page=10, text_before="Historial de pendientes que has aprobado:", add_back=True, other_buttons=other_buttons)
-        # save paginator in user_data
-        context.user_data["paginator"] = paginator
+    # only the rows of the page shown are fetched, see pending_history_list
+    paginator = pending_history_list(filter_key(c=classroom_id, u=teacher.user_id))
+    if paginator.total:
         # send first page
         await query.edit_message_text(
             paginator.text(),
@@ -183,6 +240,28 @@ async def pending_history(update: Update, context: ContextTypes):
         )
         return ConversationHandler.END
 
+def bulk_buttons(key: str) -> list[InlineKeyboardButton]:
+    """ Returns the buttons to approve or reject every pending of the list
+    with the given filter key at once. The filter goes in the callback data,
+    like the pagination of the list, so they don't depend on user_data. """
+    return [InlineKeyboardButton("✅ Aprobar todos", callback_data=f"bulk_approve|{key}"), InlineKeyboardButton("❌ Rechazar todos", callback_data=f"bulk_reject|{key}")]
+
+def filter_keyboard(classroom_id: int, direct_pending: int = None) -> InlineKeyboardMarkup:
+    """ Returns the TEACHER_FILTER_PENDING keyboard with the number of pendings
+    of each default token type, taken from the pending counters. """
+    counts = pending_sql.count_pendings_by_token_type(classroom_id, direct_pending=direct_pending)
+    keyboard = []
+    for row in keyboards.TEACHER_FILTER_PENDING:
+        buttons = []
+        for button in row:
+            if button.callback_data.startswith("filter_default:"):
+                token_type = token_type_sql.get_token_type_by_type(button.callback_data.split(":")[1])
+                if counts[token_type.id]:
+                    button = InlineKeyboardButton(f"{button.text} ({counts[token_type.id]})", callback_data=button.callback_data)
+            buttons.append(button)
+        keyboard.append(buttons)
+    return InlineKeyboardMarkup(keyboard)
+
 async def filter_pendings(update: Update, context: ContextTypes):
     """ Filter pendings by token type. Shows all default token types in the classroom
     and selecting one of them shows only the pendings of the classroom of that type.
@@ -191,14 +270,15 @@ async def filter_pendings(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
+    direct_pending = teacher.user_id if context.user_data["pending"].get("direct") else None
 
     if query.data == "filter_pendings":
         # show keyboard with default token types and "Otras actividades"
         await query.edit_message_text(
             text="Seleccione un tipo de pendiente para filtrar:",
-            reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_FILTER_PENDING),
+            reply_markup=filter_keyboard(classroom_id, direct_pending),
         )
         return states.T_PENDING_SELECT
 
@@ -207,8 +287,9 @@ async def filter_pendings(update: Update, context: ContextTypes):
         # get all not hidden activity_type of this classroom
         activity_types = activity_type_sql.get_activity_types(classroom_id)
         if activity_types:
-            # show activity_types with pagination
-            buttons = [InlineKeyboardButton(f"{i}. {token_type_sql.get_token_type(activity_type.token_type_id).type}", callback_data=f"activity_type#{activity_type.id}") for i, activity_type in enumerate(activity_types, start=1)]
+            # show activity_types with pagination, with their number of pendings
+            counts = pending_sql.count_pendings_by_token_type(classroom_id, direct_pending=direct_pending)
+            buttons = [InlineKeyboardButton(f"{i}. {token_type_sql.get_token_type(activity_type.token_type_id).type}{f' ({counts[activity_type.token_type_id]})' if counts[activity_type.token_type_id] else ''}", callback_data=f"activity_type#{activity_type.id}") for i, activity_type in enumerate(activity_types, start=1)]
             # show keyboard with activity_types
             await query.edit_message_text(
                 text="Seleccione un tipo de actividad para filtrar:",
@@ -218,7 +299,7 @@ async def filter_pendings(update: Update, context: ContextTypes):
         else:
             await query.edit_message_text(
                 query.message.text + "\n\nNo hay otras actividades disponibles, puede crear una en el menú de actividades.",
-                reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_FILTER_PENDING),
+                reply_markup=filter_keyboard(classroom_id, direct_pending),
             )
             return states.T_PENDING_SELECT
     
@@ -226,8 +307,10 @@ async def filter_pendings(update: Update, context: ContextTypes):
         # show keyboard with practic_classes of this classroom
         practic_classes = practic_class_sql.get_practic_classes(classroom_id, include_hidden=True)
         if practic_classes:
-            # show practic classes with pagination
-            buttons = [InlineKeyboardButton(f"{i}. {token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id).type}", callback_data=f"practic_class#{practic_class.id}") for i, practic_class in enumerate(practic_classes, start=1)]
+            # show practic classes with pagination, with their number of pendings
+            counts = pending_sql.count_pendings_by_token_type(classroom_id, direct_pending=direct_pending)
+            token_type_ids = {practic_class.id: activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id for practic_class in practic_classes}
+            buttons = [InlineKeyboardButton(f"{i}. {token_type_sql.get_token_type(token_type_ids[practic_class.id]).type}{f' ({counts[token_type_ids[practic_class.id]]})' if counts[token_type_ids[practic_class.id]] else ''}", callback_data=f"practic_class#{practic_class.id}") for i, practic_class in enumerate(practic_classes, start=1)]
             # show keyboard with practic_classes
             await query.edit_message_text(
                 text="Seleccione una clase práctica para filtrar:",
@@ -237,7 +320,7 @@ async def filter_pendings(update: Update, context: ContextTypes):
         else:
             await query.edit_message_text(
                 query.message.text + "\n\nNo hay clases prácticas disponibles, puede crear una en el menú de clases prácticas.",
-                reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_FILTER_PENDING),
+                reply_markup=filter_keyboard(classroom_id, direct_pending),
             )
             return states.T_PENDING_SELECT
 
@@ -247,19 +330,12 @@ async def filter_pendings(update: Update, context: ContextTypes):
         t_type = query.data.split(":")[1]
         token_type_id = token_type_sql.get_token_type_by_type(t_type).id
         # get only pendings of this classroom with this token type
-        if context.user_data["pending"]["direct"]:
-            pendings = pending_sql.get_pendings_by_token_type(token_type_id, classroom_id, status="PENDING", direct_pending=teacher.id)
-        else:
-            pendings = pending_sql.get_pendings_by_token_type(token_type_id, classroom_id, status="PENDING")
+        # only the rows of the page shown are fetched, see token_type_pendings_list
+        # diary updates are approved with a multiplier, those are reviewed one by one
+        bulk = t_type != "Actualización de diario"
+        paginator = token_type_pendings_list(filter_key(c=classroom_id, u=teacher.user_id, d=1 if direct_pending else None, k=token_type_id, f=0, b=1 if bulk else None))
             
-        if pendings:
-            # create a list of lines for each pending
-            lines = [f"{i}. {token_type_sql.get_token_type(pending.token_type_id).type} - {user_sql.get_user(pending.student_id).fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}" for i, pending in enumerate(pendings, start=1)]
-            # create new paginator using this lines
-            other_buttons = [InlineKeyboardButton("🗃 Todos los pendientes", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
-            paginator = Paginator(lines, items_per_page=10, text_before=f'Pendientes de "{t_type}":', add_back=True, other_buttons=other_buttons)
-            # save paginator in user_data
-            context.user_data["paginator"] = paginator
+        if paginator.total:
             # send first page
             await query.edit_message_text(
                 paginator.text(),
@@ -269,7 +345,7 @@ async def filter_pendings(update: Update, context: ContextTypes):
         else:
             await query.edit_message_text(
                 text="No hay pendientes de este tipo.",
-                reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_FILTER_PENDING),
+                reply_markup=filter_keyboard(classroom_id, direct_pending),
             )
             return states.T_PENDING_SELECT
 
@@ -277,7 +353,7 @@ async def filters_pendings_activity(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
 
     # filter by pendings of this activity_type. If the activity_type supports
@@ -287,18 +363,13 @@ async def filters_pendings_activity(update: Update, context: ContextTypes):
     activity_type = activity_type_sql.get_activity_type(activity_type_id)
     token_type_id = token_type_sql.get_token_type(activity_type.token_type_id).id
     # get only pendings of this classroom with this token type
-    if context.user_data["pending"]["direct"]:
-        pendings = pending_sql.get_pendings_by_token_type(token_type_id, classroom_id, status="PENDING", direct_pending=teacher.id)
-    else:
-        pendings = pending_sql.get_pendings_by_token_type(token_type_id, classroom_id, status="PENDING")
+    direct_pending = teacher.user_id if context.user_data["pending"].get("direct") else None
+    # only the rows of the page shown are fetched, see token_type_pendings_list
+    # exercises of practic classes have their own credits, those are reviewed one by one
+    bulk = not practic_class_sql.get_practic_class_by_activity_type_id(activity_type_id)
+    paginator = token_type_pendings_list(filter_key(c=classroom_id, u=teacher.user_id, d=1 if direct_pending else None, k=token_type_id, f=1, b=1 if bulk else None))
     
-    if pendings:
-        # create a list of lines for each pending
-        lines = [f"{i}. {token_sql.get_token(pending.token_id).name + ' de' if pending.token_id else ''} {token_type_sql.get_token_type(pending.token_type_id).type} - {user_sql.get_user(pending.student_id).fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}" for i, pending in enumerate(pendings, start=1)]
-        other_buttons = [InlineKeyboardButton("🗃 Todos los pendientes", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
-        paginator = Paginator(lines, items_per_page=10, text_before=f'Pendientes de "{token_type_sql.get_token_type(token_type_id).type}":', add_back=True, other_buttons=other_buttons)
-        # save paginator in user_data
-        context.user_data["paginator"] = paginator
+    if paginator.total:
         # send first page
         await query.edit_message_text(
             paginator.text(),
@@ -308,7 +379,7 @@ async def filters_pendings_activity(update: Update, context: ContextTypes):
     else:
         await query.edit_message_text(
             text="No hay pendientes de este tipo.",
-            reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_FILTER_PENDING),
+            reply_markup=filter_keyboard(classroom_id, direct_pending),
         )
         return states.T_PENDING_SELECT
 
@@ -316,7 +387,7 @@ async def filters_pendings_practic_class(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     classroom_id = teacher.active_classroom_id
 
     # filter by pendings of this practic class.
@@ -324,18 +395,11 @@ async def filters_pendings_practic_class(update: Update, context: ContextTypes):
     practic_class = practic_class_sql.get_practic_class(practic_class_id)
     token_type_id = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class.activity_type_id).token_type_id).id
     # get only pendings of this classroom with this token type
-    if context.user_data["pending"]["direct"]:
-        pendings = pending_sql.get_pendings_by_token_type(token_type_id, classroom_id, status="PENDING", direct_pending=teacher.id)
-    else:
-        pendings = pending_sql.get_pendings_by_token_type(token_type_id, classroom_id, status="PENDING")
+    direct_pending = teacher.user_id if context.user_data["pending"].get("direct") else None
+    # only the rows of the page shown are fetched, see token_type_pendings_list
+    paginator = token_type_pendings_list(filter_key(c=classroom_id, u=teacher.user_id, d=1 if direct_pending else None, k=token_type_id, f=2))
     
-    if pendings:
-        # create a list of lines for each pending
-        lines = [f"{i}. Ejercicio {token_sql.get_token(pending.token_id).name + ' de' if pending.token_id else ''} la clase práctica {token_type_sql.get_token_type(pending.token_type_id).type} - {user_sql.get_user(pending.student_id).fullname} Fecha: {datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)} -> /pending_{pending.id} {'(Esperando más información)' if pending.more_info == 'PENDING' else ''}{'(Nueva información recibida)' if pending.more_info == 'SENT' else ''}" for i, pending in enumerate(pendings, start=1)]
-        other_buttons = [InlineKeyboardButton("🗃 Todos los pendientes", callback_data="all_pendings"), InlineKeyboardButton("🔽 Filtrar", callback_data="filter_pendings"), InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")]
-        paginator = Paginator(lines, items_per_page=10, text_before=f'Pendientes de "{token_type_sql.get_token_type(token_type_id).type}":', add_back=True, other_buttons=other_buttons)
-        # save paginator in user_data
-        context.user_data["paginator"] = paginator
+    if paginator.total:
         # send first page
         await query.edit_message_text(
             paginator.text(),
@@ -345,7 +409,7 @@ async def filters_pendings_practic_class(update: Update, context: ContextTypes):
     else:
         await query.edit_message_text(
             text="No hay pendientes de este tipo.",
-            reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_FILTER_PENDING),
+            reply_markup=filter_keyboard(classroom_id, direct_pending),
         )
         return states.T_PENDING_SELECT
 
@@ -367,15 +431,18 @@ async def pending_info(update: Update, context: ContextTypes):
             reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
         )
     
+    pending = pending_sql.get_pending(pending_id)
+    # old pendings of the history may have been moved to the archive
+    if not pending and context.user_data["pending"].get("history"):
+        pending = pending_sql.get_archived_pending(pending_id)
     # check if pending exists, since now it can be deleted when updated by a student
-    if not pending_sql.get_pending(pending_id):
+    if not pending:
         await update.message.reply_text(
             "El pendiente ya no existe, es posible que el estudiante haya enviado una versión actualizada.",
             reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
         )
         return ConversationHandler.END
 
-    pending = pending_sql.get_pending(pending_id)
     student_name = user_sql.get_user(pending.student_id).fullname
     token_type = token_type_sql.get_token_type(pending.token_type_id).type
     creation_date = datetime.date(pending.creation_date.year, pending.creation_date.month, pending.creation_date.day)
@@ -394,29 +461,25 @@ async def pending_info(update: Update, context: ContextTypes):
         text += f"Aprobado por: {approved_by}\n"
         text += f"Fecha de aprobación: {approved_date}\n\n"
     elif pending.teacher_id:
-        teacher_name = user_sql.get_user(teacher_sql.get_teacher(pending.teacher_id).id).fullname
+        teacher_name = user_sql.get_user(pending.teacher_id).fullname
         text = text.rstrip("\n")
         text += f"\nProfesor: {teacher_name}.\n"
-    if pending.text:
-        text += f"Texto: {pending.text}\n"
+    # the conversation thread is only loaded here, when a single pending is opened
+    full_text = pending_sql.get_full_text(pending)
+    if full_text:
+        text += f"Texto: {full_text}\n"
     text += "\nSeleccione una opción:"
 
     if context.user_data["pending"]["history"]:
         # if viewing history, only show options to return to history or back to menu
         if pending.FileID:
             try:
-                try:
-                    await update.message.reply_photo(
-                        pending.FileID, 
-                        caption=text,
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")],[InlineKeyboardButton("🔙", callback_data="back")]]),
-                    )
-                except BadRequest:
-                    await update.message.reply_document(
-                        pending.FileID,
-                        caption=text,
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")],[InlineKeyboardButton("🔙", callback_data="back")]]),
-                    )
+                await reply_media(
+                    update.message,
+                    pending.FileID,
+                    caption=text,
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🗓 Historial", callback_data="history_pendings")],[InlineKeyboardButton("🔙", callback_data="back")]]),
+                )
             except BadRequest:
                 await update.message.reply_text(
                     text=text + "\n\nSe ha producido un error al mostrar el archivo enviado con el pendiente. Es posible que haya sido eliminado.",
@@ -432,18 +495,12 @@ async def pending_info(update: Update, context: ContextTypes):
         # if not viewing history, show options to approve, reject or assign
         if pending.FileID:
             try:
-                try:
-                    await update.message.reply_photo(
-                        pending.FileID, 
-                        caption=text,
-                        reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PENDING_OPTIONS),
-                    )
-                except BadRequest:
-                    await update.message.reply_document(
-                        pending.FileID,
-                        caption=text,
-                        reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PENDING_OPTIONS),
-                    )
+                await reply_media(
+                    update.message,
+                    pending.FileID,
+                    caption=text,
+                    reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PENDING_OPTIONS),
+                )
             except BadRequest:
                 await update.message.reply_text(
                     text=text + "\n\nSe ha producido un error al mostrar el archivo enviado con el pendiente. Es posible que haya sido eliminado.",
@@ -464,7 +521,7 @@ async def manage_pending(update: Update, context: ContextTypes):
     pending_id = context.user_data["pending"]["id"]
     pending = pending_sql.get_pending(pending_id)
     pending_type = token_type_sql.get_token_type(pending.token_type_id).type
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
 
     if query.data == "pending_approve":
         # if pending is a diary update, check how many consecutive days in a row
@@ -488,42 +545,31 @@ async def manage_pending(update: Update, context: ContextTypes):
                     multiplier += 1
                 else:
                     break
-            value = 10000 * multiplier # later teacher can change this value in classroom settings
-            # create token
-            token_sql.add_token(name=f"{pending_type} de {user_sql.get_user(pending.student_id).fullname}", token_type_id=pending.token_type_id, classroom_id=teacher.active_classroom_id)
-            logger.info(f"Token {pending_type} created")
-            # update pending with this token
-            pending_sql.update_token(pending_id, token_sql.get_last_token().id)
+            # create the token, assign it and approve the pending in one transaction
+            with unit_of_work():
+                value = 10000 * multiplier # later teacher can change this value in classroom settings
+                # create token
+                token_id = token_sql.add_token(name=f"{pending_type} de {user_sql.get_user(pending.student_id).fullname}", token_type_id=pending.token_type_id, classroom_id=teacher.active_classroom_id)
+                logger.info(f"Token {pending_type} created")
+                # update pending with this token
+                pending_sql.update_token(pending_id, token_id)
 
-            # get token id
-            token = pending_sql.get_token(pending_id)
-            # assign token to student
-            student_token_sql.add_student_token(student_id=pending.student_id, token_id=token.id, value=value, teacher_id=user_sql.get_user_by_chatid(update.effective_user.id).id)
-            logger.info(f"Token {token.id} assigned to student {pending.student_id} with value {value}")
-            # change pending status to approved
-            pending_sql.approve_pending(pending_id, user_sql.get_user_by_chatid(update.effective_user.id).id)
-            logger.info(f"Pending {pending_id} approved")
+                # get token id
+                token = pending_sql.get_token(pending_id)
+                # assign token to student
+                student_token_sql.add_student_token(student_id=pending.student_id, token_id=token.id, value=value, teacher_id=user_sql.get_identity(update.effective_user.id).user_id)
+                logger.info(f"Token {token.id} assigned to student {pending.student_id} with value {value}")
+                # change pending status to approved
+                pending_sql.approve_pending(pending_id, user_sql.get_identity(update.effective_user.id).user_id)
+                logger.info(f"Pending {pending_id} approved")
 
-            # notify student
-            text = f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} ha aprobado tu {pending_type}.\n\nTu {pending_type}:\n{pending.text}"
-            try:
-                await context.bot.send_message(
-                    chat_id=user_sql.get_user(pending.student_id).telegram_chatid,
-                    text=text,
-                )
-            except BadRequest:
-                logger.error(f"Error sending message to student {user_sql.get_user(pending.student_id).fullname} (chat_id: {user_sql.get_user(pending.student_id).telegram_chatid})")
+                # notify student
+                text = f"{user_sql.get_identity(update.effective_user.id).fullname} ha aprobado tu {pending_type}.\n\nTu {pending_type}:\n{pending.text}"
+                outbox_sql.enqueue(user_sql.get_user(pending.student_id).telegram_chatid, text, dedupe_key=f"pending_approved:{pending_id}")
+            wake_outbox(context)
 
             # Send to notif channel if exists
-            chan = classroom_sql.get_teacher_notification_channel_chat_id(teacher.active_classroom_id)
-            if chan:
-                try:
-                    await context.bot.send_message(
-                        chat_id=chan,
-                        text=f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} ha aprobado la {pending_type} de {user_sql.get_user(pending.student_id).fullname}.",
-                    )
-                except BadRequest:
-                    logger.exception(f"Failed to send message to notification channel {chan}.")
+            notify_channel(context, teacher.active_classroom_id, f"{user_sql.get_identity(update.effective_user.id).fullname} ha aprobado la {pending_type} de {user_sql.get_user(pending.student_id).fullname}.")
 
             await query.message.reply_text(
                 text="El pendiente ha sido aprobado.",
@@ -555,33 +601,21 @@ async def manage_pending(update: Update, context: ContextTypes):
                         # give full credits. X2 if pending created before practic class date
                         student = student_sql.get_student(pending.student_id)
                         token = token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id)
-                        teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+                        teacher = user_sql.get_identity(update.effective_user.id, "teacher")
                         value = exercise.value * 2 if pending.creation_date < practic_class.date else exercise.value
-                        student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher.id)
-                        logger.info(f"Token {token.id} assigned to student {student.id} with value {value}")
-                        # approve pending
-                        pending_sql.approve_pending(pending_id, user_sql.get_user_by_chatid(update.effective_user.id).id)
-                        logger.info(f"Pending {pending_id} approved")
-                        # notify student
-                        text = f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} ha aprobado tu ejercicio {token.name} de {pending_type} con {value} créditos.\n\nTu {token.name}:\n{pending.text}"
-                        try:
-                            await context.bot.send_message(
-                                chat_id=user_sql.get_user(pending.student_id).telegram_chatid,
-                                text=text,
-                            )
-                        except BadRequest:
-                            logger.error(f"Error sending message to student {user_sql.get_user(pending.student_id).fullname} (chat_id: {user_sql.get_user(pending.student_id).telegram_chatid})")
+                        with unit_of_work():
+                            student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher.user_id)
+                            logger.info(f"Token {token.id} assigned to student {student.id} with value {value}")
+                            # approve pending
+                            pending_sql.approve_pending(pending_id, user_sql.get_identity(update.effective_user.id).user_id)
+                            logger.info(f"Pending {pending_id} approved")
+                            # notify student
+                            text = f"{user_sql.get_identity(update.effective_user.id).fullname} ha aprobado tu ejercicio {token.name} de {pending_type} con {value} créditos.\n\nTu {token.name}:\n{pending.text}"
+                            outbox_sql.enqueue(user_sql.get_user(pending.student_id).telegram_chatid, text, dedupe_key=f"pending_approved:{pending_id}")
+                        wake_outbox(context)
                         
                         # Send to notif channel if exists
-                        chan = classroom_sql.get_teacher_notification_channel_chat_id(teacher.active_classroom_id)
-                        if chan:
-                            try:
-                                await context.bot.send_message(
-                                    chat_id=chan,
-                                    text=f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} ha aprobado el ejercicio {token.name} de {pending_type} con {value} créditos.",
-                                )
-                            except BadRequest:
-                                logger.exception(f"Failed to send message to notification channel {chan}.")
+                        notify_channel(context, teacher.active_classroom_id, f"{user_sql.get_identity(update.effective_user.id).fullname} ha aprobado el ejercicio {token.name} de {pending_type} con {value} créditos.")
                         
                         await query.message.reply_text(
                             text="El pendiente ha sido aprobado.",
@@ -620,7 +654,9 @@ async def manage_pending(update: Update, context: ContextTypes):
         # get list of teachers of this classroom
         teacher_ids = teacher_classroom_sql.get_teacher_ids(teacher.active_classroom_id)
         if teacher_ids:
-            buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(teacher_id).fullname}", callback_data=f"assign#{teacher_id}") for i, teacher_id in enumerate(teacher_ids, start=1)]
+            # load the names of every user at once
+            users = user_sql.get_users_by_ids(teacher_ids)
+            buttons = [InlineKeyboardButton(f"{i}. {users[teacher_id].fullname}", callback_data=f"assign#{teacher_id}") for i, teacher_id in enumerate(teacher_ids, start=1)]
             # shows the list of teachers to assing the pendign to.
             if query.message.text:
                 await query.edit_message_text(
@@ -687,38 +723,26 @@ async def reject_pending(update: Update, context: ContextTypes):
         query.answer()
     
     pending_id = context.user_data["pending"]["id"]
-    
-    if query:
-        pending_sql.reject_pending(pending_id)
-        logger.info(f"Pending {pending_id} rejected")
-        await query.message.reply_text(
-            text="El pendiente ha sido denegado.",
-            reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
-        )
-    else:
-        explanation = update.message.text
+    explanation = None if query else update.message.text
+
+    # reject and notify the student in one transaction
+    with unit_of_work():
         pending_sql.reject_pending(pending_id, explanation)
         logger.info(f"Pending {pending_id} rejected")
-        await update.message.reply_text(
-            text="El pendiente ha sido denegado. ",
-            reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
-        )
-    # notify student
-    pending = pending_sql.get_pending(pending_id)
-    student_chat_id = user_sql.get_user(pending.student_id).telegram_chatid
-    student_name = user_sql.get_user(pending.student_id).fullname
-    token_type = token_type_sql.get_token_type(pending.token_type_id).type
-    pending_text = pending.text if pending.text else ""
-    text = f"El profesor {user_sql.get_user_by_chatid(update.effective_user.id).fullname} ha denegado tu {token_type}.\n\nTu {token_type}:\n{pending_text}"
-    if pending.explanation:
-        text += f"\n\nRazón:\n{pending.explanation}"
-    try:
-        await context.bot.send_message(
-            chat_id=student_chat_id,
-            text=text,
-        )
-    except BadRequest:
-        logger.error(f"Error sending message to student {student_name} (chat_id: {student_chat_id})")
+        pending = pending_sql.get_pending(pending_id)
+        student_chat_id = user_sql.get_user(pending.student_id).telegram_chatid
+        token_type = token_type_sql.get_token_type(pending.token_type_id).type
+        pending_text = pending.text if pending.text else ""
+        text = f"El profesor {user_sql.get_identity(update.effective_user.id).fullname} ha denegado tu {token_type}.\n\nTu {token_type}:\n{pending_text}"
+        if pending.explanation:
+            text += f"\n\nRazón:\n{pending.explanation}"
+        outbox_sql.enqueue(student_chat_id, text, dedupe_key=f"pending_rejected:{pending_id}")
+    wake_outbox(context)
+
+    await (query.message if query else update.message).reply_text(
+        text="El pendiente ha sido denegado.",
+        reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
+    )
     return ConversationHandler.END
 
 async def approve_pending(update: Update, context: ContextTypes):
@@ -734,7 +758,7 @@ async def approve_pending(update: Update, context: ContextTypes):
     token_type = token_type_sql.get_token_type(pending.token_type_id).type
     classroom_id = pending.classroom_id
     guild = guild_sql.get_guild(pending.guild_id) if pending.guild_id else None
-    teacher_name = user_sql.get_user_by_chatid(update.effective_user.id).fullname
+    teacher_name = user_sql.get_identity(update.effective_user.id).fullname
 
     text = update.message.text
     # get token value and comment
@@ -745,86 +769,69 @@ async def approve_pending(update: Update, context: ContextTypes):
         value = int(text)
         comment = None
     
-    token = pending_sql.get_token(pending_id)
-    if not token:
-        # create token
-        token_sql.add_token(name=f"{token_type} de {guild.name if guild else student_name}", token_type_id=pending.token_type_id, classroom_id=classroom_id)
-        logger.info(f"Token {token_type} created")
-        # update pending with this token
-        pending_sql.update_token(pending_id, token_sql.get_last_token().id)
-
-    # get token id
-    token = pending_sql.get_token(pending_id)
-    # assign token to student or guild
-    if guild:
-        # if guild has this token already assigned (sent multiple pendings or teacher reviewed manually before seeing the pending),
-        # delete the pending and notify the teacher.
-        if guild_token_sql.exists(guild.id, token.id):
-            pending_sql.delete_pending(pending_id)
-            logger.info(f"Pending {pending_id} deleted")
-            await update.message.reply_text(
-                text=f"El gremio {guild.name} ya recibió créditos por esta actividad: {token.name} de {token_type}. El pendiente ha sido eliminado.",
-                reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
-            )
-            return ConversationHandler.END
-        guild_token_sql.add_guild_token(guild_id=guild.id, token_id=token.id, value=value, teacher_id=user_sql.get_user_by_chatid(update.effective_user.id).id)
-        logger.info(f"Token {token.id} assigned to guild {guild.id} with value {value}")
-    else:
-        # if student has this token already assigned (sent multiple pendings or teacher reviewed manually before seeing the pending),
-        # delete the pending and notify the teacher.
-        if student_token_sql.exists(pending.student_id, token.id):
-            pending_sql.delete_pending(pending_id)
-            logger.info(f"Pending {pending_id} deleted")
-            await update.message.reply_text(
-                text=f"{student_name} ya recibió créditos por esta actividad: {token.name} de {token_type}. El pendiente ha sido eliminado.",
-                reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
-            )
-            return ConversationHandler.END
-        student_token_sql.add_student_token(student_id=pending.student_id, token_id=token.id, value=value, teacher_id=user_sql.get_user_by_chatid(update.effective_user.id).id)
-        logger.info(f"Token {token.id} assigned to student {pending.student_id} with value {value}")
-    
-    # change pending status to approved
-    pending_sql.approve_pending(pending_id, user_sql.get_user_by_chatid(update.effective_user.id).id)
-    logger.info(f"Pending {pending_id} approved")
+    # everything up to the approval is a single transaction, a failure halfway
+    # doesn't leave a token without its student_token/guild_token
+    already_assigned = False
+    with unit_of_work():
+        token = pending_sql.get_token(pending_id)
+        if not token:
+            # create token
+            token_id = token_sql.add_token(name=f"{token_type} de {guild.name if guild else student_name}", token_type_id=pending.token_type_id, classroom_id=classroom_id)
+            logger.info(f"Token {token_type} created")
+            # update pending with this token
+            pending_sql.update_token(pending_id, token_id)
 
-    # notify student or guild
-    if guild:
-        text = f"<b>{teacher_name}</b> ha aprobado el <b>{token_type}</b> del gremio <b>{guild.name}</b> con un valor de <b>{value}</b>.\n\nTu {token_type}:\n{pending.text}"
-        if comment:
-            text += f"\n\n<b>Comentario:</b>\n{comment}"
-        for student in student_sql.get_students_by_guild(guild.id):
-            try:
-                await context.bot.send_message(
-                    chat_id=user_sql.get_user(student.id).telegram_chatid,
-                    text=text,
-                    parse_mode="HTML",
-                )
-            except BadRequest:
-                logger.error(f"Error sending message to student {user_sql.get_user(student.id).fullname} (chat_id: {user_sql.get_user(student.id).telegram_chatid})")
-    else:
-        text = f"<b>{teacher_name}</b> ha aprobado tu <b>{token_type}</b> con un valor de <b>{value}</b>.\n\nTu {token_type}:\n{pending.text}"
-        if comment:
-            text += f"\n\n<b>Comentario:</b>\n{comment}"
-        try:
-            await context.bot.send_message(
-                chat_id=student_chat_id,
-                text=text,
-                parse_mode="HTML",
-            )
-        except BadRequest:
-            logger.error(f"Error sending message to student {student_name} (chat_id: {student_chat_id})")
+        # get token id
+        token = pending_sql.get_token(pending_id)
+        # assign token to student or guild
+        if guild:
+            # if guild has this token already assigned (sent multiple pendings or teacher reviewed manually before seeing the pending),
+            # delete the pending and notify the teacher.
+            if guild_token_sql.exists(guild.id, token.id):
+                pending_sql.delete_pending(pending_id)
+                logger.info(f"Pending {pending_id} deleted")
+                already_assigned = True
+            else:
+                guild_token_sql.add_guild_token(guild_id=guild.id, token_id=token.id, value=value, teacher_id=user_sql.get_identity(update.effective_user.id).user_id)
+                logger.info(f"Token {token.id} assigned to guild {guild.id} with value {value}")
+        else:
+            # if student has this token already assigned (sent multiple pendings or teacher reviewed manually before seeing the pending),
+            # delete the pending and notify the teacher.
+            if student_token_sql.exists(pending.student_id, token.id):
+                pending_sql.delete_pending(pending_id)
+                logger.info(f"Pending {pending_id} deleted")
+                already_assigned = True
+            else:
+                student_token_sql.add_student_token(student_id=pending.student_id, token_id=token.id, value=value, teacher_id=user_sql.get_identity(update.effective_user.id).user_id)
+                logger.info(f"Token {token.id} assigned to student {pending.student_id} with value {value}")
+
+        if not already_assigned:
+            # change pending status to approved
+            pending_sql.approve_pending(pending_id, user_sql.get_identity(update.effective_user.id).user_id)
+            logger.info(f"Pending {pending_id} approved")
+
+            # notify student or guild
+            if guild:
+                text = f"<b>{teacher_name}</b> ha aprobado el <b>{token_type}</b> del gremio <b>{guild.name}</b> con un valor de <b>{value}</b>.\n\nTu {token_type}:\n{pending.text}"
+                if comment:
+                    text += f"\n\n<b>Comentario:</b>\n{comment}"
+                outbox_sql.enqueue_many([student.chat_id for student in student_sql.get_student_chats_by_guild(guild.id)], text, parse_mode="HTML", dedupe_key=f"pending_approved:{pending_id}")
+            else:
+                text = f"<b>{teacher_name}</b> ha aprobado tu <b>{token_type}</b> con un valor de <b>{value}</b>.\n\nTu {token_type}:\n{pending.text}"
+                if comment:
+                    text += f"\n\n<b>Comentario:</b>\n{comment}"
+                outbox_sql.enqueue(student_chat_id, text, parse_mode="HTML", dedupe_key=f"pending_approved:{pending_id}")
+
+    if already_assigned:
+        await update.message.reply_text(
+            text=f"{'El gremio ' + guild.name if guild else student_name} ya recibió créditos por esta actividad: {token.name} de {token_type}. El pendiente ha sido eliminado.",
+            reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
+        )
+        return ConversationHandler.END
+    wake_outbox(context)
 
     # Send to notif channel if exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"<b>{teacher_name}</b> ha aprobado el <b>{token_type}</b> de <b>{student_name}</b>con un valor de <b>{value}</b>.",
-                parse_mode="HTML",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, classroom_id, f"<b>{teacher_name}</b> ha aprobado el <b>{token_type}</b> de <b>{student_name}</b>con un valor de <b>{value}</b>.", parse_mode="HTML")
 
     await update.message.reply_text(
         text="El pendiente ha sido aprobado.",
@@ -862,37 +869,23 @@ async def approve_partial_credits(update: Update, context: ContextTypes):
     practic_class = practic_class_sql.get_practic_class(exercise.practic_class_id)
     student = student_sql.get_student(pending.student_id)
     token = token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id)
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     value = partial_credits * 2 if pending.creation_date < practic_class.date else partial_credits
-    student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher.id)
-    logger.info(f"Token {token.id} assigned to student {student.id} with value {value}")
-    # approve pending
-    pending_sql.approve_pending(pending_id, user_sql.get_user_by_chatid(update.effective_user.id).id)
-    logger.info(f"Pending {pending_id} approved")
-    # notify student
-    text = f"<b>{user_sql.get_user_by_chatid(update.effective_user.id).fullname}</b> ha aprobado tu ejercicio <b>{token.name}</b> de <b>{pending_type}</b> con <b>{value}</b> créditos.\n\nTu {token.name}:\n{pending.text}"
-    if comment:
+    with unit_of_work():
+        student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher.user_id)
+        logger.info(f"Token {token.id} assigned to student {student.id} with value {value}")
+        # approve pending
+        pending_sql.approve_pending(pending_id, user_sql.get_identity(update.effective_user.id).user_id)
+        logger.info(f"Pending {pending_id} approved")
+        # notify student
+        text = f"<b>{user_sql.get_identity(update.effective_user.id).fullname}</b> ha aprobado tu ejercicio <b>{token.name}</b> de <b>{pending_type}</b> con <b>{value}</b> créditos.\n\nTu {token.name}:\n{pending.text}"
+        if comment:
             text += f"\n\n<b>Comentario:</b>\n{comment}"
-    try:
-        await context.bot.send_message(
-            chat_id=user_sql.get_user(pending.student_id).telegram_chatid,
-            text=text,
-            parse_mode="HTML",
-        )
-    except BadRequest:
-        logger.error(f"Error sending message to student {user_sql.get_user(pending.student_id).fullname} (chat_id: {user_sql.get_user(pending.student_id).telegram_chatid})")
+        outbox_sql.enqueue(user_sql.get_user(pending.student_id).telegram_chatid, text, parse_mode="HTML", dedupe_key=f"pending_approved:{pending_id}")
+    wake_outbox(context)
     
     # Send to notif channel if exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(teacher.active_classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"<b>{user_sql.get_user_by_chatid(update.effective_user.id).fullname}</b> ha aprobado el ejercicio <b>{token.name}</b> de <b>{pending_type}</b> de <b>{user_sql.get_user(pending.student_id).fullname}</b> con <b>{value}</b> créditos.",
-                parse_mode="HTML",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, teacher.active_classroom_id, f"<b>{user_sql.get_identity(update.effective_user.id).fullname}</b> ha aprobado el ejercicio <b>{token.name}</b> de <b>{pending_type}</b> de <b>{user_sql.get_user(pending.student_id).fullname}</b> con <b>{value}</b> créditos.", parse_mode="HTML")
     
     await update.message.reply_text(
         text="El pendiente ha sido aprobado.",
@@ -908,42 +901,224 @@ async def more_info_pending(update: Update, context: ContextTypes):
     pending_id = context.user_data["pending"]["id"]
     pending = pending_sql.get_pending(pending_id)
     student_chat_id = user_sql.get_user(pending.student_id).telegram_chatid
-    student_name = user_sql.get_user(pending.student_id).fullname
     token_type = token_type_sql.get_token_type(pending.token_type_id).type
     teacher_chat_id = user_sql.get_user_by_chatid(update.effective_user.id).telegram_chatid
 
-    # update pending
-    text = f"> Pregunta de {user_sql.get_user_by_chatid(update.effective_user.id).fullname}:\n{update.message.text}"
-    pending_sql.ask_for_more_info(pending_id, text)
-    logger.info(f"Pending {pending_id} updated with more info from teacher")
-    # notify student
-    text = f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} ha solicitado más información sobre tu {token_type}.\n\nTu {token_type}:\n{pending_sql.get_pending(pending_id).text}"
-    try:
-        await context.bot.send_message(
-            chat_id=student_chat_id,
-            text=text,
+    with unit_of_work():
+        # update pending
+        text = f"> Pregunta de {user_sql.get_identity(update.effective_user.id).fullname}:\n{update.message.text}"
+        pending_sql.ask_for_more_info(pending_id, text, author_id=user_sql.get_identity(update.effective_user.id).user_id)
+        logger.info(f"Pending {pending_id} updated with more info from teacher")
+        # notify student
+        text = f"{user_sql.get_identity(update.effective_user.id).fullname} ha solicitado más información sobre tu {token_type}.\n\nTu {token_type}:\n{pending_sql.get_full_text(pending)}"
+        outbox_sql.enqueue(
+            student_chat_id,
+            text,
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📤 Responder", callback_data=f"pending_more_info_student#{pending_id}#{teacher_chat_id}")]]),
         )
-    except BadRequest:
-        logger.error(f"Error sending message to student {student_name} (chat_id: {student_chat_id})")
+    wake_outbox(context)
     await update.message.reply_text(
         text="El mensaje ha sido enviado al estudiante.",
         reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
     )
     return ConversationHandler.END
 
+async def bulk_pendings(update: Update, context: ContextTypes):
+    """ Starts the approval or rejection of every pending of the current filter.
+    The pendings are taken when the teacher chooses the option, so pendings
+    that arrive later are left for the next review.
+    The filter comes in the callback data, see bulk_buttons, so the buttons
+    also work after a restart. The selection is then kept in user_data."""
+    query = update.callback_query
+    query.answer()
+
+    action, key = query.data.split("|")
+    values = parse_filter_key(key)
+    identity = user_sql.get_identity(update.effective_user.id, "teacher")
+    token_type = token_type_sql.get_token_type(values["k"])
+    # the list is of another teacher, of a classroom the teacher left or its
+    # token type was deleted
+    if not identity or identity.user_id != values["u"] or not teacher_classroom_sql.exists(identity.user_id, values["c"]) or not token_type:
+        await query.edit_message_text("Esta lista ya no está disponible.")
+        return ConversationHandler.END
+
+    classroom_id = values["c"]
+    direct_pending = values["u"] if "d" in values else None
+    bulk = {"classroom_id": classroom_id, "token_type_id": token_type.id, "direct_pending": direct_pending, "type": token_type.type}
+    bulk["ids"] = pending_sql.get_pending_ids(classroom_id, direct_pending=direct_pending, token_type_id=token_type.id)
+    context.user_data.setdefault("pending", {})["bulk"] = bulk
+    if not bulk["ids"]:
+        await query.edit_message_text(
+            text="No hay pendientes de este tipo.",
+            reply_markup=filter_keyboard(classroom_id, direct_pending),
+        )
+        return states.T_PENDING_SELECT
+
+    if action == "bulk_approve":
+        await query.edit_message_text(
+            f"Ingrese la cantidad de créditos a otorgar por cada uno de los {len(bulk['ids'])} pendientes de {bulk['type']}. Puede agregar un comentario después de la cantidad de créditos después de un espacio.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙", callback_data="back")]]),
+        )
+        return states.T_PENDING_BULK_APPROVE
+    else:
+        await query.edit_message_text(
+            f"Puede ingresar una razón para el rechazo de los {len(bulk['ids'])} pendientes de {bulk['type']} o presione continuar. Se le notificará a los estudiantes.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Continuar", callback_data="bulk_reject_continue")], [InlineKeyboardButton("🔙", callback_data="back")]]),
+        )
+        return states.T_PENDING_BULK_REJECT
+
+async def bulk_expired(message) -> int:
+    """ Ends the bulk review when the selected pendings are no longer in
+    user_data, like after a restart. """
+    await message.reply_text(
+        "La selección de pendientes ha expirado, por favor filtre los pendientes nuevamente.",
+        reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
+    )
+    return ConversationHandler.END
+
+async def bulk_approve_pendings(update: Update, context: ContextTypes):
+    """ Approves every selected pending with the same value, like approve_pending
+    does for a single one: creates the missing tokens, assigns them to the
+    students or guilds and approves the pendings, all in one transaction.
+    The notifications are queued in the outbox."""
+    bulk = context.user_data.get("pending", {}).get("bulk")
+    if not bulk:
+        return await bulk_expired(update.message)
+    identity = user_sql.get_identity(update.effective_user.id, "teacher")
+    teacher_id = identity.user_id
+
+    text = update.message.text
+    # get token value and comment
+    try:
+        value = int(text.split(" ")[0])
+        comment = text.split(" ", 1)[1]
+    except:
+        value = int(text)
+        comment = None
+
+    with unit_of_work():
+        # pendings reviewed since the list was shown are skipped
+        pendings = sorted((pending for pending in pending_sql.get_pendings_by_ids(bulk["ids"]).values() if pending.status == "PENDING"), key=lambda pending: pending.id)
+        users = user_sql.get_users_by_ids(pending.student_id for pending in pendings)
+        guilds = guild_sql.get_guilds_by_ids(pending.guild_id for pending in pendings)
+
+        # create the missing tokens at once
+        without_token = [pending for pending in pendings if not pending.token_id]
+        token_ids = token_sql.add_tokens([
+            {"name": f"{bulk['type']} de {guilds[pending.guild_id].name if pending.guild_id else users[pending.student_id].fullname}", "token_type_id": pending.token_type_id, "classroom_id": pending.classroom_id}
+            for pending in without_token
+        ])
+        new_tokens = {pending.id: token_id for pending, token_id in zip(without_token, token_ids)}
+        pending_sql.update_tokens(new_tokens)
+        tokens = {pending.id: new_tokens.get(pending.id, pending.token_id) for pending in pendings}
+
+        # students or guilds that already have the token (sent multiple pendings or
+        # teacher reviewed manually before) get their pending deleted instead
+        assigned = set(student_token_sql.get_values_by_token_ids(tokens.values()))
+        assigned_guilds = set()
+        student_tokens, guild_pendings, approved, repeated = [], [], [], []
+        for pending in pendings:
+            token_id = tokens[pending.id]
+            if pending.guild_id:
+                if (pending.guild_id, token_id) in assigned_guilds or guild_token_sql.exists(pending.guild_id, token_id):
+                    repeated.append(pending)
+                    continue
+                assigned_guilds.add((pending.guild_id, token_id))
+                guild_pendings.append(pending)
+            else:
+                if (pending.student_id, token_id) in assigned:
+                    repeated.append(pending)
+                    continue
+                assigned.add((pending.student_id, token_id))
+                student_tokens.append((pending.student_id, token_id, value))
+            approved.append(pending)
+        student_token_sql.add_student_tokens(student_tokens, teacher_id=teacher_id)
+        for pending in guild_pendings:
+            guild_token_sql.add_guild_token(guild_id=pending.guild_id, token_id=tokens[pending.id], value=value, teacher_id=teacher_id)
+        for pending in repeated:
+            pending_sql.delete_pending(pending.id)
+        pending_sql.approve_pendings([pending.id for pending in approved], teacher_id)
+
+        # queue the notifications for the students and guild members, with one insert
+        guild_members = {guild_id: student_sql.get_student_chats_by_guild(guild_id) for guild_id in {pending.guild_id for pending in guild_pendings}}
+        messages = []
+        for pending in approved:
+            if pending.guild_id:
+                text = f"<b>{identity.fullname}</b> ha aprobado el <b>{bulk['type']}</b> del gremio <b>{guilds[pending.guild_id].name}</b> con un valor de <b>{value}</b>.\n\nTu {bulk['type']}:\n{pending.text}"
+                chat_ids = [student.chat_id for student in guild_members[pending.guild_id]]
+            else:
+                text = f"<b>{identity.fullname}</b> ha aprobado tu <b>{bulk['type']}</b> con un valor de <b>{value}</b>.\n\nTu {bulk['type']}:\n{pending.text}"
+                chat_ids = [users[pending.student_id].telegram_chatid]
+            if comment:
+                text += f"\n\n<b>Comentario:</b>\n{comment}"
+            messages.extend((chat_id, text, f"pending_approved:{pending.id}:{chat_id}") for chat_id in chat_ids)
+        outbox_sql.enqueue_each(messages, parse_mode="HTML")
+    logger.info(f"{len(approved)} pendings approved and {len(repeated)} deleted by teacher {teacher_id}")
+    wake_outbox(context)
+
+    if approved:
+        notify_channel(context, bulk["classroom_id"], f"<b>{identity.fullname}</b> ha aprobado {len(approved)} pendientes de <b>{bulk['type']}</b> con un valor de <b>{value}</b>.", parse_mode="HTML")
+
+    text = f"Se han aprobado {len(approved)} pendientes."
+    if repeated:
+        text += f" {len(repeated)} pendientes han sido eliminados porque ya habían recibido créditos por esa actividad."
+    await update.message.reply_text(
+        text=text,
+        reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
+    )
+    return ConversationHandler.END
+
+async def bulk_reject_pendings(update: Update, context: ContextTypes):
+    """ Rejects every selected pending and queues the notifications for the
+    students in one transaction."""
+    query = update.callback_query
+    if query:
+        query.answer()
+        explanation = None
+    else:
+        explanation = update.message.text
+    bulk = context.user_data.get("pending", {}).get("bulk")
+    if not bulk:
+        return await bulk_expired(query.message if query else update.message)
+    identity = user_sql.get_identity(update.effective_user.id, "teacher")
+
+    with unit_of_work():
+        # pendings reviewed since the list was shown are skipped
+        pendings = sorted((pending for pending in pending_sql.get_pendings_by_ids(bulk["ids"]).values() if pending.status == "PENDING"), key=lambda pending: pending.id)
+        pending_sql.reject_pendings([pending.id for pending in pendings], explanation)
+
+        # queue the notifications for the students
+        users = user_sql.get_users_by_ids(pending.student_id for pending in pendings)
+        messages = []
+        for pending in pendings:
+            text = f"El profesor {identity.fullname} ha denegado tu {bulk['type']}.\n\nTu {bulk['type']}:\n{pending.text if pending.text else ''}"
+            if explanation:
+                text += f"\n\nRazón:\n{explanation}"
+            chat_id = users[pending.student_id].telegram_chatid
+            messages.append((chat_id, text, f"pending_rejected:{pending.id}:{chat_id}"))
+        outbox_sql.enqueue_each(messages)
+    logger.info(f"{len(pendings)} pendings rejected by teacher {identity.user_id}")
+    wake_outbox(context)
+
+    message = query.message if query else update.message
+    await message.reply_text(
+        text=f"Se han denegado {len(pendings)} pendientes.",
+        reply_markup=ReplyKeyboardMarkup(keyboards.TEACHER_MAIN_MENU, one_time_keyboard=True, resize_keyboard=True),
+    )
+    return ConversationHandler.END
+
 async def teacher_pendings_back(update: Update, context: ContextTypes):
     """Returns to the teacher menu"""
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user_by_chatid(update.effective_user.id).fullname,
+            fullname=user_sql.get_identity(update.effective_user.id).fullname,
             role="teacher",
             classroom_name=classroom.name,
         ),
@@ -960,7 +1135,11 @@ async def teacher_pendings_back(update: Update, context: ContextTypes):
 
 # Handlers
 teacher_pendings_conv = ConversationHandler(
-    entry_points=[MessageHandler(filters.Regex("^🗃 Pendientes$"), teacher_pendings)],
+    entry_points=[
+        MessageHandler(filters.Regex("^🗃 Pendientes$"), teacher_pendings),
+        # the bulk buttons of a stateless list outlive the conversation
+        CallbackQueryHandler(bulk_pendings, pattern=r"^bulk_(approve|reject)\|"),
+    ],
     states={
         states.T_PENDING_SELECT: [
             text_paginator_handler,
@@ -969,6 +1148,7 @@ teacher_pendings_conv = ConversationHandler(
             CallbackQueryHandler(filter_pendings, pattern=r"^filter_"),
             CallbackQueryHandler(pending_history, pattern=r"^history_pendings$"),
             MessageHandler(filters.TEXT & filters.Regex("^/pending_"), pending_info),
+            CallbackQueryHandler(bulk_pendings, pattern=r"^bulk_(approve|reject)\|"),
         ],
         states.T_PENDING_FILTER_ACTIVITY: [
             CallbackQueryHandler(filters_pendings_activity, pattern=r"^activity_type#"),
@@ -995,6 +1175,11 @@ teacher_pendings_conv = ConversationHandler(
             MessageHandler(filters.Regex(r"^\d+(\s.*)?") & ~filters.COMMAND, approve_pending),
         ],
         states.T_PENDING_APPROVE_PARTIAL_CREDITS: [MessageHandler(filters.Regex(r"^\d+(\s.*)?") & ~filters.COMMAND, approve_partial_credits)],
+        states.T_PENDING_BULK_APPROVE: [MessageHandler(filters.Regex(r"^\d+(\s.*)?") & ~filters.COMMAND, bulk_approve_pendings)],
+        states.T_PENDING_BULK_REJECT: [
+            CallbackQueryHandler(bulk_reject_pendings, pattern=r"^bulk_reject_continue$"),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_reject_pendings),
+        ],
         states.T_PENDING_MORE_INFO: [
             MessageHandler((filters.TEXT | filters.PHOTO | filters.Document.ALL) & ~filters.COMMAND, more_info_pending),
         ],
@@ -12,11 +12,14 @@ from telegram.ext import (
 )
 
 from utils.logger import logger
+from bot.utils.notifications import notify_channel
+from bot.utils.outbox import wake_outbox
+from bot.utils.media import reply_media, remember_file
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.pagination import Paginator, text_paginator_handler
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, practic_class_sql, practic_class_exercises_sql
+from sql import run_sql, unit_of_work, user_sql, classroom_sql, course_sql, pending_sql, token_type_sql, student_sql, guild_token_sql, token_sql, student_token_sql, guild_sql, activity_type_sql, activity_sql, practic_class_sql, practic_class_exercises_sql, outbox_sql
 from bot.teacher_settings import back_to_teacher_menu
 
 
@@ -45,7 +48,7 @@ async def teacher_practic_classes(update: Update, context: ContextTypes):
     # context vars
     context.user_data["practic_class"] = {}
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get all practic classes from db (include hidden)
     practic_classes = practic_class_sql.get_practic_classes(teacher.active_classroom_id, include_hidden=True)
 
@@ -93,7 +96,7 @@ async def practic_class_string(update: Update, context: ContextTypes):
     name = cp_str.split()[0]
 
     # if name exists, ask for another one
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
     practic_class = practic_class_sql.get_practic_class_by_name(name, classroom_id)
     if practic_class:
         await update.message.reply_text(
@@ -173,21 +176,15 @@ async def practic_class_file(update: Update, context: ContextTypes):
     query = update.callback_query
     if query:
         await query.answer()
-        file = None
+        fid = None
     else:
-        file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+        fid = remember_file(update.message)
 
     # get classroom id
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
 
     # create practic class
-    practic_class_sql.add_practic_class(
+    practic_class_id = practic_class_sql.add_practic_class(
         date = context.user_data["practic_class"]["date"],
         name = context.user_data["practic_class"]["name"],
         classroom_id = classroom_id,
@@ -197,7 +194,6 @@ async def practic_class_file(update: Update, context: ContextTypes):
     logger.info(f"Created practic class {context.user_data['practic_class']['name']}")
 
     # create exercises
-    practic_class_id = practic_class_sql.get_practic_class_by_name(context.user_data["practic_class"]["name"], classroom_id).id
     exercises = context.user_data["practic_class"]["exercises"]
     for i in range(0, len(exercises), 2):
         practic_class_exercises_sql.add_practic_class_exercise(
@@ -250,8 +246,10 @@ async def practic_class_selected(update: Update, context: ContextTypes):
     exercises = practic_class_exercises_sql.get_practic_class_exercises_by_practic_class_id(practic_class_id)
     if exercises:
         # sort exercises by name
-        exercises.sort(key=lambda x: token_sql.get_token(activity_sql.get_activity(x.activity_id).token_id).name)
-        buttons = [InlineKeyboardButton(f"{i}. {token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id).name} - ({exercise.value})", callback_data=f"exercise#{exercise.id}") for i, exercise in enumerate(exercises, start=1)]    
+        # load the token of every exercise at once
+        tokens = practic_class_exercises_sql.get_tokens_of_exercises(exercises)
+        exercises.sort(key=lambda x: tokens[x.id].name)
+        buttons = [InlineKeyboardButton(f"{i}. {tokens[exercise.id].name} - ({exercise.value})", callback_data=f"exercise#{exercise.id}") for i, exercise in enumerate(exercises, start=1)]    
         other_buttons = [
             InlineKeyboardButton("➕ Crear ejercicio", callback_data=f"create_exercise#{practic_class_id}"),
             InlineKeyboardButton("Cambiar fecha", callback_data="practic_class_change_date"),
@@ -262,10 +260,7 @@ async def practic_class_selected(update: Update, context: ContextTypes):
         ]
         if activity_type.FileID:
             try:
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
+                await reply_media(query.message, activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la clase práctica para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
         else:
@@ -273,10 +268,7 @@ async def practic_class_selected(update: Update, context: ContextTypes):
     else:
         if activity_type.FileID:
             try:
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("➕ Crear ejercicio", callback_data=f"create_exercise#{practic_class_id}")],] + keyboards.TEACHER_PRACTIC_CLASS_OPTIONS))
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("➕ Crear ejercicio", callback_data=f"create_exercise#{practic_class_id}")],] + keyboards.TEACHER_PRACTIC_CLASS_OPTIONS))
+                await reply_media(query.message, activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("➕ Crear ejercicio", callback_data=f"create_exercise#{practic_class_id}")],] + keyboards.TEACHER_PRACTIC_CLASS_OPTIONS))
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la clase práctica para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("➕ Crear ejercicio", callback_data=f"create_exercise#{practic_class_id}")],] + keyboards.TEACHER_PRACTIC_CLASS_OPTIONS))
         else:
@@ -366,13 +358,7 @@ async def practic_class_edit_file(update: Update, context: ContextTypes):
     return states.T_CP_EDIT_FILE
 async def practic_class_edit_file_done(update: Update, context: ContextTypes):
     practic_class_id = context.user_data["practic_class"]["practic_class_id"]
-    file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+    fid = remember_file(update.message)
     practic_class_sql.update_file(practic_class_id, fid)
     logger.info(f"Updated practic class file to {fid}")
     await update.message.reply_text(
@@ -408,7 +394,7 @@ async def practic_class_delete_confirm(update: Update, context: ContextTypes):
 
     practic_class_id = context.user_data["practic_class"]["practic_class_id"]
     token_type_id = activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(practic_class_id).activity_type_id).token_type_id
-    token_type_sql.delete_token_type(token_type_id)
+    await run_sql(token_type_sql.delete_token_type, token_type_id)
     logger.info(f"Deleted token_type {token_type_id}")
     await query.message.reply_text(
         "Clase práctica eliminada",
@@ -424,7 +410,7 @@ async def practic_class_participants(update: Update, context: ContextTypes):
     practic_class = practic_class_sql.get_practic_class(practic_class_id)
     activity_type = activity_type_sql.get_activity_type(practic_class.activity_type_id)
     token_type = token_type_sql.get_token_type(activity_type.token_type_id)
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
 
     # get all students that have a token of this activity_type
     students = student_sql.get_students_by_classroom(classroom_id)
@@ -432,7 +418,9 @@ async def practic_class_participants(update: Update, context: ContextTypes):
 
     if students:
         # show students with text pagination
-        lines = [f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)]
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        lines = [f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)]
         # create paginator using this lines
         paginator = Paginator(lines=lines, items_per_page=10, text_before=f"Participantes de la clase práctica {token_type.type}:", add_back=True)
         # add paginator to context
@@ -531,15 +519,9 @@ async def practic_class_exercise_file(update: Update, context: ContextTypes):
     query = update.callback_query
     if query:
         await query.answer()
-        file = None
+        fid = None
     else:
-        file = update.message.document or update.message.photo
-    fid = None
-    if file:
-        if update.message.document:
-            fid = file.file_id
-        else:
-            fid = file[-1].file_id
+        fid = remember_file(update.message)
     
     # save in context
     context.user_data["practic_class"]["exercise_file_id"] = fid
@@ -563,7 +545,7 @@ async def practic_class_exercise_partial_credits(update: Update, context: Contex
     partial_credits = query.data == "yes"
 
     # get classroom id
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
     practic_class_id = context.user_data["practic_class"]["practic_class_id"]
 
     # create exercise
@@ -591,8 +573,10 @@ async def practic_class_exercise_partial_credits(update: Update, context: Contex
 
     exercises = practic_class_exercises_sql.get_practic_class_exercises_by_practic_class_id(practic_class_id)
     # sort exercises by name
-    exercises.sort(key=lambda x: token_sql.get_token(activity_sql.get_activity(x.activity_id).token_id).name)
-    buttons = [InlineKeyboardButton(f"{i}. {token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id).name} - ({exercise.value})", callback_data=f"exercise#{exercise.id}") for i, exercise in enumerate(exercises, start=1)]
+    # load the token of every exercise at once
+    tokens = practic_class_exercises_sql.get_tokens_of_exercises(exercises)
+    exercises.sort(key=lambda x: tokens[x.id].name)
+    buttons = [InlineKeyboardButton(f"{i}. {tokens[exercise.id].name} - ({exercise.value})", callback_data=f"exercise#{exercise.id}") for i, exercise in enumerate(exercises, start=1)]
     other_buttons = [
         InlineKeyboardButton("➕Crear ejercicio", callback_data=f"create_exercise#{practic_class_id}"),
         InlineKeyboardButton("Cambiar fecha", callback_data="practic_class_change_date"),
@@ -603,10 +587,7 @@ async def practic_class_exercise_partial_credits(update: Update, context: Contex
     if query:
         if activity_type.FileID:
             try:
-                try:
-                    await query.message.reply_photo(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
-                except BadRequest:
-                    await query.message.reply_document(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
+                await reply_media(query.message, activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
             except BadRequest:
                 await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar la clase práctica para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
         else:
@@ -614,10 +595,7 @@ async def practic_class_exercise_partial_credits(update: Update, context: Contex
     else:
         if activity_type.FileID:
             try:
-                try:
-                    await update.message.reply_photo(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
-                except BadRequest:
-                    await update.message.reply_document(activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
+                await reply_media(update.message, activity_type.FileID, caption=text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
             except BadRequest:
                 await update.message.reply_text("Se ha producido un error al enviar el archivo. Puede intentar editar la clase práctica para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=paginated_keyboard(buttons, context=context, add_back=True, other_buttons=other_buttons))
         else:
@@ -650,10 +628,7 @@ async def exercise_selected(update: Update, context: ContextTypes):
     
     if activity.FileID:
         try:
-            try:
-                await query.message.reply_photo(activity.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PRACTIC_CLASS_EXERCISE_OPTIONS))
-            except BadRequest:
-                await query.message.reply_document(activity.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PRACTIC_CLASS_EXERCISE_OPTIONS))
+            await reply_media(query.message, activity.FileID, caption=text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PRACTIC_CLASS_EXERCISE_OPTIONS))
         except BadRequest:
             await query.edit_message_text("Se ha producido un error al enviar el archivo. Puede intentar editar el ejercicio para enviar otro archivo.\n\n" + text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PRACTIC_CLASS_EXERCISE_OPTIONS))
     else:
@@ -689,7 +664,7 @@ async def practic_class_exercise_delete_confirm(update: Update, context: Context
 
     exercise_id = context.user_data["practic_class"]["exercise_id"]
     token_id = activity_sql.get_activity(practic_class_exercises_sql.get_practic_class_exercise(exercise_id).activity_id).token_id
-    token_sql.delete_token(token_id)
+    await run_sql(token_sql.delete_token, token_id)
     logger.info(f"Deleted token {token_id}")
     await query.message.reply_text(
         "Ejercicio eliminado",
@@ -704,7 +679,7 @@ async def practic_class_exercise_participants(update: Update, context: ContextTy
     exercise = practic_class_exercises_sql.get_practic_class_exercise(context.user_data["practic_class"]["exercise_id"])
     activity = activity_sql.get_activity(exercise.activity_id)
     token = token_sql.get_token(activity.token_id)
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id).active_classroom_id
+    classroom_id = user_sql.get_identity(update.effective_user.id, "teacher").active_classroom_id
     activity_type = activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id)
     token_type = token_type_sql.get_token_type(activity_type.token_type_id)
 
@@ -714,7 +689,9 @@ async def practic_class_exercise_participants(update: Update, context: ContextTy
 
     if students:
         # show students with text pagination
-        lines = [f"{i}. {user_sql.get_user(student.id).fullname}" for i, student in enumerate(students, start=1)]
+        # load the names of every student at once
+        users = user_sql.get_users_by_ids(student.id for student in students)
+        lines = [f"{i}. {users[student.id].fullname}" for i, student in enumerate(students, start=1)]
         # create paginator using this lines
         paginator = Paginator(lines=lines, items_per_page=10, text_before=f"Participantes del ejercicio {token.name} de la clase práctica {token_type.type}:", add_back=True)
         # add paginator to context
@@ -766,7 +743,9 @@ async def practic_class_exercise_review(update: Update, context: ContextTypes):
                 reply_markup=InlineKeyboardMarkup(keyboards.TEACHER_PRACTIC_CLASS_EXERCISE_OPTIONS)
             )
         return states.T_CP_EXERCISE_INFO
-    buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(student.id).fullname}", callback_data=f"student#{student.id}") for i, student in enumerate(students, start=1)]
+    # load the names of every student at once
+    users = user_sql.get_users_by_ids(student.id for student in students)
+    buttons = [InlineKeyboardButton(f"{i}. {users[student.id].fullname}", callback_data=f"student#{student.id}") for i, student in enumerate(students, start=1)]
     text = "Seleccione al estudiante"
 
     if query.message.caption:
@@ -836,33 +815,21 @@ async def review_exercise_select_student(update: Update, context: ContextTypes):
             # No partial credits and date is in the future, assing max value x2 (bonus for sending it early)
             student = student_sql.get_student(student_id)
             token = token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id)
-            teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-            student_token_sql.add_student_token(student.id, token.id, exercise.value * 2, teacher_id=teacher.id)
-            logger.info(f"Added {exercise.value * 2} credits to student {student.id} for exercise {token.name}")
-            # Create approved pending
-            token_type = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id).token_type_id)
-            text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user_by_chatid(update.effective_user.id).fullname} al estudiantes {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}"
-            pending_sql.add_pending(student_id=student.id, classroom_id=teacher.active_classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher.id, text=text)
-            # notify student
-            text = f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} le ha otorgado {exercise.value * 2} créditos por el ejercicio {token.name} de la clase práctica {token_type.type}"
-            try:
-                await context.bot.send_message(
-                    chat_id=user_sql.get_user(student.id).telegram_chatid,
-                    text=text,
-                )
-            except BadRequest:
-                logger.error(f"Error sending message to student {user_sql.get_user(student.id).fullname} (chat_id: {user_sql.get_user(student.id).telegram_chatid})")
+            teacher = user_sql.get_identity(update.effective_user.id, "teacher")
+            with unit_of_work():
+                student_token_sql.add_student_token(student.id, token.id, exercise.value * 2, teacher_id=teacher.user_id)
+                logger.info(f"Added {exercise.value * 2} credits to student {student.id} for exercise {token.name}")
+                # Create approved pending
+                token_type = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id).token_type_id)
+                text = f"Créditos otorgados manualmente por el profesor {user_sql.get_identity(update.effective_user.id).fullname} al estudiantes {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}"
+                pending_sql.add_pending(student_id=student.id, classroom_id=teacher.active_classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher.user_id, text=text)
+                # notify student
+                text = f"{user_sql.get_identity(update.effective_user.id).fullname} le ha otorgado {exercise.value * 2} créditos por el ejercicio {token.name} de la clase práctica {token_type.type}"
+                outbox_sql.enqueue(user_sql.get_user(student.id).telegram_chatid, text, dedupe_key=f"student_token:{student.id}:{token.id}")
+            wake_outbox(context)
             
             # Send to notif channel if exists
-            chan = classroom_sql.get_teacher_notification_channel_chat_id(teacher.active_classroom_id)
-            if chan:
-                try:
-                    await context.bot.send_message(
-                        chat_id=chan,
-                        text=f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} le ha otorgado {exercise.value * 2} créditos a {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}",
-                    )
-                except BadRequest:
-                    logger.exception(f"Failed to send message to notification channel {chan}.")
+            notify_channel(context, teacher.active_classroom_id, f"{user_sql.get_identity(update.effective_user.id).fullname} le ha otorgado {exercise.value * 2} créditos a {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}")
 
             await query.message.reply_text(
                 "Créditos otorgados!",
@@ -907,33 +874,21 @@ async def review_partial_credits(update: Update, context: ContextTypes):
         # Partial credits and date is in the future, assing partial value x2 (bonus for sending it early)
         student = student_sql.get_student(context.user_data["practic_class"]["student_id"])
         token = token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id)
-        teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-        student_token_sql.add_student_token(student.id, token.id, int(partial_value) * 2, teacher_id=teacher.id)
-        logger.info(f"Added {int(partial_value) * 2} credits to student {student.id} for exercise {token.name}")
-        # Create approved pending
-        token_type = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id).token_type_id)
-        text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user_by_chatid(update.effective_user.id).fullname} al estudiantes {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}"
-        pending_sql.add_pending(student_id=student.id, classroom_id=teacher.active_classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher.id, text=text)
-        # notify student
-        text = f"El profesor {user_sql.get_user_by_chatid(update.effective_user.id).fullname} le ha otorgado {int(partial_value) * 2} créditos por el ejercicio {token.name} de la clase práctica {token_type.type}"
-        try:
-            await context.bot.send_message(
-                chat_id=user_sql.get_user(student.id).telegram_chatid,
-                text=text,
-            )
-        except BadRequest:
-            logger.error(f"Error sending message to student {user_sql.get_user(student.id).fullname} (chat_id: {user_sql.get_user(student.id).telegram_chatid})")
+        teacher = user_sql.get_identity(update.effective_user.id, "teacher")
+        with unit_of_work():
+            student_token_sql.add_student_token(student.id, token.id, int(partial_value) * 2, teacher_id=teacher.user_id)
+            logger.info(f"Added {int(partial_value) * 2} credits to student {student.id} for exercise {token.name}")
+            # Create approved pending
+            token_type = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id).token_type_id)
+            text = f"Créditos otorgados manualmente por el profesor {user_sql.get_identity(update.effective_user.id).fullname} al estudiantes {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}"
+            pending_sql.add_pending(student_id=student.id, classroom_id=teacher.active_classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher.user_id, text=text)
+            # notify student
+            text = f"El profesor {user_sql.get_identity(update.effective_user.id).fullname} le ha otorgado {int(partial_value) * 2} créditos por el ejercicio {token.name} de la clase práctica {token_type.type}"
+            outbox_sql.enqueue(user_sql.get_user(student.id).telegram_chatid, text, dedupe_key=f"student_token:{student.id}:{token.id}")
+        wake_outbox(context)
         
         # Send to notif channel if exists
-        chan = classroom_sql.get_teacher_notification_channel_chat_id(teacher.active_classroom_id)
-        if chan:
-            try:
-                await context.bot.send_message(
-                    chat_id=chan,
-                    text=f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} le ha otorgado {int(partial_value) * 2} créditos a {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}",
-                )
-            except BadRequest:
-                logger.exception(f"Failed to send message to notification channel {chan}.")
+        notify_channel(context, teacher.active_classroom_id, f"{user_sql.get_identity(update.effective_user.id).fullname} le ha otorgado {int(partial_value) * 2} créditos a {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}")
         
         await update.message.reply_text(
             "Créditos otorgados!",
@@ -962,34 +917,21 @@ async def review_exercise_date(update: Update, context: ContextTypes):
     # assing credits
     student = student_sql.get_student(context.user_data["practic_class"]["student_id"])
     token = token_sql.get_token(activity_sql.get_activity(exercise.activity_id).token_id)
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
-    student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher.id)
-    logger.info(f"Added {value} credits to student {student.id} for exercise {token.name}")
-    # Create approved pending
-    token_type = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id).token_type_id)
-    text = f"Créditos otorgados manualmente por el profesor {user_sql.get_user_by_chatid(update.effective_user.id).fullname} al estudiante {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}"
-    pending_sql.add_pending(student_id=student.id, classroom_id=teacher.active_classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher.id, text=text)
-    # notify student
-    text = f"<b>{user_sql.get_user_by_chatid(update.effective_user.id).fullname}</b> le ha otorgado <b>{value}</b> créditos por el ejercicio <b>{token.name}</b> de la clase práctica <b>{token_type.type}</b>"
-    try:
-        await context.bot.send_message(
-            chat_id=user_sql.get_user(student.id).telegram_chatid,
-            text=text,
-            parse_mode="HTML",
-        )
-    except BadRequest:
-        logger.error(f"Error sending message to student {user_sql.get_user(student.id).fullname} (chat_id: {user_sql.get_user(student.id).telegram_chatid})")
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
+    with unit_of_work():
+        student_token_sql.add_student_token(student.id, token.id, value, teacher_id=teacher.user_id)
+        logger.info(f"Added {value} credits to student {student.id} for exercise {token.name}")
+        # Create approved pending
+        token_type = token_type_sql.get_token_type(activity_type_sql.get_activity_type(practic_class_sql.get_practic_class(exercise.practic_class_id).activity_type_id).token_type_id)
+        text = f"Créditos otorgados manualmente por el profesor {user_sql.get_identity(update.effective_user.id).fullname} al estudiante {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}"
+        pending_sql.add_pending(student_id=student.id, classroom_id=teacher.active_classroom_id, token_type_id=token_type.id, token_id=token.id, status="APPROVED", approved_by=teacher.user_id, text=text)
+        # notify student
+        text = f"<b>{user_sql.get_identity(update.effective_user.id).fullname}</b> le ha otorgado <b>{value}</b> créditos por el ejercicio <b>{token.name}</b> de la clase práctica <b>{token_type.type}</b>"
+        outbox_sql.enqueue(user_sql.get_user(student.id).telegram_chatid, text, parse_mode="HTML", dedupe_key=f"student_token:{student.id}:{token.id}")
+    wake_outbox(context)
     
     # Send to notif channel if exists
-    chan = classroom_sql.get_teacher_notification_channel_chat_id(teacher.active_classroom_id)
-    if chan:
-        try:
-            await context.bot.send_message(
-                chat_id=chan,
-                text=f"{user_sql.get_user_by_chatid(update.effective_user.id).fullname} le ha otorgado {value} créditos a {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}",
-            )
-        except BadRequest:
-            logger.exception(f"Failed to send message to notification channel {chan}.")
+    notify_channel(context, teacher.active_classroom_id, f"{user_sql.get_identity(update.effective_user.id).fullname} le ha otorgado {value} créditos a {user_sql.get_user(student.id).fullname} por el ejercicio {token.name} de la clase práctica {token_type.type}")
 
     await query.message.reply_text(
         "Créditos otorgados!",
@@ -1002,7 +944,7 @@ async def teacher_practic_classes_back(update: Update, context: ContextTypes):
     query = update.callback_query
     await query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.effective_user.id).id)
+    teacher = user_sql.get_identity(update.effective_user.id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     # get course name
@@ -1010,7 +952,7 @@ async def teacher_practic_classes_back(update: Update, context: ContextTypes):
 
     await query.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user_by_chatid(update.effective_user.id).fullname,
+            fullname=user_sql.get_identity(update.effective_user.id).fullname,
             role="teacher",
             classroom_name=classroom.name,
         ),
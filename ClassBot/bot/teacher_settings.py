@@ -11,7 +11,7 @@ from utils.logger import logger
 from bot.utils import states, keyboards, bot_text
 from bot.utils.inline_keyboard_pagination import paginated_keyboard, paginator_handler
 from bot.utils.clean_context import clean_teacher_context
-from sql import user_sql, teacher_sql, classroom_sql, course_sql, student_sql, student_classroom_sql, teacher_classroom_sql, student_guild_sql
+from sql import run_sql, user_sql, teacher_sql, classroom_sql, course_sql, student_sql, student_classroom_sql, teacher_classroom_sql, student_guild_sql
 
 
 async def teacher_settings(update: Update, context: ContextTypes):
@@ -30,13 +30,13 @@ async def back_to_teacher_menu(update: Update, context: ContextTypes):
         query = update.callback_query
         query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.message.chat_id).id)
+    teacher = user_sql.get_identity(update.message.chat_id, "teacher")
     # get active classroom from db
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
 
     await update.message.reply_text(
         bot_text.main_menu(
-            fullname=user_sql.get_user(teacher.id).fullname,
+            fullname=teacher.fullname,
             role="teacher",
             classroom_name=classroom.name,
         ),
@@ -65,13 +65,13 @@ async def edit_course(update: Update, context: ContextTypes):
     context.user_data["edit_course"] = {}
 
     # get active course from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.message.chat_id).id)
+    teacher = user_sql.get_identity(update.message.chat_id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     course = course_sql.get_course(classroom.course_id)
     
     # if onwer
-    if teacher.id == course.teacher_id:
-        logger.info(f"Teacher {teacher.id} owns course {course.id}")
+    if teacher.user_id == course.teacher_id:
+        logger.info(f"Teacher {teacher.user_id} owns course {course.id}")
         # save id of the course to edit
         context.user_data["edit_course"]["course_id"] = course.id
         # Show edit options
@@ -82,9 +82,9 @@ async def edit_course(update: Update, context: ContextTypes):
         )
         return states.EDIT_COURSE_CHOOSE_OPTION
     else:
-        logger.info(f"Teacher {teacher.id} does not own course {course.id}")
+        logger.info(f"Teacher {teacher.user_id} does not own course {course.id}")
         # get courses owned by teacher
-        courses = course_sql.get_courses_by_teacher(teacher.id)
+        courses = course_sql.get_courses_by_teacher(teacher.user_id)
         # show courses to edit if teacher owns any
         if courses:
             buttons = [InlineKeyboardButton(f"{i}. {course.name}", callback_data=f"COURSE#{course.id}") for i, course in enumerate(courses, start=1)]
@@ -131,7 +131,7 @@ async def choose_option(update: Update, context: ContextTypes):
     query.answer()
     option = query.data
 
-    teacher_id = user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id
+    teacher_id = user_sql.get_identity(update.callback_query.message.chat_id).user_id
 
     if option == "option_other_courses":
         # get courses owned by teacher
@@ -235,7 +235,7 @@ async def delete_course_confirm(update: Update, context: ContextTypes):
 
     # Check if the course to delete is the active one (if the active classroom
     # belongs to this course) to then log out the user after deletion.
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     active_course = classroom.course_id == context.user_data["edit_course"]["course_id"]
 
@@ -244,7 +244,9 @@ async def delete_course_confirm(update: Update, context: ContextTypes):
         course_id = context.user_data["edit_course"]["course_id"]
 
         # delete course
-        course_sql.delete_course(course_id)
+        await run_sql(course_sql.delete_course, course_id)
+        # active classrooms of teachers and students may have gone with it
+        user_sql.identity_cache.clear()
         # check if the classrooms of the course got deleted in cascade
         if classroom_sql.get_classrooms_by_course(course_id):
             logger.warning(f"Classrooms of course {course_id} were not deleted\n\n\n\n")
@@ -286,7 +288,7 @@ async def transfer_course(update: Update, context: ContextTypes):
 
     # check if the course to transfer is the active one (if the active classroom
     # belongs to this course) to then log out the user after transfer.
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     active_course = classroom.course_id == course_id
 
@@ -344,12 +346,12 @@ async def edit_classroom(update: Update, context: ContextTypes):
     context.user_data["edit_classroom"] = {}
 
     # get active classroom from db
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.message.chat_id).id)
+    teacher = user_sql.get_identity(update.message.chat_id, "teacher")
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
 
     # check if teacher is owner of the course to choose which keyboard to show
     course = course_sql.get_course(classroom.course_id)
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
 
     await update.message.reply_text(
         f"Aula: {classroom.name}\n"
@@ -364,9 +366,9 @@ async def edit_classroom_choose_option(update: Update, context: ContextTypes):
     query.answer()
     option = query.data
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
     course = course_sql.get_course(classroom_sql.get_classroom(teacher.active_classroom_id).course_id)
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
     
     if option == "option_edit_classroom_name":
         # asks to input new name
@@ -402,7 +404,7 @@ async def edit_classroom_choose_option(update: Update, context: ContextTypes):
         
     elif option == "option_change_classroom":
         # get classroom ids the teacher is in
-        classrooms = teacher_classroom_sql.get_classroom_ids(teacher.id)
+        classrooms = teacher_classroom_sql.get_classroom_ids(teacher.user_id)
         # remove active classroom
         classrooms.remove(teacher.active_classroom_id)
         if classrooms:
@@ -426,7 +428,9 @@ async def edit_classroom_choose_option(update: Update, context: ContextTypes):
         # show students in the classroom to remove
         student_ids = student_classroom_sql.get_student_ids(teacher.active_classroom_id)
         if student_ids:
-            buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(student_id).fullname}", callback_data=f"remove_student#{student_id}") for i, student_id in enumerate(student_ids, start=1)]
+            # load the names of every user at once
+            users = user_sql.get_users_by_ids(student_ids)
+            buttons = [InlineKeyboardButton(f"{i}. {users[student_id].fullname}", callback_data=f"remove_student#{student_id}") for i, student_id in enumerate(student_ids, start=1)]
             await query.edit_message_text(
                 "Elige un estudiante:",
                 reply_markup=paginated_keyboard(buttons, context=context, add_back=True),
@@ -443,13 +447,15 @@ async def edit_classroom_choose_option(update: Update, context: ContextTypes):
 
     elif option == "option_remove_teachers":
         # check if teacher is owner of the course
-        if teacher.id == course.teacher_id:
+        if teacher.user_id == course.teacher_id:
             # show teachers in the classroom to remove
             teacher_ids = teacher_classroom_sql.get_teacher_ids(teacher.active_classroom_id)
             # remove user from the list
-            teacher_ids.remove(teacher.id)
+            teacher_ids.remove(teacher.user_id)
             if teacher_ids:
-                buttons = [InlineKeyboardButton(f"{i}. {user_sql.get_user(teacher_id).fullname}", callback_data=f"remove_teacher#{teacher_id}") for i, teacher_id in enumerate(teacher_ids, start=1)]
+                # load the names of every user at once
+                users = user_sql.get_users_by_ids(teacher_ids)
+                buttons = [InlineKeyboardButton(f"{i}. {users[teacher_id].fullname}", callback_data=f"remove_teacher#{teacher_id}") for i, teacher_id in enumerate(teacher_ids, start=1)]
                 await query.edit_message_text(
                     "Elige un profesor:",
                     reply_markup=paginated_keyboard(buttons, context=context, add_back=True),
@@ -473,7 +479,7 @@ async def edit_classroom_choose_option(update: Update, context: ContextTypes):
         
     elif option == "option_delete_classroom":
         # check if teacher is owner of the course
-        if teacher.id == course.teacher_id:
+        if teacher.user_id == course.teacher_id:
             await query.edit_message_text(
             "¿Estás seguro que deseas eliminar el aula?\n"
             "Esta acción no se puede deshacer, perderá toda la información"
@@ -514,7 +520,7 @@ async def edit_classroom_name(update: Update, context: ContextTypes):
     # get name
     name = update.message.text
     # get classroom id
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.message.chat_id).id)
+    teacher = user_sql.get_identity(update.message.chat_id, "teacher")
     classroom_id = teacher.active_classroom_id
     # update classroom name
     classroom_sql.update_classroom_name(classroom_id, name)
@@ -522,7 +528,7 @@ async def edit_classroom_name(update: Update, context: ContextTypes):
     classroom = classroom_sql.get_classroom(classroom_id)
 
     course = course_sql.get_course(classroom.course_id)
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
     # notif
     await update.message.reply_text(
         f"Nombre cambiado a {classroom.name}\n\n"
@@ -535,7 +541,7 @@ async def edit_classroom_password(update: Update, context: ContextTypes):
     # get password
     password = update.message.text
     # get classroom id
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.message.chat_id).id)
+    teacher = user_sql.get_identity(update.message.chat_id, "teacher")
     classroom_id = teacher.active_classroom_id
     # get password type
     password_type = context.user_data["edit_classroom"]["password_type"]
@@ -545,7 +551,7 @@ async def edit_classroom_password(update: Update, context: ContextTypes):
     classroom = classroom_sql.get_classroom(classroom_id)
 
     course = course_sql.get_course(classroom.course_id)
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
     # notif
     await update.message.reply_text(
         f"Contraseña cambiada\n\n"
@@ -561,12 +567,12 @@ async def edit_classroom_change(update: Update, context: ContextTypes):
 
     classroom_id = int(query.data.split("#")[1])
     # change active classroom
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
-    teacher_sql.set_teacher_active_classroom(teacher.id, classroom_id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
+    teacher_sql.set_teacher_active_classroom(teacher.user_id, classroom_id)
 
     classroom = classroom_sql.get_classroom(classroom_id)
     course = course_sql.get_course(classroom.course_id)
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
 
     await query.edit_message_text(
         f"Aula: {classroom.name}\n"
@@ -581,7 +587,7 @@ async def edit_classroom_remove_student(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
 
     student_id = int(query.data.split("#")[1])
     # check if student's active classroom is the current one and if so set it to None
@@ -596,7 +602,7 @@ async def edit_classroom_remove_student(update: Update, context: ContextTypes):
     
     classroom = classroom_sql.get_classroom(teacher.active_classroom_id)
     course = course_sql.get_course(classroom.course_id)
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
   
     await query.edit_message_text(
         f"Estudiante removido\n\n"
@@ -611,7 +617,7 @@ async def edit_classroom_remove_teacher(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
     teacher_to_id = int(query.data.split("#")[1])   
     # check if teacher's active classroom is the current one and if so set it to None
     teacher_to = teacher_sql.get_teacher(teacher_to_id)
@@ -633,22 +639,13 @@ async def edit_classroom_delete(update: Update, context: ContextTypes):
     query = update.callback_query
     query.answer()
 
-    # first set to none the active classroom of the teachers (including this one)
-    # and students in this classroom.
-    classroom_id = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id).active_classroom_id
-    # get teachers in classroom
-    teachers = teacher_sql.get_teachers_by_classroom(classroom_id)
-    # get students in classroom
-    students = student_sql.get_students_by_classroom(classroom_id)
-    # set active classroom to None
-    for teacher in teachers:
-        teacher_sql.set_teacher_active_classroom(teacher.id, None)
-    for student in students:
-        student_sql.set_student_active_classroom(student.id, None)
+    classroom_id = user_sql.get_identity(update.callback_query.message.chat_id, "teacher").active_classroom_id
     
     if query.data == "delete_classroom_confirm":
-        # delete classroom
-        classroom_sql.delete_classroom(classroom_id)
+        # delete classroom, cascades to everything in it so keep it off the event loop.
+        # The teachers (including this one) and students that had it active are
+        # left without an active classroom in the same transaction.
+        await run_sql(classroom_sql.delete_classroom, classroom_id)
 
         context.user_data.clear()
         await query.message.reply_text(
@@ -671,16 +668,16 @@ async def edit_classroom_channels(update: Update, context: ContextTypes):
     query.answer()
 
     # get classroom id
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+    teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
     classroom_id = teacher.active_classroom_id
 
     option = query.data
     if option.split(":")[1] == "notifications":
         # get classroom id
-        teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.callback_query.message.chat_id).id)
+        teacher = user_sql.get_identity(update.callback_query.message.chat_id, "teacher")
         classroom_id = teacher.active_classroom_id
         # get notification channel
-        channel = classroom_sql.get_teacher_notification_channel_chat_id(classroom_id)
+        channel, digest = classroom_sql.get_notification_settings(classroom_id)
         if channel:
             # show channel details (channel name and link/@username if exists)
             chat = await context.bot.getChat(channel)
@@ -689,8 +686,13 @@ async def edit_classroom_channels(update: Update, context: ContextTypes):
                     f"Canal de notificaciones:\n"
                     f"Nombre: {chat.title}\n"
                     f"Link: {chat.invite_link}\n"
-                    f"Username: @{chat.username}\n\n",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Cambiar", callback_data="option_classroom_channels:add_notifications")], [InlineKeyboardButton("🔙", callback_data="option_edit_classroom_back")]]),
+                    f"Username: @{chat.username}\n"
+                    f"Resumen periódico: {'activado' if digest else 'desactivado'}\n\n",
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("🔄 Cambiar", callback_data="option_classroom_channels:add_notifications")],
+                        [InlineKeyboardButton("🗞 Desactivar resumen" if digest else "🗞 Activar resumen", callback_data="option_classroom_channels:digest")],
+                        [InlineKeyboardButton("🔙", callback_data="option_edit_classroom_back")],
+                    ]),
                 )
             else:
                 # ask to set channel
@@ -707,6 +709,16 @@ async def edit_classroom_channels(update: Update, context: ContextTypes):
             )
             return states.EDIT_CLASSROOM_CHANNELS
     
+    elif option.split(":")[1] == "digest":
+        # send the notifications one by one or as periodic digests
+        channel, digest = classroom_sql.get_notification_settings(classroom_id)
+        classroom_sql.update_classroom_notification_digest(classroom_id, not digest)
+        await query.edit_message_text(
+            "Las notificaciones se enviarán en un resumen periódico." if not digest else "Las notificaciones se enviarán una a una.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙", callback_data="option_classroom_channels:notifications")]]),
+        )
+        return states.EDIT_CLASSROOM_CHANNELS
+
     elif option.split(":")[1] == "add_notifications":
         # ask to add channel
         context.user_data['edit_classroom']['channel_type'] = "notifications"
@@ -741,13 +753,13 @@ async def edit_classroom_channels_add(update: Update, context: ContextTypes):
         )
         return states.EDIT_CLASSROOM_CHANNELS_ADD
     # get classroom id
-    teacher = teacher_sql.get_teacher(user_sql.get_user_by_chatid(update.message.chat_id).id)
+    teacher = user_sql.get_identity(update.message.chat_id, "teacher")
     classroom_id = teacher.active_classroom_id
     course = course_sql.get_course(classroom_sql.get_classroom(classroom_id).course_id)
     # add channel to classroom
     classroom_sql.update_classroom_teacher_notifications_channel(classroom_id, channel_id)
     # notif
-    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
+    keyboard = keyboards.TEACHER_EDIT_CLASSROOM_OWNER if teacher.user_id == course.teacher_id else keyboards.TEACHER_EDIT_CLASSROOM
     await message.reply_text(
         "Canal de notificaciones agregado",
         reply_markup=InlineKeyboardMarkup(keyboard),
@@ -23,7 +23,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
 
     # Check if user with this chatid exists
-    user = user_sql.get_user_by_chatid(update.effective_chat.id)
+    user = user_sql.get_identity(update.effective_chat.id)
     
     if user:    # user exists, ask to login as student or teacher
         logger.info("User exists, asking for login...")
@@ -58,7 +58,7 @@ async def new_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def select_role(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # if is a new user, first add it to the db
-    if not user_sql.get_user_by_chatid(update.effective_chat.id):
+    if not user_sql.get_identity(update.effective_chat.id):
         user_sql.add_user(update.effective_chat.id, context.user_data["fullname"])
         logger.info("New user %s created.\n\n", context.user_data["fullname"])
     # Show the representation of the user in the db
@@ -79,7 +79,7 @@ async def role_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("User %s selected role %s", update.message.from_user.first_name, update.message.text)
     if update.message.text == "🧑‍🎓 Estudiante":
         # User is a student, check if it has an student account
-        user_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        user_id = user_sql.get_identity(update.effective_chat.id).user_id
         if not student_sql.get_student(user_id):
             # create student row in db
             student_sql.add_student(user_id)
@@ -94,7 +94,7 @@ async def role_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     elif update.message.text == "🧑‍🏫 Profesor":
         # User is a teacher, check if it has a teacher account
-        user_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        user_id = user_sql.get_identity(update.effective_chat.id).user_id
         if not teacher_sql.get_teacher(user_id):
             # create teacher row in db
             teacher_sql.add_teacher(user_id)
@@ -126,7 +126,7 @@ async def student_login(update: Update, context: ContextTypes.DEFAULT_TYPE):
     classroom = classroom_sql.get_classroom_by_student_auth(student_auth)
     if classroom:
         # get student_id
-        student_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        student_id = user_sql.get_identity(update.effective_chat.id).user_id
         # create student_classroom in db if not exists
         if not student_classroom_sql.exists(student_id, classroom.id):
             student_classroom_sql.add_student_classroom(student_id, classroom.id)
@@ -148,7 +148,7 @@ async def student_login(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # show student main menu and classroom info
         await update.message.reply_text(
             bot_text.main_menu(
-                user_sql.get_user_by_chatid(update.effective_chat.id).fullname,
+                user_sql.get_identity(update.effective_chat.id).fullname,
                 role="student",
                 course_name=course_sql.get_course(classroom.course_id).name,
                 classroom_name=classroom.name,
@@ -204,7 +204,7 @@ async def teacher_enter(update: Update, context: ContextTypes.DEFAULT_TYPE):
     classroom = classroom_sql.get_classroom_by_teacher_auth(teacher_auth)
     if classroom:
         # get teacher_id
-        teacher_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        teacher_id = user_sql.get_identity(update.effective_chat.id).user_id
         # create teacher_classroom in db if not exists
         if not teacher_classroom_sql.exists(teacher_id, classroom.id):
             teacher_classroom_sql.add_teacher_classroom(teacher_id, classroom.id)
@@ -221,7 +221,7 @@ async def teacher_enter(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # show teacher main menu and classroom info
         await update.message.reply_text(
             bot_text.main_menu(
-                user_sql.get_user_by_chatid(update.effective_chat.id).fullname,
+                user_sql.get_identity(update.effective_chat.id).fullname,
                 role="teacher",
                 course_name=course_sql.get_course(classroom.course_id).name,
                 classroom_name=classroom.name,
@@ -256,7 +256,7 @@ async def teacher_creation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif update.message.text == "Crear aula":
         logger.info("Teacher %s selected to create a classroom.", update.message.from_user.first_name)
         # get teacher_id
-        teacher_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        teacher_id = user_sql.get_identity(update.effective_chat.id).user_id
         # get courses for this teacher
         courses = course_sql.get_courses_by_teacher(teacher_id)
         if courses:
@@ -288,7 +288,7 @@ async def new_course(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ Receives the course name and creates a new course assigning the teacher_id
     of the creator. Returns to TEACHER_CREATE state (for creating a classroom). """
     course_name = update.message.text
-    teacher_id = user_sql.get_user_by_chatid(update.effective_chat.id).id # teacher_id is the same as its parent user_id
+    teacher_id = user_sql.get_identity(update.effective_chat.id).user_id # teacher_id is the same as its parent user_id
     # create course in db
     course_sql.add_course(teacher_id, course_name)
     logger.info("New course added to db.\n\n")
@@ -322,7 +322,7 @@ async def select_course(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # check if course belongs to teacher (should always be true but if a user
         # knows the id of a course that does not belong to him, he could create
         # a classroom in it)
-        teacher_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        teacher_id = user_sql.get_identity(update.effective_chat.id).user_id
         if course.teacher_id != teacher_id:
             # course does not belong to teacher
             await query.message.reply_text(
@@ -358,7 +358,7 @@ async def new_classroom(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # get classroom name, teacher auth and student auth from input
         classroom_name, teacher_auth, student_auth = update.message.text.split()
         # get teacher_id
-        teacher_id = user_sql.get_user_by_chatid(update.effective_chat.id).id
+        teacher_id = user_sql.get_identity(update.effective_chat.id).user_id
         # get course_id from context
         course_id = context.user_data["course_id"]
 
@@ -373,10 +373,8 @@ async def new_classroom(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return states.NEW_CLASSROOM
 
         # create classroom in db
-        classroom_sql.add_classroom(course_id, classroom_name, teacher_auth, student_auth)
+        classroom_id = classroom_sql.add_classroom(course_id, classroom_name, teacher_auth, student_auth)
         logger.info("New classroom added to db.\n\n")
-        # get classroom_id
-        classroom_id = classroom_sql.get_classroom_by_teacher_auth(teacher_auth).id
         # create teacher_classroom in db if not exists
         if not teacher_classroom_sql.exists(teacher_id, classroom_id):
             teacher_classroom_sql.add_teacher_classroom(teacher_id, classroom_id)
@@ -407,7 +405,7 @@ async def new_classroom(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # show teacher main menu and classroom info
         await update.message.reply_text(
             bot_text.main_menu(
-                user_sql.get_user_by_chatid(update.effective_chat.id).fullname,
+                user_sql.get_identity(update.effective_chat.id).fullname,
                 role="teacher",
                 course_name=course_sql.get_course(course_id).name,
                 classroom_name=classroom_name,
@@ -0,0 +1,138 @@
+""" Sends the same message to many chats at once, as fast as telegram allows.
+Sends run concurrently (at most CONCURRENCY at a time) and every one of them
+takes a token from a bucket shared by the whole bot, refilled at GLOBAL_RATE
+messages per second. The same chat never gets more than PER_CHAT_RATE messages
+per second. When telegram answers RetryAfter every send waits that long, then
+the message is retried. See the [broadcast] section of config.ini. """
+import asyncio
+import time
+from configparser import ConfigParser
+from typing import NamedTuple
+
+from telegram.error import TelegramError, BadRequest, RetryAfter, NetworkError
+
+from utils.logger import logger
+from bot.utils.media import send_media
+
+
+config = ConfigParser()
+config.read("config.ini")
+GLOBAL_RATE = config.getfloat("broadcast", "GLOBAL_RATE", fallback=25)
+PER_CHAT_RATE = config.getfloat("broadcast", "PER_CHAT_RATE", fallback=1)
+CONCURRENCY = config.getint("broadcast", "CONCURRENCY", fallback=8)
+MAX_RETRIES = config.getint("broadcast", "MAX_RETRIES", fallback=3)
+
+
+class TokenBucket:
+    """ Lets through `rate` operations per second on average, with bursts of up
+    to `capacity`. acquire() waits until an operation is allowed, pause() stops
+    every operation for a while. """
+    def __init__(self, rate: float, capacity: int = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastResult(NamedTuple):
+    """ What happened with the message to one chat. """
+    chat_id: int
+    ok: bool
+    error: str | None = None
+
+
+# shared by every broadcast, telegram's limits are per bot
+bucket = TokenBucket(GLOBAL_RATE)
+# chat id -> time of the last message sent to it by a broadcast. Shared too,
+# two broadcasts can reach the same chat. Only the chats that can't get
+# another message yet matter, see _forget_old_chats.
+_last_sent: dict[int, float] = {}
+
+
+async def _wait_for_chat(chat_id: int) -> None:
+    """ Waits until the chat can get another message. """
+    wait = _last_sent.get(chat_id, 0) + 1 / PER_CHAT_RATE - time.monotonic()
+    if wait > 0:
+        await asyncio.sleep(wait)
+    _last_sent[chat_id] = time.monotonic()
+
+def _forget_old_chats() -> None:
+    """ Drops the chats that can already get another message from _last_sent,
+    so it doesn't grow with every chat ever sent a broadcast. """
+    oldest = time.monotonic() - 1 / PER_CHAT_RATE
+    for chat_id in [chat_id for chat_id, sent in _last_sent.items() if sent <= oldest]:
+        del _last_sent[chat_id]
+
+async def _send(send, chat_id: int) -> BroadcastResult:
+    """ Sends with send(chat_id), honoring the limits and retrying when
+    telegram asks to wait or the network fails. """
+    for attempt in range(MAX_RETRIES + 1):
+        await _wait_for_chat(chat_id)
+        await bucket.acquire()
+        try:
+            await send(chat_id)
+            return BroadcastResult(chat_id, True)
+        except BadRequest as e:     # a NetworkError too, but retrying won't help
+            return BroadcastResult(chat_id, False, str(e))
+        except RetryAfter as e:
+            # flood limit: every send waits, not only this one
+            bucket.pause(e.retry_after)
+            error = str(e)
+        except NetworkError as e:   # also TimedOut
+            await asyncio.sleep(2 ** attempt)
+            error = str(e)
+        except TelegramError as e:  # Forbidden if the user blocked the bot
+            return BroadcastResult(chat_id, False, str(e))
+    logger.warning(f"Giving up sending a broadcast to chat {chat_id}: {error}")
+    return BroadcastResult(chat_id, False, error)
+
+async def broadcast(bot, chat_ids, text: str, file_id: str = None, parse_mode: str = "HTML") -> list[BroadcastResult]:
+    """ Sends text to every chat in chat_ids, as the caption of the file if
+    file_id is given. Returns one BroadcastResult per chat, in the same order.
+    A chat is only sent the message once. """
+    methods = [
+        lambda chat_id: bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode),
+    ]
+    if file_id:
+        methods.insert(0, lambda chat_id: send_media(bot, chat_id, file_id, caption=text, parse_mode=parse_mode))
+    preferred = 0
+
+    async def send(chat_id):
+        """ Sends the file, else only the text. Once a method works for a chat
+        the next chats start with it. """
+        nonlocal preferred
+        for i in range(preferred, len(methods)):
+            try:
+                await methods[i](chat_id)
+            except BadRequest:
+                if i == len(methods) - 1:
+                    raise
+                continue
+            preferred = max(preferred, i)
+            return
+
+    _forget_old_chats()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    async def send_limited(chat_id):
+        async with semaphore:
+            return await _send(send, chat_id)
+    return list(await asyncio.gather(*(send_limited(chat_id) for chat_id in dict.fromkeys(chat_ids))))
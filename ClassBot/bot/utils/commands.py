@@ -1,3 +1,5 @@
+from configparser import ConfigParser
+
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, MessageHandler, filters
 
@@ -13,3 +15,65 @@ async def get_chat_id(update: Update, context: ContextTypes):
     logger.info(f"Chat id:{update.effective_chat.id}")
 
 get_chat_id_handler = MessageHandler(filters.Regex("^/chat_id$"), get_chat_id)
+
+# maintenance commands, only answered in the developer chat
+config = ConfigParser()
+config.read("config.ini")
+DEV_CHAT = config.get("bot", "DEV_CHAT", fallback="")
+dev_chat_filter = filters.Chat(chat_id=int(DEV_CHAT) if DEV_CHAT else [])
+
+async def cache_stats(update: Update, context: ContextTypes):
+    """ Sends the hit/miss counters of the in-memory caches. """
+    from sql import user_sql, credit_balance_sql, telegram_file_sql
+    from bot.utils import media
+    text = "\n".join(f"{name}: {stats}" for name, stats in {
+        "identity": user_sql.identity_cache.stats(),
+        "credit summary": credit_balance_sql.summary_cache.stats(),
+        "file kind": telegram_file_sql.kind_cache.stats(),
+        "media sends": dict(media.stats),
+    }.items())
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
+    logger.info(f"Cache stats: {text}")
+
+cache_stats_handler = MessageHandler(filters.Regex("^/cache_stats$") & dev_chat_filter, cache_stats)
+
+async def check_balances(update: Update, context: ContextTypes):
+    """ Sends the credit balances that don't match the sum of their tokens. """
+    from sql import run_sql, credit_balance_sql
+    mismatches = await run_sql(credit_balance_sql.check_balances)
+    lines = [f"classroom {classroom_id}, {'student ' + str(student_id) if student_id else 'guild ' + str(guild_id)}: {balance} != {total}" for classroom_id, student_id, guild_id, balance, total in mismatches]
+    text = f"{len(mismatches)} balances don't match their tokens.\n" + "\n".join(lines[:50]) if mismatches else "Every balance matches its tokens."
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
+    logger.info(f"Checked credit balances, {len(mismatches)} mismatches.")
+
+check_balances_handler = MessageHandler(filters.Regex("^/check_balances$") & dev_chat_filter, check_balances)
+
+async def rebuild_balances(update: Update, context: ContextTypes):
+    """ Rebuilds every credit balance from the tokens. """
+    from sql import run_sql, credit_balance_sql
+    count = await run_sql(credit_balance_sql.rebuild_balances)
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=f"{count} balances rebuilt.")
+    logger.info(f"Rebuilt {count} credit balances.")
+
+rebuild_balances_handler = MessageHandler(filters.Regex("^/rebuild_balances$") & dev_chat_filter, rebuild_balances)
+
+async def outbox_stats(update: Update, context: ContextTypes):
+    """ Sends how many outbox messages are pending, sent and dead. """
+    from sql import run_sql, outbox_sql
+    counts = await run_sql(outbox_sql.count_by_status)
+    text = "\n".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "The outbox is empty."
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
+    logger.info(f"Outbox stats: {counts}")
+
+outbox_stats_handler = MessageHandler(filters.Regex("^/outbox_stats$") & dev_chat_filter, outbox_stats)
+
+async def requeue_outbox(update: Update, context: ContextTypes):
+    """ Gives the dead outbox messages another chance. """
+    from sql import run_sql, outbox_sql
+    from bot.utils.outbox import wake_outbox
+    count = await run_sql(outbox_sql.requeue_dead)
+    wake_outbox(context)
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=f"{count} messages requeued.")
+    logger.info(f"Requeued {count} dead outbox messages.")
+
+requeue_outbox_handler = MessageHandler(filters.Regex("^/requeue_outbox$") & dev_chat_filter, requeue_outbox)
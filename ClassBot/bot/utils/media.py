@@ -0,0 +1,83 @@
+""" Sends stored telegram files with the method of their kind. The kind is
+recorded by remember_file() when a file is received, so a document isn't first
+tried as a photo. Files stored before the kinds were recorded are tried as a
+photo and then as a document, and the kind that works is recorded. Local
+images are uploaded once, see reply_local_photo(). """
+import asyncio
+from collections import Counter
+from pathlib import Path
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from sql import telegram_file_sql
+
+
+# direct: sent with the recorded kind. avoided_fallbacks: of those, the ones
+# that would have failed as a photo first. probed: kind unknown, tried as a
+# photo. fallbacks: probes that failed as a photo. uploads: local images
+# uploaded, uploads_avoided: local images sent by the file id of an upload.
+stats = Counter()
+
+
+def remember_file(message: Message) -> str | None:
+    """ Returns the file id of the document, photo or video of the message, None
+    if it has none, and records its kind. """
+    if message.document:
+        kind, file = "document", message.document
+    elif message.photo:
+        kind, file = "photo", message.photo[-1]
+    elif message.video:
+        kind, file = "video", message.video
+    else:
+        return None
+    telegram_file_sql.add_file(file.file_id, kind, file.file_unique_id, file.file_size)
+    return file.file_id
+
+async def send_media(bot, chat_id: int, file_id: str, **kwargs) -> Message:
+    """ Sends the file to the chat as a photo, document or video, as recorded.
+    kwargs are passed to the send method (caption, reply_markup, parse_mode).
+    Raises BadRequest if telegram doesn't accept the file. """
+    kind = telegram_file_sql.get_kind(file_id)
+    if kind:
+        stats["direct"] += 1
+        if kind != "photo":
+            stats["avoided_fallbacks"] += 1
+        return await getattr(bot, f"send_{kind}")(chat_id, file_id, **kwargs)
+
+    stats["probed"] += 1
+    try:
+        message = await bot.send_photo(chat_id, file_id, **kwargs)
+        kind, file = "photo", message.photo[-1]
+    except BadRequest:
+        stats["fallbacks"] += 1
+        message = await bot.send_document(chat_id, file_id, **kwargs)
+        kind, file = "document", message.document
+    # the file id of the sent message may differ, the one stored is file_id
+    telegram_file_sql.add_file(file_id, kind, file.file_unique_id, file.file_size)
+    return message
+
+async def reply_media(message: Message, file_id: str, **kwargs) -> Message:
+    """ send_media to the chat of the message, like message.reply_photo(). """
+    return await send_media(message.get_bot(), message.chat_id, file_id, **kwargs)
+
+async def reply_local_photo(message: Message, source: str, **kwargs) -> Message:
+    """ Sends the local image of source ("path:<file>") as a photo to the chat
+    of the message. Only the first time it is read and uploaded, after that it
+    is sent by the file id telegram gave it. """
+    file_id = telegram_file_sql.get_file_id_by_source(source)
+    if file_id:
+        try:
+            sent = await message.reply_photo(file_id, **kwargs)
+            stats["uploads_avoided"] += 1
+            return sent
+        except BadRequest:
+            # the file id is no longer valid (another bot token?), upload again
+            pass
+    # don't block the event loop reading the file
+    photo = await asyncio.to_thread(Path(source.split(":", 1)[1]).read_bytes)
+    sent = await message.reply_photo(photo, **kwargs)
+    stats["uploads"] += 1
+    file = sent.photo[-1]
+    telegram_file_sql.add_file(file.file_id, "photo", file.file_unique_id, file.file_size, source=source)
+    return sent
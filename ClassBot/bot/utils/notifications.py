@@ -0,0 +1,87 @@
+""" Notifications sent to the teacher notification channel of a classroom.
+Handlers don't wait for them, and classrooms with the digest mode enabled get
+them combined in one message every DIGEST_INTERVAL_SECONDS seconds or every
+DIGEST_MAX_EVENTS notifications, to stay below telegram's flood limits. """
+import html
+from collections import defaultdict
+from configparser import ConfigParser
+
+from telegram.constants import MessageLimit
+from telegram.error import TelegramError, BadRequest, RetryAfter, NetworkError
+from telegram.ext import ContextTypes
+
+from utils.logger import logger
+from sql import classroom_sql
+
+
+config = ConfigParser()
+config.read("config.ini")
+DIGEST_INTERVAL_SECONDS = config.getint("notifications", "DIGEST_INTERVAL_SECONDS", fallback=60)
+DIGEST_MAX_EVENTS = config.getint("notifications", "DIGEST_MAX_EVENTS", fallback=20)
+
+# notifications waiting for the next digest, channel chat id -> html texts.
+# Only touched from the event loop, and lost if the bot stops before a flush.
+# Notifications telegram couldn't take (flood limit, network) wait here too.
+_digests: dict[str, list[str]] = defaultdict(list)
+
+
+def notify_channel(context: ContextTypes, classroom_id: int, text: str, parse_mode: str = None) -> None:
+    """ Sends text to the notification channel of the classroom, if it has one,
+    in the background or in the next digest. Doesn't wait for telegram. """
+    chan, digest = classroom_sql.get_notification_settings(classroom_id)
+    if not chan:
+        return
+    # without a job queue nothing would flush the digest, send it right away
+    if not digest or context.job_queue is None:
+        context.application.create_task(_send_now(context.bot, chan, text, parse_mode, retry=context.job_queue is not None))
+        return
+    _digests[chan].append(_as_html(text, parse_mode))
+    if len(_digests[chan]) >= DIGEST_MAX_EVENTS:
+        context.application.create_task(_flush(context.bot, chan))
+
+async def flush_digests(context: ContextTypes) -> None:
+    """ Job that sends the pending digest of every channel. """
+    for chan in list(_digests):
+        await _flush(context.bot, chan)
+
+async def _flush(bot, chan: str) -> None:
+    """ Sends the notifications waiting for the channel as few messages as
+    possible. If telegram can't take them now, the rest wait for the next flush. """
+    texts = _digests.pop(chan, None)
+    if not texts:
+        return
+    messages = [""]
+    for text in texts:
+        if messages[-1] and len(messages[-1]) + len(text) + 2 > MessageLimit.MAX_TEXT_LENGTH:
+            messages.append("")
+        messages[-1] += ("\n\n" if messages[-1] else "") + text[:MessageLimit.MAX_TEXT_LENGTH]
+    for i, message in enumerate(messages):
+        if not await _send(bot, chan, message, "HTML"):
+            _digests[chan][:0] = messages[i:]
+            return
+
+async def _send_now(bot, chan: str, text: str, parse_mode: str = None, retry: bool = True) -> None:
+    """ Sends a notification without waiting for the digest. If telegram can't
+    take it now and retry is True, it waits for the next flush instead. """
+    if not await _send(bot, chan, text, parse_mode) and retry:
+        _digests[chan].append(_as_html(text, parse_mode))
+
+async def _send(bot, chan: str, text: str, parse_mode: str = None) -> bool:
+    """ Sends text to the channel. Returns False if it should be sent again
+    later, True if it was sent or will never be. """
+    try:
+        await bot.send_message(chat_id=chan, text=text, parse_mode=parse_mode)
+    except BadRequest:      # a NetworkError too, but sending it again won't help
+        logger.exception(f"Failed to send message to notification channel {chan}.")
+        if parse_mode:
+            # a malformed tag would lose the whole digest, send it as plain text
+            return await _send(bot, chan, text)
+    except (RetryAfter, NetworkError) as e:
+        logger.warning(f"Notification channel {chan} will be retried: {e}")
+        return False
+    except TelegramError:   # Forbidden if the bot was removed from the channel
+        logger.exception(f"Failed to send message to notification channel {chan}.")
+    return True
+
+def _as_html(text: str, parse_mode: str = None) -> str:
+    return text if parse_mode == "HTML" else html.escape(text)
@@ -0,0 +1,94 @@
+""" Delivers the messages of the outbox table (see sql/outbox_sql.py). Handlers
+enqueue them in the transaction of their changes and call wake_outbox(), then a
+worker sends them in batches of BATCH_SIZE, sharing the rate limits of the
+broadcasts. Messages that fail are retried with backoff and, after
+MAX_ATTEMPTS, left as dead letters. The DELIVERY_INTERVAL_SECONDS job picks up
+whatever is left, also after a restart. See the [outbox] section of config.ini. """
+import asyncio
+import datetime
+import json
+from configparser import ConfigParser
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import TelegramError, BadRequest, RetryAfter, NetworkError
+from telegram.ext import ContextTypes
+
+from utils.logger import logger
+from sql import run_sql, outbox_sql
+from bot.utils.broadcast import bucket, CONCURRENCY
+
+
+config = ConfigParser()
+config.read("config.ini")
+BATCH_SIZE = config.getint("outbox", "BATCH_SIZE", fallback=50)
+MAX_ATTEMPTS = config.getint("outbox", "MAX_ATTEMPTS", fallback=5)
+DELIVERY_INTERVAL_SECONDS = config.getint("outbox", "DELIVERY_INTERVAL_SECONDS", fallback=30)
+KEEP_SENT_DAYS = config.getint("outbox", "KEEP_SENT_DAYS", fallback=7)
+
+# one delivery at a time, a wake_outbox() during a delivery is handled by it
+_lock = asyncio.Lock()
+_woken = False
+
+
+def wake_outbox(context: ContextTypes) -> None:
+    """ Starts delivering the outbox in the background. Call it once the
+    messages are committed. """
+    global _woken
+    _woken = True
+    if not _lock.locked():
+        context.application.create_task(_deliver(context.bot))
+
+async def deliver_outbox(context: ContextTypes) -> None:
+    """ Job that sends the messages still waiting in the outbox. """
+    await _deliver(context.bot)
+
+async def purge_outbox(context: ContextTypes) -> None:
+    """ Job that deletes the delivered messages older than KEEP_SENT_DAYS. """
+    deleted = await run_sql(outbox_sql.delete_sent, datetime.timedelta(days=KEEP_SENT_DAYS))
+    logger.info(f"Deleted {deleted} delivered outbox messages.")
+
+async def _deliver(bot) -> None:
+    global _woken
+    async with _lock:
+        _woken = True
+        while _woken:
+            _woken = False
+            while True:
+                messages = await run_sql(outbox_sql.get_due, BATCH_SIZE)
+                if not messages:
+                    break
+                semaphore = asyncio.Semaphore(CONCURRENCY)
+                async def send(message):
+                    async with semaphore:
+                        return await _send(bot, message)
+                sent = await asyncio.gather(*(send(message) for message in messages))
+                await run_sql(outbox_sql.mark_sent, [message.id for message, ok in zip(messages, sent) if ok])
+
+async def _send(bot, message) -> bool:
+    """ Sends one message. Returns whether it was delivered, failures are
+    rescheduled or dead-lettered right away. """
+    await bucket.acquire()
+    try:
+        await bot.send_message(
+            chat_id=message.chat_id,
+            text=message.text,
+            parse_mode=message.parse_mode,
+            reply_markup=InlineKeyboardMarkup.de_json(json.loads(message.reply_markup), bot) if message.reply_markup else None,
+        )
+        return True
+    except RetryAfter as e:
+        bucket.pause(e.retry_after)
+        await run_sql(outbox_sql.retry_later, message.id, str(e), datetime.timedelta(seconds=e.retry_after), count_attempt=False)
+    except BadRequest as e:     # a NetworkError too, but it won't work next time either
+        logger.error(f"Outbox message {message.id} to chat {message.chat_id} failed: {e}")
+        await run_sql(outbox_sql.mark_dead, message.id, str(e))
+    except NetworkError as e:
+        if message.attempts + 1 >= MAX_ATTEMPTS:
+            logger.error(f"Outbox message {message.id} to chat {message.chat_id} failed {MAX_ATTEMPTS} times: {e}")
+            await run_sql(outbox_sql.mark_dead, message.id, str(e))
+        else:
+            await run_sql(outbox_sql.retry_later, message.id, str(e), datetime.timedelta(seconds=DELIVERY_INTERVAL_SECONDS * 2 ** message.attempts))
+    except TelegramError as e:  # Forbidden if the user blocked the bot
+        logger.error(f"Outbox message {message.id} to chat {message.chat_id} failed: {e}")
+        await run_sql(outbox_sql.mark_dead, message.id, str(e))
+    return False
@@ -1,7 +1,11 @@
 """ A simple paginator for text messages using inline keyboard buttons as navigation buttons. """
+import datetime
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CallbackQueryHandler, ContextTypes
 
+from sql import user_sql, teacher_classroom_sql, student_classroom_sql
+
 
 class Paginator():
     def __init__(self, lines: list[str], items_per_page = 10, text_before: str = None, text_after: str = None, page: int = 1, add_back = False, other_buttons: list[InlineKeyboardButton] = None) -> None:
@@ -14,15 +18,22 @@ class Paginator():
         self.add_back = add_back
         self.other_buttons = other_buttons
 
-    def text(self) -> str:
-        """ Returns the text of the current page. """
+    def page_lines(self) -> list[str]:
+        """ Returns the lines of the current page. """
         start_index = (self.page - 1) * self.items_per_page
         end_index = start_index + self.items_per_page
+        return self.lines[start_index:end_index]
+
+    def has_next(self) -> bool:
+        """ Returns True if there is a page after the current one. """
+        return self.page * self.items_per_page < len(self.lines)
 
+    def text(self) -> str:
+        """ Returns the text of the current page. """
         text = ""
         if self.text_before:
             text += self.text_before + "\n\n"
-        text += "\n".join(self.lines[start_index:end_index])
+        text += "\n".join(self.page_lines())
         if self.text_after:
             text += "\n\n" + self.text_after
 
@@ -31,33 +42,223 @@ class Paginator():
     def keyboard(self) -> InlineKeyboardMarkup:
         """ Returns the keyboard of the current page. """
         keyboard = []
-        start_index = (self.page - 1) * self.items_per_page
-        end_index = start_index + self.items_per_page
+        has_next = self.has_next()
         
         # add pagination buttons
         if self.page > 1:    # if not in the first page
-            if end_index < len(self.lines):  # if not in the first and last page
-                keyboard.append([InlineKeyboardButton("<<", callback_data=f"page#{self.page - 1}"), InlineKeyboardButton(">>", callback_data=f"page#{self.page + 1}")])
+            if has_next:  # if not in the first and last page
+                keyboard.append([InlineKeyboardButton("<<", callback_data=self.page_callback(self.page - 1)), InlineKeyboardButton(">>", callback_data=self.page_callback(self.page + 1))])
             else:       # only not in the first page
-                keyboard.append([InlineKeyboardButton("<<", callback_data=f"page#{self.page - 1}")])
-        elif end_index < len(self.lines):    # if not in the last page
-            keyboard.append([InlineKeyboardButton(">>", callback_data=f"page#{self.page + 1}")])
+                keyboard.append([InlineKeyboardButton("<<", callback_data=self.page_callback(self.page - 1))])
+        elif has_next:    # if not in the last page
+            keyboard.append([InlineKeyboardButton(">>", callback_data=self.page_callback(self.page + 1))])
         
-        # if other buttons are provided, add them here
+        # if other buttons are provided, add them here. Either a single row or a list of rows
         if self.other_buttons:
-            keyboard.append(self.other_buttons)
+            if isinstance(self.other_buttons[0], list):
+                keyboard.extend(self.other_buttons)
+            else:
+                keyboard.append(self.other_buttons)
         
         # add back button
         if self.add_back:
             keyboard.append([InlineKeyboardButton("🔙", callback_data="back")])
         
         return InlineKeyboardMarkup(keyboard)
-    
+
+    def page_callback(self, page: int) -> str:
+        """ Returns the callback data of the button that shows the given page. """
+        return f"page#{page}"
+
+
+class KeysetPaginator(Paginator):
+    """ A paginator that reads its lines from the database one page at a time,
+    for lists too long to load at once. Pages are fetched with keyset
+    pagination: fetch(after, limit) returns up to limit rows following the
+    cursor `after` (None for the first page), and row_key(row) returns the
+    cursor of a row. format_line(i, row) builds the line of the i-th row and
+    count() returns the total number of rows, used for the navigation buttons.
+    Since the pagination buttons only move one page at a time, the cursor of
+    every visited page is kept to move back.
+
+    Given a kind registered with stateless_list() and the filter_key of the
+    list, nothing needs to be kept: the buttons carry the list kind, the
+    filter key, the page and the cursor ("pg|pend|c12.u3|2|a<cursor>") and the
+    page is rebuilt from the database when pressed, even after a restart. To
+    move back the paginator then calls fetch(None, limit, before=cursor) with
+    the cursor of the first row of the current page, and fetch must return
+    the limit rows preceding it, in order. """
+    def __init__(self, fetch, count, format_line, row_key, items_per_page = 10, text_before: str = None, text_after: str = None, add_back = False, other_buttons: list[InlineKeyboardButton] = None, kind: str = None, filter_key: str = None) -> None:
+        """ Returns a paginator object. """
+        super().__init__([], items_per_page=items_per_page, text_before=text_before, text_after=text_after, add_back=add_back, other_buttons=other_buttons)
+        self.fetch = fetch
+        self.count = count
+        self.format_line = format_line
+        self.row_key = row_key
+        self.kind = kind
+        self.filter_key = filter_key
+        self._cursors = {1: None}
+        self._before = None
+        self._first_key = None
+        self._loaded_page = None
+        self.total = self.count()
+
+    def go_to(self, page: int, cursor: tuple, before = False) -> None:
+        """ Moves to the page that starts after the cursor, or ends before it. """
+        self.page = page
+        if before:
+            self._before = cursor
+        else:
+            self._cursors[page] = cursor
+
+    def page_callback(self, page: int) -> str:
+        if not self.kind:
+            return super().page_callback(page)
+        self._load()
+        if page > self.page:
+            cursor = "a" + _encode_cursor(self._cursors[page])
+        else:
+            cursor = "b" + _encode_cursor(self._first_key)
+        # telegram allows up to 64 bytes of callback data
+        return f"pg|{self.kind}|{self.filter_key}|{page}|{cursor}"
+
+    def _load(self) -> None:
+        """ Fetches the rows of the current page if they aren't loaded yet. """
+        if self._loaded_page == self.page:
+            return
+        if self._before is not None:
+            rows = self.fetch(None, self.items_per_page, before=self._before)
+            self._before = None
+        else:
+            if self.page not in self._cursors:  # unknown cursor, go back to the start
+                self.page = 1
+            rows = self.fetch(self._cursors[self.page], self.items_per_page)
+        if not rows and self.page > 1:  # the rows of the page are gone, go back to the start
+            self.page = 1
+            rows = self.fetch(None, self.items_per_page)
+        if rows:
+            self._first_key = self.row_key(rows[0])
+            self._cursors[self.page + 1] = self.row_key(rows[-1])
+        start = (self.page - 1) * self.items_per_page + 1
+        self.lines = [self.format_line(i, row) for i, row in enumerate(rows, start=start)]
+        if self._loaded_page is not None:   # the first page uses the count of __init__
+            self.total = self.count()
+        self._loaded_page = self.page
+
+    def page_lines(self) -> list[str]:
+        self._load()
+        return self.lines
+
+    def has_next(self) -> bool:
+        self._load()
+        return self.page * self.items_per_page < self.total
+
+
+# builders of the stateless paginated lists, kind -> build(filter_key)
+_lists = {}
+# kind -> role ("teacher" or "student") of the users that can see the list
+_roles = {}
+# role -> exists(user_id, classroom_id), whether the user is in the classroom
+_members = {"teacher": teacher_classroom_sql.exists, "student": student_classroom_sql.exists}
+
+def stateless_list(kind: str, role: str = "teacher"):
+    """ Decorator that registers build(filter_key) as the builder of the
+    paginated lists of the given kind. It must return the KeysetPaginator of
+    the list for the filter key, or None if the list no longer exists. Keep
+    kind and filter key short, they go in the callback data of the buttons.
+    The filter key must have the classroom as c, and the user the list is
+    for as u if it is personal: the buttons only work for users with that
+    role in the classroom, and for u. """
+    def register(build):
+        _lists[kind] = build
+        _roles[kind] = role
+        return build
+    return register
+
+def _can_see(chat_id: int, kind: str, key: str) -> bool:
+    """ Returns True if the user of the chat can see the list of the filter
+    key. The callback data comes from the user, so it can't be trusted. """
+    role = _roles[kind]
+    try:
+        values = parse_filter_key(key)
+    except ValueError:
+        return False
+    identity = user_sql.get_identity(chat_id, role)
+    if not identity or "c" not in values:
+        return False
+    if "u" in values and values["u"] != identity.user_id:
+        return False
+    return _members[role](identity.user_id, values["c"])
+
+def filter_key(**values) -> str:
+    """ Returns the filter key of a stateless list from its integer values,
+    named by a single letter: filter_key(c=12, u=3) -> "c12.u3". None values
+    are left out. """
+    return ".".join(f"{name}{value}" for name, value in values.items() if value is not None)
+
+def parse_filter_key(key: str) -> dict[str, int]:
+    """ Returns the values of a filter key, the inverse of filter_key(). """
+    return {part[0]: int(part[1:]) for part in key.split(".") if part}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def _base36(number: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        number, digit = divmod(number, 36)
+        result = digits[digit] + result
+        if not number:
+            return result
+
+def _encode_cursor(cursor: tuple) -> str:
+    """ Returns a short text for a cursor of integers and datetimes. """
+    parts = []
+    for value in cursor:
+        if isinstance(value, datetime.datetime):    # microseconds since the epoch
+            if value.tzinfo:    # Z for UTC, T for naive datetimes, ints are lowercase
+                value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                parts.append("Z" + _base36((value - _EPOCH) // datetime.timedelta(microseconds=1)))
+            else:
+                parts.append("T" + _base36((value - _EPOCH) // datetime.timedelta(microseconds=1)))
+        else:
+            parts.append(_base36(value))
+    return ",".join(parts)
+
+def _decode_cursor(text: str) -> tuple:
+    """ The inverse of _encode_cursor. """
+    values = []
+    for part in text.split(","):
+        if part.startswith("T"):
+            values.append(_EPOCH + datetime.timedelta(microseconds=int(part[1:], 36)))
+        elif part.startswith("Z"):
+            values.append((_EPOCH + datetime.timedelta(microseconds=int(part[1:], 36))).replace(tzinfo=datetime.timezone.utc))
+        else:
+            values.append(int(part, 36))
+    return tuple(values)
+
+async def stateless_update(update: Update, context: ContextTypes) -> None:
+    """ Handles the pagination of stateless lists. Rebuilds the page from the
+    callback data, doesn't use user_data. """
+    query = update.callback_query
+    await query.answer()
+    _, kind, key, page, cursor = query.data.split("|")
+    paginator = _lists[kind](key) if kind in _lists and _can_see(update.effective_user.id, kind, key) else None
+    if not paginator:
+        await query.edit_message_text("Esta lista ya no está disponible.")
+        return
+    paginator.go_to(int(page), _decode_cursor(cursor[1:]), before=cursor[0] == "b")
+
+    keyboard = paginator.keyboard()
+    await query.edit_message_text(paginator.text(), reply_markup=keyboard, parse_mode="HTML")
+
 async def update(update: Update, context: ContextTypes) -> None:
     """ Handles pagination. 
     Does not return new state, it will keep a ongoing conversation in the same
     state. This also means it cannot be used as an entry point since it will
     end the conversation."""
+    if update.callback_query.data.startswith("pg|"):
+        return await stateless_update(update, context)
     query = update.callback_query
     await query.answer()
     try:
@@ -70,4 +271,7 @@ async def update(update: Update, context: ContextTypes) -> None:
     keyboard = paginator.keyboard()
     await query.edit_message_text(paginator.text(), reply_markup=keyboard, parse_mode="HTML")
 
-text_paginator_handler = CallbackQueryHandler(update, pattern=r"^page#")
+text_paginator_handler = CallbackQueryHandler(update, pattern=r"^(page#|pg\|)")
+# outside of the conversations, for the buttons of stateless lists sent before
+# the conversation ended or the bot restarted
+stateless_paginator_handler = CallbackQueryHandler(stateless_update, pattern=r"^pg\|")
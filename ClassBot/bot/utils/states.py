@@ -10,7 +10,7 @@ EDIT_CLASSROOM_CHOOSE_OPTION, EDIT_CLASSROOM_NAME, EDIT_CLASSROOM_PASSWORD, EDIT
 # teacher_conference states
 T_CREATE_CONFERENCE, T_SELECT_CONFERENCE, T_CREATE_CONFERENCE_NAME, T_CREATE_CONFERENCE_DATE, T_CREATE_CONFERENCE_FILE, T_CONFERENCE_EDIT_OPTION, T_EDIT_CONFERENCE_NAME, T_EDIT_CONFERENCE_DATE, T_EDIT_CONFERENCE_FILE = range(9)
 # teacher_pending states
-T_PENDING_SELECT, T_PENDING_OPTIONS, T_PENDING_ASSIGN_TEACHER, T_PENDING_REJECT, T_PENDING_APPROVE, T_PENDING_MORE_INFO, T_PENDING_FILTER_ACTIVITY, T_PENDING_APPROVE_PARTIAL_CREDITS, T_PENDING_FILTER_PRACTIC_CLASS = range(9)
+T_PENDING_SELECT, T_PENDING_OPTIONS, T_PENDING_ASSIGN_TEACHER, T_PENDING_REJECT, T_PENDING_APPROVE, T_PENDING_MORE_INFO, T_PENDING_FILTER_ACTIVITY, T_PENDING_APPROVE_PARTIAL_CREDITS, T_PENDING_FILTER_PRACTIC_CLASS, T_PENDING_BULK_APPROVE, T_PENDING_BULK_REJECT = range(11)
 # teacher_guilds states
 T_GUILD_CREATE, T_GUILD_SELECT, T_GUILD_CREATE_NAME, T_GUILD_OPTIONS, T_GUILD_OPTIONS_EDIT_NAME, T_GUILD_SELECT_STUDENT_TO_ADD, T_GUILD_SELECT_STUDENT_TO_REMOVE = range(7)
 # teacher_activities states
@@ -8,11 +8,16 @@ from models.student_classroom import Student_classroom
 from models.teacher_classroom import Teacher_classroom
 from models.token_type import Token_type
 from models.pending import Pending
+from models.pending_archive import Pending_archive
+from models.pending_message import Pending_message
 from models.token import Token
 from models.student_token import Student_token
 from models.conference import Conference
 from models.student_guild import Student_guild
 from models.guild_token import Guild_token
+from models.credit_balance import Credit_balance
+from models.outbox import Outbox
+from models.telegram_file import Telegram_file
 from models.activity_type import Activity_type
 from models.activity import Activity
 from models.practic_class import Practic_class
@@ -1,4 +1,16 @@
+from sqlalchemy import DateTime
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
     pass
+
+# sqlite keeps dates as text and compares them as text. func.now() stores them
+# as 'YYYY-MM-DD HH:MM:SS', so dates written from python use the same format
+# (by default they get '.000000' appended). Otherwise a date bound in a where,
+# like a keyset cursor, never equals the stored one. Used by the date columns
+# of the pendings, which are paginated by (date, id), and of the outbox.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(timezone=True, storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
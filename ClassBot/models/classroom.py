@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING, Optional, List
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, false
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from models.base import Base
@@ -13,8 +13,10 @@ if TYPE_CHECKING:
     from models.conference import Conference
     from models.guild import Guild
     from models.pending import Pending
+    from models.pending_archive import Pending_archive
     from models.token_type import Token_type
     from models.token import Token
+    from models.credit_balance import Credit_balance
 
 class Classroom(Base):
     __tablename__ = 'classroom'
@@ -25,6 +27,8 @@ class Classroom(Base):
     teacher_auth: Mapped[str] = mapped_column(unique=True)  
     student_auth: Mapped[str] = mapped_column(unique=True)
     teacher_notification_channel: Mapped[Optional[str]]
+    # send the notifications to the channel in periodic digests instead of one by one
+    notification_digest: Mapped[bool] = mapped_column(default=False, server_default=false())
 
     # Many-to-one relationship with course
     course: Mapped["Course"] = relationship(back_populates='classrooms')
@@ -38,6 +42,10 @@ class Classroom(Base):
     guilds: Mapped[Optional[List["Guild"]]] = relationship(back_populates="classroom", cascade="all, delete-orphan")
     # one-to-many relationship with pending
     pendings: Mapped[Optional[List["Pending"]]] = relationship(back_populates="classroom", cascade="all, delete-orphan")
+    # one-to-many relationship with pending_archive
+    archived_pendings: Mapped[Optional[List["Pending_archive"]]] = relationship(back_populates="classroom", cascade="all, delete-orphan")
+    # one-to-many relationship with credit_balance
+    credit_balances: Mapped[Optional[List["Credit_balance"]]] = relationship(back_populates="classroom", cascade="all, delete-orphan")
     # One-to-many relationship with token_type
     token_types: Mapped[Optional[List["Token_type"]]] = relationship(back_populates='classroom', cascade='all, delete-orphan')
     # One-to-many relationship with token
@@ -0,0 +1,46 @@
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import ForeignKey, Index, text
+from sqlalchemy.orm import mapped_column, Mapped, relationship
+
+from models.base import Base
+
+
+if TYPE_CHECKING:
+    from models.classroom import Classroom
+    from models.student import Student
+    from models.guild import Guild
+
+# conditions of the rows covered by each unique index
+STUDENT_BALANCE = text("student_id IS NOT NULL")
+GUILD_BALANCE = text("guild_id IS NOT NULL")
+
+class Credit_balance(Base):
+    """ Total value of the student_token (or guild_token) rows of a student (or
+    guild) in a classroom. Kept up to date by credit_balance_sql whenever the
+    tokens change, so totals don't have to be summed from the ledgers. """
+    __tablename__ = "credit_balance"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    classroom_id: Mapped[int] = mapped_column(ForeignKey('classroom.id'))
+    # exactly one of student_id and guild_id is set
+    student_id: Mapped[Optional[int]] = mapped_column(ForeignKey('student.id'))
+    guild_id: Mapped[Optional[int]] = mapped_column(ForeignKey('guild.id'))
+    value: Mapped[int] = mapped_column(default=0)
+
+    # many-to-one relationship with classroom
+    classroom: Mapped["Classroom"] = relationship(back_populates="credit_balances")
+    # many-to-one relationship with student
+    student: Mapped[Optional["Student"]] = relationship(back_populates="credit_balances")
+    # many-to-one relationship with guild
+    guild: Mapped[Optional["Guild"]] = relationship(back_populates="credit_balances")
+
+    __table_args__ = (
+        Index('uq_credit_balance_student', 'classroom_id', 'student_id', unique=True,
+              sqlite_where=STUDENT_BALANCE, postgresql_where=STUDENT_BALANCE),
+        Index('uq_credit_balance_guild', 'classroom_id', 'guild_id', unique=True,
+              sqlite_where=GUILD_BALANCE, postgresql_where=GUILD_BALANCE),
+    )
+
+    def __repr__(self) -> str:
+        return f'Credit_balance(id={self.id}, classroom_id={self.classroom_id}, student_id={self.student_id}, guild_id={self.guild_id}, value={self.value})'
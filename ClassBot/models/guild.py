@@ -11,6 +11,7 @@ if TYPE_CHECKING:
     from models.pending import Pending
     from models.student_guild import Student_guild
     from models.guild_token import Guild_token
+    from models.credit_balance import Credit_balance
 
 class Guild(Base):
     __tablename__ = 'guild'
@@ -27,6 +28,8 @@ class Guild(Base):
     students: Mapped[Optional[List["Student_guild"]]] = relationship(back_populates="guild", cascade="all, delete-orphan")
     # many-to-many relationship with token
     tokens: Mapped[Optional[List["Guild_token"]]] = relationship(back_populates="guild", cascade="all, delete-orphan")
+    # one-to-many relationship with credit_balance
+    credit_balances: Mapped[Optional[List["Credit_balance"]]] = relationship(back_populates="guild", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Guild(id={self.id}, classroom_id={self.classroom_id}, name={self.name})>"
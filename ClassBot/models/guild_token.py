@@ -1,7 +1,7 @@
 import datetime
 from typing import TYPE_CHECKING, Optional, List
 
-from sqlalchemy import ForeignKey, DateTime, func
+from sqlalchemy import ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from models.base import Base
@@ -29,5 +29,10 @@ class Guild_token(Base):
     # some tokens are asignated by the system)
     guild_tokens_given_by: Mapped[Optional["Teacher"]] = relationship(back_populates='guild_tokens_given')
 
+    __table_args__ = (
+        # the primary key (guild_id, token_id) doesn't cover lookups by token
+        Index('ix_guild_token_token_id', 'token_id'),
+    )
+
     def __repr__(self) -> str:
         return f'Guild_token(guild_id={self.guild_id}, token_id={self.token_id}, teacher_id={self.teacher_id}, value={self.value}, creation_date={self.creation_date})'
@@ -0,0 +1,39 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import mapped_column, Mapped
+
+from models.base import Base, Timestamp
+
+
+class Outbox(Base):
+    """ A message to a user waiting to be delivered by the outbox worker. Added
+    in the same transaction as the change it tells about, so it is sent if and
+    only if the change is committed, even if the bot restarts in between. """
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column()
+    text: Mapped[str] = mapped_column()
+    parse_mode: Mapped[Optional[str]] = mapped_column()
+    reply_markup: Mapped[Optional[str]] = mapped_column() # json
+    # the same key is only enqueued once
+    dedupe_key: Mapped[Optional[str]] = mapped_column(unique=True)
+    status: Mapped[str] = mapped_column(default="PENDING") # PENDING, SENT, DEAD
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[Optional[str]] = mapped_column()
+    creation_date: Mapped[datetime.datetime] = mapped_column(
+        Timestamp, server_default=func.now()
+        )
+    # not before this date, None means as soon as possible. Dates are taken
+    # from the database clock, like creation_date (UTC on sqlite)
+    next_attempt: Mapped[Optional[datetime.datetime]] = mapped_column(Timestamp)
+
+    __table_args__ = (
+        Index('ix_outbox_status_next_attempt', 'status', 'next_attempt'),
+    )
+
+    def __repr__(self) -> str:
+        return f'Outbox(id={self.id}, chat_id={self.chat_id}, status={self.status}, attempts={self.attempts}, dedupe_key={self.dedupe_key}, next_attempt={self.next_attempt})'
@@ -1,11 +1,11 @@
 import datetime
 from typing import TYPE_CHECKING, Optional, List
 
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
-from models.base import Base
+from models.base import Base, Timestamp
 
 
 if TYPE_CHECKING:
@@ -15,6 +15,10 @@ if TYPE_CHECKING:
     from models.teacher import Teacher
     from models.guild import Guild
     from models.token import Token
+    from models.pending_message import Pending_message
+
+# condition of the submissions covered by uq_pending_live_submission
+LIVE_SUBMISSION = text("status = 'PENDING' AND token_id IS NOT NULL")
 
 class Pending(Base):
     __tablename__ = "pending"
@@ -28,9 +32,9 @@ class Pending(Base):
     guild_id: Mapped[Optional[int]] = mapped_column(ForeignKey('guild.id'))
     status: Mapped[str] = mapped_column(default='pending') # PENDING, APPROVED, REJECTED
     creation_date: Mapped[datetime.datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        Timestamp, server_default=func.now()
         )
-    approved_date: Mapped[Optional[datetime.date]] = mapped_column(DateTime(timezone=True))
+    approved_date: Mapped[Optional[datetime.date]] = mapped_column(Timestamp)    # when it was approved or rejected
     approved_by: Mapped[Optional[int]] = mapped_column(ForeignKey('teacher.id', ondelete='SET NULL'))
     text: Mapped[Optional[str]] = mapped_column()
     FileID: Mapped[Optional[str]] = mapped_column(default=None)
@@ -52,7 +56,27 @@ class Pending(Base):
     guild: Mapped[Optional["Guild"]] = relationship(back_populates="pendings")
     # Many-to-one relationship with token
     token: Mapped[Optional["Token"]] = relationship(back_populates="related_pendings")
-    
+    # One-to-many relationship with pending_message, the conversation about the pending
+    messages: Mapped[List["Pending_message"]] = relationship(cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Indexes matching the queries in pending_sql: classroom_id first, then the
+        # equality filters, then the column used for ordering.
+        Index('ix_pending_classroom_status_teacher_creation', 'classroom_id', 'status', 'teacher_id', 'creation_date'),
+        Index('ix_pending_classroom_status_teacher_approved', 'classroom_id', 'status', 'teacher_id', 'approved_date'),
+        Index('ix_pending_classroom_token_type_status', 'classroom_id', 'token_type_id', 'status', 'teacher_id', 'creation_date'),
+        Index('ix_pending_classroom_guild_status', 'classroom_id', 'guild_id', 'status', 'teacher_id', 'creation_date'),
+        Index('ix_pending_classroom_student_token_type', 'classroom_id', 'student_id', 'token_type_id', 'creation_date'),
+        Index('ix_pending_classroom_student_token', 'classroom_id', 'student_id', 'token_id'),
+        Index('ix_pending_classroom_approved_by', 'classroom_id', 'approved_by', 'approved_date'),
+        # A student has at most one live submission per token, resubmitting replaces
+        # it (see pending_sql.upsert_submission).
+        Index('uq_pending_live_submission', 'student_id', 'classroom_id', 'token_id', unique=True,
+              sqlite_where=LIVE_SUBMISSION, postgresql_where=LIVE_SUBMISSION),
+        # ids are never reused, an archived pending keeps its id in pending_archive
+        # and its messages and outbox dedupe keys still point to it
+        {'sqlite_autoincrement': True},
+    )
 
     def __repr__(self) -> str:
         return f'Pending(id={self.id}, student_id={self.student_id}, classroom_id={self.classroom_id}, token_type_id={self.token_type_id}, token_id={self.token_id}, teacher_id={self.teacher_id}, guild_id={self.guild_id}, status={self.status}, creation_date={self.creation_date}, approved_date={self.approved_date}, approved_by={self.approved_by}, text={self.text}, FileID={self.FileID}, explanation={self.explanation}, more_info={self.more_info})'
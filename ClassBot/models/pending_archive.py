@@ -0,0 +1,50 @@
+import datetime
+from typing import TYPE_CHECKING, Optional, List
+
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy.orm import mapped_column, Mapped, relationship
+
+from models.base import Base, Timestamp
+
+
+if TYPE_CHECKING:
+    from models.student import Student
+    from models.classroom import Classroom
+    from models.pending_message import Pending_message
+
+class Pending_archive(Base):
+    """ Approved and rejected pendings moved out of the pending table by
+    pending_sql.archive_resolved_pendings. Same columns as pending, the id is
+    the one the pending had. """
+    __tablename__ = "pending_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    student_id: Mapped[int] = mapped_column(ForeignKey('student.id'))
+    classroom_id: Mapped[int] = mapped_column(ForeignKey('classroom.id'))
+    token_type_id: Mapped[int] = mapped_column(ForeignKey('token_type.id'))
+    token_id: Mapped[Optional[int]] = mapped_column(ForeignKey('token.id', ondelete='SET NULL'))
+    teacher_id: Mapped[Optional[int]] = mapped_column(ForeignKey('teacher.id', ondelete='SET NULL'))
+    guild_id: Mapped[Optional[int]] = mapped_column(ForeignKey('guild.id'))
+    status: Mapped[str] = mapped_column() # APPROVED, REJECTED
+    creation_date: Mapped[datetime.datetime] = mapped_column(Timestamp)
+    approved_date: Mapped[Optional[datetime.date]] = mapped_column(Timestamp)
+    approved_by: Mapped[Optional[int]] = mapped_column(ForeignKey('teacher.id', ondelete='SET NULL'))
+    text: Mapped[Optional[str]] = mapped_column()
+    FileID: Mapped[Optional[str]] = mapped_column(default=None)
+    explanation: Mapped[Optional[str]] = mapped_column(default=None)
+    more_info: Mapped[Optional[str]] = mapped_column(default=None)
+
+    # many-to-one relationship with student
+    student: Mapped["Student"] = relationship(back_populates="archived_pendings")
+    # many-to-one relationship with classroom
+    classroom: Mapped["Classroom"] = relationship(back_populates="archived_pendings")
+    # One-to-many relationship with pending_message, moved from the pending
+    messages: Mapped[List["Pending_message"]] = relationship(cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # history of the pendings approved by a teacher
+        Index('ix_pending_archive_classroom_approved_by', 'classroom_id', 'approved_by', 'approved_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f'Pending_archive(id={self.id}, student_id={self.student_id}, classroom_id={self.classroom_id}, token_type_id={self.token_type_id}, token_id={self.token_id}, status={self.status}, approved_date={self.approved_date}, approved_by={self.approved_by})'
@@ -0,0 +1,34 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import mapped_column, Mapped
+
+from models.base import Base
+
+
+class Pending_message(Base):
+    """ A message of the conversation between teacher and student about a
+    pending (asking for and sending more info). Rows are only appended. """
+    __tablename__ = "pending_message"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # the pending of the thread, or the archived pending once it is moved to
+    # pending_archive (see pending_sql.archive_resolved_pendings)
+    pending_id: Mapped[Optional[int]] = mapped_column(ForeignKey('pending.id', ondelete='CASCADE'))
+    archived_pending_id: Mapped[Optional[int]] = mapped_column(ForeignKey('pending_archive.id', ondelete='CASCADE'))
+    author_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user.id', ondelete='SET NULL'))
+    creation_date: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+        )
+    text: Mapped[Optional[str]] = mapped_column()
+    FileID: Mapped[Optional[str]] = mapped_column(default=None)
+
+    __table_args__ = (
+        Index('ix_pending_message_pending', 'pending_id', 'id'),
+        Index('ix_pending_message_archived_pending', 'archived_pending_id', 'id'),
+    )
+
+    def __repr__(self) -> str:
+        return f'Pending_message(id={self.id}, pending_id={self.pending_id}, archived_pending_id={self.archived_pending_id}, author_id={self.author_id}, creation_date={self.creation_date}, text={self.text}, FileID={self.FileID})'
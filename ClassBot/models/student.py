@@ -11,7 +11,9 @@ if TYPE_CHECKING:
     from models.student_classroom import Student_classroom
     from models.student_token import Student_token
     from models.pending import Pending
+    from models.pending_archive import Pending_archive
     from models.student_guild import Student_guild
+    from models.credit_balance import Credit_balance
 
 # specialization of User table
 class Student(Base):
@@ -29,8 +31,12 @@ class Student(Base):
     tokens: Mapped[Optional[List["Student_token"]]] = relationship(back_populates="student", cascade='all, delete-orphan')
     # One-to-many relationship with pending
     pendings: Mapped[Optional[List["Pending"]]] = relationship(back_populates="student", cascade='all, delete-orphan')
+    # One-to-many relationship with pending_archive
+    archived_pendings: Mapped[Optional[List["Pending_archive"]]] = relationship(back_populates="student", cascade='all, delete-orphan')
     # Many-to-many relationship with guild
     guilds: Mapped[Optional[List["Student_guild"]]] = relationship(back_populates="student", cascade='all, delete-orphan')
+    # One-to-many relationship with credit_balance
+    credit_balances: Mapped[Optional[List["Credit_balance"]]] = relationship(back_populates="student", cascade='all, delete-orphan')
 
     def __repr__(self) -> str:
         return f'Student(id={self.id})'
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from models.base import Base
@@ -20,5 +20,10 @@ class Student_classroom(Base):
     student: Mapped["Student"] = relationship(back_populates="classrooms")
     classroom: Mapped["Classroom"] = relationship(back_populates="students")
 
+    __table_args__ = (
+        # the primary key doesn't cover lookups by classroom_id
+        Index('ix_student_classroom_classroom_id', 'classroom_id'),
+    )
+
     def __repr__(self) -> str:
         return f'student_classroom(teacher_id={self.student_id}, classroom_id={self.classroom_id})'
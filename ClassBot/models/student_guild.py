@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING, Optional, List
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from models.base import Base
@@ -19,5 +19,10 @@ class Student_guild(Base):
     student: Mapped["Student"] = relationship(back_populates="guilds")
     guild: Mapped["Guild"] = relationship(back_populates="students")
 
+    __table_args__ = (
+        # the primary key doesn't cover lookups by guild_id
+        Index('ix_student_guild_guild_id', 'guild_id'),
+    )
+
     def __repr__(self) -> str:
         return f'student_guild(student_id={self.student_id}, guild_id={self.guild_id})'
@@ -1,7 +1,7 @@
 import datetime
 from typing import TYPE_CHECKING, Optional, List
 
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import ForeignKey, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
@@ -30,5 +30,10 @@ class Student_token(Base):
     # some tokens are asignated by the system)
     given_by: Mapped[Optional["Teacher"]] = relationship(back_populates='tokens_given')
 
+    __table_args__ = (
+        # the primary key (student_id, token_id) doesn't cover lookups by token
+        Index('ix_student_token_token_id', 'token_id'),
+    )
+
     def __repr__(self) -> str:
         return f'Student_token(student_id={self.student_id}, token_id={self.token_id}, teacher_id={self.teacher_id}, value={self.value}, creation_date={self.creation_date})'
@@ -0,0 +1,33 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import mapped_column, Mapped
+
+from models.base import Base
+
+
+class Telegram_file(Base):
+    """ What kind of media a telegram file id is, recorded when the file is
+    received, so it can be sent again with the right method. The FileID
+    columns of the other tables are looked up here. """
+    __tablename__ = "telegram_file"
+
+    file_id: Mapped[str] = mapped_column(primary_key=True)
+    file_unique_id: Mapped[Optional[str]] = mapped_column()
+    kind: Mapped[str] = mapped_column() # photo, document, video
+    file_size: Mapped[Optional[int]] = mapped_column()
+    # what was uploaded to get this file id, like "path:<local file>". Set
+    # for the files the bot uploads itself, so they are only uploaded once.
+    source: Mapped[Optional[str]] = mapped_column()
+    creation_date: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+        )
+
+    __table_args__ = (
+        Index('ix_telegram_file_source', 'source'),
+    )
+
+    def __repr__(self) -> str:
+        return f'Telegram_file(file_id={self.file_id}, file_unique_id={self.file_unique_id}, kind={self.kind}, file_size={self.file_size}, source={self.source}, creation_date={self.creation_date})'
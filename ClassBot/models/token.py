@@ -1,7 +1,7 @@
 import datetime
 from typing import TYPE_CHECKING, Optional, List
 
-from sqlalchemy import ForeignKey, DateTime
+from sqlalchemy import ForeignKey, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
@@ -46,5 +46,10 @@ class Token(Base):
     # One-to-one relationship with activity (delete activity if token is deleted)
     activity: Mapped[Optional["Activity"]] = relationship(back_populates='token', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # tokens are joined and filtered by classroom in most listings
+        Index('ix_token_classroom_token_type', 'classroom_id', 'token_type_id'),
+    )
+
     def __repr__(self) -> str:
         return f'Token(id={self.id}, token_type_id={self.token_type_id}, classroom={self.classroom_id}, teacher_creator_id={self.teacher_creator_id}, name={self.name}, description={self.description}, creation_date={self.creation_date}, image_url={self.image_url})'
@@ -1,7 +1,7 @@
 import datetime
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import DateTime
+from sqlalchemy import DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
@@ -25,5 +25,10 @@ class User(Base):
     student: Mapped[Optional["Student"]] = relationship(back_populates="user", cascade="all, delete-orphan")
     teacher: Mapped[Optional["Teacher"]] = relationship(back_populates="user", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # users are looked up by chat id on almost every update
+        Index('ix_user_telegram_chatid', 'telegram_chatid'),
+    )
+
     def __repr__(self) -> str:
         return f'User(id={self.id}, fullname={self.fullname}, telegram_chatid={self.telegram_chatid}, creation_date={self.creation_date})'
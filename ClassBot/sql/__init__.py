@@ -1,23 +1,251 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.schema import CreateColumn, CreateTable
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker, Session, object_session
 
 from utils.logger import logger
 from models.base import Base
 from models.token_type import Token_type
 
 
+# database settings, see the [database] section of config.ini
+config = ConfigParser()
+config.read("config.ini")
+DATABASE_URL = config.get("database", "URL", fallback="sqlite:///classbot.db")
+ECHO = config.getboolean("database", "ECHO", fallback=False)
+POOL_SIZE = config.getint("database", "POOL_SIZE", fallback=5)
+# pragmas applied to every new sqlite connection. Empty values are skipped.
+SQLITE_PRAGMAS = {
+    "journal_mode": config.get("database", "JOURNAL_MODE", fallback="WAL"),
+    "synchronous": config.get("database", "SYNCHRONOUS", fallback="NORMAL"),
+    "cache_size": config.get("database", "CACHE_SIZE", fallback="-64000"),
+    "mmap_size": config.get("database", "MMAP_SIZE", fallback="268435456"),
+    "busy_timeout": config.get("database", "BUSY_TIMEOUT", fallback="5000"),
+    "temp_store": config.get("database", "TEMP_STORE", fallback="MEMORY"),
+}
+# in-memory caches, see the [cache] section of config.ini
+IDENTITY_CACHE_SIZE = config.getint("cache", "IDENTITY_SIZE", fallback=4096)
+IDENTITY_CACHE_TTL = config.getint("cache", "IDENTITY_TTL", fallback=600)
+SUMMARY_CACHE_SIZE = config.getint("cache", "SUMMARY_SIZE", fallback=1024)
+SUMMARY_CACHE_TTL = config.getint("cache", "SUMMARY_TTL", fallback=3600)
+FILE_CACHE_SIZE = config.getint("cache", "FILE_SIZE", fallback=4096)
+FILE_CACHE_TTL = config.getint("cache", "FILE_TTL", fallback=86400)
+
+
+# session of the unit of work open in the current context, if any
+_current_unit_of_work = contextvars.ContextVar("unit_of_work", default=None)
+
+
+class _UnitOfWorkSession:
+    """ Hands the session of the open unit of work to the sql helpers. Leaving
+    the with block doesn't close it and commit() only flushes, the unit of work
+    commits everything once when it ends. """
+    def __init__(self, s: Session) -> None:
+        self._session = s
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def commit(self):
+        self._session.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+def session():
+    """ Returns a new session, or the session of the current unit of work if
+    one is open. sql helpers use it as `with session() as s:` """
+    s = _current_unit_of_work.get()
+    if s is not None:
+        return _UnitOfWorkSession(s)
+    return _session_factory()
+
+@contextmanager
+def unit_of_work():
+    """ Opens a session shared by every sql helper called inside the with block
+    (also through run_sql) and commits it once at the end, or rolls everything
+    back if an exception is raised. Meant to wrap the database work of a single
+    update so multi-step operations are atomic. Nested calls join the open one.
+
+        with unit_of_work():
+            token_id = token_sql.add_token(...)
+            student_token_sql.add_student_token(student_id, token_id, value)
+    """
+    s = _current_unit_of_work.get()
+    if s is not None:
+        yield s
+        return
+    s = _session_factory()
+    reset_token = _current_unit_of_work.set(s)
+    try:
+        yield s
+        s.commit()
+        callbacks = s.info.pop("on_commit", [])
+    except BaseException:
+        s.rollback()
+        raise
+    finally:
+        _current_unit_of_work.reset(reset_token)
+        s.close()
+    for callback in callbacks:
+        callback()
+
+def on_commit(callback) -> None:
+    """ Runs callback once the changes made so far are committed: at the end of
+    the current unit of work, or right away if there is none. Dropped if the
+    unit of work is rolled back. Used to keep in-memory state in sync with the
+    database. """
+    s = _current_unit_of_work.get()
+    if s is None:
+        callback()
+    else:
+        s.info.setdefault("on_commit", []).append(callback)
+
+def on_delete_commit(model, callback) -> None:
+    """ Calls callback(id) for every row of model deleted through the ORM, also
+    in cascade, once the deletion is committed. """
+    def after_delete(mapper, connection, target):
+        deleted_id = target.id
+        event.listen(object_session(target), "after_commit", lambda s: callback(deleted_id), once=True)
+    event.listen(model, "after_delete", after_delete)
+
+# keeps IN (...) lists well below sqlite's bound parameter limit
+_LOAD_CHUNK_SIZE = 500
+
+def load_by_ids(model, ids, key=None) -> dict:
+    """ Returns {id: row} with the rows of model whose `key` column (id by
+    default) is in ids, using one IN (...) query. Missing ids are left out.
+    Rows already loaded are reused only inside a unit of work, which holds the
+    memo: outside one (the usual case for handlers that only read) every call
+    queries again, so wrap the screen in unit_of_work() to share the rows. """
+    column = getattr(model, key or "id")
+    ids = {id for id in ids if id is not None}
+    current = _current_unit_of_work.get()
+    memo = current.info.setdefault(("load_by_ids", model, column.key), {}) if current is not None else {}
+    missing = list(ids - memo.keys())
+    if missing:
+        with session() as s:
+            for i in range(0, len(missing), _LOAD_CHUNK_SIZE):
+                for row in s.query(model).filter(column.in_(missing[i:i + _LOAD_CHUNK_SIZE])):
+                    memo[getattr(row, column.key)] = row
+    return {id: memo[id] for id in ids if id in memo}
+
+# insert constructs with ON CONFLICT support, by dialect name
+_UPSERT_INSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def upsert_insert(bind, model):
+    """ Returns an insert into model for the dialect of bind (an engine or a
+    connection), which supports on_conflict_do_update(). """
+    return _UPSERT_INSERT[bind.dialect.name](model)
+
+# one worker per pooled connection, so queries never wait on the pool
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="classbot-sql")
+
+
+async def run_sql(func, *args, **kwargs):
+    """ Runs a blocking sql helper in the database thread pool and returns its
+    result, so handlers can await queries without stalling the event loop.
+    Example: await run_sql(classroom_sql.delete_classroom, classroom_id) """
+    loop = asyncio.get_running_loop()
+    # copy the context so context variables set by the handler are visible to the helper
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """ Connect event listener. Applies SQLITE_PRAGMAS to a new connection. """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        if value:
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+def _create_missing_indexes(engine):
+    """ create_all only creates the indexes of new tables, this adds the ones
+    declared on the models that are missing from an existing database. """
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except IntegrityError as e:
+                # a unique index over rows that are already duplicated, the bot
+                # works without it until the duplicates are removed
+                logger.warning(f"Could not create unique index {index.name}: {e.orig}")
+    logger.info("Created missing database indexes.")
+
+def _add_missing_columns(engine):
+    """ create_all doesn't change existing tables either, this adds the columns
+    declared on the models that are missing from an existing database. Only
+    for nullable columns or columns with a server default. """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.tables.values():
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and (column.nullable or column.server_default is not None):
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}")
+                    logger.info(f"Added column {table.name}.{column.name}.")
+
+def _rebuild_sqlite_tables(engine):
+    """ create_all doesn't change existing tables and sqlite can't alter a
+    column, this rebuilds, keeping their rows, the tables created before they
+    were declared with sqlite_autoincrement or before one of their columns
+    became nullable. Their indexes are created again by _create_missing_indexes. """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.tables.values():
+            ddl = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)).scalar()
+            if not ddl:
+                continue
+            autoincrement = table.dialect_options["sqlite"]["autoincrement"]
+            not_null = {column["name"] for column in inspector.get_columns(table.name) if not column["nullable"]}
+            if not (autoincrement and "AUTOINCREMENT" not in ddl.upper()) and not any(column.nullable and column.name in not_null for column in table.columns):
+                continue
+            columns = ", ".join(column.name for column in table.columns)
+            rebuilt = f"{table.name}_rebuilt"
+            create = str(CreateTable(table).compile(dialect=engine.dialect)).replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)
+            connection.exec_driver_sql(create)
+            connection.exec_driver_sql(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}")
+            connection.exec_driver_sql(f"DROP TABLE {table.name}")
+            connection.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {table.name}")
+            # AUTOINCREMENT doesn't reuse the ids of the rows moved to the
+            # archive of the table either, like pending_archive
+            archive = f"{table.name}_archive"
+            if autoincrement and archive in Base.metadata.tables:
+                last_id = connection.exec_driver_sql(f"SELECT max(id) FROM (SELECT id FROM {table.name} UNION ALL SELECT id FROM {archive})").scalar()
+                connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table.name,))
+                connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, last_id or 0))
+            logger.info(f"Rebuilt table {table.name}.")
+
 def _start():
     # set up database
-    engine = create_engine("sqlite:///classbot.db", echo=True)
+    engine = create_engine(DATABASE_URL, echo=ECHO, pool_size=POOL_SIZE)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
     logger.info("Created database engine.")
 
     Base.metadata.create_all(engine)
     logger.info("Created database tables.")
+    _add_missing_columns(engine)
+    if engine.dialect.name == "sqlite":
+        _rebuild_sqlite_tables(engine)
+    _create_missing_indexes(engine)
 
-    # Create a session factory
-    Session = sessionmaker(bind=engine)
+    # Create a session factory. Objects keep their state after commit, so the
+    # add_* helpers can return the generated id without another query.
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
 
-    return Session
+    return engine, Session
 
 def create_default_token_types(session):
     # at the start of the bot, create the default token types usable by the bot
@@ -29,7 +257,7 @@ def create_default_token_types(session):
         if not s.query(Token_type).filter(Token_type.type == "Miscelaneo").first():
             s.add(Token_type(type="Miscelaneo", hidden=True))
         if not s.query(Token_type).filter(Token_type.type == "Propuesta de título").first():
-            s.add(Token_type(type="Propuesta de título", hidden=True)) 
+            s.add(Token_type(type="Propuesta de título", hidden=True))
         if not s.query(Token_type).filter(Token_type.type == "Intervención en clase").first():
             s.add(Token_type(type="Intervención en clase", hidden=True))
         if not s.query(Token_type).filter(Token_type.type == "Rectificación al profesor").first():
@@ -45,12 +273,19 @@ def create_default_token_types(session):
         if not s.query(Token_type).filter(Token_type.type == "Créditos otorgados directamente").first():
             s.add(Token_type(type="Créditos otorgados directamente", hidden=True))
         s.commit()
-        
+
 
 
 try:
-    session = _start()
+    engine, _session_factory = _start()
     create_default_token_types(session)
+    # token_types, activity_types and pending counts are served from memory
+    from sql import token_type_sql, activity_type_sql, pending_sql, credit_balance_sql
+    token_type_sql.load_registry()
+    activity_type_sql.load_registry()
+    pending_sql.load_counters()
+    # credit totals are kept in credit_balance
+    credit_balance_sql.init_balances()
 except Exception as e:
     logger.exception(f"failed to connect due to {e}")
     raise e
@@ -3,7 +3,7 @@ import datetime
 from sqlalchemy import select
 
 from models.activity import Activity
-from sql import session
+from sql import session, load_by_ids
 import sql.token_sql as token_sql
 import sql.activity_type_sql as activity_type_sql
 
@@ -18,6 +18,15 @@ def get_activity_by_token_id(token_id: int) -> Activity | None:
     with session() as s:
         return s.query(Activity).filter(Activity.token_id == token_id).first()
 
+def get_activities_by_ids(ids) -> dict[int, Activity]:
+    """ Returns a dict id -> activity object for the given ids, in one query. """
+    return load_by_ids(Activity, ids)
+
+def get_activities_by_token_ids(token_ids) -> dict[int, Activity]:
+    """ Returns a dict token_id -> activity object for the given token ids, in one query.
+    Tokens without an activity are left out. """
+    return load_by_ids(Activity, token_ids, key="token_id")
+
 def get_activities_by_activity_type_id(activity_type_id: int) -> list[Activity]:
     """ Returns a list of activity objects with the given activity_type_id."""
     with session() as s:
@@ -30,19 +39,20 @@ def add_activity(
         description: str = None,
         FileID: str = None,
         deadline: datetime = None,    
-    ):
-    """ Adds a new activity to the database. """
+    ) -> int:
+    """ Adds a new activity to the database. Returns its id. """
     with session() as s:
         token_type_id = activity_type_sql.get_activity_type(activity_type_id).token_type_id
-        token_sql.add_token(name, token_type_id, classroom_id, description=description)
-        token_id = token_sql.get_last_token().id
-        s.add(Activity(
+        token_id = token_sql.add_token(name, token_type_id, classroom_id, description=description)
+        activity = Activity(
             activity_type_id=activity_type_id,
             token_id=token_id,
             FileID=FileID,
             submission_deadline=deadline,
-        ))
+        )
+        s.add(activity)
         s.commit()
+        return activity.id
 
 def update_name(id: int, name: str):
     """ Updates the name of the activity with the given id. """
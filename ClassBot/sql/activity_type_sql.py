@@ -1,14 +1,53 @@
 from sqlalchemy import select
 
 from models.activity_type import Activity_type
-from sql import session
+from sql import session, on_commit, on_delete_commit
 import sql.token_type_sql as token_type_sql
 
 
+# In-memory registry of every activity_type, loaded at startup by load_registry()
+# and kept in sync by the functions of this module that change activity_types.
+_by_id: dict[int, Activity_type] = {}
+_by_token_type_id: dict[int, Activity_type] = {}
+
+
+def load_registry() -> None:
+    """ (Re)loads every activity_type from the database into the registry. """
+    with session() as s:
+        activity_types = s.query(Activity_type).order_by(Activity_type.id).all()
+    _by_id.clear()
+    _by_token_type_id.clear()
+    for activity_type in activity_types:
+        _by_id[activity_type.id] = activity_type
+        _by_token_type_id[activity_type.token_type_id] = activity_type
+
+def _refresh(id: int) -> None:
+    """ Reloads the activity_type with the given id into the registry, or drops
+    it if it no longer exists. """
+    with session() as s:
+        activity_type = s.query(Activity_type).filter(Activity_type.id == id).first()
+    old = _by_id.get(id)
+    if old is not None:
+        _by_token_type_id.pop(old.token_type_id, None)
+    if activity_type is None:
+        _by_id.pop(id, None)
+    else:
+        _by_id[id] = activity_type
+        _by_token_type_id[activity_type.token_type_id] = activity_type
+
+def _forget(id: int) -> None:
+    """ Drops a deleted activity_type from the registry. """
+    activity_type = _by_id.pop(id, None)
+    if activity_type is not None:
+        _by_token_type_id.pop(activity_type.token_type_id, None)
+
+# activity_types are deleted in cascade with their token_type
+on_delete_commit(Activity_type, _forget)
+
+
 def get_activity_type(id: int) -> Activity_type | None:
     """ Returns an activity_type object with the given id. None if not found."""
-    with session() as s:
-        return s.query(Activity_type).filter(Activity_type.id == id).first()
+    return _by_id.get(id)
 
 def get_activity_type_by_type(type: str, classroom_id: int) -> Activity_type | None:
     """ Returns the first activity_type object with the token_type_id of the token
@@ -19,21 +58,18 @@ def get_activity_type_by_type(type: str, classroom_id: int) -> Activity_type | N
     token_type = token_type_sql.get_token_type_by_type(type, classroom_id)
     if token_type is None:
         return None
-    with session() as s:
-        return s.query(Activity_type).filter(Activity_type.token_type_id == token_type.id).first()
+    return _by_token_type_id.get(token_type.id)
 
 def get_activity_type_by_token_type_id(token_type_id: int) -> Activity_type | None:
     """ Returns the first activity_type object with the given token_type_id. None if not found.
         Since the token_type_id is unique, this function will return only one object."""
-    with session() as s:
-        return s.query(Activity_type).filter(Activity_type.token_type_id == token_type_id).first()
+    return _by_token_type_id.get(token_type_id)
 
 def get_activity_types(classroom_id: int, include_hidden: bool = False) -> list[Activity_type]:
     """ Return a list of activity_type objects with the token_type_id of the token_types
         with the given classroom_id. If include_hidden is True, then also include hidden activity_types."""
-    token_types = token_type_sql.get_token_types(classroom_id, include_hidden)
-    with session() as s:
-        return s.query(Activity_type).filter(Activity_type.token_type_id.in_([token_type.id for token_type in token_types])).all()
+    token_type_ids = {token_type.id for token_type in token_type_sql.get_token_types(classroom_id, include_hidden)}
+    return [activity_type for activity_type in list(_by_id.values()) if activity_type.token_type_id in token_type_ids]
 
 def add_activity_type(
         type: str, 
@@ -43,20 +79,23 @@ def add_activity_type(
         guild_activity: bool = False,
         single_submission: bool = False,
         FileID: str = None,
-    ):
+    ) -> int:
     """ Adds a new activity_type to the database. 
-    Creates a new token_type and adds it to the database, then assigns it to the activity_type."""
+    Creates a new token_type and adds it to the database, then assigns it to the activity_type.
+    Returns the id of the activity_type."""
     with session() as s:
-        token_type_sql.add_token_type(type, classroom_id, hidden)
-        token_type = token_type_sql.get_token_type_by_type(type, classroom_id)
-        s.add(Activity_type(
-            token_type_id=token_type.id,
+        token_type_id = token_type_sql.add_token_type(type, classroom_id, hidden)
+        activity_type = Activity_type(
+            token_type_id=token_type_id,
             description=description,
             guild_activity=guild_activity,
             single_submission=single_submission,
             FileID=FileID,
-        ))
+        )
+        s.add(activity_type)
         s.commit()
+    on_commit(lambda: _refresh(activity_type.id))
+    return activity_type.id
 
 def update_description(id: int, description: str):
     """ Updates the description of the activity_type with the given id."""
@@ -64,6 +103,7 @@ def update_description(id: int, description: str):
         activity_type = s.query(Activity_type).filter(Activity_type.id == id).first()
         activity_type.description = description
         s.commit()
+    on_commit(lambda: _refresh(id))
 
 def update_file(id: int, FileID: str):
     """ Updates the FileID of the activity_type with the given id."""
@@ -71,6 +111,7 @@ def update_file(id: int, FileID: str):
         activity_type = s.query(Activity_type).filter(Activity_type.id == id).first()
         activity_type.FileID = FileID
         s.commit()
+    on_commit(lambda: _refresh(id))
 
 def hide_activity_type(id: int):
     """ Hides the token_type associated with the activity_type with the given id."""
@@ -1,7 +1,10 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from models.classroom import Classroom
-from sql import session
+from models.teacher import Teacher
+from models.student import Student
+from sql import session, on_commit
+import sql.user_sql as user_sql
 
 
 def get_classroom(id: int) -> Classroom | None:
@@ -34,11 +37,19 @@ def get_teacher_notification_channel_chat_id(classroom_id: int) -> str:
     with session() as s:
         return s.query(Classroom).filter(Classroom.id == classroom_id).first().teacher_notification_channel
 
-def add_classroom(course_id: int, name: str, teacher_auth: str, student_auth: str) -> None:
-    """ Adds a new classroom to the database. """
+def get_notification_settings(classroom_id: int) -> tuple[str | None, bool]:
+    """ Returns the teacher_notification_channel of the given classroom and
+    whether its notifications are sent as digests. """
     with session() as s:
-        s.add(Classroom(course_id=course_id, name=name, teacher_auth=teacher_auth, student_auth=student_auth))
+        return s.execute(select(Classroom.teacher_notification_channel, Classroom.notification_digest).where(Classroom.id == classroom_id)).one()._tuple()
+
+def add_classroom(course_id: int, name: str, teacher_auth: str, student_auth: str) -> int:
+    """ Adds a new classroom to the database. Returns its id. """
+    with session() as s:
+        classroom = Classroom(course_id=course_id, name=name, teacher_auth=teacher_auth, student_auth=student_auth)
+        s.add(classroom)
         s.commit()
+        return classroom.id
 
 def update_classroom_name(classroom_id: int, new_name: str):
     """ Updates the classroom name """
@@ -62,11 +73,29 @@ def update_classroom_teacher_notifications_channel(classroom_id: int, teacher_no
         s.query(Classroom).filter(Classroom.id == classroom_id).update({"teacher_notification_channel": teacher_notifications_channel})
         s.commit()
 
+def update_classroom_notification_digest(classroom_id: int, notification_digest: bool):
+    """ Updates whether the classroom notifications are sent as digests """
+    with session() as s:
+        s.query(Classroom).filter(Classroom.id == classroom_id).update({"notification_digest": notification_digest})
+        s.commit()
+
 def delete_classroom(classroom_id: int) -> None:
-    """ Deletes the classroom from the database. """
+    """ Deletes the classroom from the database. The teachers and students that
+    had it as their active classroom are left without one. """
     with session() as s:
+        # one update per table instead of one per user
+        user_ids = s.scalars(
+            update(Teacher).where(Teacher.active_classroom_id == classroom_id).values(active_classroom_id=None).returning(Teacher.id)
+        ).all()
+        user_ids += s.scalars(
+            update(Student).where(Student.active_classroom_id == classroom_id).values(active_classroom_id=None).returning(Student.id)
+        ).all()
         # get classroom
         classroom = s.execute(select(Classroom).where(Classroom.id == classroom_id)).scalar_one()
         # delete classroom
         s.delete(classroom)
         s.commit()
+    def invalidate_identities():
+        for user_id in user_ids:
+            user_sql.invalidate_identity(user_id)
+    on_commit(invalidate_identities)
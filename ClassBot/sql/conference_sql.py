@@ -18,11 +18,13 @@ def get_conferences_by_classroom(classroom_id: int) -> list[Conference]:
         return s.query(Conference).filter(Conference.classroom_id == classroom_id).order_by(Conference.date).all()
 
 
-def add_conference(classroom_id: int, name: str, date: datetime, fileID: str = None) -> None:
-    """ Adds a new conference to the database. """
+def add_conference(classroom_id: int, name: str, date: datetime, fileID: str = None) -> int:
+    """ Adds a new conference to the database. Returns its id. """
     with session() as s:
-        s.add(Conference(classroom_id=classroom_id, name=name, date=date, fileID=fileID))
+        conference = Conference(classroom_id=classroom_id, name=name, date=date, fileID=fileID)
+        s.add(conference)
         s.commit()
+        return conference.id
 
 def update_conference_name(id: int, name: str) -> None:
     """ Updates the name of the conference with the given id. """
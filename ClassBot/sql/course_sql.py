@@ -20,11 +20,13 @@ def get_courses_by_teacher(teacher_id: int) -> list[Course]:
         return s.query(Course).filter(Course.teacher_id == teacher_id).all()
 
 
-def add_course(teacher_id: int, name: str) -> None:
-    """ Adds a new course to the database. """
+def add_course(teacher_id: int, name: str) -> int:
+    """ Adds a new course to the database. Returns its id. """
     with session() as s:
-        s.add(Course(teacher_id=teacher_id, name=name))
+        course = Course(teacher_id=teacher_id, name=name)
+        s.add(course)
         s.commit()
+        return course.id
 
 def update_course_name(course_id: int, new_name: str) -> None:
     """ Updates the course name. """
@@ -0,0 +1,307 @@
+import datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, update, delete, literal, event, inspect, func, and_, tuple_, true
+from sqlalchemy.orm import Session, object_session
+
+from models.credit_balance import Credit_balance, STUDENT_BALANCE, GUILD_BALANCE
+from models.student_token import Student_token
+from models.student_classroom import Student_classroom
+from models.guild_token import Guild_token
+from models.guild import Guild
+from models.token import Token
+from models.token_type import Token_type
+from models.user import User
+from sql import session, upsert_insert, SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL
+from utils.cache import TTLCache
+
+
+class LeaderboardRow(NamedTuple):
+    """ A student (or guild) in the leaderboard of a classroom. """
+    rank: int       # students with the same total share the rank
+    id: int         # student_id or guild_id
+    name: str       # fullname of the student or name of the guild
+    total: int      # credits in the classroom
+    delta: int      # credits earned in the last RECENT_DAYS days
+
+# days counted in the delta of the leaderboard
+RECENT_DAYS = 7
+
+class CreditSummaryRow(NamedTuple):
+    """ Credits of a student (or guild) of one token type in a day or week. """
+    period: datetime.date   # the day, or the monday of the week
+    token_type: str
+    total: int
+    count: int              # number of tokens
+
+# ("student" or "guild", owner id, classroom_id, period) -> list of CreditSummaryRow.
+# Entries of an owner are dropped when its tokens change.
+summary_cache = TTLCache(maxsize=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL)
+
+
+def get_student_balance(student_id: int, classroom_id: int) -> int:
+    """ Returns the total credits of the student in the classroom. """
+    with session() as s:
+        return s.scalar(select(Credit_balance.value).where(Credit_balance.classroom_id == classroom_id, Credit_balance.student_id == student_id)) or 0
+
+def get_guild_balance(guild_id: int, classroom_id: int) -> int:
+    """ Returns the total credits of the guild in the classroom. """
+    with session() as s:
+        return s.scalar(select(Credit_balance.value).where(Credit_balance.classroom_id == classroom_id, Credit_balance.guild_id == guild_id)) or 0
+
+def get_student_balances(classroom_id: int) -> dict[int, int]:
+    """ Returns a dict student_id -> total credits of the students of the
+    classroom that have any, in one query. """
+    with session() as s:
+        return dict(s.execute(select(Credit_balance.student_id, Credit_balance.value).where(Credit_balance.classroom_id == classroom_id, Credit_balance.student_id != None)).all())
+
+def get_guild_balances(classroom_id: int) -> dict[int, int]:
+    """ Returns a dict guild_id -> total credits of the guilds of the classroom
+    that have any, in one query. """
+    with session() as s:
+        return dict(s.execute(select(Credit_balance.guild_id, Credit_balance.value).where(Credit_balance.classroom_id == classroom_id, Credit_balance.guild_id != None)).all())
+
+def _ranked(s, classroom_id: int, model):
+    """ Returns a subquery with the leaderboard of the students (model is
+    Student_token) or guilds (Guild_token) of the classroom, as the columns of
+    LeaderboardRow. Totals come from credit_balance and the delta from the
+    tokens of the last RECENT_DAYS days, ranked by the database. """
+    # the token dates are set by the database, in UTC on sqlite, count the days with its clock
+    since = s.scalar(select(func.now())) - datetime.timedelta(days=RECENT_DAYS)
+    owner_column = Student_token.student_id if model is Student_token else Guild_token.guild_id
+    recent = (
+        select(owner_column.label("id"), func.sum(model.value).label("delta"))
+        .join(Token, Token.id == model.token_id)
+        .where(Token.classroom_id == classroom_id, model.creation_date >= since)
+        .group_by(owner_column)
+        .subquery()
+    )
+    if model is Student_token:
+        id_column, name_column, balance_column = Student_classroom.student_id, User.fullname, Credit_balance.student_id
+        members = select().select_from(Student_classroom).join(User, User.id == Student_classroom.student_id).where(Student_classroom.classroom_id == classroom_id)
+    else:
+        id_column, name_column, balance_column = Guild.id, Guild.name, Credit_balance.guild_id
+        members = select().select_from(Guild).where(Guild.classroom_id == classroom_id)
+    total = func.coalesce(Credit_balance.value, 0)
+    return (
+        members.add_columns(
+            func.rank().over(order_by=total.desc()).label("rank"),
+            id_column.label("id"),
+            name_column.label("name"),
+            total.label("total"),
+            func.coalesce(recent.c.delta, 0).label("delta"),
+        )
+        .outerjoin(Credit_balance, and_(Credit_balance.classroom_id == classroom_id, balance_column == id_column))
+        .outerjoin(recent, recent.c.id == id_column)
+        .subquery()
+    )
+
+def _leaderboard(classroom_id: int, model, after: tuple | None, limit: int | None, before: tuple | None = None) -> list[LeaderboardRow]:
+    with session() as s:
+        ranked = _ranked(s, classroom_id, model)
+        key = tuple_(ranked.c.rank, ranked.c.id)
+        if before is not None:  # read backwards from the cursor, reversed below
+            query = select(ranked).order_by(ranked.c.rank.desc(), ranked.c.id.desc()).where(key < tuple_(*before))
+        else:
+            query = select(ranked).order_by(ranked.c.rank, ranked.c.id)
+        if after is not None:
+            query = query.where(key > tuple_(*after))
+        if limit is not None:
+            query = query.limit(limit)
+        rows = [LeaderboardRow(*row) for row in s.execute(query)]
+    return rows[::-1] if before is not None else rows
+
+def get_leaderboard(classroom_id: int, after: tuple = None, limit: int = None, before: tuple = None) -> list[LeaderboardRow]:
+    """ Returns the students of the classroom ranked by credits, in one query.
+    Keyset paginated: up to limit rows after the cursor `after`, or the limit
+    rows before the cursor `before`, see leaderboard_row_key. Only those rows
+    leave the database. """
+    return _leaderboard(classroom_id, Student_token, after, limit, before)
+
+def get_guild_leaderboard(classroom_id: int, after: tuple = None, limit: int = None, before: tuple = None) -> list[LeaderboardRow]:
+    """ Like get_leaderboard, for the guilds of the classroom. """
+    return _leaderboard(classroom_id, Guild_token, after, limit, before)
+
+def leaderboard_row_key(row: LeaderboardRow) -> tuple:
+    """ Returns the cursor of a leaderboard row. """
+    return (row.rank, row.id)
+
+def get_student_rank(student_id: int, classroom_id: int) -> LeaderboardRow | None:
+    """ Returns the leaderboard row of the student in the classroom. None if
+    the student isn't in it. """
+    with session() as s:
+        ranked = _ranked(s, classroom_id, Student_token)
+        row = s.execute(select(ranked).where(ranked.c.id == student_id)).first()
+    return LeaderboardRow(*row) if row else None
+
+def count_leaderboard(classroom_id: int) -> int:
+    """ Returns the number of students in the leaderboard of the classroom. """
+    with session() as s:
+        return s.scalar(select(func.count()).select_from(Student_classroom).where(Student_classroom.classroom_id == classroom_id))
+
+def count_guild_leaderboard(classroom_id: int) -> int:
+    """ Returns the number of guilds in the leaderboard of the classroom. """
+    with session() as s:
+        return s.scalar(select(func.count(Guild.id)).where(Guild.classroom_id == classroom_id))
+
+def _period_start(bind, column, period: str):
+    """ Returns the expression of the first day of the day or week of column. """
+    if bind.dialect.name == "sqlite":
+        # 'weekday 0' moves to the next sunday (or stays), 6 days before is its monday
+        return func.date(column) if period == "day" else func.date(column, "weekday 0", "-6 days")
+    return func.date_trunc(period, column)
+
+def _as_date(value) -> datetime.date:
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+def get_credit_summary(classroom_id: int, student_id: int = None, guild_id: int = None, period: str = "week") -> list[CreditSummaryRow]:
+    """ Returns the credits of the student (or guild) in the classroom
+    grouped by day or week (period is "day" or "week") and token type, from
+    the most recent. Computed by the database and cached until the tokens of
+    the student (or guild) change. """
+    if period not in ("day", "week"):
+        raise ValueError("Invalid period")
+    model, owner_id = (Student_token, student_id) if student_id is not None else (Guild_token, guild_id)
+    key = ("student" if model is Student_token else "guild", owner_id, classroom_id, period)
+    rows = summary_cache.get(key)
+    if rows is not None:
+        return rows
+    owner_column = Student_token.student_id if model is Student_token else Guild_token.guild_id
+    with session() as s:
+        start = _period_start(s.get_bind(), model.creation_date, period).label("period")
+        query = (
+            select(start, Token_type.type, func.sum(model.value), func.count())
+            .join(Token, Token.id == model.token_id)
+            .join(Token_type, Token_type.id == Token.token_type_id)
+            .where(owner_column == owner_id, Token.classroom_id == classroom_id)
+            .group_by(start, Token_type.type)
+            .order_by(start.desc(), Token_type.type)
+        )
+        rows = [CreditSummaryRow(_as_date(period_start), token_type, total, count) for period_start, token_type, total, count in s.execute(query)]
+    summary_cache.set(key, rows)
+    return rows
+
+def _summary_changed(s, kind: str, owner_id: int | None) -> None:
+    """ Records that the summaries of an owner (all of kind if owner_id is
+    None) are stale, they are dropped once the session commits. """
+    s.info.setdefault("credit_summaries", set()).add((kind, owner_id))
+
+@event.listens_for(Session, "after_commit")
+def _drop_summaries(s):
+    for kind, owner_id in s.info.pop("credit_summaries", ()):
+        summary_cache.pop_where(lambda key, rows: key[0] == kind and owner_id in (None, key[1]))
+
+@event.listens_for(Session, "after_soft_rollback")
+def _keep_summaries(s, previous_transaction):
+    s.info.pop("credit_summaries", None)
+
+
+# The balances are changed in the same flush as the student_token and
+# guild_token rows, also when they are deleted in cascade, so they commit or
+# roll back together. Use the ORM to add or remove tokens.
+_OWNERS = {
+    Student_token: (Credit_balance.student_id, STUDENT_BALANCE),
+    Guild_token: (Credit_balance.guild_id, GUILD_BALANCE),
+}
+
+def _add(connection, model, owner_id, token_id: int, value: int) -> None:
+    """ Adds value to the balance of the owner in the classroom of the token,
+    creating the balance if needed, in one statement. owner_id can also be a
+    select of owner ids, to change several balances at once. """
+    owner, owner_where = _OWNERS[model]
+    if isinstance(owner_id, int):
+        rows = select(Token.classroom_id, literal(owner_id), literal(value))
+    else:
+        owner_ids = owner_id.subquery()
+        rows = select(Token.classroom_id, owner_ids.c[0], literal(value)).join_from(Token, owner_ids, true())
+    stmt = upsert_insert(connection, Credit_balance).from_select(
+        [Credit_balance.classroom_id, owner, Credit_balance.value],
+        rows.where(Token.id == token_id),
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=[Credit_balance.classroom_id, owner],
+        index_where=owner_where,
+        set_={"value": Credit_balance.value + stmt.excluded.value},
+    ))
+
+def add_to_student_balances(s, student_ids, token_id: int, value: int) -> None:
+    """ Adds value to the balances of the students selected by student_ids (a
+    select of ids), for student_token rows of token_id inserted without the ORM
+    in the session s. Must run in the same transaction as the insert. """
+    _add(s.connection(), Student_token, student_ids, token_id, value)
+    _summary_changed(s, "student", None)
+
+def _subtract(connection, model, owner_id: int, token_id: int, value: int) -> None:
+    """ Subtracts value from the balance of the owner in the classroom of the
+    token. Never creates a balance, it may have been deleted with its classroom. """
+    owner, _ = _OWNERS[model]
+    classroom_id = select(Token.classroom_id).where(Token.id == token_id).scalar_subquery()
+    connection.execute(update(Credit_balance).where(Credit_balance.classroom_id == classroom_id, owner == owner_id).values(value=Credit_balance.value - value))
+
+def _owner_id(target) -> int:
+    return target.student_id if isinstance(target, Student_token) else target.guild_id
+
+def _changed(target) -> None:
+    _summary_changed(object_session(target), "student" if isinstance(target, Student_token) else "guild", _owner_id(target))
+
+@event.listens_for(Student_token, "after_insert")
+@event.listens_for(Guild_token, "after_insert")
+def _after_insert(mapper, connection, target):
+    _add(connection, type(target), _owner_id(target), target.token_id, target.value)
+    _changed(target)
+
+@event.listens_for(Student_token, "after_update")
+@event.listens_for(Guild_token, "after_update")
+def _after_update(mapper, connection, target):
+    history = inspect(target).attrs.value.history
+    if history.deleted:
+        _add(connection, type(target), _owner_id(target), target.token_id, target.value - history.deleted[0])
+        _changed(target)
+
+@event.listens_for(Student_token, "after_delete")
+@event.listens_for(Guild_token, "after_delete")
+def _after_delete(mapper, connection, target):
+    _subtract(connection, type(target), _owner_id(target), target.token_id, target.value)
+    _changed(target)
+
+
+def _ledger_totals():
+    """ Returns the queries summing the student_token and guild_token rows by
+    classroom and owner, the source the balances are built from. """
+    students = select(Token.classroom_id, Student_token.student_id, func.sum(Student_token.value)).join(Token, Token.id == Student_token.token_id).group_by(Token.classroom_id, Student_token.student_id)
+    guilds = select(Token.classroom_id, Guild_token.guild_id, func.sum(Guild_token.value)).join(Token, Token.id == Guild_token.token_id).group_by(Token.classroom_id, Guild_token.guild_id)
+    return students, guilds
+
+def rebuild_balances() -> int:
+    """ Rebuilds every balance from the student_token and guild_token rows, in
+    one transaction. Returns how many balances were written. """
+    students, guilds = _ledger_totals()
+    with session() as s:
+        s.execute(delete(Credit_balance))
+        count = s.execute(Credit_balance.__table__.insert().from_select(["classroom_id", "student_id", "value"], students)).rowcount
+        count += s.execute(Credit_balance.__table__.insert().from_select(["classroom_id", "guild_id", "value"], guilds)).rowcount
+        s.commit()
+    return count
+
+def init_balances() -> None:
+    """ Builds the balances of a database created before the credit_balance
+    table. Does nothing once they exist. """
+    with session() as s:
+        missing = s.scalar(select(Credit_balance.id).limit(1)) is None and (
+            s.scalar(select(Student_token.token_id).limit(1)) is not None or s.scalar(select(Guild_token.token_id).limit(1)) is not None
+        )
+    if missing:
+        rebuild_balances()
+
+def check_balances() -> list[tuple[int, int | None, int | None, int, int]]:
+    """ Compares every balance with the sum of its ledger. Returns the ones that
+    differ as (classroom_id, student_id, guild_id, balance, ledger total). A
+    balance missing on either side counts as 0. """
+    students, guilds = _ledger_totals()
+    with session() as s:
+        expected = {(classroom_id, student_id, None): total for classroom_id, student_id, total in s.execute(students)}
+        expected.update({(classroom_id, None, guild_id): total for classroom_id, guild_id, total in s.execute(guilds)})
+        stored = {(classroom_id, student_id, guild_id): value for classroom_id, student_id, guild_id, value in s.execute(select(Credit_balance.classroom_id, Credit_balance.student_id, Credit_balance.guild_id, Credit_balance.value))}
+    return [key + (stored.get(key, 0), expected.get(key, 0)) for key in sorted(expected.keys() | stored.keys(), key=str) if stored.get(key, 0) != expected.get(key, 0)]
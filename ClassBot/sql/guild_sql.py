@@ -3,7 +3,7 @@ import datetime
 from sqlalchemy import select
 
 from models.guild import Guild
-from sql import session
+from sql import session, load_by_ids
 
 
 def get_guild(id: int) -> Guild | None:
@@ -11,6 +11,10 @@ def get_guild(id: int) -> Guild | None:
     with session() as s:
         return s.query(Guild).filter(Guild.id == id).first()
 
+def get_guilds_by_ids(ids) -> dict[int, Guild]:
+    """ Returns a dict id -> guild object for the given ids, in one query. """
+    return load_by_ids(Guild, ids)
+
 def get_guilds_by_classroom(classroom_id: int) -> list[Guild]:
     """ Returns a list of guilds belonging to the given classroom. 
     order by name"""
@@ -22,11 +26,13 @@ def get_guild_by_student(student_id: int, classroom_id: int) -> Guild | None:
     with session() as s:
         return s.query(Guild).join(Guild.students).filter(Guild.classroom_id == classroom_id, Guild.students.any(student_id=student_id)).first()
 
-def add_guild(classroom_id: int, name: str) -> None:
-    """ Adds a new guild to the database. """
+def add_guild(classroom_id: int, name: str) -> int:
+    """ Adds a new guild to the database. Returns its id. """
     with session() as s:
-        s.add(Guild(classroom_id=classroom_id, name=name))
+        guild = Guild(classroom_id=classroom_id, name=name)
+        s.add(guild)
         s.commit()
+        return guild.id
 
 def update_guild_name(id: int, name: str) -> None:
     """ Updates the name of the guild with the given id. """
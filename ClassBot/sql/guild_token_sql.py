@@ -1,10 +1,10 @@
-from sqlalchemy import select
+from sqlalchemy import select, insert, literal, exists as sql_exists
 
 from models.guild_token import Guild_token
+from models.student_guild import Student_guild
+from models.student_token import Student_token
 from models.token import Token
-from sql import session
-import sql.student_sql as student_sql
-import sql.student_token_sql as student_token_sql
+from sql import session, credit_balance_sql
 
 
 def get_guild_ids(token_id: int) -> list[int]:
@@ -19,12 +19,18 @@ def get_token_ids(guild_id: int) -> list[int]:
 
 def add_guild_token(guild_id: int, token_id: int, value: int, teacher_id: int = None) -> None:
     """ Adds a new guild_token to the database. Needs to be given to its students"""
+    # students of the guild that don't have the token yet, since moving students between guilds is allowed
+    members = select(Student_guild.student_id).where(
+        Student_guild.guild_id == guild_id,
+        ~sql_exists().where(Student_token.student_id == Student_guild.student_id, Student_token.token_id == token_id),
+    )
     with session() as s:
-        # add the token to the students of the guild
-        for student in student_sql.get_students_by_guild(guild_id):
-            # check if the student already has the token, since moving students between guilds is allowed
-            if not student_token_sql.exists(student.id, token_id):
-                student_token_sql.add_student_token(student_id=student.id, token_id=token_id, value=value, teacher_id=teacher_id)
+        # add the token to all of them at once, with their balances (the insert skips the ORM)
+        credit_balance_sql.add_to_student_balances(s, members, token_id, value)
+        s.execute(insert(Student_token).from_select(
+            [Student_token.student_id, Student_token.token_id, Student_token.teacher_id, Student_token.value],
+            members.with_only_columns(Student_guild.student_id, literal(token_id), literal(teacher_id), literal(value)),
+        ))
         # add the guild_token to the database
         s.add(Guild_token(
             guild_id=guild_id,
@@ -52,9 +58,9 @@ def get_guild_tokens_by_guild_and_classroom(guild_id: int, classroom_id: int) ->
 
 def get_total_value_by_classroom(guild_id: int, classroom_id: int) -> int:
     """ Returns the total value of the guild_token rows where the classroom_id
-    of the token with the token_id in guild_token is the given classroom_id. """
-    with session() as s:
-        return sum([guild_token.value for guild_token in s.query(Guild_token).filter(Guild_token.guild_id == guild_id).join(Token).filter(Token.classroom_id == classroom_id).all()])
+    of the token with the token_id in guild_token is the given classroom_id.
+    Read from credit_balance. """
+    return credit_balance_sql.get_guild_balance(guild_id, classroom_id)
 
 def remove_token(guild_id: int, token_id: int) -> None:
     """ Removes the token from the guild. """
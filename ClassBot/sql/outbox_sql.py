@@ -0,0 +1,90 @@
+import datetime
+
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.sql import func
+
+from models.outbox import Outbox
+from sql import session, upsert_insert
+
+
+def enqueue(chat_id: int, text: str, parse_mode: str = None, reply_markup=None, dedupe_key: str = None) -> None:
+    """ Adds a message for the outbox worker to send. Called inside the unit of
+    work of the change it tells about, so it is committed (or rolled back)
+    with it. A message with the dedupe_key of an earlier one is ignored. """
+    enqueue_many([chat_id], text, parse_mode, reply_markup, dedupe_key)
+
+def enqueue_many(chat_ids: list[int], text: str, parse_mode: str = None, reply_markup=None, dedupe_key: str = None) -> None:
+    """ Adds the same message for several chats with one insert. The dedupe_key,
+    if given, is made unique per chat. """
+    enqueue_each([(chat_id, text, f"{dedupe_key}:{chat_id}" if dedupe_key else None) for chat_id in chat_ids], parse_mode, reply_markup)
+
+def enqueue_each(messages: list[tuple[int, str, str | None]], parse_mode: str = None, reply_markup=None) -> None:
+    """ Adds different messages, given as (chat_id, text, dedupe_key), with one
+    insert. Like enqueue, a message with an existing dedupe_key is ignored. """
+    if not messages:
+        return
+    markup = reply_markup.to_json() if reply_markup else None
+    with session() as s:
+        s.execute(
+            upsert_insert(s.get_bind(), Outbox).on_conflict_do_nothing(index_elements=[Outbox.dedupe_key]),
+            [dict(chat_id=chat_id, text=text, parse_mode=parse_mode, reply_markup=markup, dedupe_key=dedupe_key) for chat_id, text, dedupe_key in messages],
+        )
+        s.commit()
+
+def get_due(limit: int) -> list[Outbox]:
+    """ Returns up to limit messages waiting to be sent, oldest first. """
+    with session() as s:
+        return s.scalars(
+            select(Outbox)
+            .where(Outbox.status == "PENDING", or_(Outbox.next_attempt.is_(None), Outbox.next_attempt <= func.now()))
+            .order_by(Outbox.id)
+            .limit(limit)
+        ).all()
+
+def mark_sent(ids: list[int]) -> None:
+    """ Marks the messages as delivered. """
+    if not ids:
+        return
+    with session() as s:
+        s.execute(update(Outbox).where(Outbox.id.in_(ids)).values(status="SENT", next_attempt=None))
+        s.commit()
+
+def retry_later(id: int, error: str, delay: datetime.timedelta, count_attempt: bool = True) -> None:
+    """ Schedules the message to be sent again after delay. A RetryAfter from
+    telegram doesn't count as an attempt. """
+    with session() as s:
+        # the outbox dates are all taken from the database clock
+        now = s.scalar(select(func.now()))
+        s.execute(update(Outbox).where(Outbox.id == id).values(
+            attempts=Outbox.attempts + (1 if count_attempt else 0),
+            last_error=error,
+            next_attempt=now + delay,
+        ))
+        s.commit()
+
+def mark_dead(id: int, error: str) -> None:
+    """ Gives up on the message. It stays in the table as a dead letter. """
+    with session() as s:
+        s.execute(update(Outbox).where(Outbox.id == id).values(status="DEAD", attempts=Outbox.attempts + 1, last_error=error, next_attempt=None))
+        s.commit()
+
+def requeue_dead() -> int:
+    """ Gives the dead letters another chance. Returns how many were requeued. """
+    with session() as s:
+        count = s.execute(update(Outbox).where(Outbox.status == "DEAD").values(status="PENDING", attempts=0, next_attempt=None)).rowcount
+        s.commit()
+        return count
+
+def count_by_status() -> dict[str, int]:
+    """ Returns {status: number of messages}. """
+    with session() as s:
+        return dict(s.execute(select(Outbox.status, func.count()).group_by(Outbox.status)).all())
+
+def delete_sent(older_than: datetime.timedelta) -> int:
+    """ Deletes the messages delivered more than older_than ago. Their dedupe
+    keys can be enqueued again after that. Returns how many were deleted. """
+    with session() as s:
+        cutoff = s.scalar(select(func.now())) - older_than
+        count = s.execute(delete(Outbox).where(Outbox.status == "SENT", Outbox.creation_date < cutoff)).rowcount
+        s.commit()
+        return count
@@ -1,9 +1,42 @@
-from sqlalchemy import select
+import datetime
+import threading
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from sqlalchemy import select, insert, update, delete, union_all, and_, tuple_, literal, event, inspect
+from sqlalchemy.orm import Session, object_session, defer
 from sqlalchemy.sql import func
 
-from models.pending import Pending
+from models.pending import Pending, LIVE_SUBMISSION
+from models.pending_archive import Pending_archive
+from models.pending_message import Pending_message
 from models.token import Token
-from sql import session
+from models.token_type import Token_type
+from models.user import User
+from models.guild import Guild
+from models.activity import Activity
+from models.student_token import Student_token
+from sql import session, load_by_ids, on_commit, upsert_insert
+
+
+class PendingRow(NamedTuple):
+    """ A pending as shown in the pending lists, with the names it needs already joined. """
+    id: int
+    student_id: int
+    token_id: int | None
+    token_name: str | None
+    token_type: str
+    student_fullname: str
+    guild_name: str | None
+    creation_date: datetime.datetime
+    approved_date: datetime.datetime | None
+    more_info: str | None
+    is_activity: bool       # the token belongs to an activity
+    value: int | None       # credits given to the student for the token, if any
+
+
+# list queries don't load the text of the pendings, use get_pending for it
+_LIST_OPTIONS = defer(Pending.text)
 
 
 def get_pending(id: int) -> Pending | None:
@@ -11,6 +44,15 @@ def get_pending(id: int) -> Pending | None:
     with session() as s:
         return s.query(Pending).filter(Pending.id == id).first()
 
+def get_pendings_by_ids(ids) -> dict[int, Pending]:
+    """ Returns a dict id -> pending object for the given ids, in one query. """
+    return load_by_ids(Pending, ids)
+
+def get_archived_pending(id: int) -> Pending_archive | None:
+    """ Returns the archived pending with the given id. None if not found. """
+    with session() as s:
+        return s.get(Pending_archive, id)
+
 def get_token(pending_id: int) -> Token | None:
     """ If this pending has a non-null token_id, returns the token object with that id. None if not found."""
     with session() as s:
@@ -20,23 +62,44 @@ def get_token(pending_id: int) -> Token | None:
         else:
             return None
         
-def get_pendings_of_student_by_type(student_id: int, classroom_id: int, token_type_id: int) -> list[Pending]:
-    """ Returns a list of pendings of the given student with the given token_type. """
+def get_pendings_of_student_by_type(student_id: int, classroom_id: int, token_type_id: int) -> list[Pending | Pending_archive]:
+    """ Returns a list of pendings of the given student with the given token_type,
+    including the archived ones, from newest to oldest. """
     with session() as s:
-        return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.token_type_id == token_type_id).order_by(Pending.creation_date.desc()).all()
+        pendings = s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.token_type_id == token_type_id).all()
+        pendings += s.query(Pending_archive).options(defer(Pending_archive.text)).filter(Pending_archive.classroom_id == classroom_id, Pending_archive.student_id == student_id, Pending_archive.token_type_id == token_type_id).all()
+    return sorted(pendings, key=lambda pending: (pending.creation_date, pending.id), reverse=True)
 
-def get_pending_of_student_by_token(student_id: int, classroom_id: int, token_id: int) -> Pending | None:
-    """ Returns the pending of the given student with the given token. None if not found. 
+def get_pending_of_student_by_token(student_id: int, classroom_id: int, token_id: int) -> Pending | Pending_archive | None:
+    """ Returns the pending of the given student with the given token, or its
+        archived one. None if not found.
         Should only return one pending.
         This is used to check if a student has already sent a pending with the same token.
     """
     with session() as s:
-        return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.token_id == token_id).first()
+        pending = s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.token_id == token_id).first()
+        if pending:
+            return pending
+        return s.query(Pending_archive).options(defer(Pending_archive.text)).filter(Pending_archive.classroom_id == classroom_id, Pending_archive.student_id == student_id, Pending_archive.token_id == token_id).first()
 
-def get_last_pending_of_student_by_type(student_id: int,  classroom_id: int, token_type_id: int) -> Pending | None:
-    """ Returns the last pending of the given student with the given token_type. None if not found. """
+def get_last_pending_of_student_by_type(student_id: int,  classroom_id: int, token_type_id: int) -> Pending | Pending_archive | None:
+    """ Returns the last pending of the given student with the given token_type,
+    archived or not. None if not found. """
     with session() as s:
-        return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.token_type_id == token_type_id).order_by(Pending.creation_date.desc()).first()
+        last = [
+            s.query(model).options(defer(model.text)).filter(model.classroom_id == classroom_id, model.student_id == student_id, model.token_type_id == token_type_id).order_by(model.creation_date.desc(), model.id.desc()).first()
+            for model in (Pending, Pending_archive)
+        ]
+    return max((pending for pending in last if pending), key=lambda pending: (pending.creation_date, pending.id), default=None)
+
+def update_tokens(tokens: dict[int, int]) -> None:
+    """ Sets the token of several pendings at once, given as pending_id -> token_id. """
+    if not tokens:
+        return
+    with session() as s:
+        for pending in s.scalars(select(Pending).where(Pending.id.in_(tokens))):
+            pending.token_id = tokens[pending.id]
+        s.commit()
 
 def update_token(pending_id: int, token_id: int) -> None:
     """ Updates the token_id of the pending. """
@@ -54,11 +117,11 @@ def get_pendings_by_classroom(classroom_id: int, status: str = None, direct_pend
     with session() as s:
         if status:
             if status == "APPROVED":
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
             else:
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
         else:
-            return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
+            return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
     
 def get_pendings_by_student(student_id: int, classroom_id: int, status: str = None, direct_pending: int = None) -> list[Pending]:
     """ Returns a list of pendings belonging to the given student. 
@@ -70,11 +133,11 @@ def get_pendings_by_student(student_id: int, classroom_id: int, status: str = No
     with session() as s:
         if status:
             if status == "APPROVED":
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
             else:
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
         else:
-            return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
+            return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.student_id == student_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
 
 def get_pendings_by_token_type(token_type_id: int, classroom_id: int, status: str = None, direct_pending: int = None) -> list[Pending]:
     """ Returns a list of pendings belonging to the given token_type. 
@@ -86,11 +149,11 @@ def get_pendings_by_token_type(token_type_id: int, classroom_id: int, status: st
     with session() as s:
         if status:
             if status == "APPROVED":
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.token_type_id == token_type_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.token_type_id == token_type_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
             else:
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.token_type_id == token_type_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.token_type_id == token_type_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
         else:
-            return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.token_type_id == token_type_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
+            return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.token_type_id == token_type_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date).all()
 
 def get_direct_pendings_of_teacher(teacher_id: int, classroom_id: int, status: str = None) -> list[Pending]:
     """ Returns a list of direct pendings belonging to the given teacher. 
@@ -100,17 +163,200 @@ def get_direct_pendings_of_teacher(teacher_id: int, classroom_id: int, status: s
     with session() as s:
         if status:
             if status == "APPROVED":
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == teacher_id, Pending.status == status).order_by(Pending.approved_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == teacher_id, Pending.status == status).order_by(Pending.approved_date.desc()).all()
             else:
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == teacher_id, Pending.status == status).order_by(Pending.creation_date).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == teacher_id, Pending.status == status).order_by(Pending.creation_date).all()
         else:
-            return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == teacher_id).order_by(Pending.creation_date).all()
+            return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.teacher_id == teacher_id).order_by(Pending.creation_date).all()
 
 def get_approved_pendings_of_teacher(teacher_id: int, classroom_id: int) -> list[Pending]:
     """ Returns a list of approved pendings approved by the given teacher.
     sort by approved_date from newest to oldest. """
     with session() as s:
-        return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.approved_by == teacher_id).order_by(Pending.approved_date.desc()).all()
+        return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.approved_by == teacher_id).order_by(Pending.approved_date.desc()).all()
+
+def _pending_rows_query(model=Pending):
+    """ Select of PendingRow columns, joining everything the lists show. model
+    is Pending or Pending_archive. """
+    return (
+        select(
+            model.id, model.student_id, model.token_id, Token.name.label("token_name"), Token_type.type.label("token_type"),
+            User.fullname.label("student_fullname"), Guild.name.label("guild_name"), model.creation_date, model.approved_date,
+            model.more_info, Activity.id.is_not(None).label("is_activity"), Student_token.value,
+        )
+        .join(Token_type, Token_type.id == model.token_type_id)
+        .join(User, User.id == model.student_id)
+        .outerjoin(Token, Token.id == model.token_id)
+        .outerjoin(Guild, Guild.id == model.guild_id)
+        .outerjoin(Activity, Activity.token_id == model.token_id)
+        .outerjoin(Student_token, and_(Student_token.student_id == model.student_id, Student_token.token_id == model.token_id))
+    )
+
+def _pending_rows_filter(classroom_id: int, status: str, direct_pending: int, token_type_id: int) -> list:
+    conditions = [Pending.classroom_id == classroom_id, Pending.status == status, Pending.teacher_id == direct_pending]
+    if token_type_id is not None:
+        conditions.append(Pending.token_type_id == token_type_id)
+    return conditions
+
+def _page(query, date_column, newest_first: bool, after: tuple | None, limit: int | None, id_column=Pending.id, before: tuple = None):
+    """ Orders query by (date_column, id) and applies keyset pagination: only
+    rows after the cursor `after`, the (date, id) of the last row of the
+    previous page, up to limit rows. With `before`, the (date, id) of the first
+    row of the next page, returns the limit rows preceding it instead. """
+    key = tuple_(date_column, id_column)
+    # the cursor is bound with the types of the columns so sqlite gets the
+    # date in the same text format it is stored, dates compare as strings
+    cursor = lambda values: tuple_(literal(values[0], date_column.type), literal(values[1], id_column.type))
+    # the rows before a cursor are read backwards from it and then reversed
+    backwards = before is not None
+    if newest_first != backwards:
+        query = query.order_by(date_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(date_column, id_column)
+    if after is not None:
+        query = query.where(key < cursor(after) if newest_first else key > cursor(after))
+    if before is not None:
+        query = query.where(key > cursor(before) if newest_first else key < cursor(before))
+    if limit is not None:
+        query = query.limit(limit)
+    with session() as s:
+        rows = [PendingRow(*row) for row in s.execute(query)]
+    return rows[::-1] if backwards else rows
+
+def get_pending_rows(classroom_id: int, status: str = "PENDING", direct_pending: int = None, token_type_id: int = None, after: tuple = None, limit: int = None, before: tuple = None) -> list[PendingRow]:
+    """ Returns the pendings of the given classroom as PendingRow, in a single query.
+    Same filters and order as get_pendings_by_classroom: direct_pending is the teacher_id
+    of direct pendings, None for the pendings of the classroom. If token_type_id is
+    given, only returns pendings of that token_type.
+    For pagination pass limit and, for the next pages, after=pending_row_key(last row),
+    for the previous ones before=pending_row_key(first row). """
+    query = _pending_rows_query().where(*_pending_rows_filter(classroom_id, status, direct_pending, token_type_id))
+    if status == "APPROVED":
+        return _page(query, Pending.approved_date, True, after, limit, before=before)
+    return _page(query, Pending.creation_date, False, after, limit, before=before)
+
+def get_pending_ids(classroom_id: int, status: str = "PENDING", direct_pending: int = None, token_type_id: int = None) -> list[int]:
+    """ Returns the ids of the pendings get_pending_rows would return, in the same order. """
+    query = select(Pending.id).where(*_pending_rows_filter(classroom_id, status, direct_pending, token_type_id)).order_by(Pending.creation_date, Pending.id)
+    with session() as s:
+        return list(s.scalars(query))
+
+def count_pending_rows(classroom_id: int, status: str = "PENDING", direct_pending: int = None, token_type_id: int = None) -> int:
+    """ Returns the number of rows get_pending_rows would return. Served from
+    the pending counters, doesn't query the database. """
+    with _counts_lock:
+        counts = _counts.get(classroom_id)
+        if not counts:
+            return 0
+        if token_type_id is not None:
+            return counts[(status, direct_pending, token_type_id)]
+        return sum(count for (s, teacher_id, _), count in counts.items() if s == status and teacher_id == direct_pending)
+
+def count_pendings_by_token_type(classroom_id: int, status: str = "PENDING", direct_pending: int = None) -> Counter:
+    """ Returns token_type_id -> number of pendings of the classroom with the
+    given status, direct pendings of direct_pending or of the classroom if None. """
+    result = Counter()
+    with _counts_lock:
+        for (s, teacher_id, token_type_id), count in _counts.get(classroom_id, {}).items():
+            if s == status and teacher_id == direct_pending:
+                result[token_type_id] += count
+    return result
+
+def get_approved_pending_rows_of_teacher(teacher_id: int, classroom_id: int, after: tuple = None, limit: int = None, before: tuple = None) -> list[PendingRow]:
+    """ Returns the pendings approved by the given teacher as PendingRow, in a single query,
+    including the archived ones. sort by approved_date from newest to oldest. Paginated
+    like get_pending_rows. """
+    rows = union_all(
+        _pending_rows_query().where(Pending.classroom_id == classroom_id, Pending.approved_by == teacher_id),
+        _pending_rows_query(Pending_archive).where(Pending_archive.classroom_id == classroom_id, Pending_archive.approved_by == teacher_id),
+    ).subquery()
+    return _page(select(rows), rows.c.approved_date, True, after, limit, id_column=rows.c.id, before=before)
+
+def count_approved_pendings_of_teacher(teacher_id: int, classroom_id: int) -> int:
+    """ Returns the number of pendings approved by the given teacher, including the archived ones. """
+    with session() as s:
+        live = s.scalar(select(func.count(Pending.id)).where(Pending.classroom_id == classroom_id, Pending.approved_by == teacher_id))
+        archived = s.scalar(select(func.count(Pending_archive.id)).where(Pending_archive.classroom_id == classroom_id, Pending_archive.approved_by == teacher_id))
+        return live + archived
+
+def pending_row_key(row: PendingRow, status: str = "PENDING") -> tuple:
+    """ Returns the keyset pagination cursor of a PendingRow: (approved_date, id)
+    for approved pendings, (creation_date, id) otherwise. """
+    if status == "APPROVED":
+        return (row.approved_date, row.id)
+    return (row.creation_date, row.id)
+
+# In-memory number of pendings by classroom_id -> (status, teacher_id, token_type_id),
+# loaded at startup by load_counters(). Every pending inserted, updated or deleted
+# through the ORM, also in cascade, is recorded in the session and applied once
+# the session commits, so the counters never see changes that are rolled back.
+# Use the ORM (not query().update()) to change those columns of a pending.
+_counts: dict[int, Counter] = defaultdict(Counter)
+_counts_lock = threading.Lock()
+_COUNTED_COLUMNS = ("classroom_id", "status", "teacher_id", "token_type_id")
+
+
+def load_counters() -> None:
+    """ (Re)loads the pending counters from the database. """
+    with session() as s:
+        rows = s.execute(
+            select(Pending.classroom_id, Pending.status, Pending.teacher_id, Pending.token_type_id, func.count(Pending.id))
+            .group_by(Pending.classroom_id, Pending.status, Pending.teacher_id, Pending.token_type_id)
+        ).all()
+    with _counts_lock:
+        _counts.clear()
+        for classroom_id, status, teacher_id, token_type_id, count in rows:
+            _counts[classroom_id][(status, teacher_id, token_type_id)] = count
+
+def _record(target: Pending, delta: int, values: tuple = None) -> None:
+    """ Records a change of delta pendings with the counted values of target in its session. """
+    classroom_id, status, teacher_id, token_type_id = values or tuple(getattr(target, column) for column in _COUNTED_COLUMNS)
+    object_session(target).info.setdefault("pending_counts", []).append((classroom_id, (status, teacher_id, token_type_id), delta))
+
+def _set_count(classroom_id: int, key: tuple, count: int) -> None:
+    """ Sets a counter to the given value, for changes made without the ORM. """
+    with _counts_lock:
+        if count:
+            _counts[classroom_id][key] = count
+        else:
+            _counts[classroom_id].pop(key, None)
+
+@event.listens_for(Pending, "after_insert")
+def _after_insert(mapper, connection, target):
+    _record(target, 1)
+
+@event.listens_for(Pending, "after_update")
+def _after_update(mapper, connection, target):
+    state = inspect(target)
+    old = []
+    for column in _COUNTED_COLUMNS:
+        history = state.attrs[column].history
+        old.append(history.deleted[0] if history.deleted else getattr(target, column))
+    old = tuple(old)
+    if old != tuple(getattr(target, column) for column in _COUNTED_COLUMNS):
+        _record(target, -1, old)
+        _record(target, 1)
+
+@event.listens_for(Pending, "after_delete")
+def _after_delete(mapper, connection, target):
+    _record(target, -1)
+
+@event.listens_for(Session, "after_commit")
+def _apply_counts(s):
+    changes = s.info.pop("pending_counts", None)
+    if not changes:
+        return
+    with _counts_lock:
+        for classroom_id, key, delta in changes:
+            counts = _counts[classroom_id]
+            counts[key] += delta
+            if counts[key] <= 0:
+                del counts[key]
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_counts(s, previous_transaction):
+    s.info.pop("pending_counts", None)
+
 
 def get_pendings_by_guild(guild_id: int, classroom_id: int, status: str = None, direct_pending: int = None) -> list[Pending]:
     """ Returns a list of pendings belonging to the given guild. 
@@ -122,67 +368,135 @@ def get_pendings_by_guild(guild_id: int, classroom_id: int, status: str = None,
     with session() as s:
         if status:
             if status == "APPROVED":
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.guild_id == guild_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.guild_id == guild_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.approved_date.desc()).all()
             else:
-                return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.guild_id == guild_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
+                return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.guild_id == guild_id, Pending.status == status, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
         else:
-            return s.query(Pending).filter(Pending.classroom_id == classroom_id, Pending.guild_id == guild_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
+            return s.query(Pending).options(_LIST_OPTIONS).filter(Pending.classroom_id == classroom_id, Pending.guild_id == guild_id, Pending.teacher_id == direct_pending).order_by(Pending.creation_date.desc()).all()
 
 
-def add_pending(student_id: int, classroom_id: int, token_type_id: int, token_id: int = None, teacher_id: int = None, guild_id: int = None, status: str = "PENDING", approved_by: int = None, text: str = None, FileID: str = None) -> None:
-    """ Adds a new pending to the database. """
+def add_pending(student_id: int, classroom_id: int, token_type_id: int, token_id: int = None, teacher_id: int = None, guild_id: int = None, status: str = "PENDING", approved_by: int = None, text: str = None, FileID: str = None) -> int:
+    """ Adds a new pending to the database. Returns its id. """
     with session() as s:
         if status == "APPROVED":
-            s.add(Pending(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type_id, token_id=token_id, teacher_id=teacher_id, guild_id=guild_id, status=status, approved_by=approved_by, approved_date=func.now(), text=text, FileID=FileID))
+            pending = Pending(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type_id, token_id=token_id, teacher_id=teacher_id, guild_id=guild_id, status=status, approved_by=approved_by, approved_date=func.now(), text=text, FileID=FileID)
         else:
-            s.add(Pending(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type_id, token_id=token_id, teacher_id=teacher_id, guild_id=guild_id, status=status, text=text, FileID=FileID))
+            pending = Pending(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type_id, token_id=token_id, teacher_id=teacher_id, guild_id=guild_id, status=status, text=text, FileID=FileID)
+        s.add(pending)
         s.commit()
+        return pending.id
+
 
+def upsert_submission(student_id: int, classroom_id: int, token_type_id: int, token_id: int, guild_id: int = None, text: str = None, FileID: str = None) -> int:
+    """ Adds the submission of a student for the given token (an activity or an
+    exercise) or replaces the one still pending, in a single statement backed by
+    uq_pending_live_submission, so repeated submissions never create duplicates.
+    The replaced submission is handled like a new one: it goes back to the end
+    of the queue of the classroom, even if it was assigned to a teacher, with
+    the guild given now, and loses its conversation. Approved or rejected
+    submissions are kept, a new one is added. Returns the id of the pending. """
+    values = dict(student_id=student_id, classroom_id=classroom_id, token_type_id=token_type_id, token_id=token_id, guild_id=guild_id, status="PENDING", text=text, FileID=FileID)
+    with session() as s:
+        assigned_to = s.scalar(select(Pending.teacher_id).where(Pending.student_id == student_id, Pending.classroom_id == classroom_id, Pending.token_id == token_id, Pending.status == "PENDING"))
+        stmt = upsert_insert(s.get_bind(), Pending).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Pending.student_id, Pending.classroom_id, Pending.token_id],
+            index_where=LIVE_SUBMISSION,
+            set_=dict(token_type_id=token_type_id, teacher_id=None, guild_id=guild_id, text=text, FileID=FileID, more_info=None, creation_date=func.now()),
+        ).returning(Pending.id)
+        pending_id = s.execute(stmt).scalar_one()
+        s.execute(delete(Pending_message).where(Pending_message.pending_id == pending_id))
+        # the statement skips the ORM, recount the live submissions it may have
+        # added to the classroom or taken from the teacher
+        counts = {}
+        for teacher_id in {None, assigned_to}:
+            counts[("PENDING", teacher_id, token_type_id)] = s.scalar(select(func.count(Pending.id)).where(Pending.classroom_id == classroom_id, Pending.status == "PENDING", Pending.teacher_id == teacher_id, Pending.token_type_id == token_type_id))
+        s.commit()
+    def set_counts():
+        for key, count in counts.items():
+            _set_count(classroom_id, key, count)
+    on_commit(set_counts)
+    return pending_id
+
+# approve, reject and assign change the pending through the ORM so the pending
+# counters see the change
 def approve_pending(pending_id: int, approved_by: int) -> None:
     """ Approves the pending. """
     with session() as s:
-        s.query(Pending).filter(Pending.id == pending_id).update({"status": "APPROVED", "approved_date": func.now(), "approved_by": approved_by})
+        pending = s.get(Pending, pending_id)
+        pending.status = "APPROVED"
+        pending.approved_date = func.now()
+        pending.approved_by = approved_by
         s.commit()
 
 def reject_pending(pending_id: int, explanation: str = None) -> None:
     """ Rejects the pending. """
     with session() as s:
-        s.query(Pending).filter(Pending.id == pending_id).update({"status": "REJECTED", "explanation": explanation})    # maybe add a date and teacher?
+        pending = s.get(Pending, pending_id)
+        pending.status = "REJECTED"
+        # approved_date is the date the pending was resolved, see archive_resolved_pendings
+        pending.approved_date = func.now()
+        pending.explanation = explanation    # maybe add a teacher?
         s.commit()
 
 def assign_pending(pending_id: int, teacher_id: int) -> None:
     """ Assigns the pending to the given teacher. """
     with session() as s:
-        s.query(Pending).filter(Pending.id == pending_id).update({"teacher_id": teacher_id})
+        pending = s.get(Pending, pending_id)
+        pending.teacher_id = teacher_id
         s.commit()
 
-def ask_for_more_info(pending_id: int, info: str) -> None:
-    """ Asks for more info to the student. """
+def approve_pendings(pending_ids: list[int], approved_by: int) -> None:
+    """ Approves several pendings at once. """
     with session() as s:
-        # get the current text
-        pending = s.query(Pending).filter(Pending.id == pending_id).first()
-        current_text = pending.text
-        if current_text:
-            current_text += "\n\n" + info
-        else:
-            current_text = info
-        s.query(Pending).filter(Pending.id == pending_id).update({"more_info": "PENDING", "text": current_text})
+        # one date for all, so the updates are sent as a single batch
+        now = s.scalar(select(func.now()))
+        for pending in s.scalars(select(Pending).where(Pending.id.in_(pending_ids))):
+            pending.status = "APPROVED"
+            pending.approved_date = now
+            pending.approved_by = approved_by
         s.commit()
 
-def send_more_info(pending_id: int, info: str, FileID: str = None) -> None:
-    """ Sends more info to the teacher. """
+def reject_pendings(pending_ids: list[int], explanation: str = None) -> None:
+    """ Rejects several pendings at once. """
     with session() as s:
-        # get the current text
-        pending = s.query(Pending).filter(Pending.id == pending_id).first()
-        current_text = pending.text
-        if current_text:
-            current_text += "\n\n" + info
+        now = s.scalar(select(func.now()))
+        for pending in s.scalars(select(Pending).where(Pending.id.in_(pending_ids))):
+            pending.status = "REJECTED"
+            pending.approved_date = now
+            pending.explanation = explanation
+        s.commit()
+
+def get_messages(pending_id: int, archived: bool = False) -> list[Pending_message]:
+    """ Returns the conversation thread of the pending, or of the archived
+    pending if archived is True, oldest first. """
+    column = Pending_message.archived_pending_id if archived else Pending_message.pending_id
+    with session() as s:
+        return s.query(Pending_message).filter(column == pending_id).order_by(Pending_message.id).all()
+
+def get_full_text(pending: Pending | Pending_archive) -> str:
+    """ Returns the text of the pending followed by its conversation thread. """
+    texts = [pending.text] if pending.text else []
+    texts += [message.text for message in get_messages(pending.id, archived=isinstance(pending, Pending_archive)) if message.text]
+    return "\n\n".join(texts)
+
+def ask_for_more_info(pending_id: int, info: str, author_id: int = None) -> None:
+    """ Asks for more info to the student. The question is added to the thread
+    of the pending. """
+    with session() as s:
+        s.add(Pending_message(pending_id=pending_id, author_id=author_id, text=info))
+        s.query(Pending).filter(Pending.id == pending_id).update({"more_info": "PENDING"})
+        s.commit()
+
+def send_more_info(pending_id: int, info: str, FileID: str = None, author_id: int = None) -> None:
+    """ Sends more info to the teacher. The answer is added to the thread of
+    the pending, a new file replaces the one shown with the pending. """
+    with session() as s:
+        s.add(Pending_message(pending_id=pending_id, author_id=author_id, text=info, FileID=FileID))
+        if FileID:
+            s.query(Pending).filter(Pending.id == pending_id).update({"more_info": "SENT", "FileID": FileID})
         else:
-            current_text = info
-        current_file = pending.FileID
-        if current_file and FileID == None:
-            FileID = current_file   # To avoid deleting the file
-        s.query(Pending).filter(Pending.id == pending_id).update({"more_info": "SENT", "text": current_text, "FileID": FileID})
+            s.query(Pending).filter(Pending.id == pending_id).update({"more_info": "SENT"})
         s.commit()
 
 def delete_pending(pending_id: int) -> None:
@@ -193,3 +507,32 @@ def delete_pending(pending_id: int) -> None:
         # delete pending
         s.delete(pending)
         s.commit()
+
+# columns copied as they are from pending to pending_archive
+_ARCHIVED_COLUMNS = [column.key for column in Pending_archive.__table__.columns]
+
+def archive_resolved_pendings(older_than: datetime.timedelta) -> int:
+    """ Moves the approved and rejected pendings resolved more than older_than
+    ago to pending_archive, in one transaction, so the pending table only keeps
+    the live queue and recent history. Returns how many were moved. """
+    with session() as s:
+        # the dates are set by the database, in UTC on sqlite, compare them with its clock
+        cutoff = s.scalar(select(func.now())) - older_than
+        resolved = and_(
+            Pending.status != "PENDING",
+            # rejections before they got a date age from the submission
+            func.coalesce(Pending.approved_date, Pending.creation_date) < cutoff,
+        )
+        s.execute(insert(Pending_archive).from_select(_ARCHIVED_COLUMNS, select(*[getattr(Pending, column) for column in _ARCHIVED_COLUMNS]).where(resolved)))
+        # the threads go with their pendings, also the ones of pendings archived
+        # before pending_message had archived_pending_id
+        s.execute(
+            update(Pending_message)
+            .where(Pending_message.pending_id.in_(select(Pending_archive.id)))
+            .values(archived_pending_id=Pending_message.pending_id, pending_id=None)
+        )
+        moved = s.execute(delete(Pending).where(resolved)).rowcount
+        s.commit()
+    # the rows were deleted without the ORM, rebuild the counters
+    on_commit(load_counters)
+    return moved
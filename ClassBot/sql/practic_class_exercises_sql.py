@@ -24,6 +24,13 @@ def get_practic_class_exercises_by_practic_class_id(practic_class_id: int) -> li
     with session() as s:
         return s.query(Practic_class_exercise).filter(Practic_class_exercise.practic_class_id == practic_class_id).all()
 
+def get_tokens_of_exercises(exercises: list[Practic_class_exercise]) -> dict:
+    """ Returns a dict practic_class_exercise id -> token object of its activity,
+    with one query for the activities and one for the tokens. """
+    activities = activity_sql.get_activities_by_ids(exercise.activity_id for exercise in exercises)
+    tokens = token_sql.get_tokens_by_ids(activity.token_id for activity in activities.values())
+    return {exercise.id: tokens[activities[exercise.activity_id].token_id] for exercise in exercises}
+
 def add_practic_class_exercise(
         value: int,
         practic_class_id: int,
@@ -33,11 +40,11 @@ def add_practic_class_exercise(
         description: str = None,
         FileID: str = None,
         deadline: datetime = None,
-    ):
-    """ Adds a new practic_class_exercise to the database. """
+    ) -> int:
+    """ Adds a new practic_class_exercise to the database. Returns its id. """
     with session() as s:
         activity_type_id = practic_class_sql.get_practic_class(practic_class_id).activity_type_id
-        activity_sql.add_activity(
+        activity_id = activity_sql.add_activity(
             activity_type_id,
             classroom_id,
             name,
@@ -45,14 +52,15 @@ def add_practic_class_exercise(
             FileID,
             deadline,
         )
-        activity_id = activity_sql.get_activity_by_token_id(token_sql.get_last_token().id).id
-        s.add(Practic_class_exercise(
+        practic_class_exercise = Practic_class_exercise(
             value=value,
             practic_class_id=practic_class_id,
             activity_id=activity_id,
             partial_credits_allowed=partial_credits_allowed,
-        ))
+        )
+        s.add(practic_class_exercise)
         s.commit()
+        return practic_class_exercise.id
 
 def update_value(id: int, value: int):  
     """ Updates the value of the practic_class_exercise with the given id. """
@@ -50,10 +50,10 @@ def add_practic_class(
         guild_activity: bool = False,
         single_submission: bool = True, # Practic classes are single submission
         FileID: str = None,
-    ):
-    """ Adds a new practic_class to the database. """
+    ) -> int:
+    """ Adds a new practic_class to the database. Returns its id. """
     with session() as s:
-        activity_type_sql.add_activity_type(
+        activity_type_id = activity_type_sql.add_activity_type(
             name,
             classroom_id,
             hidden,
@@ -62,12 +62,13 @@ def add_practic_class(
             single_submission,
             FileID,
         )
-        activity_type = activity_type_sql.get_activity_type_by_type(name, classroom_id)
-        s.add(Practic_class(
-            activity_type_id=activity_type.id,
+        practic_class = Practic_class(
+            activity_type_id=activity_type_id,
             date=date,
-        ))
+        )
+        s.add(practic_class)
         s.commit()
+        return practic_class.id
 
 def update_date(id: int, date: datetime):
     """ Updates the date of the practic_class with the given id. """
@@ -1,8 +1,21 @@
+from typing import NamedTuple
+
+from sqlalchemy import select
+
 from models.student import Student
+from models.user import User
 from models.classroom import Classroom
 from models.student_classroom import Student_classroom
 from models.student_guild import Student_guild
-from sql import session
+from sql import session, on_commit
+import sql.user_sql as user_sql
+
+
+class StudentChat(NamedTuple):
+    """ The telegram chat and name of a student. """
+    student_id: int
+    chat_id: int
+    fullname: str
 
 
 def get_student(id: int) -> Student | None:
@@ -22,12 +35,27 @@ def set_student_active_classroom(student_id: int, classroom_id: int) -> None:
         student = s.query(Student).filter(Student.id == student_id).first()
         student.active_classroom_id = classroom_id
         s.commit()
+    on_commit(lambda: user_sql.invalidate_identity(student_id))
 
 def get_students_by_classroom(classroom_id: int) -> list[Student]:
     """ Returns a list of students for the given classroom. """
     with session() as s:
         return s.query(Student).join(Student_classroom).filter(Student_classroom.classroom_id == classroom_id).all()
 
+def get_student_chats_by_classroom(classroom_id: int) -> list[StudentChat]:
+    """ Returns the chat id and name of every student of the classroom, in one query. """
+    with session() as s:
+        return [StudentChat(*row) for row in s.execute(
+            select(User.id, User.telegram_chatid, User.fullname).join(Student_classroom, Student_classroom.student_id == User.id).where(Student_classroom.classroom_id == classroom_id)
+        )]
+
+def get_student_chats_by_guild(guild_id: int) -> list[StudentChat]:
+    """ Returns the chat id and name of every student of the guild, in one query. """
+    with session() as s:
+        return [StudentChat(*row) for row in s.execute(
+            select(User.id, User.telegram_chatid, User.fullname).join(Student_guild, Student_guild.student_id == User.id).where(Student_guild.guild_id == guild_id)
+        )]
+
 def get_students_by_guild(guild_id: int) -> list[Student]:
     """ Returns a list of students for the given guild. """
     with session() as s:
@@ -2,7 +2,7 @@ from sqlalchemy import select
 
 from models.student_token import Student_token
 from models.token import Token
-from sql import session
+from sql import session, credit_balance_sql
 
 
 def get_student_ids(token_id: int) -> list[int]:
@@ -21,6 +21,12 @@ def add_student_token(student_id: int, token_id: int, value: int, teacher_id: in
         s.add(Student_token(student_id=student_id, token_id=token_id, teacher_id=teacher_id, value=value))
         s.commit()
 
+def add_student_tokens(student_tokens: list[tuple[int, int, int]], teacher_id: int = None) -> None:
+    """ Adds several student_tokens at once, given as (student_id, token_id, value). """
+    with session() as s:
+        s.add_all([Student_token(student_id=student_id, token_id=token_id, teacher_id=teacher_id, value=value) for student_id, token_id, value in student_tokens])
+        s.commit()
+
 def exists(student_id: int, token_id: int) -> bool:
     """ Returns True if the student_token exists. """
     with session() as s:
@@ -41,11 +47,19 @@ def get_value(student_id: int, token_id: int) -> int:
     with session() as s:
         return s.query(Student_token).filter(Student_token.student_id == student_id).filter(Student_token.token_id == token_id).first().value
     
+def get_values_by_token_ids(token_ids) -> dict[tuple[int, int], int]:
+    """ Returns a dict (student_id, token_id) -> value of the student_tokens of the given tokens, in one query. """
+    token_ids = {token_id for token_id in token_ids if token_id is not None}
+    if not token_ids:
+        return {}
+    with session() as s:
+        return {(student_id, token_id): value for student_id, token_id, value in s.execute(select(Student_token.student_id, Student_token.token_id, Student_token.value).where(Student_token.token_id.in_(token_ids)))}
+
 def get_total_value_by_classroom(student_id: int, classroom_id: int) -> int:
     """ Returns the total value of the student_token rows where the classroom_id
-    of the token with the token_id in student_token is the given classroom_id. """
-    with session() as s:
-        return sum([student_token.value for student_token in s.query(Student_token).filter(Student_token.student_id == student_id).join(Token).filter(Token.classroom_id == classroom_id).all()])
+    of the token with the token_id in student_token is the given classroom_id.
+    Read from credit_balance. """
+    return credit_balance_sql.get_student_balance(student_id, classroom_id)
 
 def get_student_token_by_student_and_classroom(student_id: int, classroom_id: int) -> list[Student_token]:
     """ Returns a list of student_tokens for the given student and classroom. 
@@ -1,7 +1,8 @@
 from models.teacher import Teacher
 from models.classroom import Classroom
 from models.teacher_classroom import Teacher_classroom
-from sql import session
+from sql import session, on_commit
+import sql.user_sql as user_sql
 
 
 def get_teacher(id: int) -> Teacher | None:
@@ -27,6 +28,8 @@ def set_teacher_active_classroom(teacher_id: int, classroom_id: int) -> None:
         teacher = s.query(Teacher).filter(Teacher.id == teacher_id).first()
         teacher.active_classroom_id = classroom_id
         s.commit()
+    # after the commit, or a concurrent get_identity could cache the old classroom again
+    on_commit(lambda: user_sql.invalidate_identity(teacher_id))
 
 def get_teachers_by_classroom(classroom_id: int) -> list[Teacher]:
     """ Returns a list of teachers for the given classroom. """
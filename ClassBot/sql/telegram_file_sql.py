@@ -0,0 +1,51 @@
+from sqlalchemy import select, update
+
+from models.telegram_file import Telegram_file
+from sql import session, upsert_insert, FILE_CACHE_SIZE, FILE_CACHE_TTL
+from utils.cache import TTLCache
+
+
+# file id -> kind. A file id never changes kind, only the size is bounded.
+kind_cache = TTLCache(maxsize=FILE_CACHE_SIZE, ttl=FILE_CACHE_TTL)
+# source -> file id of the last upload of it
+source_cache = TTLCache(maxsize=FILE_CACHE_SIZE, ttl=FILE_CACHE_TTL)
+
+
+def add_file(file_id: str, kind: str, file_unique_id: str = None, file_size: int = None, source: str = None) -> None:
+    """ Records the kind of the file. Known files are left as they are. If
+    source is given the file replaces the one recorded for that source. """
+    with session() as s:
+        if source:
+            s.execute(update(Telegram_file).where(Telegram_file.source == source).values(source=None))
+        s.execute(
+            upsert_insert(s.get_bind(), Telegram_file)
+            .values(file_id=file_id, kind=kind, file_unique_id=file_unique_id, file_size=file_size, source=source)
+            .on_conflict_do_nothing(index_elements=[Telegram_file.file_id])
+        )
+        s.commit()
+    kind_cache.set(file_id, kind)
+    if source:
+        source_cache.set(source, file_id)
+
+def get_kind(file_id: str) -> str | None:
+    """ Returns the kind of the file (photo, document or video), None if it
+    wasn't recorded. """
+    kind = kind_cache.get(file_id)
+    if kind is None:
+        with session() as s:
+            file = s.get(Telegram_file, file_id)
+            kind = file.kind if file else None
+        if kind is not None:
+            kind_cache.set(file_id, kind)
+    return kind
+
+def get_file_id_by_source(source: str) -> str | None:
+    """ Returns the file id telegram gave to the last upload of source, None if
+    it was never uploaded. """
+    file_id = source_cache.get(source)
+    if file_id is None:
+        with session() as s:
+            file_id = s.scalar(select(Telegram_file.file_id).where(Telegram_file.source == source))
+        if file_id is not None:
+            source_cache.set(source, file_id)
+    return file_id
@@ -1,7 +1,7 @@
 from sqlalchemy import select
 
 from models.token import Token
-from sql import session
+from sql import session, load_by_ids
 
 
 def get_token(id: int) -> Token | None:
@@ -9,6 +9,10 @@ def get_token(id: int) -> Token | None:
     with session() as s:
         return s.query(Token).filter(Token.id == id).first()
 
+def get_tokens_by_ids(ids) -> dict[int, Token]:
+    """ Returns a dict id -> token object for the given ids, in one query. """
+    return load_by_ids(Token, ids)
+
 def get_token_by_name(name: str) -> Token | None:
     """ Returns the first token object with the given name. None if not found."""
     with session() as s:
@@ -26,18 +30,29 @@ def add_token(
         teacher_creator_id: int = None,
         description: str = None,
         image_url: str = None,
-        ):
-    """ Adds a new token to the database. """
+        ) -> int:
+    """ Adds a new token to the database. Returns its id. """
     with session() as s:
-        s.add(Token(
+        token = Token(
             name=name, 
             token_type_id=token_type_id, 
             classroom_id=classroom_id, 
             teacher_creator_id=teacher_creator_id,
             description=description,
             image_url=image_url,
-        ))
+        )
+        s.add(token)
+        s.commit()
+        return token.id
+
+def add_tokens(tokens: list[dict]) -> list[int]:
+    """ Adds several tokens at once, each dict has the arguments of add_token.
+    Returns their ids in the same order. """
+    with session() as s:
+        new_tokens = [Token(**token) for token in tokens]
+        s.add_all(new_tokens)
         s.commit()
+        return [token.id for token in new_tokens]
 
 def update_name(id: int, name: str):
     """ Updates the name of the token with the given id. """
@@ -1,47 +1,94 @@
 from sqlalchemy import select
 
 from models.token_type import Token_type
-from sql import session
+from sql import session, on_commit, on_delete_commit
+
+
+# In-memory registry of every token_type, loaded at startup by load_registry()
+# and kept in sync by the functions of this module that change token_types.
+_by_id: dict[int, Token_type] = {}
+_by_type: dict[tuple[str, int | None], Token_type] = {}
+
+
+def load_registry() -> None:
+    """ (Re)loads every token_type from the database into the registry. """
+    with session() as s:
+        token_types = s.query(Token_type).order_by(Token_type.id).all()
+    _by_id.clear()
+    _by_type.clear()
+    for token_type in token_types:
+        _by_id[token_type.id] = token_type
+        _by_type[(token_type.type, token_type.classroom_id)] = token_type
+
+def _refresh(id: int) -> None:
+    """ Reloads the token_type with the given id into the registry, or drops it
+    if it no longer exists. """
+    with session() as s:
+        token_type = s.query(Token_type).filter(Token_type.id == id).first()
+    old = _by_id.get(id)
+    if old is not None:
+        _by_type.pop((old.type, old.classroom_id), None)
+    if token_type is None:
+        _by_id.pop(id, None)
+    else:
+        # updating in place keeps the id order of get_token_types
+        _by_id[id] = token_type
+        _by_type[(token_type.type, token_type.classroom_id)] = token_type
+
+def _forget(id: int) -> None:
+    """ Drops a deleted token_type from the registry. """
+    token_type = _by_id.pop(id, None)
+    if token_type is not None:
+        _by_type.pop((token_type.type, token_type.classroom_id), None)
+
+# also catches the token_types deleted in cascade with their classroom
+on_delete_commit(Token_type, _forget)
 
 
 def get_token_type(id: int) -> Token_type | None:
     """ Returns a token_type object with the given id. None if not found."""
-    with session() as s:
-        return s.query(Token_type).filter(Token_type.id == id).first()
+    return _by_id.get(id)
+    
+def get_token_types_by_ids(ids) -> dict[int, Token_type]:
+    """ Returns a dict id -> token_type object for the given ids. """
+    return {id: _by_id[id] for id in ids if id in _by_id}
     
 def get_token_type_by_type(type: str, classroom_id: int = None) -> Token_type | None:
     """ Returns the first token_type object with the given type. None if not found.
         In this case type is unique as long as is a default type, meaning classroom_id is None.
         Is not related to a classroom. If it is related to a course, then type is not unique, 
         but the combination of type and classroom_id is unique."""
-    with session() as s:
-        return s.query(Token_type).filter(Token_type.type == type, Token_type.classroom_id == classroom_id).first()
+    return _by_type.get((type, classroom_id))
 
 def get_token_types(classroom_id: int = None, include_hidden: bool = False) -> list[Token_type]:
     """ Return a list of token_type objects with the given classroom_id. If include_hidden is True, then also include hidden token_types."""
-    with session() as s:
-        if include_hidden:
-            return s.query(Token_type).filter(Token_type.classroom_id == classroom_id).all()
-        else:
-            return s.query(Token_type).filter(Token_type.classroom_id == classroom_id, Token_type.hidden == False).all()
+    return [
+        token_type for token_type in list(_by_id.values())
+        if token_type.classroom_id == classroom_id and (include_hidden or not token_type.hidden)
+    ]
 
 def hide_token_type(id: int) -> None:
     """ Hides a token_type from the database. """
     with session() as s:
         s.query(Token_type).filter(Token_type.id == id).update({Token_type.hidden: True})
         s.commit()
+    on_commit(lambda: _refresh(id))
 
 def unhide_token_type(id: int) -> None:
     """ Unhides a token_type from the database. """
     with session() as s:
         s.query(Token_type).filter(Token_type.id == id).update({Token_type.hidden: False})
         s.commit()
+    on_commit(lambda: _refresh(id))
 
-def add_token_type(type: str, classroom_id: int = None, hidden: bool = False) -> None:
-    """ Adds a new token_type to the database. """
+def add_token_type(type: str, classroom_id: int = None, hidden: bool = False) -> int:
+    """ Adds a new token_type to the database. Returns its id. """
     with session() as s:
-        s.add(Token_type(type=type, classroom_id=classroom_id, hidden=hidden))
+        token_type = Token_type(type=type, classroom_id=classroom_id, hidden=hidden)
+        s.add(token_type)
         s.commit()
+    on_commit(lambda: _refresh(token_type.id))
+    return token_type.id
 
 def delete_token_type(id: int) -> None:
     """ Deletes a token_type from the database. """
@@ -1,5 +1,25 @@
+from typing import NamedTuple
+
+from sqlalchemy import select, null
+
 from models.user import User
-from sql import session
+from models.teacher import Teacher
+from models.student import Student
+from sql import session, on_commit, load_by_ids, IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL
+from utils.cache import TTLCache
+
+
+class Identity(NamedTuple):
+    """ Who is behind a telegram chat: user id, fullname, role ("teacher",
+    "student" or None) and the active classroom in that role. """
+    user_id: int
+    fullname: str
+    role: str | None
+    active_classroom_id: int | None
+
+# (chatid, role) -> Identity, or None if there is no user with that chatid
+identity_cache = TTLCache(maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL)
+_MISSING = object()
 
 
 def get_user(id: int) -> User | None:
@@ -7,14 +27,49 @@ def get_user(id: int) -> User | None:
     with session() as s:
         return s.query(User).filter(User.id == id).first()
 
+def get_users_by_ids(ids) -> dict[int, User]:
+    """ Returns a dict id -> user object for the given ids, in one query. """
+    return load_by_ids(User, ids)
+
 def get_user_by_chatid(chatid: int) -> User | None:
     """ Returns a user object with the given chatid. None if not found."""
     with session() as s:
         return s.query(User).filter(User.telegram_chatid == chatid).first()
 
+def get_identity(chatid: int, role: str = None) -> Identity | None:
+    """ Returns the Identity of the user with the given chatid, with the active
+    classroom of its teacher or student if role is given. None if not found.
+    Cached, use instead of get_user_by_chatid when only ids and names are needed. """
+    key = (chatid, role)
+    identity = identity_cache.get(key, _MISSING)
+    if identity is not _MISSING:
+        return identity
+    with session() as s:
+        if role == "teacher":
+            query = select(User.id, User.fullname, Teacher.active_classroom_id).outerjoin(Teacher, Teacher.id == User.id)
+        elif role == "student":
+            query = select(User.id, User.fullname, Student.active_classroom_id).outerjoin(Student, Student.id == User.id)
+        else:
+            query = select(User.id, User.fullname, null())
+        row = s.execute(query.where(User.telegram_chatid == chatid)).first()
+    identity = Identity(row[0], row[1], role, row[2]) if row else None
+    identity_cache.set(key, identity)
+    return identity
+
+def invalidate_identity(user_id: int = None, chatid: int = None) -> None:
+    """ Drops the cached identities of the given user or chat. Called whenever
+    something stored in an Identity changes. """
+    if chatid is not None:
+        identity_cache.pop_where(lambda key, identity: key[0] == chatid)
+    if user_id is not None:
+        identity_cache.pop_where(lambda key, identity: identity is not None and identity.user_id == user_id)
+
 
-def add_user(chatid: int, fullname: str) -> None:
-    """ Adds a new user to the database. """
+def add_user(chatid: int, fullname: str) -> int:
+    """ Adds a new user to the database. Returns its id. """
     with session() as s:
-        s.add(User(telegram_chatid=chatid, fullname=fullname))
+        user = User(telegram_chatid=chatid, fullname=fullname)
+        s.add(user)
         s.commit()
+    on_commit(lambda: invalidate_identity(chatid=chatid))
+    return user.id
@@ -0,0 +1,179 @@
+""" The tests run the sql helpers and handlers against a throwaway sqlite
+database. The bot reads config.ini from the working directory when it is
+imported, so a copy pointing to a temporary database is made first.
+Run from the ClassBot folder: python -m pytest tests
+Tests marked benchmark measure the performance work and print the numbers,
+they only run with --benchmarks. """
+import os
+import sys
+import tempfile
+from configparser import ConfigParser
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+
+CLASSBOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CLASSBOT))
+
+_tmp = tempfile.mkdtemp(prefix="classbot-tests-")
+_config = ConfigParser()
+_config.read(CLASSBOT.parent / "config.ini")
+_config["database"]["URL"] = f"sqlite:///{_tmp}/classbot.db"
+with open(os.path.join(_tmp, "config.ini"), "w") as f:
+    _config.write(f)
+os.chdir(_tmp)
+
+from sqlalchemy import event, delete
+
+import sql
+from sql import session, user_sql, teacher_sql, student_sql, course_sql, classroom_sql, teacher_classroom_sql, student_classroom_sql, pending_sql, token_type_sql, activity_type_sql, credit_balance_sql, telegram_file_sql
+from models.base import Base
+from models.token_type import Token_type
+from bot.utils import media
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", help="also run the tests marked benchmark")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: slow measurement, only runs with --benchmarks")
+    # the conversation handlers warn about per_message when they are imported
+    config.addinivalue_line("filterwarnings", "ignore::telegram.warnings.PTBUserWarning")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+@pytest.fixture(autouse=True)
+def database():
+    """ Empties the database and the in-memory state after every test. The
+    default token types are kept. """
+    yield
+    with session() as s:
+        # sqlite doesn't enforce the foreign keys, the order doesn't matter
+        for table in Base.metadata.tables.values():
+            if table.name != "token_type":
+                s.execute(delete(table))
+        s.execute(delete(Token_type).where(Token_type.classroom_id.is_not(None)))
+        s.commit()
+    token_type_sql.load_registry()
+    activity_type_sql.load_registry()
+    pending_sql.load_counters()
+    for cache in (user_sql.identity_cache, credit_balance_sql.summary_cache, telegram_file_sql.kind_cache, telegram_file_sql.source_cache):
+        cache.clear()
+    media.stats.clear()
+
+def make_classroom() -> SimpleNamespace:
+    """ Adds a classroom with a teacher (chat 1000) and 30 students (chats 2000...). """
+    teacher_id = user_sql.add_user(1000, "Profesor")
+    teacher_sql.add_teacher(teacher_id)
+    course_id = course_sql.add_course(teacher_id, "Curso")
+    classroom_id = classroom_sql.add_classroom(course_id, "Aula", "teacher-auth", "student-auth")
+    teacher_classroom_sql.add_teacher_classroom(teacher_id, classroom_id)
+    teacher_sql.set_teacher_active_classroom(teacher_id, classroom_id)
+    student_ids = []
+    for i in range(30):
+        student_id = user_sql.add_user(2000 + i, f"Estudiante {i}")
+        student_sql.add_student(student_id)
+        student_classroom_sql.add_student_classroom(student_id, classroom_id)
+        student_ids.append(student_id)
+    return SimpleNamespace(id=classroom_id, teacher_id=teacher_id, teacher_chat=1000, student_ids=student_ids)
+
+@pytest.fixture
+def classroom():
+    """ The classroom of make_classroom(). """
+    return make_classroom()
+
+@pytest.fixture
+def add_pendings(classroom):
+    """ add_pendings(n, type="Meme") adds n pendings of the classroom, one per
+    student, in the same second. Returns their ids. """
+    def add(n: int, type: str = "Meme", **kwargs) -> list[int]:
+        token_type_id = token_type_sql.get_token_type_by_type(type).id
+        return [
+            pending_sql.add_pending(classroom.student_ids[i % len(classroom.student_ids)], classroom.id, token_type_id, text=f"pendiente {i}", **kwargs)
+            for i in range(n)
+        ]
+    return add
+
+@pytest.fixture
+def count_queries():
+    """ with count_queries() as queries: ... leaves in queries the statements
+    sent to the database inside the block. """
+    @contextmanager
+    def counting():
+        queries = []
+        listener = lambda conn, cursor, statement, *args: queries.append(statement)
+        event.listen(sql.engine, "before_cursor_execute", listener)
+        try:
+            yield queries
+        finally:
+            event.remove(sql.engine, "before_cursor_execute", listener)
+    return counting
+
+
+class _Done:
+    """ An awaitable that does nothing, for methods the handlers call with
+    or without await (query.answer()). """
+    def __await__(self):
+        return iter(())
+
+class FakeBot:
+    """ Records what the handlers send instead of calling telegram. """
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text, kwargs))
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+class FakeMessage:
+    def __init__(self, chat_id: int, text: str = None) -> None:
+        self.chat_id = chat_id
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append((text, kwargs))
+        return FakeMessage(self.chat_id, text)
+
+class FakeQuery:
+    def __init__(self, chat_id: int, data: str) -> None:
+        self.data = data
+        self.message = FakeMessage(chat_id)
+        self.edits = []
+
+    def answer(self, *args, **kwargs):
+        return _Done()
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+    async def edit_message_reply_markup(self, reply_markup=None, **kwargs):
+        self.edits.append((None, reply_markup))
+
+def make_update(chat_id: int, text: str = None, data: str = None) -> SimpleNamespace:
+    """ An update with a message with text, or a callback query with data. """
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=chat_id),
+        effective_chat=SimpleNamespace(id=chat_id),
+        message=FakeMessage(chat_id, text) if data is None else None,
+        callback_query=FakeQuery(chat_id, data) if data is not None else None,
+    )
+
+@pytest.fixture
+def context():
+    """ The context of a logged in teacher. Background tasks are dropped. """
+    return SimpleNamespace(
+        user_data={"role": "teacher"},
+        bot=FakeBot(),
+        application=SimpleNamespace(create_task=lambda coroutine: coroutine.close()),
+        job_queue=None,
+    )
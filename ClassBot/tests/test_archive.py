@@ -0,0 +1,78 @@
+""" Resolved pendings are moved to pending_archive keeping their ids. """
+import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.sql import func
+
+from sql import session, pending_sql, token_sql, token_type_sql
+from models.pending import Pending
+from models.pending_message import Pending_message
+
+
+def resolved_ago(pending_ids: list[int], delta: datetime.timedelta) -> None:
+    """ Moves the approved_date of the pendings delta back, in the clock of the database. """
+    with session() as s:
+        now = s.scalar(select(func.now()))
+        s.execute(update(Pending).where(Pending.id.in_(pending_ids)).values(approved_date=now - delta))
+        s.commit()
+
+def test_archive_compares_with_the_database_clock(classroom, add_pendings):
+    old, recent = add_pendings(2)
+    pending_sql.approve_pendings([old, recent], classroom.teacher_id)
+    resolved_ago([old], datetime.timedelta(hours=2))
+    resolved_ago([recent], datetime.timedelta(minutes=30))
+    assert pending_sql.archive_resolved_pendings(datetime.timedelta(hours=1)) == 1
+    assert pending_sql.get_archived_pending(old)
+    assert pending_sql.get_pending(recent)
+
+def test_new_pendings_dont_take_archived_ids(classroom, add_pendings):
+    pending_ids = add_pendings(3)
+    pending_sql.approve_pendings(pending_ids, classroom.teacher_id)
+    resolved_ago(pending_ids, datetime.timedelta(days=2))
+    assert pending_sql.archive_resolved_pendings(datetime.timedelta(days=1)) == 3
+    new_ids = add_pendings(3)
+    assert not set(new_ids) & set(pending_ids)
+    assert min(new_ids) > max(pending_ids)
+
+def test_archived_pendings_keep_their_thread(classroom, add_pendings):
+    pending_id, = add_pendings(1)
+    pending_sql.ask_for_more_info(pending_id, "¿Puedes enviar la fuente?", classroom.teacher_id)
+    pending_sql.approve_pendings([pending_id], classroom.teacher_id)
+    resolved_ago([pending_id], datetime.timedelta(days=2))
+    pending_sql.archive_resolved_pendings(datetime.timedelta(days=1))
+    archived = pending_sql.get_archived_pending(pending_id)
+    assert "¿Puedes enviar la fuente?" in pending_sql.get_full_text(archived)
+    assert not pending_sql.get_messages(pending_id)
+
+def test_deleted_pendings_take_their_thread(classroom, add_pendings):
+    pending_id, = add_pendings(1)
+    pending_sql.ask_for_more_info(pending_id, "¿Puedes enviar la fuente?", classroom.teacher_id)
+    pending_sql.delete_pending(pending_id)
+    with session() as s:
+        assert not s.scalars(select(Pending_message)).all()
+
+def test_rejected_pendings_age_from_their_rejection(classroom, add_pendings):
+    old, recent = add_pendings(2)
+    # both submitted long ago, only one rejected long ago
+    with session() as s:
+        s.execute(update(Pending).values(creation_date=s.scalar(select(func.now())) - datetime.timedelta(days=2)))
+        s.commit()
+    pending_sql.reject_pendings([old, recent])
+    resolved_ago([old], datetime.timedelta(days=2))
+    assert pending_sql.archive_resolved_pendings(datetime.timedelta(days=1)) == 1
+    assert pending_sql.get_archived_pending(old)
+    assert pending_sql.get_pending(recent).status == "REJECTED"
+
+def test_history_checks_see_archived_pendings(classroom, add_pendings):
+    token_type_id = token_type_sql.get_token_type_by_type("Meme").id
+    token_id = token_sql.add_token(name="Meme 1", token_type_id=token_type_id, classroom_id=classroom.id)
+    student_id = classroom.student_ids[0]
+    pending_id = pending_sql.add_pending(student_id, classroom.id, token_type_id, token_id=token_id, text="meme")
+    pending_sql.approve_pendings([pending_id], classroom.teacher_id)
+    resolved_ago([pending_id], datetime.timedelta(days=2))
+    pending_sql.archive_resolved_pendings(datetime.timedelta(days=1))
+    assert pending_sql.get_pending_of_student_by_token(student_id, classroom.id, token_id).id == pending_id
+    assert pending_sql.get_last_pending_of_student_by_type(student_id, classroom.id, token_type_id).id == pending_id
+    new_id, = add_pendings(1)
+    assert pending_sql.get_last_pending_of_student_by_type(student_id, classroom.id, token_type_id).id == new_id
+    assert [pending.id for pending in pending_sql.get_pendings_of_student_by_type(student_id, classroom.id, token_type_id)] == [new_id, pending_id]
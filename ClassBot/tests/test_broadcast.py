@@ -0,0 +1,42 @@
+""" Broadcasts keep to the global and per chat rates, measured with a fake bot. """
+import asyncio
+import time
+
+import pytest
+
+from conftest import FakeBot
+from bot.utils import broadcast
+
+
+@pytest.fixture(autouse=True)
+def fast_limits(monkeypatch):
+    """ 100 messages per second with bursts of 10, and 10 per second per chat. """
+    monkeypatch.setattr(broadcast, "bucket", broadcast.TokenBucket(100, capacity=10))
+    monkeypatch.setattr(broadcast, "PER_CHAT_RATE", 10)
+    yield
+    broadcast._last_sent.clear()
+
+def timed_broadcast(bot, chat_ids) -> tuple[list, float]:
+    start = time.monotonic()
+    results = asyncio.run(broadcast.broadcast(bot, chat_ids, "Hola"))
+    return results, time.monotonic() - start
+
+def test_broadcast_keeps_to_the_global_rate():
+    bot = FakeBot()
+    results, elapsed = timed_broadcast(bot, range(60))
+    assert all(result.ok for result in results)
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == list(range(60))
+    # the burst of 10 goes at once, the other 50 at 100 per second
+    assert 0.45 < elapsed < 1.5
+
+def test_broadcast_keeps_to_the_per_chat_rate():
+    bot = FakeBot()
+    timed_broadcast(bot, [1])
+    _, elapsed = timed_broadcast(bot, [1])
+    assert elapsed >= 0.09
+
+def test_chats_that_can_get_messages_are_forgotten():
+    timed_broadcast(FakeBot(), range(60))
+    time.sleep(0.1)
+    timed_broadcast(FakeBot(), [100])
+    assert list(broadcast._last_sent) == [100]
@@ -0,0 +1,73 @@
+""" Bulk approval of the pendings of a list, compared with approving them one
+by one. The bulk buttons carry the filter of the list in their callback data. """
+import asyncio
+
+from telegram.ext import ConversationHandler
+
+from conftest import make_update
+from bot import teacher_pendings
+from bot.utils import states
+from bot.utils.pagination import filter_key
+from sql import pending_sql, token_type_sql, teacher_sql, teacher_classroom_sql
+
+
+def bulk_button(classroom, action: str) -> str:
+    """ Returns the callback data of the bulk button of the Meme list. """
+    key = filter_key(c=classroom.id, u=classroom.teacher_id, k=token_type_sql.get_token_type_by_type("Meme").id, f=0, b=1)
+    keyboard = teacher_pendings.token_type_pendings_list(key).keyboard()
+    return next(button.callback_data for row in keyboard.inline_keyboard for button in row if button.callback_data.startswith(action))
+
+def bulk_approve(classroom, context, value: str = "5"):
+    data = bulk_button(classroom, "bulk_approve")
+    state = asyncio.run(teacher_pendings.bulk_pendings(make_update(classroom.teacher_chat, data=data), context))
+    assert state == states.T_PENDING_BULK_APPROVE
+    update = make_update(classroom.teacher_chat, text=value)
+    assert asyncio.run(teacher_pendings.bulk_approve_pendings(update, context)) == ConversationHandler.END
+    return update.message.replies[-1][0]
+
+def test_bulk_buttons_work_without_user_data(classroom, add_pendings, context):
+    pending_ids = add_pendings(25)
+    # after a restart user_data is empty
+    context.user_data.clear()
+    assert bulk_approve(classroom, context) == "Se han aprobado 25 pendientes."
+    assert {pending.status for pending in pending_sql.get_pendings_by_ids(pending_ids).values()} == {"APPROVED"}
+
+def test_bulk_reject_without_selection_expires(classroom, context):
+    context.user_data.clear()
+    update = make_update(classroom.teacher_chat, text="fuera de plazo")
+    assert asyncio.run(teacher_pendings.bulk_reject_pendings(update, context)) == ConversationHandler.END
+    assert "ha expirado" in update.message.replies[-1][0]
+
+def test_bulk_approval_takes_fewer_queries_than_one_by_one(classroom, add_pendings, context, count_queries):
+    single_ids = add_pendings(100)
+    with count_queries() as single:
+        for pending_id in single_ids:
+            context.user_data["pending"] = {"id": pending_id}
+            asyncio.run(teacher_pendings.approve_pending(make_update(classroom.teacher_chat, text="5"), context))
+    add_pendings(100)
+    with count_queries() as bulk:
+        assert bulk_approve(classroom, context) == "Se han aprobado 100 pendientes."
+    print(f"\n100 pendings approved one by one: {len(single)} queries, at once: {len(bulk)} queries")
+    assert len(bulk) * 5 < len(single)
+
+def test_bulk_buttons_of_another_classroom_are_refused(classroom, add_pendings, context):
+    pending_ids = add_pendings(5)
+    # the teacher leaves the classroom, or forges the key of one it isn't in
+    teacher_classroom_sql.remove_teacher(classroom.teacher_id, classroom.id)
+    data = f"bulk_approve|{filter_key(c=classroom.id, u=classroom.teacher_id, k=token_type_sql.get_token_type_by_type('Meme').id, f=0, b=1)}"
+    update = make_update(classroom.teacher_chat, data=data)
+    assert asyncio.run(teacher_pendings.bulk_pendings(update, context)) == ConversationHandler.END
+    assert update.callback_query.edits[-1][0] == "Esta lista ya no está disponible."
+    assert "bulk" not in context.user_data.get("pending", {})
+    assert {pending.status for pending in pending_sql.get_pendings_by_ids(pending_ids).values()} == {"PENDING"}
+
+def test_bulk_approval_notifies_the_channel_of_the_list(classroom, add_pendings, context, monkeypatch):
+    add_pendings(5)
+    notified = []
+    monkeypatch.setattr(teacher_pendings, "notify_channel", lambda context, classroom_id, text, **kwargs: notified.append(classroom_id))
+    data = bulk_button(classroom, "bulk_approve")
+    asyncio.run(teacher_pendings.bulk_pendings(make_update(classroom.teacher_chat, data=data), context))
+    # the teacher switches classroom before sending the value
+    teacher_sql.set_teacher_active_classroom(classroom.teacher_id, None)
+    asyncio.run(teacher_pendings.bulk_approve_pendings(make_update(classroom.teacher_chat, text="5"), context))
+    assert notified == [classroom.id]
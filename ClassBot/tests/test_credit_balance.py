@@ -0,0 +1,104 @@
+""" The credit balances follow the student_token and guild_token rows, and the
+maintenance commands find and fix the ones that don't. The cached credit
+summaries are dropped when the credits change. """
+import pytest
+from sqlalchemy import select, update, delete
+
+from sql import session, unit_of_work, credit_balance_sql, student_token_sql, guild_token_sql, guild_sql, student_guild_sql, token_sql, token_type_sql
+from models.credit_balance import Credit_balance
+from models.student_token import Student_token
+
+
+def new_token(classroom, name: str) -> int:
+    return token_sql.add_token(name=name, token_type_id=token_type_sql.get_token_type_by_type("Meme").id, classroom_id=classroom.id)
+
+def award(classroom) -> int:
+    """ Gives tokens to the first three students and to a guild of the next
+    two. Returns the guild id. """
+    first, second, third = classroom.student_ids[:3]
+    student_token_sql.add_student_tokens([(first, new_token(classroom, "Meme 1"), 5), (second, new_token(classroom, "Meme 2"), 3)])
+    student_token_sql.add_student_token(third, new_token(classroom, "Meme 3"), 8)
+    guild_id = guild_sql.add_guild(classroom.id, "Gremio")
+    for student_id in classroom.student_ids[3:5]:
+        student_guild_sql.add_student_guild(student_id, guild_id)
+    guild_token_sql.add_guild_token(guild_id, new_token(classroom, "Meme del gremio"), 10)
+    return guild_id
+
+def test_balances_follow_the_tokens(classroom):
+    guild_id = award(classroom)
+    assert credit_balance_sql.get_student_balances(classroom.id) == {
+        classroom.student_ids[0]: 5, classroom.student_ids[1]: 3, classroom.student_ids[2]: 8,
+        classroom.student_ids[3]: 10, classroom.student_ids[4]: 10,
+    }
+    assert credit_balance_sql.get_guild_balances(classroom.id) == {guild_id: 10}
+    assert credit_balance_sql.check_balances() == []
+
+def test_check_finds_and_rebuild_fixes_corrupted_balances(classroom):
+    guild_id = award(classroom)
+    first, second = classroom.student_ids[:2]
+    expected = credit_balance_sql.get_student_balances(classroom.id), credit_balance_sql.get_guild_balances(classroom.id)
+    with session() as s:
+        s.execute(update(Credit_balance).where(Credit_balance.student_id == first).values(value=50))
+        s.execute(delete(Credit_balance).where(Credit_balance.student_id == second))
+        s.execute(update(Credit_balance).where(Credit_balance.guild_id == guild_id).values(value=0))
+        s.commit()
+
+    assert set(credit_balance_sql.check_balances()) == {
+        (classroom.id, first, None, 50, 5),
+        (classroom.id, second, None, 0, 3),
+        (classroom.id, None, guild_id, 0, 10),
+    }
+    assert credit_balance_sql.rebuild_balances() == 6
+    assert credit_balance_sql.check_balances() == []
+    assert (credit_balance_sql.get_student_balances(classroom.id), credit_balance_sql.get_guild_balances(classroom.id)) == expected
+
+def summary_key(student_id: int, classroom) -> tuple:
+    return ("student", student_id, classroom.id, "week")
+
+def cached_totals(classroom, *student_ids) -> None:
+    """ Loads the weekly summaries of the students into the cache. """
+    for student_id in student_ids:
+        credit_balance_sql.get_credit_summary(classroom.id, student_id=student_id)
+        assert summary_key(student_id, classroom) in credit_balance_sql.summary_cache
+
+def test_summary_cache_is_dropped_when_the_credits_change(classroom):
+    first, second = classroom.student_ids[:2]
+    token_id = new_token(classroom, "Meme 1")
+
+    cached_totals(classroom, first, second)
+    student_token_sql.add_student_token(first, token_id, 5)
+    assert summary_key(first, classroom) not in credit_balance_sql.summary_cache
+    # the summaries of other students are kept
+    assert summary_key(second, classroom) in credit_balance_sql.summary_cache
+    assert [row.total for row in credit_balance_sql.get_credit_summary(classroom.id, student_id=first)] == [5]
+
+    with session() as s:
+        s.scalars(select(Student_token).where(Student_token.student_id == first)).one().value = 7
+        s.commit()
+    assert summary_key(first, classroom) not in credit_balance_sql.summary_cache
+    assert [row.total for row in credit_balance_sql.get_credit_summary(classroom.id, student_id=first)] == [7]
+
+    student_token_sql.remove_token(first, token_id)
+    assert summary_key(first, classroom) not in credit_balance_sql.summary_cache
+    assert credit_balance_sql.get_credit_summary(classroom.id, student_id=first) == []
+
+def test_summary_cache_is_dropped_for_guild_members(classroom):
+    members = classroom.student_ids[3:5]
+    guild_id = guild_sql.add_guild(classroom.id, "Gremio")
+    for student_id in members:
+        student_guild_sql.add_student_guild(student_id, guild_id)
+    cached_totals(classroom, *members)
+    # the members get the token with an insert that skips the ORM
+    guild_token_sql.add_guild_token(guild_id, new_token(classroom, "Meme del gremio"), 10)
+    for student_id in members:
+        assert summary_key(student_id, classroom) not in credit_balance_sql.summary_cache
+        assert [row.total for row in credit_balance_sql.get_credit_summary(classroom.id, student_id=student_id)] == [10]
+
+def test_summary_cache_is_kept_on_rollback(classroom):
+    first = classroom.student_ids[0]
+    cached_totals(classroom, first)
+    with pytest.raises(ValueError):
+        with unit_of_work():
+            student_token_sql.add_student_token(first, new_token(classroom, "Meme 1"), 5)
+            raise ValueError
+    assert summary_key(first, classroom) in credit_balance_sql.summary_cache
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+import sql
+from sql import user_sql, pending_sql
+from models.base import Base
+from models.token_type import Token_type
+from conftest import make_classroom
+
+
+def test_sqlite_pragmas_applied_to_every_connection():
+    with sql.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1   # NORMAL
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+    assert not sql.engine.echo
+
+def _classroom_workload(engine, monkeypatch, n: int = 300) -> tuple[float, float]:
+    """ Runs the sql helpers against engine on a synthetic classroom of 30
+    students. Returns the pendings submitted per second, one transaction each
+    like the handlers do, and the pending screens read per second: a page of
+    the queue, the lookup of a student by chat and its pendings of a type. """
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(sql, "_session_factory", sessionmaker(bind=engine, expire_on_commit=False))
+    sql.create_default_token_types(sql.session)
+    classroom = make_classroom()
+    with sql.session() as s:
+        token_type_id = s.scalar(select(Token_type.id).where(Token_type.type == "Meme"))
+
+    start = time.perf_counter()
+    for i in range(n):
+        pending_sql.add_pending(classroom.student_ids[i % 30], classroom.id, token_type_id, text=f"pendiente {i}")
+    writes = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(n):
+        pending_sql.get_pending_rows(classroom.id, limit=10)
+        student = user_sql.get_user_by_chatid(2000 + i % 30)
+        pending_sql.get_pendings_of_student_by_type(student.id, classroom.id, token_type_id)
+    reads = n / (time.perf_counter() - start)
+    return writes, reads
+
+@pytest.mark.benchmark
+def test_classroom_throughput_with_pragmas(tmp_path, monkeypatch):
+    """ The classroom workload with the configured pragmas against sqlite's
+    defaults (rollback journal, synchronous=FULL). """
+    default = create_engine(f"sqlite:///{tmp_path}/default.db")
+    configured = create_engine(f"sqlite:///{tmp_path}/configured.db")
+    event.listen(configured, "connect", sql._set_sqlite_pragmas)
+    default_writes, default_reads = _classroom_workload(default, monkeypatch)
+    configured_writes, configured_reads = _classroom_workload(configured, monkeypatch)
+    print(f"\npendings submitted/s: default {default_writes:.0f}, configured {configured_writes:.0f}")
+    print(f"pending screens read/s: default {default_reads:.0f}, configured {configured_reads:.0f}")
+    assert configured_writes > default_writes
+    # reads don't wait for the disk, the pragmas must not slow them down
+    assert configured_reads > default_reads * 0.8
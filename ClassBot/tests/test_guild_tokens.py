@@ -0,0 +1,53 @@
+""" A guild token is given to its members with one insert, with the same result
+as giving it to them one by one. """
+import pytest
+from sqlalchemy import select
+
+from sql import session, credit_balance_sql, guild_sql, guild_token_sql, student_guild_sql, student_token_sql, token_sql, token_type_sql
+from models.guild_token import Guild_token
+from models.student_token import Student_token
+
+
+def add_guild_token_one_by_one(guild_id: int, token_id: int, value: int, teacher_id: int = None) -> None:
+    """ What add_guild_token did before the fan-out, a student_token per member. """
+    for student_id in student_guild_sql.get_student_ids(guild_id):
+        if not student_token_sql.exists(student_id, token_id):
+            student_token_sql.add_student_token(student_id, token_id, value, teacher_id=teacher_id)
+    with session() as s:
+        s.add(Guild_token(guild_id=guild_id, token_id=token_id, value=value, teacher_id=teacher_id))
+        s.commit()
+
+@pytest.fixture
+def guilds(classroom):
+    """ Two guilds of five students. In both, the first member already has the
+    token of the guild, like a student that moved from another guild. Returns
+    [(guild_id, token_id, member ids)]. """
+    token_type_id = token_type_sql.get_token_type_by_type("Meme").id
+    result = []
+    for i in range(2):
+        guild_id = guild_sql.add_guild(classroom.id, f"Gremio {i}")
+        members = classroom.student_ids[5 * i:5 * i + 5]
+        for student_id in members:
+            student_guild_sql.add_student_guild(student_id, guild_id)
+        token_id = token_sql.add_token(name=f"Meme del gremio {i}", token_type_id=token_type_id, classroom_id=classroom.id)
+        student_token_sql.add_student_token(members[0], token_id, 4)
+        result.append((guild_id, token_id, members))
+    return result
+
+def rows(token_id: int, members: list[int]) -> list[tuple]:
+    """ The student_token rows of the token, with the members by position. """
+    with session() as s:
+        found = s.execute(select(Student_token.student_id, Student_token.value, Student_token.teacher_id).where(Student_token.token_id == token_id)).all()
+    return sorted((members.index(student_id), value, teacher_id) for student_id, value, teacher_id in found)
+
+def test_fan_out_matches_the_per_member_loop(classroom, guilds):
+    (fan_out, fan_out_token, fan_out_members), (loop, loop_token, loop_members) = guilds
+    guild_token_sql.add_guild_token(fan_out, fan_out_token, 10, teacher_id=classroom.teacher_id)
+    add_guild_token_one_by_one(loop, loop_token, 10, teacher_id=classroom.teacher_id)
+
+    assert rows(fan_out_token, fan_out_members) == rows(loop_token, loop_members)
+    assert rows(fan_out_token, fan_out_members) == [(0, 4, None)] + [(i, 10, classroom.teacher_id) for i in range(1, 5)]
+    balances = credit_balance_sql.get_student_balances(classroom.id)
+    assert [balances[student_id] for student_id in fan_out_members] == [balances[student_id] for student_id in loop_members] == [4, 10, 10, 10, 10]
+    assert credit_balance_sql.get_guild_balance(fan_out, classroom.id) == credit_balance_sql.get_guild_balance(loop, classroom.id) == 10
+    assert credit_balance_sql.check_balances() == []
@@ -0,0 +1,42 @@
+""" The chat id -> identity cache is dropped only once the change is committed. """
+import threading
+
+import pytest
+
+from sql import unit_of_work, user_sql, teacher_sql, student_sql, classroom_sql
+
+
+def read_elsewhere(chatid: int, role: str):
+    """ get_identity from another thread, outside the open unit of work, like
+    a concurrent update would. """
+    result = []
+    thread = threading.Thread(target=lambda: result.append(user_sql.get_identity(chatid, role)))
+    thread.start()
+    thread.join()
+    return result[0]
+
+def test_concurrent_read_doesnt_keep_the_old_classroom(classroom):
+    with unit_of_work():
+        teacher_sql.set_teacher_active_classroom(classroom.teacher_id, None)
+        # not committed yet, the other update still sees (and caches) the old classroom
+        assert read_elsewhere(classroom.teacher_chat, "teacher").active_classroom_id == classroom.id
+    assert user_sql.get_identity(classroom.teacher_chat, "teacher").active_classroom_id is None
+
+def test_rolled_back_change_keeps_the_cache(classroom):
+    user_sql.get_identity(classroom.teacher_chat, "teacher")
+    with pytest.raises(ValueError):
+        with unit_of_work():
+            teacher_sql.set_teacher_active_classroom(classroom.teacher_id, None)
+            raise ValueError
+    assert user_sql.get_identity(classroom.teacher_chat, "teacher").active_classroom_id == classroom.id
+
+def test_deleted_classroom_is_no_longer_active(classroom, count_queries):
+    student_sql.set_student_active_classroom(classroom.student_ids[0], classroom.id)
+    assert user_sql.get_identity(classroom.teacher_chat, "teacher").active_classroom_id == classroom.id
+    assert user_sql.get_identity(2000, "student").active_classroom_id == classroom.id
+    with count_queries() as queries:
+        classroom_sql.delete_classroom(classroom.id)
+    # not one update per member of the classroom
+    assert sum(query.lstrip().upper().startswith("UPDATE") for query in queries) == 2
+    assert user_sql.get_identity(classroom.teacher_chat, "teacher").active_classroom_id is None
+    assert user_sql.get_identity(2000, "student").active_classroom_id is None
@@ -0,0 +1,53 @@
+""" The hot queries use the indexes declared on the models, checked with
+EXPLAIN QUERY PLAN on the statements the sql helpers actually send. """
+import re
+
+import pytest
+from sqlalchemy import select, event
+
+import sql
+from sql import user_sql, pending_sql, student_token_sql
+from models.token_type import Token_type
+
+
+def query_plan(func, *args, **kwargs) -> str:
+    """ Returns the query plans of the statements run by func(*args, **kwargs). """
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *rest: statements.append((statement, parameters))
+    event.listen(sql.engine, "before_cursor_execute", listener)
+    try:
+        func(*args, **kwargs)
+    finally:
+        event.remove(sql.engine, "before_cursor_execute", listener)
+    assert statements, f"{func.__name__} didn't query the database"
+    with sql.engine.connect() as connection:
+        return "\n".join(
+            row[-1]
+            for statement, parameters in statements
+            for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        )
+
+@pytest.mark.parametrize("func, args, kwargs, index", [
+    (user_sql.get_user_by_chatid, (1000,), {}, "ix_user_telegram_chatid"),
+    (pending_sql.get_pendings_by_classroom, (1,), {"status": "PENDING"}, "ix_pending_classroom_status_teacher_creation"),
+    (pending_sql.get_pendings_by_token_type, (1, 1), {"status": "PENDING"}, "ix_pending_classroom_token_type_status"),
+    (pending_sql.get_pendings_by_guild, (1, 1), {"status": "PENDING"}, "ix_pending_classroom_guild_status"),
+    (pending_sql.get_pendings_of_student_by_type, (1, 1, 1), {}, "ix_pending_classroom_student_token_type"),
+    (pending_sql.get_pending_rows, (1,), {"limit": 10}, "ix_pending_classroom_status_teacher_creation"),
+    (pending_sql.get_approved_pendings_of_teacher, (1, 1), {}, "ix_pending_classroom_approved_by"),
+    (pending_sql.get_approved_pending_rows_of_teacher, (1, 1), {"limit": 10}, "ix_pending_archive_classroom_approved_by"),
+    (student_token_sql.get_student_ids, (1,), {}, "ix_student_token_token_id"),
+    (student_token_sql.get_values_by_token_ids, ([1, 2],), {}, "ix_student_token_token_id"),
+])
+def test_hot_query_uses_index(func, args, kwargs, index):
+    assert re.search(rf"USING (COVERING )?INDEX {index}\b", query_plan(func, *args, **kwargs))
+
+def test_token_type_lookup_uses_the_unique_index():
+    # served from the registry, the query is only run to load it. type is
+    # unique, its own index is the one to use, no other index is needed
+    statement = select(Token_type).where(Token_type.type == "Meme", Token_type.classroom_id == 1)
+    compiled = statement.compile(sql.engine, compile_kwargs={"literal_binds": True})
+    with sql.engine.connect() as connection:
+        plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+        unique_indexes = [row[1] for row in connection.exec_driver_sql("PRAGMA index_list(token_type)") if row[2]]
+    assert re.match(r"SEARCH token_type USING INDEX (\w+)", plan).group(1) in unique_indexes
@@ -0,0 +1,36 @@
+""" Keyset pagination of the pending queue and history. The pendings are
+created in the same second, so the cursors only differ in the id. """
+from sql import pending_sql
+
+
+def walk(fetch, row_key, limit: int = 10) -> list[int]:
+    """ Returns the ids of every page fetched with fetch(after, limit). Stops
+    after 10 pages, a broken cursor could return the same page forever. """
+    ids, after = [], None
+    for _ in range(10):
+        rows = fetch(after, limit)
+        if not rows:
+            break
+        ids.extend(row.id for row in rows)
+        after = row_key(rows[-1])
+    return ids
+
+def test_queue_pages_pendings_of_the_same_second(classroom, add_pendings):
+    pending_ids = add_pendings(25)
+    ids = walk(lambda after, limit: pending_sql.get_pending_rows(classroom.id, after=after, limit=limit), pending_sql.pending_row_key)
+    assert ids == pending_ids
+
+def test_history_pages_pendings_approved_in_the_same_second(classroom, add_pendings):
+    pending_ids = add_pendings(25)
+    pending_sql.approve_pendings(pending_ids, classroom.teacher_id)
+    ids = walk(
+        lambda after, limit: pending_sql.get_approved_pending_rows_of_teacher(classroom.teacher_id, classroom.id, after=after, limit=limit),
+        lambda row: pending_sql.pending_row_key(row, "APPROVED"),
+    )
+    assert ids == pending_ids[::-1]
+
+def test_previous_page_of_pendings_of_the_same_second(classroom, add_pendings):
+    pending_ids = add_pendings(25)
+    third_page = pending_sql.get_pending_rows(classroom.id, after=pending_sql.pending_row_key(pending_sql.get_pending_rows(classroom.id, limit=20)[-1]), limit=10)
+    second_page = pending_sql.get_pending_rows(classroom.id, before=pending_sql.pending_row_key(third_page[0]), limit=10)
+    assert [row.id for row in second_page] == pending_ids[10:20]
@@ -0,0 +1,86 @@
+""" The leaderboard is ranked by the database: students with the same credits
+share the rank and the pages follow the (rank, id) cursor. """
+import asyncio
+import datetime
+import time
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.sql import func
+
+from conftest import make_update
+from bot import student_inventory
+from sql import session, credit_balance_sql, student_sql, student_token_sql, token_sql, token_type_sql
+from models.student_token import Student_token
+
+
+# credits of the first students of the classroom, the rest have none
+CREDITS = [5, 8, 8, 3, 8, 1, 3, 12, 5, 2]
+
+@pytest.fixture
+def awarded(classroom):
+    """ Gives CREDITS to the first students, one token each. """
+    token_type_id = token_type_sql.get_token_type_by_type("Meme").id
+    student_token_sql.add_student_tokens([
+        (student_id, token_sql.add_token(name=f"Meme {i}", token_type_id=token_type_id, classroom_id=classroom.id), value)
+        for i, (student_id, value) in enumerate(zip(classroom.student_ids, CREDITS))
+    ])
+    return classroom
+
+def expected_ranking(classroom) -> list[tuple[int, int, int]]:
+    """ (rank, id, total) of every student, ranked in python. """
+    totals = {student_id: 0 for student_id in classroom.student_ids}
+    totals.update(zip(classroom.student_ids, CREDITS))
+    return sorted((1 + sum(other > total for other in totals.values()), student_id, total) for student_id, total in totals.items())
+
+def test_students_with_the_same_credits_share_the_rank(awarded):
+    rows = credit_balance_sql.get_leaderboard(awarded.id)
+    assert [(row.rank, row.id, row.total) for row in rows] == expected_ranking(awarded)
+    # the three students with 8 credits, after the one with 12
+    assert [row.rank for row in rows[:5]] == [1, 2, 2, 2, 5]
+
+def test_pages_follow_the_rank_and_id_cursor(awarded):
+    ids, after = [], None
+    for _ in range(10):     # a broken cursor could return the same page forever
+        rows = credit_balance_sql.get_leaderboard(awarded.id, after=after, limit=7)
+        if not rows:
+            break
+        ids.extend(row.id for row in rows)
+        after = credit_balance_sql.leaderboard_row_key(rows[-1])
+    assert ids == [student_id for _, student_id, _ in expected_ranking(awarded)]
+
+    full = credit_balance_sql.get_leaderboard(awarded.id)
+    previous = credit_balance_sql.get_leaderboard(awarded.id, before=credit_balance_sql.leaderboard_row_key(full[14]), limit=7)
+    assert previous == full[7:14]
+
+def test_rank_lookup_matches_the_leaderboard(awarded):
+    for row in credit_balance_sql.get_leaderboard(awarded.id):
+        assert credit_balance_sql.get_student_rank(row.id, awarded.id) == row
+    assert credit_balance_sql.get_student_rank(awarded.teacher_id, awarded.id) is None
+
+@pytest.fixture
+def ahead_of_utc(monkeypatch):
+    """ Five hours ahead of UTC, the dates the database writes are in UTC. """
+    monkeypatch.setenv("TZ", "Etc/GMT-5")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_inventory_shows_the_rank_and_recent_credits(awarded, context, ahead_of_utc):
+    student_id = awarded.student_ids[1]
+    student_sql.set_student_active_classroom(student_id, awarded.id)
+    # the token of the student is almost RECENT_DAYS days old in the clock of the database
+    with session() as s:
+        now = s.scalar(select(func.now()))
+        s.execute(update(Student_token).where(Student_token.student_id == student_id).values(
+            creation_date=now - datetime.timedelta(days=credit_balance_sql.RECENT_DAYS) + datetime.timedelta(hours=2)
+        ))
+        s.commit()
+    context.user_data["role"] = "student"
+    request = make_update(2001, text="📦 Inventario")
+    asyncio.run(student_inventory.student_inventory(request, context))
+    assert request.message.replies[-1][0] == (
+        f"Tienes 8 créditos, puesto 2 de 30 en el aula.\n"
+        f"+8 créditos en los últimos {credit_balance_sql.RECENT_DAYS} días."
+    )
@@ -0,0 +1,19 @@
+""" load_by_ids reuses the rows it loaded only inside a unit of work. """
+from sql import unit_of_work, user_sql
+
+
+def test_rows_are_reused_inside_a_unit_of_work(classroom, count_queries):
+    ids = classroom.student_ids[:5]
+    with count_queries() as queries, unit_of_work():
+        first = user_sql.get_users_by_ids(ids)
+        second = user_sql.get_users_by_ids(ids[:3])
+    assert sum(query.lstrip().upper().startswith("SELECT") for query in queries) == 1
+    assert sorted(first) == ids and sorted(second) == ids[:3]
+    assert second[ids[0]] is first[ids[0]]
+
+def test_every_call_queries_outside_a_unit_of_work(classroom, count_queries):
+    ids = classroom.student_ids[:5]
+    with count_queries() as queries:
+        user_sql.get_users_by_ids(ids)
+        user_sql.get_users_by_ids(ids)
+    assert sum(query.lstrip().upper().startswith("SELECT") for query in queries) == 2
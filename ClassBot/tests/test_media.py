@@ -0,0 +1,109 @@
+""" Stored files are sent with the method of their kind and local images are
+uploaded once. media.stats counts how they were sent, it starts at zero in
+every test. """
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+from conftest import FakeBot
+from bot.utils import media
+from sql import telegram_file_sql
+
+
+def telegram_file(file_id: str) -> SimpleNamespace:
+    return SimpleNamespace(file_id=file_id, file_unique_id=f"unique-{file_id}", file_size=100)
+
+class MediaBot(FakeBot):
+    """ Records the send methods called. Telegram refuses documents sent as photos. """
+    def __init__(self, documents=()) -> None:
+        super().__init__()
+        self.documents = set(documents)
+        self.calls = []
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.calls.append(("photo", photo))
+        if photo in self.documents:
+            raise BadRequest("Type of file mismatch")
+        return SimpleNamespace(photo=[telegram_file(photo)])
+
+    async def send_document(self, chat_id, document, **kwargs):
+        self.calls.append(("document", document))
+        return SimpleNamespace(document=telegram_file(document))
+
+def send(bot, file_id: str) -> None:
+    asyncio.run(media.send_media(bot, 2000, file_id))
+
+@pytest.fixture(autouse=True)
+def starts_at_zero():
+    assert not media.stats
+
+def test_recorded_kinds_are_sent_directly():
+    telegram_file_sql.add_file("foto", "photo")
+    telegram_file_sql.add_file("doc", "document")
+    bot = MediaBot(documents={"doc"})
+    send(bot, "foto")
+    send(bot, "doc")
+    assert bot.calls == [("photo", "foto"), ("document", "doc")]
+    assert media.stats == {"direct": 2, "avoided_fallbacks": 1}
+
+def test_unknown_documents_fall_back_once():
+    bot = MediaBot(documents={"doc"})
+    send(bot, "doc")
+    assert bot.calls == [("photo", "doc"), ("document", "doc")]
+    assert media.stats == {"probed": 1, "fallbacks": 1}
+    # the kind that worked is recorded, the next send goes straight to it
+    send(bot, "doc")
+    assert bot.calls[2:] == [("document", "doc")]
+    assert media.stats == {"probed": 1, "fallbacks": 1, "direct": 1, "avoided_fallbacks": 1}
+
+def test_unknown_photos_are_probed_without_fallback():
+    bot = MediaBot()
+    send(bot, "foto")
+    send(bot, "foto")
+    assert bot.calls == [("photo", "foto"), ("photo", "foto")]
+    assert media.stats == {"probed": 1, "direct": 1}
+
+class PhotoMessage:
+    """ A message that replies with photos. Uploads get a new file id, the
+    file ids in stale aren't accepted anymore. """
+    def __init__(self, stale=()) -> None:
+        self.stale = set(stale)
+        self.sent = []
+
+    async def reply_photo(self, photo, **kwargs):
+        self.sent.append(photo)
+        if isinstance(photo, bytes):
+            return SimpleNamespace(photo=[telegram_file(f"subida-{len(self.sent)}")])
+        if photo in self.stale:
+            raise BadRequest("Wrong file identifier")
+        return SimpleNamespace(photo=[telegram_file(photo)])
+
+@pytest.fixture
+def medal(tmp_path) -> str:
+    """ The source of a local medal image. """
+    path = tmp_path / "medalla.png"
+    path.write_bytes(b"png")
+    return f"path:{path}"
+
+def test_local_photo_is_uploaded_once(medal):
+    message = PhotoMessage()
+    asyncio.run(media.reply_local_photo(message, medal))
+    asyncio.run(media.reply_local_photo(message, medal))
+    assert message.sent == [b"png", "subida-1"]
+    assert media.stats == {"uploads": 1, "uploads_avoided": 1}
+    # also after a restart, from the database
+    telegram_file_sql.source_cache.clear()
+    assert telegram_file_sql.get_file_id_by_source(medal) == "subida-1"
+
+def test_stale_file_id_is_uploaded_again(medal):
+    asyncio.run(media.reply_local_photo(PhotoMessage(), medal))
+    message = PhotoMessage(stale={"subida-1"})
+    asyncio.run(media.reply_local_photo(message, medal))
+    assert message.sent == ["subida-1", b"png"]
+    assert media.stats == {"uploads": 2}
+    # the new upload replaces the stale one
+    assert telegram_file_sql.get_file_id_by_source(medal) == "subida-2"
+    telegram_file_sql.source_cache.clear()
+    assert telegram_file_sql.get_file_id_by_source(medal) == "subida-2"
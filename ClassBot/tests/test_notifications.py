@@ -0,0 +1,44 @@
+""" Digests of the notification channel are kept when telegram can't take them. """
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter, NetworkError, Forbidden
+
+from conftest import FakeBot
+from bot.utils import notifications
+
+
+CHAN = "@canal"
+
+class FailingBot(FakeBot):
+    """ Raises error on every send. """
+    def __init__(self, error: Exception) -> None:
+        super().__init__()
+        self.error = error
+
+    async def send_message(self, chat_id, text, **kwargs):
+        raise self.error
+
+@pytest.fixture(autouse=True)
+def digests():
+    yield notifications._digests
+    notifications._digests.clear()
+
+@pytest.mark.parametrize("error", [RetryAfter(5), NetworkError("sin conexión")])
+def test_digest_waits_for_the_next_flush(digests, error):
+    digests[CHAN] = ["uno", "dos"]
+    asyncio.run(notifications._flush(FailingBot(error), CHAN))
+    assert digests[CHAN] == ["uno\n\ndos"]
+    bot = FakeBot()
+    asyncio.run(notifications._flush(bot, CHAN))
+    assert [text for _, text, _ in bot.sent] == ["uno\n\ndos"]
+    assert not digests.get(CHAN)
+
+def test_digest_is_dropped_when_the_channel_is_gone(digests):
+    digests[CHAN] = ["uno"]
+    asyncio.run(notifications._flush(FailingBot(Forbidden("bot was kicked")), CHAN))
+    assert not digests.get(CHAN)
+
+def test_direct_notification_waits_for_the_next_flush(digests):
+    asyncio.run(notifications._send_now(FailingBot(RetryAfter(5)), CHAN, "<b>tres</b> & cuatro"))
+    assert digests[CHAN] == ["&lt;b&gt;tres&lt;/b&gt; &amp; cuatro"]
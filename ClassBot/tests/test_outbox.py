@@ -0,0 +1,40 @@
+""" Every outbox date comes from the database clock, whatever the local time zone. """
+import datetime
+import time
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.sql import func
+
+from sql import session, outbox_sql
+from models.outbox import Outbox
+
+
+@pytest.fixture(autouse=True)
+def local_time_zone(monkeypatch):
+    """ Five hours behind UTC, the dates the database writes are in UTC. """
+    monkeypatch.setenv("TZ", "Etc/GMT+5")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def enqueued() -> int:
+    outbox_sql.enqueue(2000, "Hola")
+    return outbox_sql.get_due(10)[0].id
+
+def test_retried_messages_wait_for_the_delay():
+    message_id = enqueued()
+    outbox_sql.retry_later(message_id, "sin conexión", datetime.timedelta(hours=1))
+    assert not outbox_sql.get_due(10)
+    outbox_sql.retry_later(message_id, "sin conexión", datetime.timedelta(0))
+    assert [message.id for message in outbox_sql.get_due(10)] == [message_id]
+
+def test_only_old_sent_messages_are_deleted():
+    message_id = enqueued()
+    outbox_sql.mark_sent([message_id])
+    assert outbox_sql.delete_sent(datetime.timedelta(hours=1)) == 0
+    with session() as s:
+        s.execute(update(Outbox).values(creation_date=s.scalar(select(func.now())) - datetime.timedelta(hours=2)))
+        s.commit()
+    assert outbox_sql.delete_sent(datetime.timedelta(hours=1)) == 1
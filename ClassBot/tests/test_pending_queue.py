@@ -0,0 +1,23 @@
+""" The pending queue is read with one joined query, one page at a time. """
+import asyncio
+
+from conftest import make_update
+from bot import teacher_pendings
+
+
+def open_queue(classroom, context):
+    update = make_update(classroom.teacher_chat, text="🗃 Pendientes")
+    asyncio.run(teacher_pendings.teacher_pendings(update, context))
+    return update.message.replies[-1][0]
+
+def test_queue_opens_in_constant_query_count(classroom, add_pendings, context, count_queries):
+    add_pendings(10)
+    open_queue(classroom, context)     # warms the identity cache
+    with count_queries() as short_queue:
+        open_queue(classroom, context)
+    add_pendings(290)
+    with count_queries() as long_queue:
+        text = open_queue(classroom, context)
+    assert "Pendientes del aula (300)" in text
+    assert len(long_queue) == len(short_queue)
+    assert sum("FROM pending" in statement for statement in long_queue) == 1
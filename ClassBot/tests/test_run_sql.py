@@ -0,0 +1,70 @@
+""" run_sql lets handlers await the sql helpers while the event loop keeps
+serving other updates. """
+import asyncio
+import statistics
+import time
+
+import pytest
+
+from sql import run_sql, pending_sql
+
+
+def slow_helper(seconds: float) -> float:
+    """ Stands for a long blocking write, like a classroom deleted in cascade. """
+    time.sleep(seconds)
+    return seconds
+
+async def max_loop_lag(task) -> float:
+    """ Runs task while measuring how late a 10 ms timer fires, returns the worst delay. """
+    lag = 0.0
+    async def tick():
+        nonlocal lag
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - start - 0.01)
+    ticker = asyncio.create_task(tick())
+    await task
+    ticker.cancel()
+    return lag
+
+def test_run_sql_returns_the_result():
+    assert asyncio.run(run_sql(slow_helper, 0)) == 0
+
+def test_run_sql_doesnt_block_the_event_loop():
+    async def main():
+        return await max_loop_lag(run_sql(slow_helper, 0.3))
+    assert asyncio.run(main()) < 0.1
+
+async def _users(classroom_id: int, call, users: int = 50, requests: int = 10, interval: float = 0.2) -> list[float]:
+    """ users concurrent users, each asking for a page of pendings every
+    interval seconds while another one runs slow writes. Returns the latency
+    of every request, from the moment it arrives until it is answered. """
+    latencies = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async def user(offset: float):
+        for i in range(requests):
+            arrival = start + offset + i * interval
+            await asyncio.sleep(max(0, arrival - loop.time()))
+            await call(pending_sql.get_pending_rows, classroom_id, limit=10)
+            latencies.append(loop.time() - arrival)
+    async def writer():
+        for _ in range(5):
+            await call(slow_helper, 0.1)
+            await asyncio.sleep(0.2)
+    await asyncio.gather(writer(), *(user(n * interval / users) for n in range(users)))
+    return latencies
+
+def _p99(latencies: list[float]) -> float:
+    return statistics.quantiles(latencies, n=100)[98]
+
+@pytest.mark.benchmark
+def test_p99_latency_with_50_users(classroom, add_pendings):
+    add_pendings(30)
+    async def inline(func, *args, **kwargs):     # how the handlers called the helpers before
+        return func(*args, **kwargs)
+    inline_p99 = _p99(asyncio.run(_users(classroom.id, inline)))
+    pool_p99 = _p99(asyncio.run(_users(classroom.id, run_sql)))
+    print(f"\np99 latency of 50 users: inline {inline_p99 * 1000:.1f} ms, run_sql {pool_p99 * 1000:.1f} ms")
+    assert pool_p99 < inline_p99
@@ -0,0 +1,97 @@
+""" The stateless lists of pendings are walked through their pg| buttons only,
+as after a restart. The pendings are created in the same second, so the
+cursors in the callback data only differ in the id. The buttons only work for
+the teachers of the classroom, and personal lists only for their teacher. """
+import asyncio
+import re
+
+import pytest
+
+from conftest import make_update
+from bot import teacher_pendings, teacher_classroom     # register their lists
+from bot.utils import pagination
+from bot.utils.pagination import filter_key
+from sql import pending_sql, token_type_sql, user_sql, teacher_sql, teacher_classroom_sql
+
+
+def pending_ids(text: str) -> list[int]:
+    return [int(pending_id) for pending_id in re.findall(r"/pending_(\d+)", text)]
+
+def button(keyboard, text: str) -> str | None:
+    """ Returns the callback data of the button with the given text. """
+    return next((button.callback_data for row in keyboard.inline_keyboard for button in row if button.text == text), None)
+
+def walk(paginator, chat_id: int, direction: str) -> list[list[int]]:
+    """ Presses direction (">>" or "<<") until the last page. Returns the ids of
+    every page, starting with the one shown. """
+    text, keyboard = paginator.text(), paginator.keyboard()
+    pages = [pending_ids(text)]
+    for _ in range(10):     # a broken cursor could never reach the last page
+        data = button(keyboard, direction)
+        if not data:
+            break
+        assert data.startswith("pg|") and len(data.encode()) <= 64
+        update = make_update(chat_id, data=data)
+        asyncio.run(pagination.stateless_update(update, None))
+        text, keyboard = update.callback_query.edits[-1]
+        pages.append(pending_ids(text))
+    return pages
+
+def last_page(paginator):
+    """ Returns the paginator of the last page, rebuilt from its callback data. """
+    while data := button(paginator.keyboard(), ">>"):
+        _, kind, key, page, cursor = data.split("|")
+        paginator = pagination._lists[kind](key)
+        paginator.go_to(int(page), pagination._decode_cursor(cursor[1:]))
+    return paginator
+
+@pytest.mark.parametrize("kind", ["pend", "pendt", "pendh"])
+def test_stateless_lists_walk_every_pending_once(classroom, add_pendings, kind):
+    ids = add_pendings(25)
+    key = filter_key(c=classroom.id, u=classroom.teacher_id)
+    if kind == "pend":
+        build = lambda: teacher_pendings.pendings_list(key)
+    elif kind == "pendt":
+        key = filter_key(c=classroom.id, u=classroom.teacher_id, k=token_type_sql.get_token_type_by_type("Meme").id, f=0, b=1)
+        build = lambda: teacher_pendings.token_type_pendings_list(key)
+    else:
+        pending_sql.approve_pendings(ids, classroom.teacher_id)
+        ids = ids[::-1]     # newest first
+        build = lambda: teacher_pendings.pending_history_list(key)
+
+    forward = walk(build(), classroom.teacher_chat, ">>")
+    assert forward == [ids[:10], ids[10:20], ids[20:]]
+    backward = walk(last_page(build()), classroom.teacher_chat, "<<")
+    assert backward == forward[::-1]
+
+@pytest.fixture
+def outsider(classroom):
+    """ A teacher of another classroom, on chat 3000. Returns its id. """
+    user_id = user_sql.add_user(3000, "Otro profesor")
+    teacher_sql.add_teacher(user_id)
+    return user_id
+
+@pytest.mark.parametrize("kind", ["pend", "pendh", "lb", "lbg"])
+def test_forged_keys_of_another_classroom_are_refused(classroom, add_pendings, outsider, kind):
+    add_pendings(5)
+    # the key of the outsider itself, or the one of the teacher of the classroom
+    for key in (filter_key(c=classroom.id, u=outsider), filter_key(c=classroom.id, u=classroom.teacher_id)):
+        if kind in ("lb", "lbg"):
+            key = filter_key(c=classroom.id)
+        update = make_update(3000, data=f"pg|{kind}|{key}|1|a0")
+        asyncio.run(pagination.stateless_update(update, None))
+        assert update.callback_query.edits == [("Esta lista ya no está disponible.", None)]
+
+def test_keys_of_another_teacher_of_the_classroom_are_refused(classroom, add_pendings, outsider):
+    ids = add_pendings(15)
+    teacher_classroom_sql.add_teacher_classroom(outsider, classroom.id)
+    for user_id, expected in ((classroom.teacher_id, None), (outsider, ids[10:])):
+        data = button(teacher_pendings.pendings_list(filter_key(c=classroom.id, u=user_id)).keyboard(), ">>")
+        update = make_update(3000, data=data)
+        asyncio.run(pagination.stateless_update(update, None))
+        text, _ = update.callback_query.edits[-1]
+        # only its own list of the classroom is shown
+        if expected:
+            assert pending_ids(text) == expected
+        else:
+            assert text == "Esta lista ya no está disponible."
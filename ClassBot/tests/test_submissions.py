@@ -0,0 +1,28 @@
+""" A resubmission replaces the live submission of the student for the token. """
+import pytest
+
+from sql import pending_sql, token_sql, token_type_sql
+
+
+@pytest.fixture
+def submit(classroom):
+    """ submit(text) sends the submission of the first student for a meme token. """
+    token_type_id = token_type_sql.get_token_type_by_type("Meme").id
+    token_id = token_sql.add_token(name="Meme 1", token_type_id=token_type_id, classroom_id=classroom.id)
+    return lambda text: pending_sql.upsert_submission(classroom.student_ids[0], classroom.id, token_type_id, token_id, text=text)
+
+def test_resubmission_replaces_the_live_one(classroom, submit):
+    first = submit("primera")
+    second = submit("segunda")
+    assert first == second
+    assert pending_sql.get_pending(first).text == "segunda"
+    assert pending_sql.count_pending_rows(classroom.id) == 1
+
+def test_resubmission_goes_back_to_the_classroom_queue(classroom, submit):
+    pending_id = submit("primera")
+    pending_sql.assign_pending(pending_id, classroom.teacher_id)
+    assert pending_sql.count_pending_rows(classroom.id, direct_pending=classroom.teacher_id) == 1
+    submit("segunda")
+    assert pending_sql.get_pending(pending_id).teacher_id is None
+    assert pending_sql.count_pending_rows(classroom.id, direct_pending=classroom.teacher_id) == 0
+    assert pending_sql.count_pending_rows(classroom.id) == 1